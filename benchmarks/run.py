@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the usb_iss host-side overhead and link throughput.
+
+Each scenario is timed against an emulated module (see
+:mod:`usb_iss.emulator`), so the numbers measure the library rather than the
+hardware:
+
+* ``inproc.*`` scenarios talk to the emulator in-process, through the same
+  driver code that's used for a real serial port. These measure the
+  per-call overhead of the public methods.
+* ``pty.*`` scenarios serve the emulator on a pty, so that every command
+  goes through pyserial and the kernel. These measure end-to-end
+  throughput. They are skipped on platforms without ptys.
+
+For each scenario, the best of several timed rounds is reported in ops/sec,
+along with the memory allocated by a single operation (peak bytes, measured
+with tracemalloc) and any memory retained after many operations. For the
+``pty.*`` scenarios, this includes allocations made by the emulator thread.
+
+Results are written as JSON, and compared against a stored baseline::
+
+    $ python benchmarks/run.py                      # compare with baseline
+    $ python benchmarks/run.py --output results.json
+    $ python benchmarks/run.py --save-baseline      # update the baseline
+    $ python benchmarks/run.py --filter i2c
+
+The script exits with status 1 if any scenario is slower than the baseline
+by more than the tolerance, or allocates significantly more memory.
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import usb_iss  # noqa: E402
+from usb_iss import UsbIss  # noqa: E402
+from usb_iss.emulator import Emulator, I2CMemory, PtyEmulator  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "baseline.json")
+
+# Allocation changes smaller than this are treated as noise
+ALLOCATION_SLACK_BYTES = 256
+
+I2C_ADDRESS = 0x50
+
+
+class Scenario(object):
+    """
+    A benchmark scenario.
+
+    Args:
+        name (str): Scenario name.
+        setup (callable): Called with a UsbIss and its Emulator before the
+            scenario is timed. Returns the operation to time.
+        bytes_per_op (int): Payload bytes transferred by each operation,
+            used to report throughput.
+        pty (bool): Run against an emulator served on a pty, rather than
+            in-process.
+    """
+    def __init__(self, name, setup, bytes_per_op=0, pty=False):
+        self.name = name
+        self.setup = setup
+        self.bytes_per_op = bytes_per_op
+        self.pty = pty
+
+
+def _i2c(iss, emulator):
+    emulator.add_i2c_device(I2C_ADDRESS, I2CMemory())
+    iss.setup_i2c()
+
+
+def setup_i2c_read(iss, emulator):
+    _i2c(iss, emulator)
+    return lambda: iss.i2c.read(I2C_ADDRESS, 0x00, 16)
+
+
+def setup_i2c_read_large(iss, emulator):
+    _i2c(iss, emulator)
+    return lambda: iss.i2c.read(I2C_ADDRESS, 0x00, 60)
+
+
+def setup_i2c_write(iss, emulator):
+    _i2c(iss, emulator)
+    data = list(range(16))
+    return lambda: iss.i2c.write(I2C_ADDRESS, 0x00, data)
+
+
+def setup_i2c_batch(iss, emulator):
+    _i2c(iss, emulator)
+
+    def operation():
+        with iss.batch() as batch:
+            results = [batch.i2c.read(I2C_ADDRESS, register, 4)
+                       for register in range(0, 64, 4)]
+        return [result.result() for result in results]
+    return operation
+
+
+def setup_spi_transfer(iss, emulator):
+    iss.setup_spi()
+    data = list(range(32))
+    return lambda: iss.spi.transfer(data)
+
+
+def setup_spi_transfer_large(iss, emulator):
+    iss.setup_spi()
+    data = list(range(61))
+    return lambda: iss.spi.transfer(data)
+
+
+def setup_io_get_ad(iss, emulator):
+    iss.setup_io(io1_type=usb_iss.defs.IOType.ANALOGUE_INPUT)
+    emulator.adc[0] = 512
+    return lambda: iss.io.get_ad(1)
+
+
+def setup_serial_receive(iss, emulator):
+    iss.setup_serial(baud_rate=115200)
+    data = bytearray(range(16))
+
+    # Queue data for each receive, so that every call returns 16 bytes
+    def operation():
+        emulator.serial_input(data)
+        return iss.serial.receive(timeout_ms=0)
+    return operation
+
+
+SCENARIOS = [
+    Scenario("inproc.i2c.read", setup_i2c_read, 16),
+    Scenario("inproc.i2c.write", setup_i2c_write, 16),
+    Scenario("inproc.i2c.batch_16_reads", setup_i2c_batch, 64),
+    Scenario("inproc.spi.transfer", setup_spi_transfer, 32),
+    Scenario("inproc.io.get_ad", setup_io_get_ad, 2),
+    Scenario("inproc.serial.receive", setup_serial_receive, 16),
+    Scenario("pty.i2c.read_60", setup_i2c_read_large, 60, pty=True),
+    Scenario("pty.i2c.write", setup_i2c_write, 16, pty=True),
+    Scenario("pty.i2c.batch_16_reads", setup_i2c_batch, 64, pty=True),
+    Scenario("pty.spi.transfer_61", setup_spi_transfer_large, 61, pty=True),
+    Scenario("pty.io.get_ad", setup_io_get_ad, 2, pty=True),
+]
+
+
+def measure(operation, min_time, rounds):
+    """
+    Time an operation.
+
+    Returns:
+        dict: ops_per_sec (the best round), peak_bytes_per_op and
+        retained_bytes_per_op.
+    """
+    # Warm up, and find how many operations fill a round
+    count = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(count):
+            operation()
+        duration = time.perf_counter() - start
+        if duration >= min_time / 10:
+            break
+        count *= 2
+    count = max(1, int(count * min_time / duration))
+
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(count):
+            operation()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    return {
+        "ops_per_sec": count / best,
+        "peak_bytes_per_op": _peak_bytes(operation),
+        "retained_bytes_per_op": _retained_bytes(operation),
+    }
+
+
+def _peak_bytes(operation, samples=20):
+    # Restarting tracemalloc resets the peak
+    peaks = []
+    for _ in range(samples):
+        tracemalloc.start()
+        operation()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sorted(peaks)[len(peaks) // 2]
+
+
+def _retained_bytes(operation, count=1000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(count):
+        operation()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return max(0.0, (after - before) / float(count))
+
+
+def run_scenario(scenario, min_time, rounds):
+    emulator = Emulator()
+    if scenario.pty:
+        pty = PtyEmulator(emulator).start()
+        iss = UsbIss().open(pty.port)
+    else:
+        pty = None
+        iss = UsbIss(emulator=emulator).open("emulated")
+
+    try:
+        result = measure(scenario.setup(iss, emulator), min_time, rounds)
+    finally:
+        iss.close()
+        if pty is not None:
+            pty.stop()
+
+    result["bytes_per_sec"] = result["ops_per_sec"] * scenario.bytes_per_op
+    return result
+
+
+def run(scenarios, min_time, rounds):
+    results = {}
+    for scenario in scenarios:
+        if scenario.pty and not hasattr(os, "openpty"):
+            print("%-28s skipped (no pty support)" % scenario.name)
+            continue
+        results[scenario.name] = run_scenario(scenario, min_time, rounds)
+        print("%-28s %12.0f ops/sec %8d peak bytes/op" % (
+            scenario.name, results[scenario.name]["ops_per_sec"],
+            results[scenario.name]["peak_bytes_per_op"]))
+
+    return {
+        "usb_iss": usb_iss.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list of str: Descriptions of the regressions found.
+    """
+    regressions = []
+    print()
+    print("%-28s %10s %10s %8s" % ("scenario", "baseline", "current",
+                                   "change"))
+    for name in sorted(results["results"]):
+        if name not in baseline["results"]:
+            continue
+        current = results["results"][name]
+        previous = baseline["results"][name]
+
+        ratio = current["ops_per_sec"] / previous["ops_per_sec"]
+        print("%-28s %10.0f %10.0f %+7.1f%%" % (
+            name, previous["ops_per_sec"], current["ops_per_sec"],
+            (ratio - 1) * 100))
+        if ratio < 1 - tolerance:
+            regressions.append("%s is %.1f%% slower" % (
+                name, (1 - ratio) * 100))
+
+        for key in ["peak_bytes_per_op", "retained_bytes_per_op"]:
+            limit = max(previous[key] * (1 + tolerance),
+                        previous[key] + ALLOCATION_SLACK_BYTES)
+            if current[key] > limit:
+                regressions.append("%s %s grew from %d to %d" % (
+                    name, key, previous[key], current[key]))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="baseline results to compare against")
+    parser.add_argument("--output", help="write the results to a JSON file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save the results as the new baseline")
+    parser.add_argument("--filter", default="",
+                        help="only run scenarios containing this string")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before failing (default 0.25)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum duration of each timed round")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="number of timed rounds per scenario")
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if args.filter in scenario.name]
+    results = run(scenarios, args.min_time, args.rounds)
+
+    if args.output:
+        _write_json(args.output, results)
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found at %s" % args.baseline)
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION: %s" % regression)
+    return 1 if regressions else 0
+
+
+def _write_json(path, results):
+    with open(path, "w") as json_file:
+        json.dump(results, json_file, indent=2, sort_keys=True)
+        json_file.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,15 @@
 from .usb_iss import UsbIss
+from .async_ import AsyncUsbIss
 from . import defs
+from . import session
 from .exceptions import UsbIssError
 
 __version__ = '2.0.1'
 
 __all__ = [
     'UsbIss',
+    'AsyncUsbIss',
     'defs',
+    'session',
     'UsbIssError',
 ]
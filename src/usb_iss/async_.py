@@ -0,0 +1,239 @@
+import asyncio
+from collections import deque
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from time import time as monotonic
+
+from .exceptions import UsbIssError
+from .async_driver import AsyncDriver
+from .usb_iss import UsbIss
+from .i2c import I2C
+from .io import IO
+from .spi import SPI, _frames
+from .serial_ import Serial, _read_response
+from .driver import verify_ack
+from . import defs
+
+
+class AsyncUsbIss(UsbIss):
+    """
+    Interact with the USB_ISS device from asyncio code.
+
+    This has the same methods as :class:`usb_iss.UsbIss`, but they return
+    awaitables instead of the response data. The same applies to the
+    ``i2c``, ``io``, ``spi`` and ``serial`` attributes.
+
+    Commands don't wait for earlier responses before being sent, so
+    commands from concurrent tasks are pipelined automatically and
+    :meth:`batch` isn't needed. Capture, metrics, profiling and the timeout
+    options of :class:`usb_iss.UsbIss` aren't supported.
+
+    Example:
+        ::
+
+            import asyncio
+            from usb_iss import AsyncUsbIss
+
+            async def main():
+                iss = AsyncUsbIss()
+                iss.open("/dev/ttyACM0")
+                await iss.setup_i2c()
+
+                # Both reads are sent before either response arrives
+                data = await asyncio.gather(iss.i2c.read(0x62, 0, 3),
+                                            iss.i2c.read(0x63, 0, 3))
+
+                print(data)
+                # [[0, 1, 2], [3, 4, 5]]
+
+            asyncio.get_event_loop().run_until_complete(main())
+
+    Args:
+        verbose (bool): Print every command and response to the console.
+        data_type (type): Type used to return data read from I2C, SPI and
+            Serial devices. See :class:`usb_iss.UsbIss`.
+        tracer (:class:`usb_iss.trace.Tracer`): Log commands and responses
+            with the given tracer.
+    """
+    def __init__(self, verbose=False, data_type=list, tracer=None):
+        self._drv = AsyncDriver(verbose)
+        if tracer is not None:
+            self._drv.tracer = tracer
+        self._data_type = data_type
+        self._timeouts = None
+        self.metrics = None
+
+        self.i2c = I2C(self._drv, data_type)
+        self.io = AsyncIO(self._drv)
+        self.spi = AsyncSPI(self._drv, data_type)
+        self.serial = AsyncSerial(self._drv, data_type)
+
+        self.current_io_type = 0xAA  # Everything digital input by default
+
+    def open(self, port, loop=None):
+        """
+        Open the specified serial port for communication with the USB_ISS
+        module.
+
+        Args:
+            port (str): Serial port to use for usb_iss communication.
+            loop (asyncio.AbstractEventLoop): Event loop to use, or None for
+                the current event loop.
+        """
+        self._drv.open(port, loop)
+        return self
+
+    async def read_serial_number(self):
+        serial_number = await self._read_serial_number()
+        self.i2c.serial_number = serial_number
+        return serial_number
+
+    def batch(self):
+        raise UsbIssError(
+            "AsyncUsbIss pipelines commands automatically, so batches "
+            "aren't supported")
+
+    def start_capture(self, path, max_bytes=16 * 1024 * 1024,
+                      backup_count=4):
+        raise UsbIssError("Capture isn't supported by AsyncUsbIss")
+
+    def stop_capture(self):
+        raise UsbIssError("Capture isn't supported by AsyncUsbIss")
+
+    def stats(self):
+        raise UsbIssError("Metrics aren't supported by AsyncUsbIss")
+
+    def profile(self, profiler=None, name=None):
+        raise UsbIssError("Profiling isn't supported by AsyncUsbIss")
+
+    def calibrate_timeouts(self, samples=20):
+        raise UsbIssError("Adaptive timeouts aren't supported by AsyncUsbIss")
+
+    def with_timeout(self, timeout=None, deadline=None):
+        raise UsbIssError(
+            "Per-call timeouts aren't supported by AsyncUsbIss - use "
+            "asyncio.wait_for() instead")
+
+
+class AsyncIO(IO):
+    """
+    Asyncio counterpart of :class:`usb_iss.io.IO`. Don't create this
+    directly - use the ``io`` attribute of :class:`AsyncUsbIss`.
+    """
+    def start_watcher(self, *args, **kwargs):
+        raise UsbIssError(
+            "The pin watcher isn't supported by AsyncUsbIss - "
+            "poll get_pins() from a task instead")
+
+
+class AsyncSPI(SPI):
+    """
+    Asyncio counterpart of :class:`usb_iss.spi.SPI`. Don't create this
+    directly - use the ``spi`` attribute of :class:`AsyncUsbIss`.
+    """
+    def transfer_stream(self, write_data, window=4):
+        """
+        Perform an SPI transfer of any length. See
+        :meth:`usb_iss.spi.SPI.transfer_stream`.
+
+        Up to window SPI commands are queued at once. Each is written once
+        the response to the previous one has arrived, without waiting for
+        the caller to take the data.
+
+        Returns:
+            An asynchronous iterator of memoryviews holding the data read
+            from the device, one SPI command at a time.
+
+        Example:
+            ::
+
+                async for chunk in iss.spi.transfer_stream(write_data):
+                    data += chunk
+        """
+        return _AsyncTransferStream(self._drv, write_data, window)
+
+
+class _AsyncTransferStream(object):
+    def __init__(self, drv, write_data, window):
+        self._drv = drv
+        self._frames = _frames(write_data, defs.SPI_MAX_BYTE_COUNT)
+        self._window = window
+        self._in_flight = deque()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while len(self._in_flight) < self._window:
+            frame = next(self._frames, None)
+            if frame is None:
+                break
+            self._in_flight.append(self._drv.transact(
+                defs.Command.SPI.value, frame, 1 + len(frame), _decode_spi))
+
+        if not self._in_flight:
+            raise StopAsyncIteration
+        return await self._in_flight.popleft()
+
+
+def _decode_spi(response):
+    verify_ack(response)
+    return memoryview(response)[1:]
+
+
+class AsyncSerial(Serial):
+    """
+    Asyncio counterpart of :class:`usb_iss.serial_.Serial`. Don't create
+    this directly - use the ``serial`` attribute of :class:`AsyncUsbIss`.
+    """
+    async def transmit(self, data):
+        await self._transaction(data)
+
+    async def transmit_string(self, string, encoding="utf-8"):
+        await self.transmit(string.encode(encoding))
+
+    async def receive(self, timeout_ms=100):
+        data = bytearray()
+        poll_interval = self._poll_interval()
+        deadline = monotonic() + timeout_ms / 1000.0
+
+        while True:
+            received = await self._poll()
+            if received:
+                data += received
+                deadline = monotonic() + timeout_ms / 1000.0
+            interval = poll_interval.update(len(received) > 0)
+
+            remaining = deadline - monotonic()
+            if remaining < 0:
+                return self._data_type(data)
+            await asyncio.sleep(min(interval, remaining))
+
+    async def receive_string(self, timeout_ms=100, encoding="utf-8"):
+        return bytes(await self.receive(timeout_ms)).decode(encoding)
+
+    async def get_rx_count(self):
+        await self._transaction()
+        return len(self._rx_buffer)
+
+    async def get_tx_count(self):
+        return await self._transaction()
+
+    def start_reader(self, *args, **kwargs):
+        raise UsbIssError(
+            "The background reader isn't needed with AsyncUsbIss - "
+            "use receive() instead")
+
+    async def _poll(self):
+        await self._transaction()
+        received = bytes(self._rx_buffer)
+        del self._rx_buffer[:]
+        return received
+
+    async def _transaction(self, data=None):
+        (tx_count, received) = await self._drv.command(
+            defs.Command.SERIAL.value, [] if data is None else data,
+            _read_response)
+        self._rx_buffer.extend(received)
+        return tx_count
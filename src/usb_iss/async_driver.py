@@ -0,0 +1,284 @@
+import asyncio
+from collections import deque
+import serial
+
+from .exceptions import UsbIssError, ResponseTimeoutError
+from .driver import (SERIAL_OPTS, _FixedReader, _sequence_reader, verify_ack,
+                     verify_i2c_ack, verify_ack_error_code, ends_write)
+from .trace import Tracer
+
+
+class AsyncDriver(object):
+    """
+    Internal asyncio serial port driver. Don't use this class directly.
+
+    Commands are written without waiting for earlier responses, so commands
+    from concurrent tasks are pipelined onto the wire. Commands issued in the
+    same event loop iteration are coalesced into a single write. Responses
+    are matched to their commands in the order they were sent.
+
+    SPI and Serial commands have no length field, so the module takes the
+    rest of the write as their data. These commands therefore end a write,
+    and the commands queued after them are held back until their response
+    has arrived.
+
+    The serial port is used in non-blocking mode through its file
+    descriptor, so this driver needs a platform where the event loop can
+    watch serial ports (Linux or macOS).
+    """
+    def __init__(self, verbose=False, timeout=SERIAL_OPTS['timeout']):
+        self._serial = None
+        self._loop = None
+        self.tracer = Tracer.console() if verbose else None
+        self.timeout = timeout
+
+        self._tx_buffer = bytearray()
+        self._rx_buffer = bytearray()
+        self._pending = deque()
+        self._unsent = deque()
+        self._barrier = None
+        self._write_scheduled = False
+        self._timer = None
+
+    def open(self, port, loop=None):
+        opts = dict(SERIAL_OPTS, timeout=0, write_timeout=0)
+        self._serial = serial.Serial(port=port, **opts)
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._loop.add_reader(self._serial.fileno(), self._on_readable)
+        if self.tracer is not None:
+            self.tracer.bind(port)
+        return self
+
+    def close(self):
+        if self._serial is None:
+            return
+
+        self._loop.remove_reader(self._serial.fileno())
+        self._loop.remove_writer(self._serial.fileno())
+        self._serial.close()
+        self._serial = None
+        self._fail_pending(UsbIssError("Serial port has been closed"))
+
+    def command(self, command, data, reader):
+        """
+        Queue a command for writing. Returns a future holding the response,
+        decoded by the reader.
+        """
+        return self.commands([(command, data)], reader)
+
+    def commands(self, commands, reader):
+        """
+        Queue a sequence of (command, data) pairs for writing. Returns a
+        single future holding all of their responses, decoded by the reader.
+        """
+        if self._serial is None:
+            raise UsbIssError("Serial port has not been opened")
+
+        frames = bytearray()
+        for command, data in commands:
+            frames.append(command)
+            if data is not None:
+                frames.extend(data)
+
+        if self.tracer is not None:
+            self.tracer.write(commands)
+
+        future = self._loop.create_future()
+        entry = (reader, future)
+        self._pending.append(entry)
+        self._unsent.append((frames, entry, ends_write(commands)))
+        self._send()
+        if self._timer is None:
+            self._restart_timer()
+        return future
+
+    def transact(self, command, data, response_len, decode=None):
+        """
+        Queue a command whose response has a known length.
+        """
+        return self.command(command, data,
+                            _FixedReader(response_len, decode))
+
+    def transact_many(self, commands, response_lens, decode=None):
+        """
+        Queue a sequence of (command, data) pairs with fixed-length
+        responses.
+        """
+        return self.commands(commands,
+                             _sequence_reader(response_lens, decode))
+
+    def completed(self, value):
+        """
+        Returns a future that already holds the value, without queuing a
+        command.
+        """
+        future = self._loop.create_future()
+        future.set_result(value)
+        return future
+
+    def gather(self, futures, combine):
+        """
+        Returns a future holding the combined values of several futures,
+        once they have all completed. If any of them failed, it holds the
+        first error instead, and if any were cancelled it is cancelled.
+        """
+        gathered = self._loop.create_future()
+
+        def done(_):
+            if gathered.done() or not all(future.done()
+                                          for future in futures):
+                return
+            if any(future.cancelled() for future in futures):
+                gathered.cancel()
+                return
+            try:
+                gathered.set_result(combine(
+                    [future.result() for future in futures]))
+            except Exception as ex:
+                gathered.set_exception(ex)
+
+        for future in futures:
+            future.add_done_callback(done)
+        return gathered
+
+    def _send(self):
+        # Move commands to the write buffer, up to the first one that ends a
+        # write. The rest wait until its response has arrived.
+        while self._unsent and self._barrier is None:
+            (frames, entry, ends) = self._unsent.popleft()
+            self._tx_buffer += frames
+            if ends:
+                self._barrier = entry
+
+        if self._tx_buffer and not self._write_scheduled:
+            self._write_scheduled = True
+            self._loop.call_soon(self._write)
+
+    def _write(self):
+        self._write_scheduled = False
+        if self._serial is None or not self._tx_buffer:
+            return
+
+        written = self._serial.write(self._tx_buffer)
+        del self._tx_buffer[:written]
+
+        fileno = self._serial.fileno()
+        if self._tx_buffer:
+            self._loop.add_writer(fileno, self._write)
+        else:
+            self._loop.remove_writer(fileno)
+
+    def _on_readable(self):
+        data = self._serial.read(max(1, self._serial.in_waiting))
+        if not data:
+            return
+
+        if self.tracer is not None:
+            self.tracer.read(data)
+
+        self._rx_buffer += data
+        self._process()
+
+    def _process(self):
+        while self._pending:
+            (reader, future) = self._pending[0]
+            if (isinstance(reader, _FixedReader) and
+                    len(self._rx_buffer) < reader.length):
+                break
+
+            source = _ResponseBuffer(self._rx_buffer)
+            try:
+                result = reader(source)
+            except _Incomplete:
+                break
+            except Exception as ex:
+                self._complete(source, future, exception=ex)
+            else:
+                self._complete(source, future, result=result)
+
+        self._restart_timer()
+
+    def _complete(self, source, future, result=None, exception=None):
+        del self._rx_buffer[:source.offset]
+        if self._pending.popleft() is self._barrier:
+            self._barrier = None
+            self._send()
+
+        # The response must be consumed even if nobody is waiting for it
+        if future.cancelled():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def _restart_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            self._timer = self._loop.call_later(self.timeout, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timer = None
+        # The response stream can't be trusted after a timeout
+        del self._rx_buffer[:]
+        self._fail_pending(
+            ResponseTimeoutError("Timed out waiting for a response"))
+
+    def _fail_pending(self, exception):
+        pending, self._pending = self._pending, deque()
+        self._unsent.clear()
+        self._barrier = None
+        # Commands that haven't been written yet would have their responses
+        # matched to later commands
+        del self._tx_buffer[:]
+        if self._serial is not None:
+            self._loop.remove_writer(self._serial.fileno())
+        for (_, future) in pending:
+            if not future.done():
+                future.set_exception(exception)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class _Incomplete(Exception):
+    """
+    Raised when a reader needs more data than has been received so far.
+    """
+    pass
+
+
+class _ResponseBuffer(object):
+    """
+    Presents the data received so far to a reader, as if it were a Driver.
+    Raises _Incomplete if the reader asks for more, so that it can be run
+    again from the start once more data arrives.
+    """
+    def __init__(self, data):
+        self._data = data
+        self.offset = 0
+
+    def read(self, byte_count):
+        end = self.offset + byte_count
+        if end > len(self._data):
+            raise _Incomplete()
+
+        data = bytes(self._data[self.offset:end])
+        self.offset = end
+        return data
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        view[:] = self.read(len(view))
+        return len(view)
+
+    def check_i2c_ack(self):
+        verify_i2c_ack(self.read(1))
+
+    def check_ack(self):
+        verify_ack(self.read(1))
+
+    def check_ack_error_code(self, error_enum):
+        return verify_ack_error_code(self.read(2), error_enum)
@@ -0,0 +1,66 @@
+from .i2c import I2C
+from .io import IO
+from .spi import SPI
+
+
+class Batch(object):
+    """
+    Queue I2C, IO and SPI commands and send them to the USB_ISS module in a
+    single write, avoiding a USB round trip per command. Create one with
+    :meth:`usb_iss.UsbIss.batch`.
+
+    SPI commands have no length field, so the module takes the rest of the
+    write as SPI data. Each SPI command therefore ends a write, and the
+    commands queued after it are sent once its response has arrived.
+
+    The batch's methods return :class:`usb_iss.driver.Result` objects
+    instead of the response data. These are filled in when the batch is
+    flushed, which happens automatically when leaving the ``with`` block or
+    when a result is first requested.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+
+            iss = UsbIss()
+            iss.open("COM3")
+            iss.setup_i2c()
+
+            with iss.batch() as batch:
+                status = batch.i2c.read(0x62, 0x00, 1)
+                samples = [batch.io.get_ad(pin) for pin in [3, 4]]
+
+            print(status.result())
+            # [0]
+            print([sample.result() for sample in samples])
+            # [512, 1023]
+
+    Attributes:
+        i2c (:class:`i2c.I2C`): Queue I2C commands.
+        io (:class:`io.IO`): Queue IO commands.
+        spi (:class:`spi.SPI`): Queue SPI commands.
+    """
+    def __init__(self, pipeline, data_type=list, io_outputs=None,
+                 i2c_bus=None):
+        self._pipeline = pipeline
+
+        self.i2c = I2C(pipeline, data_type, i2c_bus)
+        self.io = IO(pipeline, io_outputs)
+        self.spi = SPI(pipeline, data_type)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._pipeline.__exit__(exc_type, exc_value, traceback)
+
+    def flush(self):
+        """
+        Send all queued commands, then read back their responses.
+
+        Returns:
+            list of :class:`usb_iss.driver.Result`: Results of the flushed
+            commands, in the order they were queued.
+        """
+        return self._pipeline.flush()
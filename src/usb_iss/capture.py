@@ -0,0 +1,200 @@
+from collections import namedtuple
+import mmap
+import os
+import struct
+import threading
+import time
+try:
+    from time import monotonic_ns
+except ImportError:  # pragma: no cover
+    from time import monotonic
+
+    def monotonic_ns():
+        return int(monotonic() * 1e9)
+
+from .exceptions import UsbIssError
+
+WRITE = b"W"
+READ = b"R"
+
+# File header: magic, format version, wall-clock start time (ns since epoch)
+_HEADER = struct.Struct("<6sHQ")
+_MAGIC = b"USBISS"
+_VERSION = 1
+
+# Record header: direction, time since the capture started (ns), data length
+_RECORD = struct.Struct("<cQI")
+
+Frame = namedtuple('Frame', ['timestamp', 'direction', 'data'])
+Frame.__doc__ = """
+A write to, or read from, the module's serial port.
+
+Attributes:
+    timestamp (int): Time since the capture started, in nanoseconds.
+    direction (bytes): :data:`WRITE` or :data:`READ`.
+    data (bytes): The bytes written or read. A read that timed out holds the
+        bytes that arrived before the timeout.
+"""
+
+
+class CaptureWriter(object):
+    """
+    Appends the bytes written to and read from the module's serial port to
+    a compact binary log, for debugging issues that need the exact byte
+    stream. Start a capture with :meth:`usb_iss.UsbIss.start_capture`, and
+    read it back with :func:`read_capture` or replay it with
+    :class:`usb_iss.replay.Replay`.
+
+    Each file is preallocated and memory-mapped, so appending a frame is a
+    copy into memory rather than a system call. The file is truncated to
+    its used length when it is closed. If the process dies first, the rest
+    of the file is left zeroed, and readers stop at the first empty record.
+
+    Files are rotated by size, like
+    :class:`logging.handlers.RotatingFileHandler`: when the file at path is
+    full, it is renamed to path.1 (path.1 to path.2 and so on), and a new
+    file is started. The oldest files beyond backup_count are deleted. Any
+    earlier capture at the same path, including its rotated files, is
+    replaced.
+
+    Args:
+        path (str): Path of the capture file.
+        max_bytes (int): Size of each capture file.
+        backup_count (int): Number of rotated files to keep.
+    """
+    def __init__(self, path, max_bytes=16 * 1024 * 1024, backup_count=4):
+        if max_bytes < _HEADER.size + _RECORD.size:
+            raise UsbIssError("max_bytes is too small for a capture file")
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._start_ns = monotonic_ns()
+        self._wall_start_ns = int(time.time() * 1e9)
+        self._file = None
+        self._map = None
+        self._offset = 0
+
+        index = 1
+        while os.path.exists(_rotated_path(path, index)):
+            os.remove(_rotated_path(path, index))
+            index += 1
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        """
+        Record bytes written to the module.
+        """
+        self._append(WRITE, data)
+
+    def read(self, data):
+        """
+        Record bytes read from the module.
+        """
+        self._append(READ, data)
+
+    def close(self):
+        """
+        Close the capture file, truncating it to its used length.
+        """
+        with self._lock:
+            self._close()
+
+    def _append(self, direction, data):
+        data = bytes(data)
+        size = _RECORD.size + len(data)
+        with self._lock:
+            if self._map is None:
+                raise UsbIssError("Capture has been closed")
+            if self._offset + size > self.max_bytes:
+                if _HEADER.size + size > self.max_bytes:
+                    raise UsbIssError(
+                        "Capture frame of %d bytes is larger than max_bytes"
+                        % len(data))
+                self._rotate()
+
+            _RECORD.pack_into(self._map, self._offset, direction,
+                              monotonic_ns() - self._start_ns, len(data))
+            start = self._offset + _RECORD.size
+            self._map[start:start + len(data)] = data
+            self._offset += size
+
+    def _open(self):
+        self._file = open(self.path, "w+b")
+        self._file.truncate(self.max_bytes)
+        self._map = mmap.mmap(self._file.fileno(), self.max_bytes)
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION,
+                          self._wall_start_ns)
+        self._offset = _HEADER.size
+
+    def _close(self):
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map.close()
+        self._map = None
+        self._file.truncate(self._offset)
+        self._file.close()
+        self._file = None
+
+    def _rotate(self):
+        self._close()
+        # Renaming onto the oldest file deletes it
+        for index in range(self.backup_count - 1, -1, -1):
+            source = _rotated_path(self.path, index)
+            if os.path.exists(source):
+                os.replace(source, _rotated_path(self.path, index + 1))
+        self._open()
+
+
+def read_capture(path):
+    """
+    Read the frames of a capture, including any rotated files, oldest first.
+
+    Args:
+        path (str): Path of the capture file, as given to
+            :class:`CaptureWriter`.
+    Returns:
+        generator of :class:`Frame`: The frames.
+    """
+    index = 1
+    while os.path.exists(_rotated_path(path, index)):
+        index += 1
+
+    for file_index in range(index - 1, -1, -1):
+        for frame in _read_file(_rotated_path(path, file_index)):
+            yield frame
+
+
+def _read_file(path):
+    with open(path, "rb") as capture_file:
+        data = capture_file.read()
+
+    if len(data) < _HEADER.size:
+        raise UsbIssError("%s is not a USB_ISS capture" % path)
+    (magic, version, _) = _HEADER.unpack_from(data, 0)
+    if magic != _MAGIC:
+        raise UsbIssError("%s is not a USB_ISS capture" % path)
+    if version != _VERSION:
+        raise UsbIssError("Unsupported capture version %d" % version)
+
+    offset = _HEADER.size
+    while offset + _RECORD.size <= len(data):
+        (direction, timestamp, length) = _RECORD.unpack_from(data, offset)
+        if direction not in (WRITE, READ):
+            # The rest of a file that wasn't closed is zeroed
+            return
+        start = offset + _RECORD.size
+        yield Frame(timestamp, direction, data[start:start + length])
+        offset = start + length
+
+
+def _rotated_path(path, index):
+    return path if index == 0 else "%s.%d" % (path, index)
@@ -151,3 +151,24 @@ I2C_AD1_MAX_READ_BYTE_COUNT = 60
 I2C_AD2_MAX_WRITE_BYTE_COUNT = 59
 I2C_AD2_MAX_READ_BYTE_COUNT = 64
 SPI_MAX_BYTE_COUNT = 62
+
+# Maximum size of an I2C_DIRECT command sequence, and of the data it reads
+I2C_DIRECT_MAX_SEQUENCE_BYTE_COUNT = 60
+I2C_DIRECT_MAX_READ_BYTE_COUNT = 60
+
+# Size of the module's Serial UART receive buffer
+SERIAL_RX_BUFFER_SIZE = 62
+
+# I2C clock rate of each I2C mode in Hz, keyed by the upper nibble of the mode
+I2C_CLOCKS_HZ = {
+    0x2: 20000,
+    0x3: 50000,
+    0x4: 100000,
+    0x5: 400000,
+    0x6: 100000,
+    0x7: 400000,
+    0x8: 1000000,
+}
+
+# The SPI clock rate is SPI_BASE_CLOCK_HZ / (divisor + 1)
+SPI_BASE_CLOCK_HZ = 6000000
@@ -0,0 +1,148 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+from serial.tools import list_ports
+
+from .driver import Driver
+from . import defs
+
+#: USB vendor ID of the USB_ISS module.
+USB_VID = 0x04D8
+#: USB product ID of the USB_ISS module.
+USB_PID = 0xFFEE
+
+#: Serial timeout used when probing ports. A USB_ISS module responds within
+#: a few milliseconds, so this only delays ports that aren't modules.
+PROBE_TIMEOUT = 0.1
+
+MODULE_ID = 7
+
+ModuleInfo = namedtuple('ModuleInfo',
+                        ['port', 'serial_number', 'fw_version', 'hwid'])
+ModuleInfo.__doc__ = """
+A USB_ISS module found by :func:`discover`.
+
+Attributes:
+    port (str): Serial port of the module.
+    serial_number (str): Serial number read from the module.
+    fw_version (int): Firmware version read from the module.
+    hwid (str): USB hardware ID of the port, as reported by pyserial.
+"""
+
+
+def discover(vid=USB_VID, pid=USB_PID, timeout=PROBE_TIMEOUT,
+             cache_path=None):
+    """
+    Find the USB_ISS modules attached to this machine.
+
+    Serial ports are filtered by USB vendor and product ID before they are
+    opened. The remaining ports are probed in parallel, reading each
+    module's ID, firmware version and serial number.
+
+    Args:
+        vid (int): USB vendor ID to look for, or None to probe ports with any
+            vendor ID.
+        pid (int): USB product ID to look for, or None to probe ports with
+            any product ID.
+        timeout (float): Serial timeout in seconds while probing each port.
+        cache_path (str): Optional JSON file used to cache the modules found.
+            Ports whose USB hardware ID hasn't changed since the last call
+            aren't probed again. Ports that have been re-enumerated (for
+            example, because a different module was plugged in) are probed
+            as usual.
+    Returns:
+        list of :class:`ModuleInfo`: The modules found, sorted by port.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+            from usb_iss.discovery import discover
+
+            modules = {module.serial_number: module
+                       for module in discover(cache_path="usb_iss.json")}
+
+            iss = UsbIss()
+            iss.open(modules["00000001"].port)
+    """
+    candidates = [port for port in list_ports.comports()
+                  if (vid is None or port.vid == vid) and
+                  (pid is None or port.pid == pid)]
+
+    cache = _load_cache(cache_path)
+    modules = []
+    to_probe = []
+    for port in candidates:
+        cached = cache.get(port.device)
+        if cached is not None and cached.hwid == port.hwid:
+            modules.append(cached)
+        else:
+            to_probe.append(port)
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=len(to_probe)) as executor:
+            probed = list(executor.map(
+                lambda port: probe(port.device, timeout, port.hwid),
+                to_probe))
+        modules += [module for module in probed if module is not None]
+
+    modules.sort(key=lambda module: module.port)
+    if cache_path is not None:
+        _save_cache(cache_path, modules)
+    return modules
+
+
+def probe(port, timeout=PROBE_TIMEOUT, hwid=None):
+    """
+    Check whether a USB_ISS module is attached to a serial port.
+
+    Args:
+        port (str): Serial port to probe.
+        timeout (float): Serial timeout in seconds.
+        hwid (str): USB hardware ID to store in the result.
+    Returns:
+        :class:`ModuleInfo`: The module found, or None if the port couldn't
+        be opened or didn't respond like a USB_ISS module.
+    """
+    drv = Driver()
+    try:
+        drv.open(port, timeout=timeout)
+        with drv.pipeline() as pipeline:
+            version = pipeline.transact(defs.Command.USB_ISS.value,
+                                        [defs.SubCommand.ISS_VERSION.value],
+                                        3)
+            serial_number = pipeline.transact(
+                defs.Command.USB_ISS.value,
+                [defs.SubCommand.GET_SER_NUM.value], 8)
+
+        if version.result()[0] != MODULE_ID:
+            return None
+        return ModuleInfo(
+            port, ''.join([chr(byte) for byte in serial_number.result()]),
+            version.result()[1], hwid)
+    except Exception:
+        return None
+    finally:
+        drv.close()
+
+
+def _load_cache(cache_path):
+    if cache_path is None or not os.path.exists(cache_path):
+        return {}
+
+    try:
+        with open(cache_path) as cache_file:
+            entries = json.load(cache_file)
+        modules = [ModuleInfo(**entry) for entry in entries]
+    except (ValueError, TypeError):
+        # Ignore a corrupt or outdated cache - it'll be rewritten
+        return {}
+    return {module.port: module for module in modules}
+
+
+def _save_cache(cache_path, modules):
+    with open(cache_path, 'w') as cache_file:
+        json.dump([module._asdict() for module in modules], cache_file,
+                  indent=2)
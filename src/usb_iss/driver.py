@@ -1,7 +1,15 @@
-from __future__ import print_function
+from concurrent.futures import Future
+from contextlib import contextmanager
+import math
+import threading
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from time import time as monotonic
 import serial
 
-from .exceptions import UsbIssError
+from .exceptions import UsbIssError, ResponseTimeoutError
+from .trace import Tracer
 from . import defs
 
 # In Py2, bytes means str, and there's no immutable byte array defined.
@@ -19,17 +27,80 @@ SERIAL_OPTS = {
     'timeout': 0.5,
 }
 
+# Fixed-length responses queued in a pipeline are read back together, up to
+# one full-speed USB packet at a time. Larger reads gain little, and risk
+# running into the serial read timeout on slow buses.
+MAX_GROUPED_READ = 64
+
+# Commands without a length field. The module takes the rest of the USB
+# packet as their data, so nothing can follow them in the same write.
+UNFRAMED_COMMANDS = (defs.Command.SPI.value, defs.Command.SERIAL.value)
+
+
+def verify_ack(response):
+    """
+    Raise an error unless the response starts with an ACK.
+    """
+    if response[0] != defs.ResponseCode.ACK.value:
+        raise UsbIssError("Received 0x%02X instead of ACK" % response[0])
+
+
+def verify_i2c_ack(response):
+    """
+    For I2C, any non-zero code means ACK.
+    """
+    if response[0] == defs.ResponseCode.NACK.value:
+        raise UsbIssError("Received NACK instead of ACK")
+
+
+def verify_ack_error_code(response, error_enum):
+    """
+    Raise an error unless the response starts with an ACK, reporting the
+    error code in the second byte if not. Returns the second byte.
+    """
+    if response[0] != defs.ResponseCode.ACK.value:
+        raise UsbIssError(
+            "Received %s [0x%02X, 0x%02X] instead of ACK"
+            % (error_enum(response[1]), response[0], response[1]))
+    return response[1]
+
 
 class Driver(object):
     """
     Internal serial port driver. Don't use this class directly.
+
+    Commands written with :meth:`commands` (and the methods built on it)
+    hold the lock until their responses have been read, so they can be
+    issued from more than one thread.
+
+    Set metrics to a :class:`usb_iss.metrics.Metrics` to record each write,
+    capture to a :class:`usb_iss.capture.CaptureWriter` to record the bytes
+    written and read, and tracer to a :class:`usb_iss.trace.Tracer` to log
+    them. Set timeouts to a :class:`usb_iss.timeouts.Timeouts` to work out
+    the read timeout from the commands written, instead of using a fixed
+    timeout.
+
+    After a read times out, any late response is discarded before the next
+    write, to keep the responses in sync with their commands.
     """
     def __init__(self, verbose=False):
         self._serial = None
-        self.verbose = verbose
+        self.tracer = Tracer.console() if verbose else None
+        self.lock = threading.RLock()
+        self.metrics = None
+        self.capture = None
+        self.timeouts = None
+        self.timeout = SERIAL_OPTS['timeout']
+        self._deadline = None
+        self._timeout_adjusted = False
+        self._timed_out = False
+        self._bytes_read = 0
 
-    def open(self, port):
-        self._serial = serial.Serial(port=port, **SERIAL_OPTS)
+    def open(self, port, timeout=SERIAL_OPTS['timeout']):
+        opts = dict(SERIAL_OPTS, timeout=timeout)
+        self._serial = serial.Serial(port=port, **opts)
+        self.timeout = timeout
+        self._bind_tracer(port)
         return self
 
     def close(self):
@@ -38,77 +109,418 @@ class Driver(object):
             self._serial = None
 
     def write_cmd(self, command, data=None):
+        self.write_cmds([(command, data)])
+
+    def write_cmds(self, commands):
+        """
+        Write a sequence of (command, data) pairs to the serial port in a
+        single write.
+        """
         if self._serial is None:
             raise UsbIssError("Serial port has not been opened")
 
-        if data is None:
-            data = []
+        frames = bytearray()
+        for command, data in commands:
+            frames.append(command)
+            if data is not None:
+                frames.extend(data)
+
+        if self.tracer is not None:
+            self.tracer.write(commands)
+        if self.capture is not None:
+            self.capture.write(frames)
+        if self._timed_out:
+            self._serial.reset_input_buffer()
+            self._timed_out = False
+        if self.timeouts is not None:
+            timeout = self.timeouts.timeout(commands)
+            self._serial.write(frames)
+            self._deadline = monotonic() + timeout
+        else:
+            self._serial.write(frames)
+
+    def command(self, command, data, reader):
+        """
+        Write a command, then read and decode its response.
+
+        The reader is called with this driver once the command has been
+        written, and is responsible for reading the whole response.
+        """
+        return self.commands([(command, data)], reader)
+
+    def commands(self, commands, reader):
+        """
+        Write a sequence of (command, data) pairs in a single write, then
+        read and decode all of their responses with the reader.
+        """
+        with self.lock:
+            deadline = self._deadline
+            try:
+                if self.metrics is not None:
+                    return self.metrics.measure(self, commands, reader)
+                self.write_cmds(commands)
+                return reader(self)
+            finally:
+                # The deadline only applies to the responses to this write
+                self._deadline = deadline
 
-        if self.verbose:
-            print("USB_ISS write: ", end="")
-            print(" ".join(["%02X" % byte for byte in [command] + data]))
+    def transact(self, command, data, response_len, decode=None):
+        """
+        Write a command whose response has a known length, and read the
+        whole response (including any ACK byte) in a single read.
 
-        self._serial.write(bytes([command] + data))
+        Returns the response, passed through decode if given.
+        """
+        return self.command(command, data,
+                            _FixedReader(response_len, decode))
+
+    def transact_many(self, commands, response_lens, decode=None):
+        """
+        Write a sequence of (command, data) pairs in a single write, then
+        read each of their fixed-length responses in turn.
+
+        Returns the list of responses, passed through decode if given.
+        """
+        return self.commands(commands,
+                             _sequence_reader(response_lens, decode))
+
+    def completed(self, value):
+        """
+        Return a value that is already known, such as a cached response, in
+        the same form as the result of a command.
+        """
+        return value
+
+    def gather(self, results, combine):
+        """
+        Combine the results of several commands into one, in the same form
+        as the result of a command.
+        """
+        return combine(results)
+
+    def pipeline(self):
+        return Pipeline(self)
 
     def read(self, byte_count):
         if self._serial is None:
             raise UsbIssError("Serial port has not been opened")
 
         if byte_count == 0:
-            return []
+            return bytes()
 
-        data = list(bytes(self._serial.read(byte_count)))
-
-        if self.verbose:
-            print("USB_ISS read : ", end="")
-            print(" ".join(["%02X" % byte for byte in data]))
+        self._apply_deadline()
+        data = bytes(self._serial.read(byte_count))
+        self._bytes_read += len(data)
+        if self.capture is not None:
+            self.capture.read(data)
+        if self.tracer is not None:
+            self.tracer.read(data)
 
         if len(data) != byte_count:
-            raise UsbIssError(
+            self._timed_out = True
+            raise ResponseTimeoutError(
                 "Expected %d bytes, but %d received" % (byte_count, len(data)))
         return data
 
+    def readinto(self, buffer):
+        """
+        Read exactly len(buffer) bytes into a writable bytes-like object.
+        """
+        if self._serial is None:
+            raise UsbIssError("Serial port has not been opened")
+
+        view = memoryview(buffer).cast('B')
+        if len(view) == 0:
+            return 0
+
+        self._apply_deadline()
+        byte_count = self._serial.readinto(view)
+        self._bytes_read += byte_count
+        if self.capture is not None:
+            self.capture.read(view[:byte_count])
+        if self.tracer is not None:
+            self.tracer.read(view[:byte_count])
+
+        if byte_count != len(view):
+            self._timed_out = True
+            raise ResponseTimeoutError(
+                "Expected %d bytes, but %d received" % (len(view), byte_count))
+        return byte_count
+
     def check_i2c_ack(self):
-        """For I2C, any non-zero code means ACK"""
-        data = self.read(1)
-        if data[0] == defs.ResponseCode.NACK.value:
-            raise UsbIssError("Received NACK instead of ACK")
+        verify_i2c_ack(self.read(1))
 
     def check_ack(self):
-        data = self.read(1)
-        if data[0] != defs.ResponseCode.ACK.value:
-            raise UsbIssError("Received 0x%02X instead of ACK" % data[0])
+        verify_ack(self.read(1))
 
     def check_ack_error_code(self, error_enum):
-        data = self.read(2)
-        if data[0] != defs.ResponseCode.ACK.value:
-            raise UsbIssError(
-                "Received %s [0x%02X, 0x%02X] instead of ACK"
-                % (error_enum(data[1]), data[0], data[1]))
-        return data[1]
+        return verify_ack_error_code(self.read(2), error_enum)
+
+    @contextmanager
+    def deadline(self, deadline):
+        """
+        Read responses by the given monotonic() time, instead of using the
+        usual timeout.
+        """
+        previous = self._deadline
+        self._deadline = deadline
+        try:
+            yield
+        finally:
+            self._deadline = previous
+            if previous is None:
+                self._restore_timeout()
+
+    def _apply_deadline(self):
+        if self._deadline is not None:
+            self._set_timeout(self._deadline - monotonic())
+        else:
+            self._restore_timeout()
+
+    def _set_timeout(self, timeout):
+        # Rounded up to whole milliseconds (ignoring rounding errors), so
+        # that the serial port is only reconfigured when the timeout changes
+        timeout = max(0, math.ceil(timeout * 1000 - 1e-6)) / 1000.0
+        if self._serial.timeout != timeout:
+            self._serial.timeout = timeout
+            self._timeout_adjusted = True
 
+    def _restore_timeout(self):
+        if self._timeout_adjusted and self._serial is not None:
+            self._serial.timeout = self.timeout
+            self._timeout_adjusted = False
 
-class DummyDriver(object):  # pragma: no cover
+    def _bind_tracer(self, port):
+        if self.tracer is not None:
+            self.tracer.bind(port)
+
+
+class _FixedReader(object):
     """
-    Dummy Driver object, used for testing.
+    Reader for a response of known length, which can be read in one go.
     """
-    def open(self, _):
+    def __init__(self, length, decode=None):
+        self.length = length
+        self.decode = decode
+
+    def __call__(self, drv):
+        return self.parse(drv.read(self.length))
+
+    def parse(self, response):
+        if self.decode is None:
+            return response
+        return self.decode(response)
+
+
+def _sequence_reader(response_lens, decode=None):
+    def read_responses(drv):
+        responses = [drv.read(length) for length in response_lens]
+        return responses if decode is None else decode(responses)
+    return read_responses
+
+
+class Pipeline(object):
+    """
+    Queues commands so that they can be written to the serial port in a
+    single write (or one write per SPI or SERIAL command, which must come
+    last in a write). The responses are then read back and decoded in order.
+    Don't use this class directly - see :meth:`usb_iss.UsbIss.batch`.
+    """
+    def __init__(self, drv):
+        self._drv = drv
+        self._pending = []
+
+    def __enter__(self):
         return self
 
-    def close(self):
-        pass
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
 
-    def write_cmd(self, command, data=None):
-        pass
+    def command(self, command, data, reader):
+        """
+        Queue a command. Returns a :class:`Result` that holds the decoded
+        response once the pipeline has been flushed.
+        """
+        return self.commands([(command, data)], reader)
 
-    def read(self, byte_count):
-        return list(range(byte_count))
+    def commands(self, commands, reader):
+        """
+        Queue a sequence of (command, data) pairs, whose responses are all
+        read and decoded by the reader. Returns a single :class:`Result`.
+        """
+        return self.add(commands, reader, Result(self))
 
-    def check_i2c_ack(self):
-        pass
+    def add(self, commands, reader, future):
+        """
+        Queue a sequence of (command, data) pairs, storing the decoded
+        response in the given future once the pipeline has been flushed.
+        """
+        self._pending.append((commands, reader, future))
+        return future
 
-    def check_ack(self):
-        pass
+    def transact(self, command, data, response_len, decode=None):
+        """
+        Queue a command whose response has a known length. Consecutive
+        fixed-length responses are read back together in a single read.
+        """
+        return self.command(command, data,
+                            _FixedReader(response_len, decode))
 
-    def check_ack_error_code(self, error_enum):
-        return 0
+    def transact_many(self, commands, response_lens, decode=None):
+        """
+        Queue a sequence of (command, data) pairs with fixed-length
+        responses. Returns a single :class:`Result` holding the list of
+        responses, passed through decode if given.
+        """
+        return self.commands(commands,
+                             _sequence_reader(response_lens, decode))
+
+    def completed(self, value):
+        """
+        Returns a :class:`Result` that already holds the value, without
+        queuing a command.
+        """
+        result = Result(self)
+        result.set_result(value)
+        return result
+
+    def gather(self, results, combine):
+        """
+        Returns a :class:`Result` holding the combined values of several
+        queued results, once they have all been filled in. If any of them
+        failed, it holds the first error instead.
+        """
+        gathered = Result(self)
+        remaining = [len(results)]
+
+        def done(_):
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                _resolve(gathered, lambda results: combine(
+                    [result.result() for result in results]), results)
+
+        for result in results:
+            result.add_done_callback(done)
+        return gathered
+
+    def pipeline(self):
+        return self
+
+    def flush(self):
+        """
+        Write all queued commands, then read and decode their responses.
+
+        Returns:
+            list of Result: The results of the flushed commands, in order.
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+
+        with self._drv.lock:
+            deadline = self._drv._deadline
+            try:
+                if self._drv.metrics is not None:
+                    self._drv.metrics.measure_pipeline(self._drv, pending,
+                                                       self._flush)
+                else:
+                    self._flush(pending)
+            finally:
+                self._drv._deadline = deadline
+        return [result for (_, _, result) in pending]
+
+    def _flush(self, pending):
+        # The write ends after each SPI or SERIAL command, and the next write
+        # waits for its response so that the writes aren't merged
+        start = 0
+        for (index, (commands, _, _)) in enumerate(pending):
+            if index == len(pending) - 1 or ends_write(commands):
+                self._flush_write(pending[start:index + 1])
+                start = index + 1
+
+    def _flush_write(self, pending):
+        self._drv.write_cmds([command
+                              for (commands, _, _) in pending
+                              for command in commands])
+
+        # Every response must be read to keep the stream in sync, so errors
+        # are stored in the failing command's result rather than raised.
+        fixed = []
+        fixed_len = 0
+        for (_, reader, result) in pending:
+            if not isinstance(reader, _FixedReader):
+                self._read_fixed(fixed)
+                fixed, fixed_len = [], 0
+                _resolve(result, reader, self._drv)
+                continue
+
+            if fixed and fixed_len + reader.length > MAX_GROUPED_READ:
+                self._read_fixed(fixed)
+                fixed, fixed_len = [], 0
+            fixed.append((reader, result))
+            fixed_len += reader.length
+        self._read_fixed(fixed)
+
+    def _read_fixed(self, fixed):
+        if not fixed:
+            return
+
+        total = sum(reader.length for (reader, _) in fixed)
+        try:
+            response = self._drv.read(total)
+        except Exception as ex:
+            for (_, result) in fixed:
+                result.set_exception(ex)
+            return
+
+        offset = 0
+        for (reader, result) in fixed:
+            chunk = response[offset:offset + reader.length]
+            offset += reader.length
+            _resolve(result, reader.parse, chunk)
+
+    def discard(self):
+        """
+        Drop all queued commands without sending them.
+        """
+        pending, self._pending = self._pending, []
+        for (_, _, result) in pending:
+            result.cancel()
+
+
+def ends_write(commands):
+    """
+    True if a sequence of (command, data) pairs includes an SPI or SERIAL
+    command, which must be the last command in its write.
+    """
+    return any(command in UNFRAMED_COMMANDS for (command, _) in commands)
+
+
+def _resolve(result, reader, source):
+    try:
+        result.set_result(reader(source))
+    except Exception as ex:
+        result.set_exception(ex)
+
+
+class Result(Future):
+    """
+    The pending result of a queued command. Calling :meth:`result` before
+    the pipeline has been flushed will flush it first.
+    """
+    def __init__(self, pipeline):
+        super(Result, self).__init__()
+        self._pipeline = pipeline
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._pipeline.flush()
+        return super(Result, self).result(timeout)
+
+    def exception(self, timeout=None):
+        if not self.done():
+            self._pipeline.flush()
+        return super(Result, self).exception(timeout)
@@ -0,0 +1,712 @@
+import os
+import select
+import threading
+from time import sleep
+
+from .driver import Driver
+from .exceptions import UsbIssError
+from . import defs
+
+MODULE_ID = 7
+
+# Size of the module's Serial UART transmit buffer
+SERIAL_TX_BUFFER_SIZE = 30
+
+# Duration of a full-speed USB frame. A command waits for the next frame to
+# reach the module, and its response waits for the next frame back.
+USB_FRAME_TIME = 0.001
+
+_SPI_MODES = [mode.value for mode in defs.SPIMode]
+
+
+class I2CDevice(object):
+    """
+    Base class for virtual I2C devices attached to an :class:`Emulator`.
+    Each method is called for the corresponding event on the I2C bus.
+    Override them to model a device.
+    """
+    def start(self, read):
+        """
+        Called when the device is addressed after a start or repeated start.
+
+        Args:
+            read (bool): True for a read, False for a write.
+        Returns:
+            bool: True to ACK the address.
+        """
+        return True
+
+    def write(self, byte):
+        """
+        Called for each byte written to the device.
+
+        Returns:
+            bool: True to ACK the byte.
+        """
+        return True
+
+    def read(self, ack):
+        """
+        Called for each byte read from the device.
+
+        Args:
+            ack (bool): False for the last byte of the read.
+        Returns:
+            int: The byte read.
+        """
+        return 0xFF
+
+    def stop(self):
+        """
+        Called at the end of each transaction.
+        """
+        pass
+
+
+class I2CMemory(I2CDevice):
+    """
+    Virtual I2C device with auto-incrementing internal registers, like most
+    sensors and EEPROMs. The first bytes of each write set the register
+    address, and any further bytes are written to the registers.
+
+    Args:
+        size (int): Number of registers.
+        register_size (int): Size of the internal register address in bytes
+            (1 or 2).
+
+    Attributes:
+        data (bytearray): Register contents.
+    """
+    def __init__(self, size=256, register_size=1):
+        self.data = bytearray(size)
+        self.register_size = register_size
+        self.register = 0
+        self._address_bytes = 0
+
+    def start(self, read):
+        self._address_bytes = 0 if read else self.register_size
+        if not read:
+            self.register = 0
+        return True
+
+    def write(self, byte):
+        if self._address_bytes > 0:
+            self.register = ((self.register << 8) | byte) % len(self.data)
+            self._address_bytes -= 1
+        else:
+            self.data[self.register] = byte
+            self.register = (self.register + 1) % len(self.data)
+        return True
+
+    def read(self, ack):
+        byte = self.data[self.register]
+        self.register = (self.register + 1) % len(self.data)
+        return byte
+
+
+class SPIDevice(object):
+    """
+    Base class for a virtual SPI device attached to an :class:`Emulator`.
+    By default, data is looped back from MOSI to MISO.
+    """
+    def transfer(self, data):
+        """
+        Called for each SPI transfer.
+
+        Args:
+            data (bytes): Bytes written to the device.
+        Returns:
+            bytes-like: Bytes read from the device (the same length).
+        """
+        return data
+
+
+class Emulator(object):
+    """
+    Emulates a USB_ISS module, for testing without hardware.
+
+    The emulator implements the command set in :mod:`usb_iss.defs`: the
+    operating modes, I2C (including I2C_DIRECT), SPI, Serial UART, GPIO, ADC
+    and the module information commands. Virtual I2C devices and an SPI
+    device can be attached, and the digital and analogue input pins can be
+    set.
+
+    It can be used in-process, with ``UsbIss(emulator=...)``, or behind a
+    pty with :class:`PtyEmulator` so that the real serial port code is
+    exercised.
+
+    Each write to the emulator is treated as one USB packet. As with the
+    real module, SPI and SERIAL commands take the rest of the packet as
+    their data, and I2C_DIRECT sequences end at the first byte that isn't an
+    I2C_DIRECT command.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+            from usb_iss.emulator import Emulator, I2CMemory
+
+            emulator = Emulator()
+            eeprom = emulator.add_i2c_device(0x50, I2CMemory())
+
+            iss = UsbIss(emulator=emulator)
+            iss.open("emulated")
+            iss.setup_i2c()
+            iss.i2c.write(0x50, 0x10, [1, 2, 3])
+
+            print(eeprom.data[0x10:0x13])
+            # bytearray(b'\\x01\\x02\\x03')
+
+    Args:
+        serial_number (str): Serial number reported by the module.
+        fw_version (int): Firmware version reported by the module.
+        timing (bool): Delay each response by the time the real module would
+            take, based on the USB frame time and the I2C, SPI and UART
+            clock rates. The modelled time is recorded in the elapsed
+            attribute either way.
+
+    Attributes:
+        pins (int): Levels of the digital input pins (bits 0-3 are IO1-IO4).
+        adc (list of int): Values returned by GET_AD for IO1-IO4 (0-1023).
+        spi_device (:class:`SPIDevice`): Device attached to the SPI bus.
+        serial_device (callable): Called with each chunk of data transmitted
+            on the Serial UART. Any bytes it returns are received, as if
+            they had been echoed back.
+        elapsed (float): Total modelled time of the commands processed, in
+            seconds.
+    """
+    def __init__(self, serial_number="00000001", fw_version=7, timing=False):
+        self.serial_number = serial_number
+        self.fw_version = fw_version
+        self.timing = timing
+
+        self.i2c_devices = {}
+        self.spi_device = SPIDevice()
+        self.serial_device = None
+        self.pins = 0
+        self.adc = [0, 0, 0, 0]
+
+        self.mode = defs.Mode.IO_MODE.value
+        self.io_type = 0xAA
+        self.outputs = 0
+        self.i2c_clock_hz = 400000
+        self.spi_clock_hz = 500000
+        self.baud_rate = 9600
+        self.elapsed = 0.0
+
+        self._rx_buffer = bytearray()
+        self._pending = bytearray()
+        self._lock = threading.RLock()
+
+    def add_i2c_device(self, address, device):
+        """
+        Attach a virtual device to the I2C bus.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            device (:class:`I2CDevice`): The device.
+        Returns:
+            :class:`I2CDevice`: The device.
+        """
+        self.i2c_devices[address] = device
+        return device
+
+    def serial_input(self, data):
+        """
+        Receive data on the Serial UART. Data that doesn't fit in the
+        module's receive buffer is lost, as on the real module.
+
+        Args:
+            data (bytes-like): Bytes received.
+        """
+        with self._lock:
+            free = defs.SERIAL_RX_BUFFER_SIZE - len(self._rx_buffer)
+            self._rx_buffer.extend(bytearray(data)[:free])
+
+    def process(self, data):
+        """
+        Process one USB packet of commands from the host.
+
+        As on the real module, SPI and Serial commands have no length
+        field, so they take the rest of the packet. The drivers therefore
+        end each write after one of these commands.
+
+        Args:
+            data (bytes-like): Bytes written by the host.
+        Returns:
+            tuple of (bytes, float): The response, and the time the real
+            module would take to send it.
+        """
+        with self._lock:
+            self._pending.extend(data)
+            response = bytearray()
+            duration = USB_FRAME_TIME * 2
+            while self._pending:
+                length = self._command_length(self._pending)
+                if length is None:
+                    # Wait for the rest of the command
+                    break
+                command = bytes(self._pending[:length])
+                del self._pending[:length]
+
+                (command_response, bus_time) = self._execute(command)
+                response.extend(command_response)
+                duration += bus_time
+
+            self.elapsed += duration
+            return (bytes(response), duration)
+
+    def _command_length(self, data):
+        command = data[0]
+        if command == defs.Command.I2C_SGL.value:
+            return _fixed(data, 2 if _needs(data, 2) and data[1] & 1 else 3)
+        if command == defs.Command.I2C_AD0.value:
+            return _with_write_data(data, 3)
+        if command == defs.Command.I2C_AD1.value:
+            return _with_write_data(data, 4)
+        if command == defs.Command.I2C_AD2.value:
+            return _with_write_data(data, 5)
+        if command == defs.Command.I2C_DIRECT.value:
+            return _direct_length(data)
+        if command in [defs.Command.I2C_TEST.value,
+                       defs.Command.SET_PINS.value,
+                       defs.Command.GET_AD.value]:
+            return _fixed(data, 2)
+        if command == defs.Command.GET_PINS.value:
+            return 1
+        if command == defs.Command.USB_ISS.value:
+            if not _needs(data, 2):
+                return None
+            if data[1] != defs.SubCommand.ISS_MODE.value:
+                return 2
+            if not _needs(data, 3):
+                return None
+            return _fixed(data, 3 + _mode_data_length(data[2]))
+        # SPI, SERIAL and unknown commands take the rest of the packet
+        return len(data)
+
+    def _execute(self, command):
+        code = command[0]
+        if code == defs.Command.USB_ISS.value:
+            return (self._usb_iss(command), 0)
+        if code == defs.Command.SET_PINS.value:
+            self._set_pins(command[1])
+            return (bytes([defs.ResponseCode.ACK.value]), 0)
+        if code == defs.Command.GET_PINS.value:
+            return (bytes([self._get_pins()]), 0)
+        if code == defs.Command.GET_AD.value:
+            value = self.adc[command[1] - 1] if 1 <= command[1] <= 4 else 0
+            return (bytes([value >> 8, value & 0xFF]), 0)
+        if code == defs.Command.SPI.value:
+            return self._spi(command[1:])
+        if code == defs.Command.SERIAL.value:
+            return self._serial(command[1:])
+        if code in [defs.Command.I2C_SGL.value, defs.Command.I2C_AD0.value,
+                    defs.Command.I2C_AD1.value, defs.Command.I2C_AD2.value,
+                    defs.Command.I2C_TEST.value,
+                    defs.Command.I2C_DIRECT.value]:
+            bus = _I2CBus(self.i2c_devices, self._i2c_enabled())
+            response = self._i2c(bus, command)
+            return (response, bus.byte_count * 9.0 / self.i2c_clock_hz)
+        return (bytes(), 0)
+
+    def _usb_iss(self, command):
+        sub_command = command[1]
+        if sub_command == defs.SubCommand.ISS_VERSION.value:
+            return bytes([MODULE_ID, self.fw_version, self.mode])
+        if sub_command == defs.SubCommand.GET_SER_NUM.value:
+            return self.serial_number.encode("ascii")[:8].ljust(8, b"0")
+        if sub_command == defs.SubCommand.ISS_MODE.value:
+            return self._set_mode(command[2], command[3:])
+        return bytes()
+
+    def _set_mode(self, mode, data):
+        if mode == defs.Mode.IO_MODE.value:
+            self.io_type = data[0]
+        elif mode == defs.Mode.IO_CHANGE.value:
+            self.io_type = data[0]
+            # Changing the IO types doesn't affect the operating mode
+            return _mode_ack()
+        elif mode in _SPI_MODES:
+            self.spi_clock_hz = defs.SPI_BASE_CLOCK_HZ // (data[0] + 1)
+        elif mode == defs.Mode.SERIAL.value:
+            self.baud_rate = 3000000 // (((data[0] << 8) | data[1]) + 1)
+            self.io_type = (self.io_type & 0x0F) | (data[2] & 0xF0)
+        elif mode & 0x0F == defs.Mode.SERIAL.value and mode >> 4 in \
+                defs.I2C_CLOCKS_HZ:
+            self.i2c_clock_hz = defs.I2C_CLOCKS_HZ[mode >> 4]
+            self.baud_rate = 3000000 // (((data[0] << 8) | data[1]) + 1)
+        elif mode & 0x0F == 0 and mode >> 4 in defs.I2C_CLOCKS_HZ:
+            self.i2c_clock_hz = defs.I2C_CLOCKS_HZ[mode >> 4]
+            self.io_type = (self.io_type & 0xF0) | (data[0] & 0x0F)
+        else:
+            return bytes([defs.ResponseCode.NACK.value,
+                          defs.ModeError.UNKNOWN_COMMAND.value])
+
+        self.mode = mode
+        return _mode_ack()
+
+    def _set_pins(self, value):
+        # Only pins configured as outputs are changed
+        for bit in range(4):
+            if self._pin_type(bit) in [defs.IOType.OUTPUT_LOW.value,
+                                       defs.IOType.OUTPUT_HIGH.value]:
+                self.outputs = (self.outputs & ~(1 << bit)) | \
+                    (value & (1 << bit))
+
+    def _get_pins(self):
+        value = 0
+        for bit in range(4):
+            if self._pin_type(bit) in [defs.IOType.OUTPUT_LOW.value,
+                                       defs.IOType.OUTPUT_HIGH.value]:
+                value |= self.outputs & (1 << bit)
+            else:
+                value |= self.pins & (1 << bit)
+        return value
+
+    def _pin_type(self, bit):
+        return (self.io_type >> (2 * bit)) & 0x03
+
+    def _i2c_enabled(self):
+        return self.mode >> 4 in defs.I2C_CLOCKS_HZ
+
+    def _serial_enabled(self):
+        return (self.mode not in _SPI_MODES and
+                self.mode & 0x0F == defs.Mode.SERIAL.value)
+
+    def _i2c(self, bus, command):
+        code = command[0]
+        ack = bytes([defs.ResponseCode.ACK.value])
+        nack = bytes([defs.ResponseCode.NACK.value])
+
+        if code == defs.Command.I2C_TEST.value:
+            found = bus.start(command[1] & 0xFE)
+            bus.stop()
+            return ack if found else nack
+
+        if code == defs.Command.I2C_DIRECT.value:
+            return bus.direct(command[1:])
+
+        address = command[1]
+        if code == defs.Command.I2C_SGL.value:
+            if address & 1:
+                return bus.read(address, bytes(), 1)
+            return ack if bus.write(address, command[2:3]) else nack
+
+        register_len = {defs.Command.I2C_AD0.value: 0,
+                        defs.Command.I2C_AD1.value: 1,
+                        defs.Command.I2C_AD2.value: 2}[code]
+        register = command[2:2 + register_len]
+        count = command[2 + register_len]
+        if address & 1:
+            return bus.read(address, register, count)
+        data = command[3 + register_len:]
+        return ack if bus.write(address, register + data) else nack
+
+    def _spi(self, data):
+        if self.mode not in _SPI_MODES:
+            return (bytes([defs.ResponseCode.NACK.value]), 0)
+
+        response = bytearray(self.spi_device.transfer(bytes(data)))
+        return (bytes([defs.ResponseCode.ACK.value]) + bytes(response),
+                len(data) * 8.0 / self.spi_clock_hz)
+
+    def _serial(self, data):
+        if not self._serial_enabled():
+            return (bytes([defs.ResponseCode.NACK.value, 0, 0]), 0)
+        if len(data) > SERIAL_TX_BUFFER_SIZE:
+            return (bytes([defs.ResponseCode.NACK.value, 0,
+                           len(self._rx_buffer)]), 0)
+
+        if data and self.serial_device is not None:
+            echo = self.serial_device(bytes(data))
+            if echo:
+                self.serial_input(echo)
+
+        received = bytes(self._rx_buffer)
+        del self._rx_buffer[:]
+        return (bytes([defs.ResponseCode.ACK.value, 0, len(received)]) +
+                received,
+                (len(data) + len(received)) * 10.0 / self.baud_rate)
+
+
+class _I2CBus(object):
+    """
+    Runs I2C transactions on the virtual devices, counting the bytes sent
+    on the bus.
+    """
+    def __init__(self, devices, enabled):
+        self._devices = devices
+        self._enabled = enabled
+        self._device = None
+        self.byte_count = 0
+
+    def start(self, address_8bit):
+        self.byte_count += 1
+        device = self._devices.get(address_8bit >> 1)
+        if not self._enabled or device is None:
+            self._device = None
+            return False
+        self._device = device
+        return device.start(bool(address_8bit & 1))
+
+    def stop(self):
+        if self._device is not None:
+            self._device.stop()
+        self._device = None
+
+    def write_byte(self, byte):
+        self.byte_count += 1
+        return self._device is not None and self._device.write(byte)
+
+    def read_byte(self, ack):
+        self.byte_count += 1
+        if self._device is None:
+            return 0xFF
+        return self._device.read(ack)
+
+    def write(self, address_8bit, data):
+        acked = self.start(address_8bit)
+        for byte in data:
+            acked = acked and self.write_byte(byte)
+        self.stop()
+        return acked
+
+    def read(self, address_8bit, register, count):
+        if register:
+            # Set the register address, then read after a repeated start
+            if self.start(address_8bit & 0xFE):
+                for byte in register:
+                    self.write_byte(byte)
+        self.start(address_8bit)
+        data = bytes([self.read_byte(index < count - 1)
+                      for index in range(count)])
+        self.stop()
+        return data
+
+    def direct(self, tokens):
+        data = bytearray()
+        error = None
+        addressing = False
+        ack = True
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            index += 1
+            if token in [defs.I2CDirect.START.value,
+                         defs.I2CDirect.RESTART.value]:
+                addressing = True
+            elif token == defs.I2CDirect.STOP.value:
+                self.stop()
+            elif token == defs.I2CDirect.NACK.value:
+                ack = False
+            elif (defs.I2CDirect.READ1.value <= token <=
+                  defs.I2CDirect.READ16.value):
+                count = token - defs.I2CDirect.READ1.value + 1
+                for byte in range(count):
+                    data.append(self.read_byte(ack or byte < count - 1))
+                ack = True
+            elif (defs.I2CDirect.WRITE1.value <= token <=
+                  defs.I2CDirect.WRITE16.value):
+                count = token - defs.I2CDirect.WRITE1.value + 1
+                for byte in tokens[index:index + count]:
+                    if addressing:
+                        acked = self.start(byte)
+                        addressing = False
+                    else:
+                        acked = self.write_byte(byte)
+                    if not acked and error is None:
+                        error = defs.I2CDirectError.DEVICE_ERROR
+                index += count
+            elif error is None:
+                error = defs.I2CDirectError.UNKNOWN_COMMAND
+
+        if error is not None:
+            return bytes([defs.ResponseCode.NACK.value, error.value])
+        return bytes([defs.ResponseCode.ACK.value, len(data)]) + bytes(data)
+
+
+class EmulatedSerial(object):
+    """
+    Stands in for a ``serial.Serial`` port connected to an
+    :class:`Emulator`.
+    """
+    def __init__(self, emulator):
+        self._emulator = emulator
+        self._output = bytearray()
+        # Responses are available as soon as they're written, so reads
+        # never wait
+        self.timeout = None
+
+    @property
+    def in_waiting(self):
+        return len(self._output)
+
+    def write(self, data):
+        (response, duration) = self._emulator.process(data)
+        if self._emulator.timing:
+            sleep(duration)
+        self._output.extend(response)
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self._output[:size])
+        del self._output[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        del self._output[:]
+
+    def close(self):
+        pass
+
+
+class EmulatorDriver(Driver):
+    """
+    Driver connected to an :class:`Emulator` instead of a serial port.
+    Don't use this class directly - see the emulator option of
+    :class:`usb_iss.UsbIss`.
+    """
+    def __init__(self, emulator, verbose=False):
+        super(EmulatorDriver, self).__init__(verbose)
+        self.emulator = emulator
+
+    def open(self, port="emulator", timeout=None):
+        self._serial = EmulatedSerial(self.emulator)
+        self._bind_tracer(port)
+        return self
+
+
+class PtyEmulator(object):
+    """
+    Serves an :class:`Emulator` on a pty, so that it can be opened as a
+    serial port by :class:`usb_iss.UsbIss` or :class:`usb_iss.AsyncUsbIss`.
+    Only available on platforms with ptys, such as Linux.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+            from usb_iss.emulator import Emulator, PtyEmulator
+
+            with PtyEmulator(Emulator(timing=True)) as pty:
+                iss = UsbIss().open(pty.port)
+                print(iss.read_serial_number())
+                # 00000001
+
+    Args:
+        emulator (:class:`Emulator`): The emulated module.
+
+    Attributes:
+        port (str): Serial port name to open.
+    """
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Create the pty and start serving the emulator on it.
+        """
+        import tty
+
+        if self._thread is not None:
+            raise UsbIssError("Emulator pty is already running")
+
+        (self._master, self._slave) = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="usb_iss emulator")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving the emulator, and close the pty.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            os.close(self._master)
+            os.close(self._slave)
+
+    def _run(self):
+        while not self._stop.is_set():
+            (readable, _, _) = select.select([self._master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+
+            (response, duration) = self.emulator.process(data)
+            if self.emulator.timing:
+                sleep(duration)
+            if response:
+                os.write(self._master, response)
+
+
+def _needs(data, length):
+    return len(data) >= length
+
+
+def _fixed(data, length):
+    return length if _needs(data, length) else None
+
+
+def _with_write_data(data, header_length):
+    # Reads have a byte count, writes have a byte count followed by the data
+    if not _needs(data, header_length):
+        return None
+    if data[1] & 1:
+        return header_length
+    return _fixed(data, header_length + data[header_length - 1])
+
+
+def _direct_length(data):
+    index = 1
+    while index < len(data):
+        token = data[index]
+        if (defs.I2CDirect.WRITE1.value <= token <=
+                defs.I2CDirect.WRITE16.value):
+            index += token - defs.I2CDirect.WRITE1.value + 2
+        elif token in [token.value for token in defs.I2CDirect]:
+            index += 1
+        else:
+            return index
+    return len(data) if index == len(data) else None
+
+
+def _mode_data_length(mode):
+    if mode in _SPI_MODES:
+        return 1
+    if mode == defs.Mode.SERIAL.value:
+        return 3
+    if mode & 0x0F == defs.Mode.SERIAL.value:
+        return 2
+    return 1
+
+
+def _mode_ack():
+    return bytes([defs.ResponseCode.ACK.value, 0x00])
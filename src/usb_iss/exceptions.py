@@ -3,3 +3,30 @@ class UsbIssError(Exception):
     Raised when an error condition is detected by the usb_iss library.
     """
     pass
+
+
+class ResponseTimeoutError(UsbIssError):
+    """
+    Raised when the module doesn't send a complete response in time.
+    """
+    pass
+
+
+class PoolError(UsbIssError):
+    """
+    Raised by :class:`usb_iss.pool.UsbIssPool` when a job fails on one or
+    more modules.
+
+    Attributes:
+        results (dict): Results from the modules where the job succeeded,
+            keyed by serial number.
+        errors (dict): Exceptions from the modules where the job failed,
+            keyed by serial number.
+    """
+    def __init__(self, results, errors):
+        super(PoolError, self).__init__(
+            "Job failed on %s" % "; ".join(
+                ["%s: %s" % (serial_number, error)
+                 for (serial_number, error) in errors.items()]))
+        self.results = results
+        self.errors = errors
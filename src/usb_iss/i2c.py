@@ -1,8 +1,19 @@
+from .driver import verify_i2c_ack, verify_ack_error_code, _FixedReader
 from .exceptions import UsbIssError
 from . import defs
 
 I2C_RD = 0x01
 
+# Largest number of bytes written, or read back, by a single write of a
+# block transfer. Longer transfers are split across several writes.
+MAX_BLOCK_BYTES = 4096
+
+
+def _with_header(header, data):
+    payload = bytearray(header)
+    payload.extend(data)
+    return payload
+
 
 class I2C(object):
     """
@@ -27,9 +38,38 @@ class I2C(object):
 
             print(data)
             # [0, 1, 2]
+
+    Data read from the device is returned as a list of int, unless a
+    different data_type was passed to :class:`usb_iss.UsbIss`.
     """
-    def __init__(self, drv):
+    def __init__(self, drv, data_type=list, bus=None):
         self._drv = drv
+        self._data_type = data_type
+        self._bus = bus if bus is not None else _Bus()
+
+    @property
+    def clock_khz(self):
+        """
+        int: The I2C clock rate configured by :class:`usb_iss.UsbIss`, used
+        to key scan() caches.
+        """
+        return self._bus.clock_khz
+
+    @clock_khz.setter
+    def clock_khz(self, clock_khz):
+        self._bus.clock_khz = clock_khz
+
+    @property
+    def serial_number(self):
+        """
+        str: The module's serial number, once read. Used to key scan()
+        caches.
+        """
+        return self._bus.serial_number
+
+    @serial_number.setter
+    def serial_number(self, serial_number):
+        self._bus.serial_number = serial_number
 
     def write(self, address, register, data):
         """
@@ -41,9 +81,9 @@ class I2C(object):
             address (int): 7-bit I2C address of the device (0x00 - 0x7F).
             register (int): Internal register address to write
                 (0x00 - 0xFF).
-            data (list of int): List of bytes to write to the device.
+            data (bytes-like or list of int): Bytes to write to the device.
         """
-        self.write_ad1(address, register, data)
+        return self.write_ad1(address, register, data)
 
     def read(self, address, register, byte_count):
         """
@@ -69,9 +109,9 @@ class I2C(object):
             data_byte (int): Data byte to write to the device.
         """
         address_8bit = address << 1
-        self._drv.write_cmd(defs.Command.I2C_SGL.value,
-                            [address_8bit, data_byte])
-        self._drv.check_i2c_ack()
+        return self._drv.transact(defs.Command.I2C_SGL.value,
+                                  [address_8bit, data_byte], 1,
+                                  verify_i2c_ack)
 
     def read_single(self, address):
         """
@@ -83,8 +123,8 @@ class I2C(object):
             int: Data byte read from the device.
         """
         address_8bit = (address << 1) | I2C_RD
-        self._drv.write_cmd(defs.Command.I2C_SGL.value, [address_8bit])
-        return self._drv.read(1)[0]
+        return self._drv.transact(defs.Command.I2C_SGL.value, [address_8bit],
+                                  1, lambda response: response[0])
 
     def write_ad0(self, address, data):
         """
@@ -93,12 +133,13 @@ class I2C(object):
 
         Args:
             address (int): 7-bit I2C address of the device (0x00 - 0x7F).
-            data (list of int): List of bytes to write to the device.
+            data (bytes-like or list of int): Bytes to write to the device.
         """
         address_8bit = address << 1
-        self._drv.write_cmd(defs.Command.I2C_AD0.value,
-                            [address_8bit, len(data)] + data)
-        self._drv.check_i2c_ack()
+        return self._drv.transact(
+            defs.Command.I2C_AD0.value,
+            _with_header([address_8bit, len(data)], data),
+            1, verify_i2c_ack)
 
     def read_ad0(self, address, byte_count):
         """
@@ -112,9 +153,9 @@ class I2C(object):
             list of int: List of bytes read from the device.
         """
         address_8bit = (address << 1) | I2C_RD
-        self._drv.write_cmd(defs.Command.I2C_AD0.value,
-                            [address_8bit, byte_count])
-        return self._drv.read(byte_count)
+        return self._drv.transact(defs.Command.I2C_AD0.value,
+                                  [address_8bit, byte_count], byte_count,
+                                  self._data_type)
 
     def write_ad1(self, address, register, data):
         """
@@ -124,7 +165,7 @@ class I2C(object):
         Args:
             address (int): 7-bit I2C address of the device (0x00 - 0x7F).
             register (int): Internal register address to write (0x00 - 0xFF).
-            data (list of int): List of bytes to write to the device.
+            data (bytes-like or list of int): Bytes to write to the device.
         """
         if len(data) > defs.I2C_AD1_MAX_WRITE_BYTE_COUNT:
             raise UsbIssError(
@@ -132,9 +173,10 @@ class I2C(object):
                 (len(data), defs.I2C_AD1_MAX_WRITE_BYTE_COUNT))
 
         address_8bit = address << 1
-        self._drv.write_cmd(defs.Command.I2C_AD1.value,
-                            [address_8bit, register, len(data)] + data)
-        self._drv.check_i2c_ack()
+        return self._drv.transact(
+            defs.Command.I2C_AD1.value,
+            _with_header([address_8bit, register, len(data)], data),
+            1, verify_i2c_ack)
 
     def read_ad1(self, address, register, byte_count):
         """
@@ -154,9 +196,9 @@ class I2C(object):
                 (byte_count, defs.I2C_AD1_MAX_READ_BYTE_COUNT))
 
         address_8bit = (address << 1) | I2C_RD
-        self._drv.write_cmd(defs.Command.I2C_AD1.value,
-                            [address_8bit, register, byte_count])
-        return self._drv.read(byte_count)
+        return self._drv.transact(defs.Command.I2C_AD1.value,
+                                  [address_8bit, register, byte_count],
+                                  byte_count, self._data_type)
 
     def write_ad2(self, address, register, data):
         """
@@ -167,7 +209,7 @@ class I2C(object):
             address (int): 7-bit I2C address of the device (0x00 - 0x7F).
             register (int): Internal register address to write
                 (0x0000 - 0xFFFF).
-            data (list of int): List of bytes to write to the device.
+            data (bytes-like or list of int): Bytes to write to the device.
         """
         if len(data) > defs.I2C_AD2_MAX_WRITE_BYTE_COUNT:
             raise UsbIssError(
@@ -177,10 +219,11 @@ class I2C(object):
         address_8bit = address << 1
         reg_high = register >> 8
         reg_low = register & 0xFF
-        self._drv.write_cmd(
+        return self._drv.transact(
             defs.Command.I2C_AD2.value,
-            [address_8bit, reg_high, reg_low, len(data)] + data)
-        self._drv.check_i2c_ack()
+            _with_header([address_8bit, reg_high, reg_low, len(data)], data),
+            1,
+            verify_i2c_ack)
 
     def read_ad2(self, address, register, byte_count):
         """
@@ -203,9 +246,157 @@ class I2C(object):
         address_8bit = (address << 1) | I2C_RD
         reg_high = register >> 8
         reg_low = register & 0xFF
-        self._drv.write_cmd(defs.Command.I2C_AD2.value,
-                            [address_8bit, reg_high, reg_low, byte_count])
-        return self._drv.read(byte_count)
+        return self._drv.transact(
+            defs.Command.I2C_AD2.value,
+            [address_8bit, reg_high, reg_low, byte_count], byte_count,
+            self._data_type)
+
+    def write_block(self, address, register, data, register_size=1,
+                    page_size=None):
+        """
+        Write any number of bytes to a device with a one or two-byte internal
+        register address.
+
+        The data is split into the largest chunks that the I2C_AD1 or
+        I2C_AD2 command allows, advancing the register address for each
+        chunk. The chunks are sent to the module together, in writes of up
+        to :data:`MAX_BLOCK_BYTES` bytes.
+
+        Note that devices that are busy after each write (such as EEPROMs
+        during their write cycle) may NACK the following chunks.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            register (int): Internal register address to start writing at.
+            data (bytes-like or list of int): Bytes to write to the device.
+            register_size (int): Size of the internal register address in
+                bytes (1 or 2).
+            page_size (int): If set, chunks do not cross a multiple of this
+                many bytes (for devices with paged writes).
+        """
+        return self.write_blocks(address, [(register, data)], register_size,
+                                 page_size)
+
+    def write_blocks(self, address, blocks, register_size=1,
+                     page_size=None):
+        """
+        Write several blocks of registers of a device, each as
+        :meth:`write_block` would. The chunks of all the blocks are sent to
+        the module together.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            blocks (list of tuple): (register, data) pairs to write.
+            register_size (int): Size of the internal register address in
+                bytes (1 or 2).
+            page_size (int): If set, chunks do not cross a multiple of this
+                many bytes (for devices with paged writes).
+        """
+        max_count = self._block_max_count(register_size,
+                                          defs.I2C_AD1_MAX_WRITE_BYTE_COUNT,
+                                          defs.I2C_AD2_MAX_WRITE_BYTE_COUNT)
+
+        address_8bit = address << 1
+        commands = []
+        for (register, data) in blocks:
+            chunks = self._block_chunks(register, len(data), register_size,
+                                        max_count, page_size)
+            for (chunk_register, offset, count) in chunks:
+                commands.append(self._register_command(
+                    address_8bit, chunk_register, register_size,
+                    _with_header([count], data[offset:offset + count])))
+
+        def decode(responses):
+            for response in responses:
+                verify_i2c_ack(response)
+
+        if not commands:
+            return self._drv.completed(None)
+        return self._transact_blocks(commands, [1] * len(commands), decode)
+
+    def read_block(self, address, register, byte_count, register_size=1):
+        """
+        Read any number of bytes from a device with a one or two-byte
+        internal register address.
+
+        The read is split into the largest chunks that the I2C_AD1 or
+        I2C_AD2 command allows, advancing the register address for each
+        chunk. The chunks are requested from the module together, in writes
+        whose responses are up to :data:`MAX_BLOCK_BYTES` bytes.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            register (int): Internal register address to start reading from.
+            byte_count (int): Number of bytes to read.
+            register_size (int): Size of the internal register address in
+                bytes (1 or 2).
+        Returns:
+            list of int: List of bytes read from the device.
+        """
+        max_count = self._block_max_count(register_size,
+                                          defs.I2C_AD1_MAX_READ_BYTE_COUNT,
+                                          defs.I2C_AD2_MAX_READ_BYTE_COUNT)
+        chunks = self._block_chunks(register, byte_count, register_size,
+                                    max_count)
+
+        address_8bit = (address << 1) | I2C_RD
+        commands = []
+        for (chunk_register, _, count) in chunks:
+            commands.append(self._register_command(
+                address_8bit, chunk_register, register_size, [count]))
+
+        def decode(responses):
+            return self._data_type(b"".join(responses))
+
+        if not commands:
+            return self._drv.completed(self._data_type(bytes()))
+        return self._transact_blocks(
+            commands, [count for (_, _, count) in chunks], decode)
+
+    def read_into(self, address, register, buffer, register_size=1):
+        """
+        Read from a device with a one or two-byte internal register address
+        straight into a caller-supplied buffer, filling the whole buffer.
+        See :meth:`read_block` for how the read is split into commands.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            register (int): Internal register address to start reading from.
+            buffer (writable bytes-like): Buffer to read into.
+            register_size (int): Size of the internal register address in
+                bytes (1 or 2).
+        Returns:
+            int: Number of bytes read.
+        """
+        view = memoryview(buffer).cast('B')
+        max_count = self._block_max_count(register_size,
+                                          defs.I2C_AD1_MAX_READ_BYTE_COUNT,
+                                          defs.I2C_AD2_MAX_READ_BYTE_COUNT)
+        chunks = self._block_chunks(register, len(view), register_size,
+                                    max_count)
+
+        address_8bit = (address << 1) | I2C_RD
+        commands = []
+        for (chunk_register, _, count) in chunks:
+            commands.append(self._register_command(
+                address_8bit, chunk_register, register_size, [count]))
+
+        def reader(group_chunks):
+            def read_responses(drv):
+                for (_, offset, count) in group_chunks:
+                    drv.readinto(view[offset:offset + count])
+                return sum(count for (_, _, count) in group_chunks)
+            return read_responses
+
+        if not commands:
+            return self._drv.completed(0)
+        results = [self._drv.commands(commands[start:end],
+                                      reader(chunks[start:end]))
+                   for (start, end) in _block_groups(
+                       commands, [count for (_, _, count) in chunks])]
+        if len(results) == 1:
+            return results[0]
+        return self._drv.gather(results, sum)
 
     def direct(self, data):
         """
@@ -241,9 +432,61 @@ class I2C(object):
                 return byte
         bytes = [convert_to_value(byte) for byte in data]
 
-        self._drv.write_cmd(defs.Command.I2C_DIRECT.value, bytes)
-        bytes_to_read = self._drv.check_ack_error_code(defs.I2CDirectError)
-        return self._drv.read(bytes_to_read)
+        def read_response(drv):
+            bytes_to_read = drv.check_ack_error_code(defs.I2CDirectError)
+            return self._data_type(drv.read(bytes_to_read))
+
+        return self._drv.command(defs.Command.I2C_DIRECT.value, bytes,
+                                 read_response)
+
+    def run_sequence(self, sequence):
+        """
+        Run a sequence of I2C transactions built with
+        :class:`~usb_iss.i2c_direct.DirectSequence`. All of its I2C_DIRECT
+        commands are sent in a single write.
+
+        Args:
+            sequence (:class:`~usb_iss.i2c_direct.DirectSequence`): The
+                transactions to run.
+        Returns:
+            list: The bytes read by each transaction, in the order they were
+            added (None for writes).
+        """
+        compiled = sequence.compile()
+        commands = [(defs.Command.I2C_DIRECT.value, data)
+                    for (data, _) in compiled]
+
+        def read_responses(drv):
+            # Read every response before reporting an error, so that the
+            # responses to later commands aren't left unread
+            results = []
+            error = None
+            for (_, read_counts) in compiled:
+                try:
+                    byte_count = verify_ack_error_code(drv.read(2),
+                                                       defs.I2CDirectError)
+                except UsbIssError as ex:
+                    error = error or ex
+                    continue
+
+                response = drv.read(byte_count)
+                if len(response) != sum(read_counts):
+                    error = error or UsbIssError(
+                        "Expected %d bytes from I2C_DIRECT, but %d received"
+                        % (sum(read_counts), len(response)))
+                    continue
+
+                offset = 0
+                for count in read_counts:
+                    results.append(self._data_type(
+                        response[offset:offset + count]) if count else None)
+                    offset += count
+
+            if error is not None:
+                raise error
+            return results
+
+        return self._drv.commands(commands, read_responses)
 
     def test(self, address):
         """
@@ -256,5 +499,164 @@ class I2C(object):
             bool: True if the device responds with an ACK.
         """
         address_8bit = address << 1
-        self._drv.write_cmd(defs.Command.I2C_TEST.value, [address_8bit])
-        return self._drv.read(1) != [defs.ResponseCode.NACK.value]
+        return self._drv.transact(
+            defs.Command.I2C_TEST.value, [address_8bit], 1,
+            lambda response: response[0] != defs.ResponseCode.NACK.value)
+
+    def scan(self, start=0x08, end=0x77, cache=None):
+        """
+        Find the devices that respond on the I2C bus.
+
+        An I2C_TEST command is sent for every address in the range, all in a
+        single write, and the responses are read back together. This takes
+        one round trip to the module rather than one per address.
+
+        Args:
+            start (int): First 7-bit address to test (0x00 - 0x7F).
+            end (int): Last 7-bit address to test (0x00 - 0x7F).
+            cache (dict): Optional dict holding previous scan results, keyed
+                by the module's serial number, I2C clock rate and address
+                range. A matching result is returned without accessing the
+                bus. Remove entries from the dict when the devices on the bus
+                may have changed. The serial number and clock rate are shared
+                with the module's batches and other views, and a cached result
+                is returned in the same form as any other, for example as a
+                :class:`usb_iss.driver.Result` in a batch.
+
+        Returns:
+            set of int: 7-bit addresses of the devices that responded with an
+            ACK.
+
+        Example:
+            ::
+
+                scan_cache = {}
+                print(iss.i2c.scan(cache=scan_cache))
+                # {80, 98}
+        """
+        if not 0 <= start <= end <= 0x7F:
+            raise UsbIssError("Invalid I2C address range 0x%02X - 0x%02X" %
+                              (start, end))
+
+        addresses = range(start, end + 1)
+        commands = [(defs.Command.I2C_TEST.value, [address << 1])
+                    for address in addresses]
+
+        def found(response):
+            return set(address for (address, ack) in zip(addresses, response)
+                       if ack != defs.ResponseCode.NACK.value)
+
+        if cache is None:
+            return self._drv.commands(commands,
+                                      _FixedReader(len(commands), found))
+
+        if self.serial_number is not None:
+            key = (self.serial_number, self.clock_khz, start, end)
+            if key in cache:
+                return self._drv.completed(set(cache[key]))
+
+        # Read the serial number for the cache key in the same round trip
+        serial_number_len = 0
+        if self.serial_number is None:
+            serial_number_len = 8
+            commands.insert(0, (defs.Command.USB_ISS.value,
+                                [defs.SubCommand.GET_SER_NUM.value]))
+
+        def update_cache(response):
+            if serial_number_len:
+                self.serial_number = ''.join(
+                    [chr(byte) for byte in response[:serial_number_len]])
+            result = found(response[serial_number_len:])
+            key = (self.serial_number, self.clock_khz, start, end)
+            cache[key] = frozenset(result)
+            return result
+
+        return self._drv.commands(
+            commands,
+            _FixedReader(serial_number_len + len(addresses), update_cache))
+
+    def _transact_blocks(self, commands, response_lens, decode):
+        """
+        Send the commands of a block transfer, in as many writes as
+        _block_groups needs, and decode all of their responses together.
+        """
+        groups = _block_groups(commands, response_lens)
+        if len(groups) == 1:
+            return self._drv.transact_many(commands, response_lens, decode)
+
+        results = [self._drv.transact_many(commands[start:end],
+                                           response_lens[start:end])
+                   for (start, end) in groups]
+        return self._drv.gather(results, lambda responses: decode(
+            [response for group in responses for response in group]))
+
+    @staticmethod
+    def _register_command(address_8bit, register, register_size, data):
+        if register_size == 1:
+            return (defs.Command.I2C_AD1.value,
+                    _with_header([address_8bit, register], data))
+        return (defs.Command.I2C_AD2.value,
+                _with_header([address_8bit, register >> 8, register & 0xFF],
+                             data))
+
+    @staticmethod
+    def _block_max_count(register_size, ad1_max_count, ad2_max_count):
+        if register_size == 1:
+            return ad1_max_count
+        if register_size == 2:
+            return ad2_max_count
+        raise UsbIssError("Invalid register_size value")
+
+    @staticmethod
+    def _block_chunks(register, byte_count, register_size, max_count,
+                      page_size=None):
+        """
+        Split a block access into (register, offset, count) chunks.
+        """
+        if register + byte_count > 1 << (8 * register_size):
+            raise UsbIssError(
+                "Attempted to access %d bytes from register 0x%02X, "
+                "which is beyond the last register" % (byte_count, register))
+
+        chunks = []
+        offset = 0
+        while offset < byte_count:
+            count = min(max_count, byte_count - offset)
+            if page_size is not None:
+                page_remaining = page_size - (register + offset) % page_size
+                count = min(count, page_remaining)
+            chunks.append((register + offset, offset, count))
+            offset += count
+        return chunks
+
+
+def _block_groups(commands, response_lens):
+    """
+    Split the commands of a block transfer into (start, end) groups, each
+    writing and reading back at most MAX_BLOCK_BYTES bytes.
+    """
+    groups = []
+    start = 0
+    write_len = read_len = 0
+    for (index, ((_, data), response_len)) in enumerate(
+            zip(commands, response_lens)):
+        command_len = 1 + len(data)
+        if index > start and (write_len + command_len > MAX_BLOCK_BYTES or
+                              read_len + response_len > MAX_BLOCK_BYTES):
+            groups.append((start, index))
+            start = index
+            write_len = read_len = 0
+        write_len += command_len
+        read_len += response_len
+    groups.append((start, len(commands)))
+    return groups
+
+
+class _Bus(object):
+    """
+    Details of the I2C bus that key scan() caches, shared by the I2C objects
+    of a UsbIss (including those of its batches and other views).
+    """
+    def __init__(self):
+        self.clock_khz = None
+        self.serial_number = None
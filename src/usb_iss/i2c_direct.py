@@ -0,0 +1,184 @@
+from .exceptions import UsbIssError
+from . import defs
+
+I2C_RD = 0x01
+
+# Largest READn/WRITEn token
+MAX_TOKEN_BYTE_COUNT = 16
+
+
+class DirectSequence(object):
+    """
+    Builds I2C_DIRECT command sequences from whole I2C transactions.
+
+    Each transaction is compiled into I2C_DIRECT tokens, with reads and
+    writes split into READn/WRITEn pieces of up to 16 bytes. The
+    transactions are then packed into as few I2C_DIRECT commands as the
+    module's buffers allow, which are all sent in a single write by
+    :meth:`usb_iss.i2c.I2C.run_sequence`.
+
+    The compiled commands are kept, so a sequence can be built once and run
+    many times, for example from a polling loop.
+
+    Example:
+        ::
+
+            from usb_iss.i2c_direct import DirectSequence
+
+            # Read the status register of eight sensors in one round trip
+            sequence = DirectSequence()
+            for address in range(0x48, 0x50):
+                sequence.read_register(address, 0x00, 2)
+
+            statuses = iss.i2c.run_sequence(sequence)
+
+            print(statuses)
+            # [[0, 1], [0, 1], [0, 1], [0, 1], [0, 1], [0, 1], [0, 1], [0, 1]]
+    """
+    def __init__(self):
+        self._transactions = []
+        self._compiled = None
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def write(self, address, data):
+        """
+        Add a write to a device.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            data (bytes-like or list of int): Bytes to write to the device.
+        Returns:
+            DirectSequence: This sequence, so that calls can be chained.
+        """
+        tokens = [defs.I2CDirect.START.value]
+        tokens += _write_tokens(bytearray([address << 1]) + bytearray(data))
+        tokens.append(defs.I2CDirect.STOP.value)
+        return self._add(tokens, 0)
+
+    def read(self, address, byte_count):
+        """
+        Add a read from a device, without internal register addressing.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            byte_count (int): Number of bytes to read.
+        Returns:
+            DirectSequence: This sequence, so that calls can be chained.
+        """
+        tokens = [defs.I2CDirect.START.value]
+        tokens += _write_tokens([(address << 1) | I2C_RD])
+        tokens += _read_tokens(byte_count)
+        tokens.append(defs.I2CDirect.STOP.value)
+        return self._add(tokens, byte_count)
+
+    def write_register(self, address, register, data, register_size=1):
+        """
+        Add a write to a device's internal registers.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            register (int): Internal register address to write.
+            data (bytes-like or list of int): Bytes to write to the device.
+            register_size (int): Size of the internal register address in
+                bytes (1 or 2).
+        Returns:
+            DirectSequence: This sequence, so that calls can be chained.
+        """
+        data = _register_bytes(register, register_size) + bytearray(data)
+        return self.write(address, data)
+
+    def read_register(self, address, register, byte_count, register_size=1):
+        """
+        Add a read from a device's internal registers. The register address
+        is written, followed by a repeated start and the read.
+
+        Args:
+            address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+            register (int): Internal register address to read.
+            byte_count (int): Number of bytes to read.
+            register_size (int): Size of the internal register address in
+                bytes (1 or 2).
+        Returns:
+            DirectSequence: This sequence, so that calls can be chained.
+        """
+        tokens = [defs.I2CDirect.START.value]
+        tokens += _write_tokens(bytearray([address << 1]) +
+                                _register_bytes(register, register_size))
+        tokens.append(defs.I2CDirect.RESTART.value)
+        tokens += _write_tokens([(address << 1) | I2C_RD])
+        tokens += _read_tokens(byte_count)
+        tokens.append(defs.I2CDirect.STOP.value)
+        return self._add(tokens, byte_count)
+
+    def compile(self):
+        """
+        Pack the transactions into I2C_DIRECT commands. This is done
+        automatically when the sequence is run.
+
+        Returns:
+            list of (bytearray, list of int): The data of each I2C_DIRECT
+            command, and the number of bytes read by each of its
+            transactions.
+        """
+        if self._compiled is not None:
+            return self._compiled
+
+        commands = []
+        data = None
+        read_counts = None
+        for (tokens, read_count) in self._transactions:
+            if (data is None or
+                    len(data) + len(tokens) >
+                    defs.I2C_DIRECT_MAX_SEQUENCE_BYTE_COUNT or
+                    sum(read_counts) + read_count >
+                    defs.I2C_DIRECT_MAX_READ_BYTE_COUNT):
+                data = bytearray()
+                read_counts = []
+                commands.append((data, read_counts))
+            data.extend(tokens)
+            read_counts.append(read_count)
+
+        self._compiled = commands
+        return commands
+
+    def _add(self, tokens, read_count):
+        if (len(tokens) > defs.I2C_DIRECT_MAX_SEQUENCE_BYTE_COUNT or
+                read_count > defs.I2C_DIRECT_MAX_READ_BYTE_COUNT):
+            raise UsbIssError(
+                "I2C transaction is too large for a single I2C_DIRECT command")
+
+        self._transactions.append((tokens, read_count))
+        self._compiled = None
+        return self
+
+
+def _write_tokens(data):
+    tokens = []
+    for offset in range(0, len(data), MAX_TOKEN_BYTE_COUNT):
+        chunk = data[offset:offset + MAX_TOKEN_BYTE_COUNT]
+        tokens.append(defs.I2CDirect.WRITE1.value + len(chunk) - 1)
+        tokens.extend(chunk)
+    return tokens
+
+
+def _read_tokens(byte_count):
+    if byte_count < 1:
+        raise UsbIssError("Attempted to read %d bytes" % byte_count)
+
+    # The last byte is NACKed, to tell the device the read is complete
+    tokens = []
+    for offset in range(0, byte_count - 1, MAX_TOKEN_BYTE_COUNT):
+        count = min(MAX_TOKEN_BYTE_COUNT, byte_count - 1 - offset)
+        tokens.append(defs.I2CDirect.READ1.value + count - 1)
+    tokens += [defs.I2CDirect.NACK.value, defs.I2CDirect.READ1.value]
+    return tokens
+
+
+def _register_bytes(register, register_size):
+    if register_size == 1:
+        return bytearray([register])
+    if register_size == 2:
+        return bytearray([register >> 8, register & 0xFF])
+    raise UsbIssError("Invalid register_size value")
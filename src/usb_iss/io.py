@@ -1,5 +1,22 @@
+from array import array
+import threading
+from time import sleep
+try:
+    from time import monotonic_ns
+except ImportError:  # pragma: no cover
+    from time import monotonic
+
+    def monotonic_ns():
+        return int(monotonic() * 1e9)
+
 from . import defs
+from .driver import verify_ack, _FixedReader, MAX_GROUPED_READ, Pipeline
+from .async_driver import AsyncDriver
 from .exceptions import UsbIssError
+from .pin_watcher import PinWatcher
+
+# Full scale reading of the 10-bit ADC
+ADC_MAX = 1023
 
 
 class IO(object):
@@ -23,8 +40,18 @@ class IO(object):
             # Drive IO1 & IO3 high
             iss.io.set_pins(1, 0, 1, 0);
     """
-    def __init__(self, drv):
+    def __init__(self, drv, outputs=None):
         self._drv = drv
+        self._outputs = outputs if outputs is not None else _Outputs()
+
+    @property
+    def outputs(self):
+        """
+        list of int: The output values last written to IO1-IO4, or set when
+        configuring them as outputs (0 = low, 1 = high).
+        """
+        value = self._outputs.value
+        return [(value >> bit) & 0x01 for bit in range(4)]
 
     def set_pins(self, io0, io1, io2, io3):
         """
@@ -45,8 +72,64 @@ class IO(object):
                 ((io1 & 0x01) << 1) +
                 ((io2 & 0x01) << 2) +
                 ((io3 & 0x01) << 3))
-        self._drv.write_cmd(defs.Command.SET_PINS.value, [data])
-        self._drv.check_ack()
+        return self._set_outputs(lambda _: data)
+
+    def set_pin(self, pin, value):
+        """
+        Set a single digital output pin high or low, leaving the others
+        unchanged. The other pins' values are taken from :attr:`outputs`,
+        so the pins don't need to be read first.
+
+        Args:
+            pin (int): Pin to set (1-4).
+            value (int): 0 to drive low, 1 to drive high.
+        """
+        self._check_pin_values_in_range([value])
+        mask = self._pin_mask(pin)
+        return self._set_outputs(
+            lambda outputs: (outputs & ~mask) | (mask if value else 0))
+
+    def toggle(self, pin):
+        """
+        Invert a single digital output pin, leaving the others unchanged.
+
+        Args:
+            pin (int): Pin to toggle (1-4).
+        """
+        mask = self._pin_mask(pin)
+        return self._set_outputs(lambda outputs: outputs ^ mask)
+
+    def write_sequence(self, patterns):
+        """
+        Set the digital output pins to a sequence of values, all sent to the
+        module in a single write. Useful for bit-banging.
+
+        Args:
+            patterns (list of int): Output values, with bits 0-3 driving
+                IO1-IO4.
+
+        Example:
+            ::
+
+                # Clock out 0b101 on IO2 (data) with IO1 (clock)
+                iss.io.write_sequence([0b10, 0b11, 0b00, 0b01, 0b10, 0b11])
+        """
+        patterns = list(patterns)
+        if any(not 0 <= pattern <= 0x0F for pattern in patterns):
+            raise UsbIssError("Pin patterns must be between 0x0 and 0xF")
+        if not patterns:
+            return None
+
+        def decode(response):
+            for code in bytearray(response):
+                verify_ack([code])
+
+        commands = [(defs.Command.SET_PINS.value, [pattern])
+                    for pattern in patterns]
+        with self._outputs.send_lock:
+            self._outputs.request(lambda _: patterns[-1])
+            return self._drv.commands(commands, _FixedReader(
+                len(commands), self._outputs.commit(patterns[-1], decode)))
 
     def get_pins(self):
         """
@@ -56,12 +139,14 @@ class IO(object):
             list of int: List containing the current state of the four digital
             IO pins (0 = low, 1 = high).
         """
-        self._drv.write_cmd(defs.Command.GET_PINS.value)
-        data = self._drv.read(1)[0]
-        return [(data >> 0) & 0x01,
-                (data >> 1) & 0x01,
-                (data >> 2) & 0x01,
-                (data >> 3) & 0x01]
+        def decode(response):
+            data = response[0]
+            return [(data >> 0) & 0x01,
+                    (data >> 1) & 0x01,
+                    (data >> 2) & 0x01,
+                    (data >> 3) & 0x01]
+
+        return self._drv.transact(defs.Command.GET_PINS.value, None, 1, decode)
 
     def get_ad(self, pin):
         """
@@ -76,12 +161,283 @@ class IO(object):
         Returns:
             int: Sample value returned by the ADC (0-1023).
         """
-        self._drv.write_cmd(defs.Command.GET_AD.value, [pin])
-        data = self._drv.read(2)
-        return (data[0] << 8) + data[1]
+        return self._drv.transact(
+            defs.Command.GET_AD.value, [pin], 2,
+            lambda response: (response[0] << 8) + response[1])
+
+    def sample(self, pins, count, rate_hz=None, digital=False, oversample=1,
+               use_numpy=False):
+        """
+        Take a series of ADC samples from one or more analogue input pins.
+
+        Each sample is a GET_AD command for every pin, plus a GET_PINS
+        command if digital is set. The commands for several samples are sent
+        in a single write whenever possible: without a rate, samples are
+        taken back to back as fast as the link allows. With a rate, samples
+        are taken at fixed intervals, and any samples that fall behind
+        schedule are caught up in a single write.
+
+        Sampling isn't available from a batch or from
+        :class:`usb_iss.AsyncUsbIss`.
+
+        Args:
+            pins (list of int): Analogue input pins to sample.
+            count (int): Number of samples to take.
+            rate_hz (float): Sample rate, or None to sample as fast as
+                possible.
+            digital (bool): Also read the digital pins with each sample.
+            oversample (int): Number of ADC readings averaged into each
+                sample value.
+            use_numpy (bool): Return NumPy arrays instead of
+                :class:`array.array`. Requires NumPy.
+
+        Returns:
+            :class:`Samples`: The samples taken.
+
+        Example:
+            ::
+
+                samples = iss.io.sample([3, 4], count=1000, rate_hz=200)
+
+                print(samples.channel(3)[:4])
+                # array('H', [512, 511, 513, 512])
+                print(samples.volts(3.3)[:2])
+                # array('d', [1.651, 3.3])
+        """
+        self._require_blocking_driver("Sampling")
+        pins = list(pins)
+        if not pins or count < 0 or oversample < 1:
+            raise UsbIssError("Invalid sample parameters")
+        numpy = _import_numpy() if use_numpy else None
+
+        commands = [(defs.Command.GET_AD.value, [pin])
+                    for pin in pins for _ in range(oversample)]
+        response_len = 2 * len(commands)
+        if digital:
+            commands.append((defs.Command.GET_PINS.value, None))
+            response_len += 1
+        max_batch = max(1, MAX_GROUPED_READ // response_len)
+
+        samples = Samples(pins, digital)
+
+        def decode(response):
+            for offset in range(0, len(response), response_len):
+                samples._add(response[offset:offset + response_len],
+                             oversample)
+
+        start = monotonic_ns()
+        while len(samples) < count:
+            batch = min(max_batch, count - len(samples))
+            if rate_hz is not None:
+                # Catch up on any samples that are due
+                next_due = start + int(len(samples) * 1e9 / rate_hz)
+                now = monotonic_ns()
+                if now < next_due:
+                    sleep((next_due - now) / 1e9)
+                    now = next_due
+                due = int((now - start) * rate_hz / 1e9) + 1
+                batch = max(1, min(batch, due - len(samples)))
+
+            before = monotonic_ns()
+            self._drv.commands(commands * batch,
+                               _FixedReader(response_len * batch, decode))
+            after = monotonic_ns()
+            samples._add_timestamps(before, after, batch)
+
+        if numpy is not None:
+            samples._convert_to_numpy(numpy)
+        return samples
+
+    def start_watcher(self, pins=(1, 2, 3, 4), rate_hz=1000,
+                      polls_per_write=4, buffer_size=1024, callback=None):
+        """
+        Start a background thread that polls the digital input pins and
+        records their changes. See :class:`usb_iss.pin_watcher.PinWatcher`.
+
+        The watcher isn't available from a batch or from
+        :class:`usb_iss.AsyncUsbIss`.
+
+        Args:
+            pins (list of int): Pins to watch (1-4).
+            rate_hz (float): Rate to poll the pins, or None to poll as fast
+                as possible while leaving the port free for about a round
+                trip between writes.
+            polls_per_write (int): Number of GET_PINS commands sent in each
+                write.
+            buffer_size (int): Maximum number of edges held in the buffer.
+            callback (callable): If given, called with each
+                :class:`~usb_iss.pin_watcher.Edge` on the watcher thread
+                instead of storing it in the buffer.
+        Returns:
+            :class:`usb_iss.pin_watcher.PinWatcher`: The running watcher.
+        """
+        self._require_blocking_driver("The pin watcher")
+        return PinWatcher(self, pins, rate_hz, polls_per_write, buffer_size,
+                          callback).start()
+
+    def _require_blocking_driver(self, feature):
+        """
+        Raise an error if commands aren't sent straight away, as in a batch
+        or with AsyncUsbIss, since feature relies on timing each write.
+        """
+        if isinstance(self._drv, (Pipeline, AsyncDriver)):
+            raise UsbIssError(
+                "%s isn't available from a batch or from AsyncUsbIss" %
+                feature)
+
+    def _set_outputs(self, update):
+        """
+        Send a SET_PINS command with the output values returned by update,
+        which is passed the current output values.
+        """
+        with self._outputs.send_lock:
+            data = self._outputs.request(update)
+            return self._drv.transact(defs.Command.SET_PINS.value, [data], 1,
+                                      self._outputs.commit(data, verify_ack))
+
+    def _set_output_types(self, io_type):
+        """
+        Record the output values set by configuring pins as OUTPUT_LOW or
+        OUTPUT_HIGH.
+        """
+        with self._outputs.lock:
+            for bit in range(4):
+                pin_type = (io_type >> (2 * bit)) & 0x03
+                if pin_type == defs.IOType.OUTPUT_LOW.value:
+                    self._outputs.value &= ~(1 << bit)
+                elif pin_type == defs.IOType.OUTPUT_HIGH.value:
+                    self._outputs.value |= 1 << bit
+            self._outputs.requested = self._outputs.value
+
+    @staticmethod
+    def _pin_mask(pin):
+        if pin not in [1, 2, 3, 4]:
+            raise UsbIssError("Pin must be between 1 and 4")
+        return 1 << (pin - 1)
 
     @staticmethod
     def _check_pin_values_in_range(pins):
         for pin in pins:
             if pin not in [0, 1]:
                 raise UsbIssError("Pin values must be 0 or 1")
+
+
+class _Outputs(object):
+    """
+    Output pin values, shared by the IO objects of a UsbIss (including those
+    of its batches).
+
+    value holds the outputs the module has acknowledged, and requested the
+    outputs of the last SET_PINS command sent, which later commands build
+    on. lock guards both, and is never held while waiting for a response,
+    since responses may be decoded on a Session's worker thread. send_lock
+    keeps SET_PINS commands in the order their values were worked out.
+    """
+    def __init__(self):
+        self.value = 0
+        self.requested = 0
+        self.lock = threading.RLock()
+        self.send_lock = threading.RLock()
+
+    def request(self, update):
+        """
+        Work out the outputs for a new SET_PINS command, by passing the
+        requested outputs to update.
+        """
+        with self.lock:
+            self.requested = update(self.requested)
+            return self.requested
+
+    def commit(self, data, decode):
+        """
+        Returns a decoder that records the outputs once the module has
+        acknowledged them. If it doesn't, later commands build on the
+        acknowledged outputs again.
+        """
+        def commit_outputs(response):
+            try:
+                result = decode(response)
+            except Exception:
+                with self.lock:
+                    self.requested = self.value
+                raise
+            with self.lock:
+                self.value = data
+            return result
+        return commit_outputs
+
+
+class Samples(object):
+    """
+    ADC samples taken by :meth:`IO.sample`.
+
+    Attributes:
+        pins (list of int): Analogue input pins sampled.
+        values (array.array): ADC values (0-1023), interleaved by pin in the
+            order of the pins attribute. Use :meth:`channel` to get the
+            values for a single pin.
+        timestamps (array.array): Time of each sample, in nanoseconds of
+            :func:`time.monotonic_ns`. Samples sent in a single write are
+            spread evenly over its round trip.
+        digital (array.array): Digital pin states read with each sample
+            (bits 0-3 are IO1-IO4), or None if not requested.
+    """
+    def __init__(self, pins, digital=False):
+        self.pins = pins
+        self.values = array('H')
+        self.timestamps = array('q')
+        self.digital = array('B') if digital else None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def channel(self, pin):
+        """
+        Returns the ADC values sampled from one pin.
+        """
+        index = self.pins.index(pin)
+        return self.values[index::len(self.pins)]
+
+    def volts(self, vref=3.3):
+        """
+        Convert the ADC values to volts.
+
+        Args:
+            vref (float): ADC reference voltage (the module's supply).
+        Returns:
+            array.array of float: Voltages, interleaved by pin like the
+            values attribute.
+        """
+        scale = vref / ADC_MAX
+        if isinstance(self.values, array):
+            return array('d', [value * scale for value in self.values])
+        return self.values * scale
+
+    def _add(self, response, oversample):
+        for (index, _) in enumerate(self.pins):
+            total = 0
+            for reading in range(oversample):
+                offset = 2 * (index * oversample + reading)
+                total += (response[offset] << 8) + response[offset + 1]
+            self.values.append(total // oversample)
+        if self.digital is not None:
+            self.digital.append(response[-1] & 0x0F)
+
+    def _add_timestamps(self, before, after, count):
+        for index in range(count):
+            self.timestamps.append(
+                before + (after - before) * (2 * index + 1) // (2 * count))
+
+    def _convert_to_numpy(self, numpy):
+        self.values = numpy.array(self.values, dtype=numpy.uint16)
+        self.timestamps = numpy.array(self.timestamps, dtype=numpy.int64)
+        if self.digital is not None:
+            self.digital = numpy.array(self.digital, dtype=numpy.uint8)
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise UsbIssError("use_numpy requires NumPy")
+    return numpy
@@ -0,0 +1,410 @@
+import os
+import threading
+try:
+    from time import monotonic_ns
+except ImportError:  # pragma: no cover
+    from time import monotonic
+
+    def monotonic_ns():
+        return int(monotonic() * 1e9)
+
+from .exceptions import UsbIssError, ResponseTimeoutError
+from . import defs
+
+# Latency percentiles included in snapshots and exports
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram(object):
+    """
+    Fixed-size histogram of latencies, in the style of HdrHistogram.
+
+    Buckets are linear up to sub_buckets units, then each power of two is
+    split into sub_buckets linear buckets. With the defaults, latencies from
+    1us to 60s are recorded to within 1/16 (6.25%) using a few hundred
+    counters, however many latencies are recorded.
+
+    Args:
+        unit_ns (int): Resolution of the histogram, in nanoseconds.
+        highest_ns (int): Largest latency recorded. Larger latencies are
+            counted in the last bucket.
+        sub_buckets (int): Buckets per power of two (a power of two).
+    """
+    def __init__(self, unit_ns=1000, highest_ns=60 * 10**9, sub_buckets=16):
+        self.unit_ns = unit_ns
+        self._sub_buckets = sub_buckets
+        self._sub_bits = sub_buckets.bit_length()
+        self._counts = [0] * (self._index(highest_ns // unit_ns) + 1)
+
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def record(self, latency_ns):
+        """
+        Record a latency.
+
+        Args:
+            latency_ns (int): The latency in nanoseconds.
+        """
+        index = min(self._index(latency_ns // self.unit_ns),
+                    len(self._counts) - 1)
+        self._counts[index] += 1
+        self.count += 1
+        self.total_ns += latency_ns
+        if self.min_ns is None or latency_ns < self.min_ns:
+            self.min_ns = latency_ns
+        if self.max_ns is None or latency_ns > self.max_ns:
+            self.max_ns = latency_ns
+
+    def percentile(self, percentile):
+        """
+        Returns:
+            int: The latency in nanoseconds below which the given percentage
+            of latencies fall (to within the histogram's resolution), or None
+            if nothing has been recorded.
+        """
+        if self.count == 0:
+            return None
+
+        target = max(1, int(round(self.count * percentile / 100.0)))
+        seen = 0
+        for (index, count) in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return max(self.min_ns,
+                           min(self.max_ns, self._upper_ns(index)))
+        return self.max_ns  # pragma: no cover
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: count, and the sum, min, mean, max and percentile latencies
+            in seconds.
+        """
+        snapshot = {"count": self.count}
+        if self.count == 0:
+            return snapshot
+
+        snapshot["sum"] = self.total_ns / 1e9
+        snapshot["min"] = self.min_ns / 1e9
+        snapshot["mean"] = self.total_ns / 1e9 / self.count
+        snapshot["max"] = self.max_ns / 1e9
+        for percentile in PERCENTILES:
+            snapshot["p%s" % _percentile_name(percentile)] = (
+                self.percentile(percentile) / 1e9)
+        return snapshot
+
+    def _index(self, units):
+        if units < self._sub_buckets:
+            return units
+        shift = units.bit_length() - self._sub_bits
+        return (self._sub_buckets * (shift + 1) +
+                (units >> shift) - self._sub_buckets)
+
+    def _upper_ns(self, index):
+        if index < self._sub_buckets:
+            return (index + 1) * self.unit_ns - 1
+        shift = index // self._sub_buckets - 1
+        sub_bucket = index % self._sub_buckets + self._sub_buckets
+        return ((sub_bucket + 1) << shift) * self.unit_ns - 1
+
+
+class CommandStats(object):
+    """
+    Counters for one command code.
+
+    Attributes:
+        commands (int): Number of commands sent.
+        writes (int): Number of writes that started with this command. Each
+            command (or group of commands) queued in a batch counts as a
+            write.
+        bytes_out (int): Bytes written, including the command code.
+        bytes_in (int): Response bytes read for the writes that started
+            with this command.
+        timeouts (int): Writes whose response timed out.
+        nacks (int): Writes whose response was a NACK or error code.
+        latency (:class:`LatencyHistogram`): Round trip time of each write,
+            from the start of the write until the last response byte was
+            read.
+    """
+    def __init__(self):
+        self.commands = 0
+        self.writes = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.timeouts = 0
+        self.nacks = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self):
+        return {
+            "commands": self.commands,
+            "writes": self.writes,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "timeouts": self.timeouts,
+            "nacks": self.nacks,
+            "latency": self.latency.snapshot(),
+        }
+
+
+class Metrics(object):
+    """
+    Per-command counters and latency histograms, recorded by the driver.
+    Enable them with ``UsbIss(metrics=True)``, and read them with
+    :meth:`usb_iss.UsbIss.stats`.
+
+    Commands are counted under their :class:`usb_iss.defs.Command` code.
+    Several commands are often sent in a single write (for example by a
+    batch or :meth:`usb_iss.i2c.I2C.scan`), so latencies, response bytes,
+    timeouts and NACKs are recorded against the first command of each
+    write. Commands queued in a batch are timed from the start of the batch
+    write until all of its responses have been read.
+
+    When disabled, the only cost is a single check per write.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, commands, bytes_in, latency_ns, error=None):
+        """
+        Record a write and its response.
+
+        Args:
+            commands (list of (int, bytes-like)): The (command, data) pairs
+                written.
+            bytes_in (int): Number of response bytes read.
+            latency_ns (int): Round trip time in nanoseconds.
+            error (Exception): Error raised while reading the response, if
+                any.
+        """
+        if not commands:
+            # Nothing was written, so there's no command to record it under
+            return
+
+        with self._lock:
+            for (command, data) in commands:
+                stats = self._get(command)
+                stats.commands += 1
+                stats.bytes_out += 1 + (len(data) if data is not None else 0)
+
+            stats = self._get(commands[0][0])
+            stats.writes += 1
+            stats.bytes_in += bytes_in
+            stats.latency.record(latency_ns)
+            if isinstance(error, ResponseTimeoutError):
+                stats.timeouts += 1
+            elif isinstance(error, UsbIssError):
+                stats.nacks += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Counters and latency statistics for each command, keyed by
+            command name (see :meth:`CommandStats.snapshot`). Latencies are
+            in seconds.
+        """
+        with self._lock:
+            return dict((_command_name(command), stats.snapshot())
+                        for (command, stats) in self._stats.items())
+
+    def reset(self):
+        """
+        Clear all counters and histograms.
+        """
+        with self._lock:
+            self._stats = {}
+
+    def measure(self, drv, commands, reader):
+        """
+        Write commands and read their responses with the reader, as
+        :meth:`usb_iss.driver.Driver.commands` does, recording the result.
+        """
+        start = monotonic_ns()
+        bytes_read = drv._bytes_read
+        try:
+            drv.write_cmds(commands)
+            result = reader(drv)
+        except Exception as ex:
+            self.record(commands, drv._bytes_read - bytes_read,
+                        monotonic_ns() - start, ex)
+            raise
+        self.record(commands, drv._bytes_read - bytes_read,
+                    monotonic_ns() - start)
+        return result
+
+    def measure_pipeline(self, drv, pending, flush):
+        """
+        Flush a pipeline's pending (commands, reader, result) entries,
+        recording each entry.
+        """
+        start = monotonic_ns()
+        bytes_read = drv._bytes_read
+        flush(pending)
+        latency_ns = monotonic_ns() - start
+
+        # Fixed-length responses are read in groups, so their lengths are
+        # taken from the readers. Any other bytes were read by the rest.
+        fixed = [getattr(reader, "length", None)
+                 for (_, reader, _) in pending]
+        others = fixed.count(None)
+        remainder = drv._bytes_read - bytes_read - sum(
+            length for length in fixed if length is not None)
+
+        for ((commands, _, result), length) in zip(pending, fixed):
+            if length is None:
+                length = remainder // others
+                remainder -= length
+                others -= 1
+            error = result.exception() if result.done() else None
+            self.record(commands, length, latency_ns, error)
+
+    def _get(self, command):
+        if command not in self._stats:
+            self._stats[command] = CommandStats()
+        return self._stats[command]
+
+
+class PrometheusExporter(object):
+    """
+    Writes metrics to a file in the Prometheus text exposition format, for
+    collection by the node_exporter textfile collector.
+
+    The file is replaced atomically, so it is never read half-written.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+            from usb_iss.metrics import PrometheusExporter
+
+            iss = UsbIss(metrics=True)
+            iss.open("COM3")
+
+            exporter = PrometheusExporter(
+                iss.metrics, "/var/lib/node_exporter/usb_iss.prom",
+                labels={"module": iss.read_serial_number()})
+            exporter.start(interval=15)
+
+    Args:
+        metrics (:class:`Metrics`): Metrics to export.
+        path (str): Path of the file to write.
+        labels (dict): Extra labels added to every sample, for example to
+            tell several modules apart.
+    """
+    def __init__(self, metrics, path, labels=None):
+        self.metrics = metrics
+        self.path = path
+        self.labels = labels or {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        """
+        Write the current metrics to the file.
+        """
+        temp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(temp_path, "w") as prom_file:
+            prom_file.write(self.text())
+        os.replace(temp_path, self.path)
+
+    def start(self, interval=15.0):
+        """
+        Write the metrics periodically from a background thread.
+
+        Args:
+            interval (float): Time between writes in seconds.
+        """
+        if self._thread is not None:
+            raise UsbIssError("Exporter is already running")
+
+        def run():
+            while not self._stop.wait(interval):
+                self.write()
+
+        self.write()
+        self._stop.clear()
+        self._thread = threading.Thread(target=run,
+                                        name="usb_iss metrics exporter")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop writing the metrics periodically, and write them one last time.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.write()
+
+    def text(self):
+        """
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        snapshot = self.metrics.snapshot()
+        lines = []
+        for (name, key, metric_type, help_text) in _COUNTERS:
+            lines.append("# HELP usb_iss_%s %s" % (name, help_text))
+            lines.append("# TYPE usb_iss_%s %s" % (name, metric_type))
+            for command in sorted(snapshot):
+                lines.append("usb_iss_%s%s %d" % (
+                    name, self._labels(command), snapshot[command][key]))
+
+        lines.append("# HELP usb_iss_latency_seconds "
+                     "Round trip time of each write.")
+        lines.append("# TYPE usb_iss_latency_seconds summary")
+        for command in sorted(snapshot):
+            latency = snapshot[command]["latency"]
+            for percentile in PERCENTILES:
+                key = "p%s" % _percentile_name(percentile)
+                if key in latency:
+                    lines.append("usb_iss_latency_seconds%s %.9f" % (
+                        self._labels(command, quantile=percentile / 100.0),
+                        latency[key]))
+            lines.append("usb_iss_latency_seconds_sum%s %.9f" % (
+                self._labels(command), latency.get("sum", 0)))
+            lines.append("usb_iss_latency_seconds_count%s %d" % (
+                self._labels(command), latency["count"]))
+        return "\n".join(lines) + "\n"
+
+    def _labels(self, command, quantile=None):
+        labels = sorted(self.labels.items()) + [("command", command)]
+        if quantile is not None:
+            labels.append(("quantile", "%g" % quantile))
+        return "{%s}" % ",".join(
+            '%s="%s"' % (key, _escape(value)) for (key, value) in labels)
+
+
+_COUNTERS = [
+    ("commands_total", "commands", "counter", "Commands sent."),
+    ("writes_total", "writes", "counter",
+     "Writes starting with each command."),
+    ("bytes_out_total", "bytes_out", "counter", "Bytes written."),
+    ("bytes_in_total", "bytes_in", "counter", "Response bytes read."),
+    ("timeouts_total", "timeouts", "counter", "Responses that timed out."),
+    ("nacks_total", "nacks", "counter",
+     "Responses that were a NACK or error code."),
+]
+
+
+def _command_name(command):
+    try:
+        return defs.Command(command).name
+    except ValueError:
+        return "0x%02X" % command
+
+
+def _percentile_name(percentile):
+    return ("%g" % percentile).replace(".", "")
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
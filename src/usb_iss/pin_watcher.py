@@ -0,0 +1,238 @@
+from collections import deque, namedtuple
+import threading
+try:
+    from time import monotonic_ns
+except ImportError:  # pragma: no cover
+    from time import monotonic
+
+    def monotonic_ns():
+        return int(monotonic() * 1e9)
+
+from .driver import _FixedReader
+from .exceptions import UsbIssError
+from . import defs
+
+# Shortest time the port is left idle between writes when polling as fast as
+# possible, in nanoseconds
+MIN_IDLE_NS = 500000
+
+Edge = namedtuple('Edge', ['timestamp', 'pin', 'value'])
+Edge.__doc__ = """
+A change of a digital input pin, detected by a :class:`PinWatcher`.
+
+Attributes:
+    timestamp (int): Time of the poll that saw the change, in nanoseconds of
+        :func:`time.monotonic_ns`.
+    pin (int): Pin that changed (1-4).
+    value (int): New pin value (0 = low, 1 = high).
+"""
+
+
+class PinWatcher(object):
+    """
+    Background thread that polls the digital pins and reports when they
+    change. Create one with :meth:`usb_iss.io.IO.start_watcher`.
+
+    Several GET_PINS commands are sent in each write, so the pins can be
+    polled faster than the USB round trip time. The watcher releases the
+    serial port between writes, so other commands are interleaved with the
+    polls. With a thread_safe :class:`usb_iss.UsbIss`, create the watcher
+    from ``iss.priority(session.PRIORITY_LOW).io`` to send other commands
+    ahead of the polls.
+
+    Changes are stored as :class:`Edge` tuples in a fixed-size buffer, and
+    returned by :meth:`get`. If the buffer is full, the oldest edges are
+    dropped. Alternatively, a callback can be given to handle each edge as
+    it is detected, or edges can be delivered to an asyncio queue with
+    :meth:`asyncio_queue`. Callbacks run on the watcher thread, so they
+    should be quick.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+
+            iss = UsbIss()
+            iss.open("COM3")
+            iss.setup_io()
+
+            with iss.io.start_watcher(pins=[1, 2], rate_hz=500) as watcher:
+                edge = watcher.get(timeout=5.0)
+                print(edge)
+                # Edge(timestamp=81234567890, pin=2, value=1)
+
+    Attributes:
+        polls (int): Number of times the pins have been read.
+        edges_detected (int): Total number of edges detected.
+        edges_dropped (int): Number of edges discarded because the buffer
+            was full.
+    """
+    def __init__(self, io, pins=(1, 2, 3, 4), rate_hz=1000,
+                 polls_per_write=4, buffer_size=1024, callback=None):
+        if any(pin not in [1, 2, 3, 4] for pin in pins):
+            raise UsbIssError("Pin must be between 1 and 4")
+        if polls_per_write < 1:
+            raise UsbIssError("polls_per_write must be at least 1")
+
+        self._io = io
+        self._mask = sum(1 << (pin - 1) for pin in pins)
+        self.rate_hz = rate_hz
+        self.polls_per_write = polls_per_write
+        self._callbacks = [callback] if callback is not None else []
+
+        self._edges = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+        self._finished = False
+        self._state = None
+
+        self.polls = 0
+        self.edges_detected = 0
+        self.edges_dropped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        """
+        bool: True while the watcher thread is polling the module.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def state(self):
+        """
+        list of int: The pin values seen by the last poll, or None before the
+        first poll.
+        """
+        state = self._state
+        if state is None:
+            return None
+        return [(state >> bit) & 0x01 for bit in range(4)]
+
+    def start(self):
+        """
+        Start the watcher thread.
+        """
+        if self.running:
+            raise UsbIssError("Pin watcher is already running")
+
+        self._stop.clear()
+        self._finished = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="usb_iss pin watcher")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the watcher thread. Edges already in the buffer can still be
+        read.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get(self, timeout=None):
+        """
+        Remove the oldest edge from the buffer, waiting for one to be
+        detected if needed.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds, or None to wait
+                until an edge is detected.
+        Returns:
+            :class:`Edge`: The edge, or None if the timeout expired or the
+            watcher stopped first.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self._edges or self._error is not None or
+                         self._finished),
+                timeout)
+            error, self._error = self._error, None
+            if error is not None:
+                raise error
+            return self._edges.popleft() if self._edges else None
+
+    def asyncio_queue(self, loop=None):
+        """
+        Deliver edges to an asyncio queue instead of the buffer.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): Event loop that reads the
+                queue, or None for the current event loop.
+        Returns:
+            asyncio.Queue: Queue that receives each :class:`Edge`.
+        """
+        import asyncio
+        loop = loop or asyncio.get_event_loop()
+        queue = asyncio.Queue()
+
+        def put(edge):
+            loop.call_soon_threadsafe(queue.put_nowait, edge)
+
+        with self._condition:
+            self._callbacks.append(put)
+        return queue
+
+    def _run(self):
+        commands = ([(defs.Command.GET_PINS.value, None)] *
+                    self.polls_per_write)
+        reader = _FixedReader(self.polls_per_write, bytearray)
+        try:
+            while not self._stop.is_set():
+                before = monotonic_ns()
+                response = self._io._drv.commands(commands, reader)
+                after = monotonic_ns()
+                for (index, pins) in enumerate(response):
+                    # The polls are assumed to be spread over the round trip
+                    timestamp = before + ((after - before) * (2 * index + 1) //
+                                          (2 * len(response)))
+                    self._update(pins & self._mask, timestamp)
+
+                if self.rate_hz is None:
+                    # Leave the port idle for about a round trip, so that
+                    # other threads get a chance to use it
+                    self._stop.wait(max(MIN_IDLE_NS, after - before) / 1e9)
+                else:
+                    period_ns = self.polls_per_write * 1e9 / self.rate_hz
+                    self._stop.wait(
+                        max(0, period_ns - (monotonic_ns() - before)) / 1e9)
+        except Exception as ex:
+            with self._condition:
+                self._error = ex
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def _update(self, state, timestamp):
+        self.polls += 1
+        previous, self._state = self._state, state
+        if previous is None or previous == state:
+            return
+
+        edges = [Edge(timestamp, bit + 1, (state >> bit) & 0x01)
+                 for bit in range(4) if (previous ^ state) & (1 << bit)]
+        with self._condition:
+            self.edges_detected += len(edges)
+            callbacks = list(self._callbacks)
+            if not callbacks:
+                for edge in edges:
+                    if len(self._edges) == self._edges.maxlen:
+                        self.edges_dropped += 1
+                    self._edges.append(edge)
+            self._condition.notify_all()
+
+        for edge in edges:
+            for callback in callbacks:
+                callback(edge)
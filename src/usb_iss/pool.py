@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+from .exceptions import UsbIssError, PoolError
+from .usb_iss import UsbIss
+
+
+class UsbIssPool(object):
+    """
+    A group of USB_ISS modules, identified by their serial numbers.
+
+    Each module has its own worker thread and job queue, so jobs for
+    different modules run in parallel while jobs for the same module run in
+    the order they were submitted.
+
+    Example:
+        ::
+
+            from usb_iss.pool import UsbIssPool
+
+            with UsbIssPool().open(["/dev/ttyACM0", "/dev/ttyACM1"]) as pool:
+                pool.run("setup_i2c")
+
+                # Run a whole job function on every module in parallel
+                def test_fixture(iss):
+                    iss.i2c.write(0x62, 0, [0, 1, 2])
+                    return iss.i2c.read(0x62, 0, 3)
+
+                print(pool.run(test_fixture))
+                # {'00000001': [0, 1, 2], '00000002': [0, 1, 2]}
+
+    Args:
+        **kwargs: Options passed to each :class:`usb_iss.UsbIss`.
+    """
+    def __init__(self, **kwargs):
+        self._options = kwargs
+        self._modules = OrderedDict()
+        self._executors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._modules)
+
+    def __iter__(self):
+        return iter(self._modules)
+
+    def __getitem__(self, serial_number):
+        """
+        Returns the :class:`usb_iss.UsbIss` with the given serial number.
+        Use :meth:`submit` rather than accessing it directly while jobs are
+        running.
+        """
+        return self._modules[serial_number]
+
+    @property
+    def serial_numbers(self):
+        """
+        list of str: Serial numbers of the modules in the pool.
+        """
+        return list(self._modules)
+
+    def open(self, ports):
+        """
+        Open several USB_ISS modules in parallel, and read their serial
+        numbers.
+
+        Args:
+            ports (list of str): Serial ports to open.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, len(ports))) as executor:
+            futures = [executor.submit(self._open_module, port)
+                       for port in ports]
+
+        opened = []
+        error = None
+        for future in futures:
+            if future.exception() is None:
+                opened.append(future.result())
+            elif error is None:
+                error = future.exception()
+
+        serial_numbers = [serial_number for (serial_number, _) in opened]
+        for serial_number in serial_numbers:
+            if error is None and (serial_numbers.count(serial_number) > 1 or
+                                  serial_number in self._modules):
+                error = UsbIssError("Serial number %s found more than once"
+                                    % serial_number)
+
+        if error is not None:
+            for (_, usb_iss) in opened:
+                usb_iss.close()
+            raise error
+
+        for (serial_number, usb_iss) in opened:
+            self._modules[serial_number] = usb_iss
+            self._executors[serial_number] = ThreadPoolExecutor(max_workers=1)
+        return self
+
+    def close(self):
+        """
+        Wait for any queued jobs to complete, then close all the modules.
+        """
+        for executor in self._executors.values():
+            executor.shutdown()
+        for usb_iss in self._modules.values():
+            usb_iss.close()
+        self._executors.clear()
+        self._modules.clear()
+
+    def submit(self, serial_number, job, *args, **kwargs):
+        """
+        Queue a job to run on one module.
+
+        Args:
+            serial_number (str): Serial number of the module.
+            job (callable or str): Function called with the
+                :class:`usb_iss.UsbIss` followed by args and kwargs. Or the
+                name of a UsbIss method (such as ``"i2c.read"``) to call with
+                args and kwargs.
+        Returns:
+            concurrent.futures.Future: Holds the job's return value.
+        """
+        if serial_number not in self._modules:
+            raise UsbIssError("No module with serial number %s" %
+                              serial_number)
+
+        return self._executors[serial_number].submit(
+            _job_function(job), self._modules[serial_number], *args, **kwargs)
+
+    def run(self, job, *args, **kwargs):
+        """
+        Run a job on every module in parallel, and wait for them all to
+        complete. See :meth:`submit` for the arguments.
+
+        Returns:
+            dict: The job's return value from each module, keyed by serial
+            number.
+        Raises:
+            PoolError: If the job raised an exception on any module. The
+                exception holds the results and errors from all modules.
+        """
+        return self.run_on(self.serial_numbers, job, *args, **kwargs)
+
+    def run_on(self, serial_numbers, job, *args, **kwargs):
+        """
+        Run a job on some of the modules in parallel, and wait for them all
+        to complete. See :meth:`run`.
+
+        Args:
+            serial_numbers (list of str): Serial numbers of the modules.
+        """
+        futures = OrderedDict(
+            (serial_number, self.submit(serial_number, job, *args, **kwargs))
+            for serial_number in serial_numbers)
+
+        results = OrderedDict()
+        errors = OrderedDict()
+        for (serial_number, future) in futures.items():
+            if future.exception() is None:
+                results[serial_number] = future.result()
+            else:
+                errors[serial_number] = future.exception()
+
+        if errors:
+            raise PoolError(results, errors)
+        return results
+
+    def _open_module(self, port):
+        usb_iss = UsbIss(**self._options).open(port)
+        try:
+            return (usb_iss.read_serial_number(), usb_iss)
+        except Exception:
+            usb_iss.close()
+            raise
+
+
+def _job_function(job):
+    if callable(job):
+        return job
+
+    def call_method(usb_iss, *args, **kwargs):
+        method = reduce(getattr, job.split("."), usb_iss)
+        return method(*args, **kwargs)
+    return call_method
@@ -0,0 +1,331 @@
+import os
+import threading
+from time import perf_counter
+
+# Public methods that aren't profiled
+EXCLUDED_METHODS = ("profile",)
+
+# Name used for serial port traffic outside a profiled call, such as the
+# flush at the end of a batch
+OTHER = "(other)"
+
+
+class CallProfile(object):
+    """
+    Time spent in one public method of one module, broken down by phase.
+    All times are totals, in seconds.
+
+    Attributes:
+        adapter (str): Name of the module.
+        method (str): Name of the method, for example ``"i2c.read"``.
+        calls (int): Number of calls.
+        total (float): Total time in the method.
+        encode (float): Time from the start of each call until its first
+            write, spent checking arguments and building commands.
+        write (float): Time spent in serial port writes.
+        wait (float): Time spent waiting for the first byte of the
+            response to each write, which includes the module's response
+            time.
+        read (float): Time spent reading the rest of the responses.
+        decode (float): The rest of the time in the method, spent decoding
+            responses and building results.
+    """
+    def __init__(self, adapter, method):
+        self.adapter = adapter
+        self.method = method
+        self.calls = 0
+        self.total = 0.0
+        self.encode = 0.0
+        self.write = 0.0
+        self.wait = 0.0
+        self.read = 0.0
+        self.decode = 0.0
+
+    @property
+    def host(self):
+        """
+        float: Time spent on the host, in encode and decode.
+        """
+        return self.encode + self.decode
+
+    @property
+    def wire(self):
+        """
+        float: Time spent in serial port writes and reads.
+        """
+        return self.write + self.wait + self.read
+
+    def __repr__(self):
+        return ("CallProfile(%r, %r, calls=%d, total=%.6f, encode=%.6f, "
+                "write=%.6f, wait=%.6f, read=%.6f, decode=%.6f)" % (
+                    self.adapter, self.method, self.calls, self.total,
+                    self.encode, self.write, self.wait, self.read,
+                    self.decode))
+
+
+class Profiler(object):
+    """
+    Breaks the time spent in each public :class:`usb_iss.UsbIss` method
+    down into encode, write, wait-for-first-byte, read and decode time.
+    Use :meth:`usb_iss.UsbIss.profile` to profile a module.
+
+    While profiling, the public methods of the module and its I2C, IO, SPI
+    and Serial attributes are wrapped, and the serial port is replaced by a
+    proxy that times each write and read. Nothing is added to the normal
+    code path when no profiler is active. Nested calls (for example
+    :meth:`usb_iss.i2c.I2C.read` calling
+    :meth:`usb_iss.i2c.I2C.read_ad1`) are counted against the outer call.
+
+    Serial port traffic outside a profiled call, such as the flush at the
+    end of a batch, is counted against ``"(other)"``. When calls are made
+    from several threads at once, their times are correct, but their
+    serial port time may be attributed to the wrong call.
+
+    One profiler can be shared by several modules, to compare them.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._local = threading.local()
+        self._active = None
+
+    @property
+    def profiles(self):
+        """
+        list of :class:`CallProfile`: The profile of each method of each
+        module.
+        """
+        with self._lock:
+            return list(self._profiles.values())
+
+    def top(self, count=10, key="total"):
+        """
+        Args:
+            count (int): Number of profiles to return.
+            key (str): :class:`CallProfile` attribute to sort by, for
+                example ``"total"``, ``"host"`` or ``"wait"``.
+        Returns:
+            list of :class:`CallProfile`: The profiles with the most time,
+            largest first.
+        """
+        return sorted(self.profiles, key=lambda profile: getattr(
+            profile, key), reverse=True)[:count]
+
+    def report(self, count=10, key="total"):
+        """
+        Returns:
+            str: A table of the top profiles (see :meth:`top`), with the
+            share of each call spent in each phase.
+        """
+        lines = ["%-12s %-24s %8s %10s %10s %7s %7s %7s %7s %7s" % (
+            "adapter", "method", "calls", "total ms", "mean us", "encode",
+            "write", "wait", "read", "decode")]
+        for profile in self.top(count, key):
+            total = profile.total or 1.0
+            lines.append(
+                "%-12s %-24s %8d %10.3f %10.1f %6.1f%% %6.1f%% %6.1f%% "
+                "%6.1f%% %6.1f%%" % (
+                    profile.adapter, profile.method, profile.calls,
+                    profile.total * 1e3,
+                    profile.total * 1e6 / max(profile.calls, 1),
+                    100 * profile.encode / total, 100 * profile.write / total,
+                    100 * profile.wait / total, 100 * profile.read / total,
+                    100 * profile.decode / total))
+        return "\n".join(lines)
+
+    def reset(self):
+        """
+        Discard all profiles.
+        """
+        with self._lock:
+            self._profiles = {}
+
+    def attach(self, iss, adapter):
+        """
+        Start profiling a module. Use :meth:`usb_iss.UsbIss.profile` rather
+        than calling this directly.
+
+        Returns:
+            callable: Stops profiling the module when called.
+        """
+        wrapped = []
+        for (prefix, target) in [("", iss), ("i2c.", iss.i2c),
+                                 ("io.", iss.io), ("spi.", iss.spi),
+                                 ("serial.", iss.serial)]:
+            for name in _public_methods(target):
+                setattr(target, name, self._wrap(
+                    adapter, prefix + name, getattr(target, name)))
+                wrapped.append((target, name))
+
+        drv = iss._port_drv
+        original_serial = drv._serial
+        if original_serial is not None:
+            drv._serial = _TimedSerial(self, adapter, original_serial)
+
+        def detach():
+            for (target, name) in wrapped:
+                delattr(target, name)
+            if isinstance(drv._serial, _TimedSerial):
+                drv._serial = drv._serial.serial
+        return detach
+
+    def _wrap(self, adapter, method_name, method):
+        def profiled(*args, **kwargs):
+            if getattr(self._local, "call", None) is not None:
+                return method(*args, **kwargs)
+
+            call = _Call(perf_counter())
+            self._local.call = call
+            self._active = call
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                self._local.call = None
+                if self._active is call:
+                    self._active = None
+                self._record(adapter, method_name, call, end)
+        profiled.__name__ = getattr(method, "__name__", method_name)
+        profiled.__doc__ = getattr(method, "__doc__", None)
+        return profiled
+
+    def _record(self, adapter, method_name, call, end):
+        total = end - call.start
+        first_write = (call.first_write if call.first_write is not None
+                       else end)
+        encode = first_write - call.start
+        decode = max(0.0,
+                     total - encode - call.write - call.wait - call.read)
+        with self._lock:
+            profile = self._get(adapter, method_name)
+            profile.calls += 1
+            profile.total += total
+            profile.encode += encode
+            profile.write += call.write
+            profile.wait += call.wait
+            profile.read += call.read
+            profile.decode += decode
+
+    def _record_other(self, adapter, attribute, duration):
+        with self._lock:
+            profile = self._get(adapter, OTHER)
+            setattr(profile, attribute, getattr(profile, attribute) + duration)
+            profile.total += duration
+
+    def _get(self, adapter, method_name):
+        key = (adapter, method_name)
+        if key not in self._profiles:
+            self._profiles[key] = CallProfile(adapter, method_name)
+        return self._profiles[key]
+
+
+class _Call(object):
+    """
+    Times of a profiled call in progress.
+    """
+    def __init__(self, start):
+        self.start = start
+        self.first_write = None
+        self.awaiting_response = False
+        self.write = 0.0
+        self.wait = 0.0
+        self.read = 0.0
+
+
+class _TimedSerial(object):
+    """
+    Serial port proxy that adds the time of each write and read to the
+    profiled call in progress.
+    """
+    def __init__(self, profiler, adapter, serial):
+        self._profiler = profiler
+        self._adapter = adapter
+        self.serial = serial
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
+
+    @property
+    def timeout(self):
+        return self.serial.timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self.serial.timeout = timeout
+
+    def write(self, data):
+        start = perf_counter()
+        result = self.serial.write(data)
+        duration = perf_counter() - start
+
+        call = self._call()
+        if call is None:
+            self._profiler._record_other(self._adapter, "write", duration)
+        else:
+            if call.first_write is None:
+                call.first_write = start
+            call.write += duration
+            call.awaiting_response = True
+        return result
+
+    def read(self, size=1):
+        if size > 1 and self._awaiting_response():
+            # Read the first byte on its own, so that the wait for the
+            # module is timed separately from the transfer of the rest
+            first = self.read(1)
+            if len(first) < 1:
+                return first
+            return first + self.read(size - 1)
+
+        start = perf_counter()
+        data = self.serial.read(size)
+        self._add_read(perf_counter() - start)
+        return data
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        if len(view) > 1 and self._awaiting_response():
+            byte_count = self.readinto(view[:1])
+            if byte_count < 1:
+                return byte_count
+            return byte_count + self.readinto(view[1:])
+
+        start = perf_counter()
+        byte_count = self.serial.readinto(view)
+        self._add_read(perf_counter() - start)
+        return byte_count
+
+    def _call(self):
+        call = getattr(self._profiler._local, "call", None)
+        # Commands sent by a thread_safe UsbIss's worker thread belong to
+        # the call waiting for them
+        return call if call is not None else self._profiler._active
+
+    def _awaiting_response(self):
+        call = self._call()
+        return call is not None and call.awaiting_response
+
+    def _add_read(self, duration):
+        call = self._call()
+        if call is None:
+            self._profiler._record_other(self._adapter, "wait", duration)
+        elif call.awaiting_response:
+            call.wait += duration
+            call.awaiting_response = False
+        else:
+            call.read += duration
+
+
+def adapter_name(port):
+    """
+    Returns:
+        str: Short name for a module, from its serial port.
+    """
+    return os.path.basename(str(port)) if port else "usb_iss"
+
+
+def _public_methods(target):
+    return [name for name in dir(type(target))
+            if not name.startswith("_") and name not in EXCLUDED_METHODS and
+            callable(getattr(type(target), name)) and
+            not isinstance(getattr(type(target), name), type)]
@@ -0,0 +1,199 @@
+from .exceptions import UsbIssError
+
+
+class RegisterCache(object):
+    """
+    Shadow copy of an I2C device's registers, so that reads of registers
+    whose values are already known don't need to access the bus.
+
+    In write-through mode (the default), writes go to the device straight
+    away and also update the cache. In write-back mode, writes only update
+    the cache and mark the registers as dirty, until :meth:`flush` writes
+    them to the device. Contiguous dirty registers are written together,
+    using as few I2C commands as possible, and all of the commands are sent
+    in a single write. The cache is only updated once the device has
+    acknowledged a write-through.
+
+    Volatile registers (such as status registers, whose values are changed
+    by the device) are never cached: they are always read from the device,
+    and always written straight away.
+
+    The cache uses :meth:`i2c.I2C.read_block`, :meth:`i2c.I2C.write_block`
+    and :meth:`i2c.I2C.write_blocks`, so it needs a UsbIss that returns
+    results directly (not a batch, or :class:`usb_iss.AsyncUsbIss`).
+
+    Example:
+        ::
+
+            from usb_iss.register_cache import RegisterCache
+
+            pmic = RegisterCache(iss.i2c, 0x60, write_back=True,
+                                 volatile=[0x00])
+
+            # Each register is read from the device at most once
+            pmic.update(0x10, mask=0x0F, value=0x05)
+            pmic.update(0x10, mask=0x30, value=0x10)
+            pmic.update(0x11, mask=0xFF, value=0x80)
+
+            # Registers 0x10 and 0x11 are written in a single command
+            pmic.flush()
+
+    Args:
+        i2c (:class:`i2c.I2C`): I2C interface the device is attached to.
+        address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+        register_size (int): Size of the internal register address in bytes
+            (1 or 2).
+        write_back (bool): Hold writes in the cache until :meth:`flush` is
+            called.
+        volatile (iterable of int): Registers that are never cached.
+        data_type (type): Type used to return data read from the registers.
+    """
+    def __init__(self, i2c, address, register_size=1, write_back=False,
+                 volatile=(), data_type=list):
+        self._i2c = i2c
+        self.address = address
+        self.register_size = register_size
+        self.write_back = write_back
+        self.volatile = set(volatile)
+        self._data_type = data_type
+
+        self._values = {}
+        self._dirty = set()
+
+    @property
+    def dirty(self):
+        """
+        list of int: Registers that have been written to the cache, but not
+        yet to the device.
+        """
+        return sorted(self._dirty)
+
+    def read(self, register, byte_count=1):
+        """
+        Read from consecutive registers. The device is only accessed if any
+        of the registers are volatile or not yet cached.
+
+        Args:
+            register (int): First register to read.
+            byte_count (int): Number of registers to read.
+        Returns:
+            list of int: Values of the registers.
+        """
+        registers = range(register, register + byte_count)
+        if any(reg in self.volatile or reg not in self._values
+               for reg in registers):
+            data = self._i2c.read_block(self.address, register, byte_count,
+                                        self.register_size)
+            for (reg, value) in zip(registers, bytearray(data)):
+                # Dirty registers hold newer values than the device
+                if reg not in self.volatile and reg not in self._dirty:
+                    self._values[reg] = value
+
+            values = [self._values.get(reg, value)
+                      for (reg, value) in zip(registers, bytearray(data))]
+        else:
+            values = [self._values[reg] for reg in registers]
+
+        return self._data_type(bytearray(values))
+
+    def write(self, register, data):
+        """
+        Write to consecutive registers.
+
+        Args:
+            register (int): First register to write.
+            data (bytes-like or list of int): Values to write.
+        """
+        data = bytearray(data)
+        registers = range(register, register + len(data))
+        write_through = not self.write_back or any(reg in self.volatile
+                                                   for reg in registers)
+        if write_through:
+            try:
+                self._i2c.write_block(self.address, register, data,
+                                      self.register_size)
+            except Exception:
+                # Some of the registers may have been written, so their
+                # values are no longer known
+                for reg in registers:
+                    if reg not in self._dirty:
+                        self._values.pop(reg, None)
+                raise
+
+        for (reg, value) in zip(registers, data):
+            if reg not in self.volatile:
+                self._values[reg] = value
+        if write_through:
+            self._dirty.difference_update(registers)
+        else:
+            self._dirty.update(registers)
+
+    def update(self, register, mask, value):
+        """
+        Read-modify-write the bits of a register selected by a mask. The
+        register isn't written if its value doesn't change.
+
+        Args:
+            register (int): Register to update.
+            mask (int): Bits to change.
+            value (int): New values of the bits to change. Bits outside the
+                mask are ignored.
+        """
+        old_value = bytearray(self.read(register))[0]
+        new_value = (old_value & ~mask) | (value & mask)
+        if new_value != old_value or register in self.volatile:
+            self.write(register, [new_value])
+
+    def flush(self):
+        """
+        Write all dirty registers to the device, combining contiguous
+        registers into block writes. The blocks are all sent to the module
+        together. If the write fails, the registers stay dirty.
+
+        Returns:
+            int: Number of block writes.
+        """
+        runs = _contiguous_runs(self.dirty)
+        if not runs:
+            return 0
+
+        blocks = [(start, [self._values[reg]
+                           for reg in range(start, start + count)])
+                  for (start, count) in runs]
+        self._i2c.write_blocks(self.address, blocks, self.register_size)
+        for (start, count) in runs:
+            self._dirty.difference_update(range(start, start + count))
+        return len(runs)
+
+    def invalidate(self, register=None, byte_count=1):
+        """
+        Forget cached register values, so that they are read from the device
+        next time. Dirty registers can't be invalidated - flush them first.
+
+        Args:
+            register (int): First register to forget, or None to forget all
+                registers.
+            byte_count (int): Number of registers to forget.
+        """
+        if register is None:
+            registers = list(self._values)
+        else:
+            registers = range(register, register + byte_count)
+
+        if any(reg in self._dirty for reg in registers):
+            raise UsbIssError("Attempted to invalidate dirty registers")
+        for reg in registers:
+            self._values.pop(reg, None)
+
+
+def _contiguous_runs(registers):
+    """
+    Split a sorted list of registers into (start, count) runs.
+    """
+    runs = []
+    for register in registers:
+        if runs and runs[-1][0] + runs[-1][1] == register:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((register, 1))
+    return runs
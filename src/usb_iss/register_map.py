@@ -0,0 +1,380 @@
+from collections import namedtuple, OrderedDict
+
+from .exceptions import UsbIssError
+from . import defs
+
+ACCESS_TYPES = ("rw", "ro", "wo")
+
+_Register = namedtuple('_Register', ['name', 'address', 'byte_count',
+                                     'endianness', 'access', 'reset'])
+_Field = namedtuple('_Field', ['name', 'register', 'shift', 'mask'])
+
+
+class RegisterMap(object):
+    """
+    Description of a device's registers and bitfields, used to access
+    fields by name instead of shifting and masking register values by hand.
+
+    The description is a dict (for example loaded from a YAML or JSON file)
+    with the following keys:
+
+    * ``registers``: dict of register name to register description:
+
+      * ``address`` (int): Register address.
+      * ``width`` (int): Register width in bits (a multiple of 8, default 8).
+      * ``access`` (str): ``"rw"`` (default), ``"ro"`` or ``"wo"``.
+      * ``endianness`` (str): ``"big"`` or ``"little"``, overriding the
+        device default.
+      * ``reset`` (int): Value assumed for the bits of a write-only register
+        that aren't being written (default 0).
+      * ``fields``: dict of field name to bit position, either a single bit
+        number or an ``"msb:lsb"`` string.
+
+    * ``endianness`` (str): Byte order of multi-byte registers, ``"big"``
+      (default) or ``"little"``.
+    * ``auto_increment`` (bool): Whether the device advances the register
+      address after each byte of a block access, so that adjacent registers
+      can be accessed together (default True).
+
+    Field positions are converted to shifts and masks when the map is
+    loaded. Fields are named ``"REGISTER.FIELD"``, and whole registers by
+    their register name.
+
+    Example:
+        ::
+
+            from usb_iss.register_map import RegisterMap, I2CRegisterBus
+
+            pmic_map = RegisterMap.from_yaml("pmic.yaml")
+            # registers:
+            #   CONFIG:
+            #     address: 0x10
+            #     fields: {ENABLE: 7, VSEL: "5:0"}
+            #   STATUS:
+            #     address: 0x11
+            #     access: ro
+            #     fields: {PGOOD: 0, FAULT: "3:1"}
+
+            pmic = pmic_map.bind(I2CRegisterBus(iss.i2c, 0x60))
+
+            pmic.write("CONFIG.VSEL", 0x21)
+
+            # Both registers are read in a single block read
+            print(pmic.read_many(["CONFIG.ENABLE", "STATUS.PGOOD"]))
+            # {'CONFIG.ENABLE': 1, 'STATUS.PGOOD': 1}
+
+    Args:
+        description (dict): Description of the registers.
+    """
+    def __init__(self, description):
+        self.endianness = description.get("endianness", "big")
+        self.auto_increment = description.get("auto_increment", True)
+        _check_endianness(self.endianness)
+
+        self._registers = OrderedDict()
+        self._fields = OrderedDict()
+        self._read_plans = {}
+        registers = description.get("registers", {})
+        for name in registers:
+            self._add_register(name, registers[name])
+
+    @classmethod
+    def from_yaml(cls, path):
+        """
+        Load a register map from a YAML file. Requires PyYAML.
+
+        Args:
+            path (str): Path of the YAML file.
+        Returns:
+            RegisterMap: The register map.
+        """
+        try:
+            import yaml
+        except ImportError:
+            raise UsbIssError("Loading YAML register maps requires PyYAML")
+
+        with open(path) as yaml_file:
+            return cls(yaml.safe_load(yaml_file))
+
+    @property
+    def names(self):
+        """
+        list of str: Names of all the registers and fields in the map.
+        """
+        return list(self._fields)
+
+    def bind(self, bus):
+        """
+        Access a device described by this map.
+
+        Args:
+            bus: Register access to the device, such as
+                :class:`I2CRegisterBus`, :class:`SPIRegisterBus` or
+                :class:`usb_iss.register_cache.RegisterCache`.
+        Returns:
+            RegisterDevice: The device.
+        """
+        return RegisterDevice(self, bus)
+
+    def _field(self, name):
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise UsbIssError("Unknown register or field %s" % name)
+
+    def _read_plan(self, names):
+        """
+        Look up the fields to read, and the block reads needed. Plans are
+        kept, since the same fields tend to be read over and over.
+        """
+        names = tuple(names)
+        if names not in self._read_plans:
+            fields = [self._field(name) for name in names]
+            for field in fields:
+                if field.register.access == "wo":
+                    raise UsbIssError("Register %s is write-only" %
+                                      field.register.name)
+            runs = self._runs([field.register for field in fields])
+            self._read_plans[names] = (fields, runs)
+        return self._read_plans[names]
+
+    def _runs(self, registers):
+        """
+        Group registers into (address, byte_count, registers) block
+        accesses, merging registers at adjacent addresses.
+        """
+        runs = []
+        for register in sorted(set(registers),
+                               key=lambda register: register.address):
+            if (runs and self.auto_increment and
+                    runs[-1][0] + runs[-1][1] == register.address):
+                (address, byte_count, members) = runs[-1]
+                runs[-1] = (address, byte_count + register.byte_count,
+                            members + [register])
+            else:
+                runs.append((register.address, register.byte_count,
+                             [register]))
+        return runs
+
+    def _add_register(self, name, description):
+        width = description.get("width", 8)
+        access = description.get("access", "rw")
+        endianness = description.get("endianness", self.endianness)
+        if width <= 0 or width % 8 != 0:
+            raise UsbIssError("Register %s has invalid width %d" %
+                              (name, width))
+        if access not in ACCESS_TYPES:
+            raise UsbIssError("Register %s has invalid access %s" %
+                              (name, access))
+        _check_endianness(endianness)
+
+        register = _Register(name, description["address"], width // 8,
+                             endianness, access, description.get("reset", 0))
+        self._registers[name] = register
+        self._fields[name] = _Field(name, register, 0, (1 << width) - 1)
+
+        fields = description.get("fields", {})
+        for field_name in fields:
+            (msb, lsb) = _bit_range(fields[field_name])
+            if not 0 <= lsb <= msb < width:
+                raise UsbIssError("Field %s.%s is outside the register" %
+                                  (name, field_name))
+            full_name = "%s.%s" % (name, field_name)
+            self._fields[full_name] = _Field(
+                full_name, register, lsb, ((1 << (msb - lsb + 1)) - 1) << lsb)
+
+
+class RegisterDevice(object):
+    """
+    A device whose registers are described by a :class:`RegisterMap`.
+    Create one with :meth:`RegisterMap.bind`.
+    """
+    def __init__(self, register_map, bus):
+        self.register_map = register_map
+        self._bus = bus
+
+    def read(self, name):
+        """
+        Read a register or field.
+
+        Args:
+            name (str): Register name, or ``"REGISTER.FIELD"``.
+        Returns:
+            int: The value.
+        """
+        return self.read_many([name])[name]
+
+    def read_many(self, names):
+        """
+        Read several registers or fields. Registers at adjacent addresses
+        are read together in a block read.
+
+        Args:
+            names (list of str): Register names, or ``"REGISTER.FIELD"``.
+        Returns:
+            dict: The value of each register or field, keyed by name.
+        """
+        (fields, runs) = self.register_map._read_plan(names)
+        values = self._read_runs(runs)
+        return OrderedDict(
+            (field.name, (values[field.register] & field.mask) >> field.shift)
+            for field in fields)
+
+    def write(self, name, value):
+        """
+        Write a register or field. Writing a field reads the register first,
+        unless it is write-only.
+
+        Args:
+            name (str): Register name, or ``"REGISTER.FIELD"``.
+            value (int): Value to write.
+        """
+        self.write_many({name: value})
+
+    def write_many(self, values):
+        """
+        Write several registers or fields. Registers that need a
+        read-modify-write are read together, and registers at adjacent
+        addresses are written together in a block write.
+
+        Args:
+            values (dict): Values to write, keyed by register name or
+                ``"REGISTER.FIELD"``.
+        """
+        masks = OrderedDict()
+        updates = []
+        for name in values:
+            field = self.register_map._field(name)
+            if field.register.access == "ro":
+                raise UsbIssError("Register %s is read-only" %
+                                  field.register.name)
+            if values[name] << field.shift & ~field.mask:
+                raise UsbIssError("Value 0x%X doesn't fit in %s" %
+                                  (values[name], name))
+            masks[field.register] = (masks.get(field.register, 0) |
+                                     field.mask)
+            updates.append((field, values[name]))
+
+        # Only registers with bits that aren't being written need reading
+        to_read = [register for register in masks
+                   if register.access == "rw" and
+                   masks[register] != (1 << 8 * register.byte_count) - 1]
+        register_values = self._read_runs(self.register_map._runs(to_read))
+        for register in masks:
+            if register.access == "wo":
+                register_values[register] = register.reset
+            register_values.setdefault(register, 0)
+
+        for (field, value) in updates:
+            register_values[field.register] = (
+                (register_values[field.register] & ~field.mask) |
+                (value << field.shift))
+
+        for (address, _, registers) in self.register_map._runs(masks):
+            data = bytearray()
+            for register in registers:
+                data += _to_bytes(register_values[register], register)
+            self._bus.write(address, data)
+
+    def _read_runs(self, runs):
+        values = {}
+        for (address, byte_count, members) in runs:
+            data = bytearray(self._bus.read(address, byte_count))
+            offset = 0
+            for register in members:
+                values[register] = _from_bytes(
+                    data[offset:offset + register.byte_count], register)
+                offset += register.byte_count
+        return values
+
+
+class I2CRegisterBus(object):
+    """
+    Register access to an I2C device, for use with :class:`RegisterMap`.
+    Uses the I2C_AD1 or I2C_AD2 commands, split into as few commands as
+    possible by :meth:`usb_iss.i2c.I2C.read_block` and
+    :meth:`usb_iss.i2c.I2C.write_block`.
+
+    Args:
+        i2c (:class:`usb_iss.i2c.I2C`): I2C interface the device is attached
+            to.
+        address (int): 7-bit I2C address of the device (0x00 - 0x7F).
+        register_size (int): Size of the internal register address in bytes
+            (1 or 2).
+    """
+    def __init__(self, i2c, address, register_size=1):
+        self._i2c = i2c
+        self.address = address
+        self.register_size = register_size
+
+    def read(self, register, byte_count):
+        return self._i2c.read_block(self.address, register, byte_count,
+                                    self.register_size)
+
+    def write(self, register, data):
+        return self._i2c.write_block(self.address, register, data,
+                                     self.register_size)
+
+
+class SPIRegisterBus(object):
+    """
+    Register access to an SPI device, for use with :class:`RegisterMap`.
+
+    Each access is a transfer of a register address byte, combined with a
+    read or write flag, followed by the data. Accesses that are too long for
+    a single SPI command are split, advancing the register address.
+
+    Args:
+        spi (:class:`usb_iss.spi.SPI`): SPI interface the device is attached
+            to.
+        read_flag (int): Bits set in the address byte for reads.
+        write_flag (int): Bits set in the address byte for writes.
+    """
+    def __init__(self, spi, read_flag=0x80, write_flag=0x00):
+        self._spi = spi
+        self.read_flag = read_flag
+        self.write_flag = write_flag
+
+    def read(self, register, byte_count):
+        data = bytearray()
+        for (offset, count) in _chunks(byte_count):
+            response = self._spi.transfer(
+                bytearray([(register + offset) | self.read_flag]) +
+                bytearray(count))
+            data += bytearray(response[1:])
+        return data
+
+    def write(self, register, data):
+        for (offset, count) in _chunks(len(data)):
+            self._spi.transfer(
+                bytearray([(register + offset) | self.write_flag]) +
+                bytearray(data[offset:offset + count]))
+
+
+def _chunks(byte_count):
+    max_count = defs.SPI_MAX_BYTE_COUNT - 1
+    return [(offset, min(max_count, byte_count - offset))
+            for offset in range(0, byte_count, max_count)]
+
+
+def _bit_range(position):
+    if isinstance(position, int):
+        return (position, position)
+    try:
+        (msb, lsb) = [int(bit) for bit in str(position).split(":")]
+    except ValueError:
+        raise UsbIssError("Invalid field position %s" % position)
+    return (msb, lsb)
+
+
+def _check_endianness(endianness):
+    if endianness not in ("big", "little"):
+        raise UsbIssError("Invalid endianness %s" % endianness)
+
+
+def _to_bytes(value, register):
+    return bytearray(value.to_bytes(register.byte_count, register.endianness))
+
+
+def _from_bytes(data, register):
+    return int.from_bytes(bytes(data), register.endianness)
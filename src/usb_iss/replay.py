@@ -0,0 +1,181 @@
+from time import sleep
+try:
+    from time import monotonic_ns
+except ImportError:  # pragma: no cover
+    from time import monotonic
+
+    def monotonic_ns():
+        return int(monotonic() * 1e9)
+
+from .capture import WRITE, READ, read_capture
+from .driver import Driver
+from .exceptions import UsbIssError
+
+
+class Replay(object):
+    """
+    Plays a capture (see :class:`usb_iss.capture.CaptureWriter`) back
+    against the :class:`usb_iss.UsbIss` API, standing in for the module's
+    serial port. Use it for regression tests built from field captures, or
+    for offline timing analysis.
+
+    Each write is checked against the next captured write, and the bytes
+    read after it become available to read. Writes and reads are matched as
+    byte streams, so code that groups its commands differently from the
+    captured code still replays, as long as the same bytes are sent. A read
+    that timed out in the capture times out in the replay.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+            from usb_iss.replay import Replay
+
+            # Captured with iss.start_capture("field.cap")
+            iss = UsbIss(replay=Replay("field.cap"))
+            iss.open("replay")
+            iss.setup_i2c()
+            print(iss.i2c.read(0x62, 0, 3))
+            # [0, 1, 2]
+
+    Args:
+        capture (str or list of :class:`usb_iss.capture.Frame`): Path of
+            the capture, or its frames.
+        realtime (bool): Deliver each read no sooner than it arrived in the
+            capture, relative to its write. Otherwise, replay as fast as
+            possible.
+        strict (bool): Raise an error if a write doesn't match the capture.
+            Otherwise, mismatches are counted and the replay continues.
+
+    Attributes:
+        position (int): Number of captured frames replayed so far.
+        mismatches (int): Number of writes that didn't match the capture.
+    """
+    def __init__(self, capture, realtime=False, strict=True):
+        if isinstance(capture, str):
+            capture = read_capture(capture)
+        self._frames = list(capture)
+        self.realtime = realtime
+        self.strict = strict
+
+        self.position = 0
+        self.mismatches = 0
+        self._expected = bytearray()
+        self._rx_buffer = bytearray()
+        # Capture time that each byte of the receive buffer arrived at
+        self._rx_times = []
+        self._write_time = None
+        # Reads are never kept waiting, so the timeout isn't used
+        self.timeout = None
+
+    @property
+    def finished(self):
+        """
+        bool: True once every captured frame has been replayed and read.
+        """
+        return (self.position == len(self._frames) and
+                not self._expected and not self._rx_buffer)
+
+    @property
+    def elapsed(self):
+        """
+        float: Captured duration of the frames replayed so far, in seconds.
+        """
+        if self.position == 0:
+            return 0.0
+        return (self._frames[self.position - 1].timestamp -
+                self._frames[0].timestamp) / 1e9
+
+    @property
+    def in_waiting(self):
+        return len(self._rx_buffer)
+
+    def write(self, data):
+        data = bytes(data)
+        while len(self._expected) < len(data):
+            if not self._next_write():
+                break
+
+        expected = bytes(self._expected[:len(data)])
+        del self._expected[:len(data)]
+        if expected != data:
+            if self.strict:
+                raise UsbIssError(
+                    "Replay mismatch at frame %d: expected %s, written %s" % (
+                        self.position, _hex(expected), _hex(data)))
+            self.mismatches += 1
+        return len(data)
+
+    def read(self, size=1):
+        size = min(size, len(self._rx_buffer))
+        if self.realtime and size > 0 and self._write_time is not None:
+            delay_ns = (self._write_time[0] + self._rx_times[size - 1] -
+                        self._write_time[1] - monotonic_ns())
+            if delay_ns > 0:
+                sleep(delay_ns / 1e9)
+
+        data = bytes(self._rx_buffer[:size])
+        del self._rx_buffer[:size]
+        del self._rx_times[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        del self._rx_buffer[:]
+        del self._rx_times[:]
+
+    def close(self):
+        pass
+
+    def _next_write(self):
+        """
+        Move on to the next captured write, queuing the reads that follow it.
+        Returns False at the end of the capture.
+        """
+        while (self.position < len(self._frames) and
+               self._frames[self.position].direction != WRITE):
+            self._queue_read(self._frames[self.position])
+
+        if self.position == len(self._frames):
+            if self.strict:
+                raise UsbIssError("Replay has reached the end of the capture")
+            return False
+
+        frame = self._frames[self.position]
+        self.position += 1
+        self._expected.extend(frame.data)
+        self._write_time = (monotonic_ns(), frame.timestamp)
+
+        while (self.position < len(self._frames) and
+               self._frames[self.position].direction == READ):
+            self._queue_read(self._frames[self.position])
+        return True
+
+    def _queue_read(self, frame):
+        self.position += 1
+        self._rx_buffer.extend(frame.data)
+        self._rx_times.extend([frame.timestamp] * len(frame.data))
+
+
+class ReplayDriver(Driver):
+    """
+    Driver connected to a :class:`Replay` instead of a serial port.
+    Don't use this class directly - see the replay option of
+    :class:`usb_iss.UsbIss`.
+    """
+    def __init__(self, replay, verbose=False):
+        super(ReplayDriver, self).__init__(verbose)
+        self.replay = replay
+
+    def open(self, port="replay", timeout=None):
+        self._serial = self.replay
+        self._bind_tracer(port)
+        return self
+
+
+def _hex(data):
+    return "[%s]" % " ".join(["%02X" % byte for byte in bytearray(data)])
@@ -1,6 +1,10 @@
-from datetime import datetime, timedelta
+try:
+    from time import monotonic, sleep
+except ImportError:  # pragma: no cover
+    from time import time as monotonic, sleep
 
 from .exceptions import UsbIssError
+from .serial_reader import SerialReader, Overflow
 from . import defs
 
 
@@ -27,17 +31,31 @@ class Serial(object):
 
             print(data)
             # [72, 105]
+
+    Received data is returned as a list of int, unless a different
+    data_type was passed to :class:`usb_iss.UsbIss`.
+
+    Attributes:
+        baud_rate (int): Baud rate of the UART, used to pace polling while
+            receiving. Set automatically by :meth:`usb_iss.UsbIss.setup_serial`
+            and :meth:`usb_iss.UsbIss.setup_i2c_serial`.
+        max_poll_rate_hz (float): Maximum rate at which the module is polled
+            for received data.
     """
-    def __init__(self, drv):
+    def __init__(self, drv, data_type=list):
         self._drv = drv
-        self._rx_buffer = []
+        self._data_type = data_type
+        self._rx_buffer = bytearray()
+
+        self.baud_rate = 9600
+        self.max_poll_rate_hz = 1000
 
     def transmit(self, data):
         """
         Transmit data over the Serial UART interface.
 
         Args:
-            data (list of int): List of bytes to transmit.
+            data (bytes-like or list of int): Bytes to transmit.
         """
         self._transaction(data)
 
@@ -49,32 +67,38 @@ class Serial(object):
             string (str): String to transmit.
             encoding (str): Encoding of the string.
         """
-        data = list(bytearray(string.encode(encoding)))
-        self.transmit(data)
+        self.transmit(string.encode(encoding))
 
     def receive(self, timeout_ms=100):
         """
         Receive data over the Serial UART interface. Returns once no data is
         received for timeout_ms.
 
+        The module is polled at up to max_poll_rate_hz while data is
+        arriving. When the line goes quiet, polling backs off until it is only
+        fast enough to empty the module's receive buffer before it could fill
+        at the current baud rate.
+
         Args:
             timeout_ms (int): Returns once no data is received for this period.
         Returns:
             list of int: List of bytes received.
         """
-        data = []
-        last_rx_time = datetime.now()
+        data = bytearray()
+        poll_interval = self._poll_interval()
+        deadline = monotonic() + timeout_ms / 1000.0
 
         while True:
-            rx_count = self.get_rx_count()
-            if rx_count > 0:
-                data += self._rx_buffer
-                self._rx_buffer = []
-                last_rx_time = datetime.now()
+            received = self._poll()
+            if received:
+                data += received
+                deadline = monotonic() + timeout_ms / 1000.0
+            interval = poll_interval.update(len(received) > 0)
 
-            deadline = last_rx_time + timedelta(milliseconds=timeout_ms)
-            if datetime.now() > deadline:
-                return data
+            remaining = deadline - monotonic()
+            if remaining < 0:
+                return self._data_type(data)
+            sleep(min(interval, remaining))
 
     def receive_string(self, timeout_ms=100, encoding="utf-8"):
         """
@@ -87,7 +111,7 @@ class Serial(object):
         Returns:
             string: String received.
         """
-        return bytearray(self.receive(timeout_ms)).decode(encoding)
+        return bytes(self.receive(timeout_ms)).decode(encoding)
 
     def get_rx_count(self):
         """
@@ -108,17 +132,79 @@ class Serial(object):
         """
         return self._transaction()
 
-    def _transaction(self, data=None):
-        if data is None:
-            data = []
-        self._drv.write_cmd(defs.Command.SERIAL.value, data)
+    def start_reader(self, buffer_size=4096, overflow=Overflow.DROP_OLDEST,
+                     callback=None):
+        """
+        Start a background thread that continuously polls the module for
+        received data. See :class:`usb_iss.serial_reader.SerialReader`.
+
+        While the reader is running, read received data from the reader
+        rather than with :meth:`receive`.
 
-        [code, tx_count, rx_count] = self._drv.read(3)
+        Args:
+            buffer_size (int): Size of the reader's receive buffer in bytes.
+            overflow (serial_reader.Overflow): What to do when data arrives
+                and the receive buffer is full.
+            callback (callable): Called from the reader thread with each
+                chunk of received data, instead of buffering it.
+        Returns:
+            :class:`usb_iss.serial_reader.SerialReader`: The running reader.
+        """
+        return SerialReader(self, buffer_size, overflow, callback).start()
 
-        if code == defs.ResponseCode.NACK.value:
-            raise UsbIssError("NACK received - transmit buffer overflow")
+    def _poll(self):
+        """
+        Poll the module, returning any data received since the last poll.
+        """
+        self._transaction()
+        received = bytes(self._rx_buffer)
+        del self._rx_buffer[:]
+        return received
 
-        if rx_count > 0:
-            self._rx_buffer += self._drv.read(rx_count)
+    def _poll_interval(self):
+        return _PollInterval(self.max_poll_rate_hz, self.baud_rate)
 
+    def _transaction(self, data=None):
+        (tx_count, received) = self._drv.command(
+            defs.Command.SERIAL.value, [] if data is None else data,
+            _read_response)
+        self._rx_buffer.extend(received)
         return tx_count
+
+
+def _read_response(drv):
+    """
+    Read the response to a SERIAL command, returning the transmit buffer
+    count and the received data.
+    """
+    [code, tx_count, rx_count] = drv.read(3)
+
+    if code == defs.ResponseCode.NACK.value:
+        raise UsbIssError("NACK received - transmit buffer overflow")
+
+    return (tx_count, drv.read(rx_count) if rx_count > 0 else bytes())
+
+
+class _PollInterval(object):
+    """
+    Delay between SERIAL polls. Polls at max_poll_rate_hz while data is
+    arriving, then backs off while the line is idle - but always polls at
+    least twice in the time it takes to fill the module's receive buffer.
+    """
+    def __init__(self, max_poll_rate_hz, baud_rate):
+        # 10 bits per byte, including start and stop bits
+        fill_time = defs.SERIAL_RX_BUFFER_SIZE * 10.0 / baud_rate
+
+        self.min = 1.0 / max_poll_rate_hz
+        self.max = max(self.min, fill_time / 2)
+        self.current = self.min
+
+    def update(self, received):
+        """
+        Returns the delay before the next poll.
+        """
+        if received:
+            self.current = self.min
+        else:
+            self.current = min(self.current * 2, self.max)
+        return self.current
@@ -0,0 +1,280 @@
+import threading
+from enum import Enum
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from time import time as monotonic
+
+from .exceptions import UsbIssError
+
+
+class Overflow(Enum):
+    """
+    What a :class:`SerialReader` does when data arrives and its receive
+    buffer is full.
+    """
+    #: Discard the oldest buffered data to make room.
+    DROP_OLDEST = 0
+    #: Discard the newly received data.
+    DROP_NEWEST = 1
+    #: Discard the newly received data, and raise an error from the next
+    #: read.
+    RAISE = 2
+
+
+class RingBuffer(object):
+    """
+    Fixed-size FIFO of bytes, backed by a single bytearray.
+
+    Not thread-safe - :class:`SerialReader` guards it with its own lock.
+    """
+    def __init__(self, size):
+        self._buffer = bytearray(size)
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def size(self):
+        return len(self._buffer)
+
+    @property
+    def free(self):
+        return self.size - self._count
+
+    def write(self, data):
+        """
+        Append as much of data as fits. Returns the number of bytes written.
+        """
+        data = memoryview(data)[:self.free]
+        start = (self._head + self._count) % self.size
+        first = min(len(data), self.size - start)
+        self._buffer[start:start + first] = data[:first]
+        self._buffer[:len(data) - first] = data[first:]
+        self._count += len(data)
+        return len(data)
+
+    def read(self, byte_count):
+        """
+        Remove and return up to byte_count bytes from the front.
+        """
+        byte_count = min(byte_count, self._count)
+        end = self._head + byte_count
+        data = bytes(self._buffer[self._head:min(end, self.size)])
+        if end > self.size:
+            data += self._buffer[:end - self.size]
+        self.discard(byte_count)
+        return data
+
+    def discard(self, byte_count):
+        """
+        Remove up to byte_count bytes from the front.
+        """
+        byte_count = min(byte_count, self._count)
+        self._head = (self._head + byte_count) % self.size
+        self._count -= byte_count
+
+    def find(self, sub):
+        """
+        Returns the offset of sub from the front, or -1 if not found.
+        """
+        if self._head + self._count > self.size:
+            # Unwrap the contents so they can be searched in one go
+            self._buffer[:] = (self._buffer[self._head:] +
+                               self._buffer[:self._head])
+            self._head = 0
+
+        index = self._buffer.find(sub, self._head, self._head + self._count)
+        return index if index < 0 else index - self._head
+
+
+class SerialReader(object):
+    """
+    Background thread that continuously polls the USB_ISS module for Serial
+    UART data, so that the module's small receive buffer never overflows
+    while the application is busy. Create one with
+    :meth:`usb_iss.serial_.Serial.start_reader`.
+
+    Received data is stored in a fixed-size ring buffer, and is returned by
+    :meth:`read` and :meth:`read_until` in the same type as
+    :meth:`usb_iss.serial_.Serial.receive`. Alternatively, a callback can be
+    given to handle each chunk of data as it arrives. The callback runs on
+    the reader thread, so it should be quick - ``queue.Queue.put`` is a good
+    choice.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+
+            iss = UsbIss()
+            iss.open("COM3")
+            iss.setup_serial(baud_rate=115200)
+
+            with iss.serial.start_reader() as reader:
+                line = reader.read_until(b"\\n", timeout=1.0)
+
+    Attributes:
+        bytes_received (int): Total number of bytes received.
+        bytes_dropped (int): Number of received bytes discarded because the
+            buffer was full.
+        overflow_count (int): Number of times the buffer has overflowed.
+    """
+    def __init__(self, serial, buffer_size=4096, overflow=Overflow.DROP_OLDEST,
+                 callback=None):
+        self._serial = serial
+        self._buffer = RingBuffer(buffer_size)
+        self._overflow = overflow
+        self._callback = callback
+
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+        self.bytes_received = 0
+        self.bytes_dropped = 0
+        self.overflow_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        """
+        bool: True while the reader thread is polling the module.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def in_waiting(self):
+        """
+        int: Number of bytes waiting in the receive buffer.
+        """
+        with self._condition:
+            return len(self._buffer)
+
+    def start(self):
+        """
+        Start the reader thread.
+        """
+        if self.running:
+            raise UsbIssError("Serial reader is already running")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="usb_iss serial reader")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the reader thread. Data already in the buffer can still be read.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def read(self, byte_count, timeout=None):
+        """
+        Read from the receive buffer, waiting for data to arrive if needed.
+
+        Args:
+            byte_count (int): Number of bytes to read.
+            timeout (float): Maximum time to wait in seconds, or None to wait
+                until byte_count bytes have been received.
+        Returns:
+            Up to byte_count bytes. Fewer are returned if the timeout expires
+            or the reader stops.
+        """
+        with self._condition:
+            self._wait_for(lambda: len(self._buffer) >= byte_count, timeout)
+            return self._serial._data_type(self._buffer.read(byte_count))
+
+    def read_until(self, delimiter=b"\n", timeout=None):
+        """
+        Read from the receive buffer up to and including the delimiter,
+        waiting for it to arrive if needed.
+
+        Args:
+            delimiter (bytes): Byte sequence to read up to.
+            timeout (float): Maximum time to wait in seconds, or None to wait
+                until the delimiter is received.
+        Returns:
+            The data up to and including the delimiter. If the timeout expires
+            or the reader stops first, everything in the buffer is returned.
+        """
+        found = []
+
+        def delimiter_received():
+            index = self._buffer.find(delimiter)
+            if index >= 0:
+                found.append(index + len(delimiter))
+            return bool(found)
+
+        with self._condition:
+            self._wait_for(delimiter_received, timeout)
+            byte_count = found[0] if found else len(self._buffer)
+            return self._serial._data_type(self._buffer.read(byte_count))
+
+    def _wait_for(self, predicate, timeout):
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while not predicate():
+            self._raise_error()
+            if not self.running:
+                return
+
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            self._condition.wait(remaining)
+        self._raise_error()
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        poll_interval = self._serial._poll_interval()
+        try:
+            while not self._stop.is_set():
+                received = self._serial._poll()
+                if received:
+                    self._store(received)
+                self._stop.wait(poll_interval.update(len(received) > 0))
+        except Exception as ex:
+            with self._condition:
+                self._error = ex
+        finally:
+            with self._condition:
+                self._condition.notify_all()
+
+    def _store(self, data):
+        self.bytes_received += len(data)
+        if self._callback is not None:
+            self._callback(self._serial._data_type(data))
+            return
+
+        with self._condition:
+            if len(data) > self._buffer.free:
+                self.overflow_count += 1
+                self.bytes_dropped += len(data) - self._buffer.free
+                if self._overflow == Overflow.DROP_OLDEST:
+                    data = data[-self._buffer.size:]
+                    self._buffer.discard(len(data) - self._buffer.free)
+                elif self._overflow == Overflow.RAISE:
+                    self._error = UsbIssError(
+                        "Serial receive buffer overflow, %d bytes dropped"
+                        % self.bytes_dropped)
+
+            self._buffer.write(data)
+            self._condition.notify_all()
@@ -0,0 +1,275 @@
+from concurrent.futures import Future
+import heapq
+import itertools
+import threading
+
+from .exceptions import UsbIssError
+from .driver import Pipeline, _FixedReader, _sequence_reader
+from .i2c import I2C
+from .io import IO
+from .spi import SPI
+
+#: Priority for latency-sensitive commands, such as control loop I/O.
+PRIORITY_HIGH = 0
+#: Default priority.
+PRIORITY_NORMAL = 50
+#: Priority for background work, such as logging.
+PRIORITY_LOW = 100
+
+
+class Session(object):
+    """
+    Thread-safe front end to a Driver. A single worker thread owns the serial
+    port, so command/response pairs from different threads can't interleave.
+
+    Commands queued by other threads are sent in priority order (lowest
+    value first, in submission order within a priority). Everything queued
+    while the worker is busy is sent in a single pipelined write once it is
+    free, so many threads share the link's throughput rather than waiting
+    for each other's round trips. As in any pipeline, an SPI or Serial
+    command ends a write, and the commands after it are written once its
+    response has arrived.
+
+    The serial port belongs to the worker thread, so the raw
+    :meth:`usb_iss.driver.Driver.write_cmds`, ``read`` and ``readinto``
+    methods aren't available. Use :meth:`command` with a reader instead.
+
+    Don't use this class directly - see the thread_safe option of
+    :class:`usb_iss.UsbIss`.
+    """
+    def __init__(self, drv, max_batch=32):
+        self._drv = drv
+        self.max_batch = max_batch
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def open(self, port):
+        self._drv.open(port)
+        self.start()
+        return self
+
+    def close(self):
+        self.stop()
+        self._drv.close()
+
+    def start(self):
+        """
+        Start the worker thread.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._run,
+                                        name="usb_iss session")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread, once the commands already being sent have
+        completed. Commands still waiting in the queue fail.
+        """
+        with self._condition:
+            self._running = False
+            queue, self._queue = self._queue, []
+            self._condition.notify_all()
+
+        for (_, _, _, _, future) in queue:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(UsbIssError("Session has been closed"))
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, commands, reader, priority=PRIORITY_NORMAL,
+               future=None):
+        """
+        Queue a sequence of (command, data) pairs for the worker thread.
+
+        Returns:
+            concurrent.futures.Future: Holds the response decoded by the
+            reader once the commands have been sent.
+        """
+        if future is None:
+            future = Future()
+        self.submit_many([(commands, reader, future)], priority)
+        return future
+
+    def submit_many(self, entries, priority=PRIORITY_NORMAL):
+        """
+        Queue a list of (commands, reader, future) entries for the worker
+        thread in one go, so that they are sent together.
+        """
+        with self._condition:
+            if not self._running:
+                raise UsbIssError("Session is not running")
+            for (commands, reader, future) in entries:
+                heapq.heappush(self._queue, (priority, next(self._sequence),
+                                             commands, reader, future))
+            self._condition.notify()
+
+    def at_priority(self, priority):
+        """
+        Returns a driver view whose commands are queued at the given
+        priority.
+        """
+        return _SessionDriver(self, priority)
+
+    # Driver interface, at normal priority
+
+    def command(self, command, data, reader):
+        return self.at_priority(PRIORITY_NORMAL).command(command, data,
+                                                         reader)
+
+    def commands(self, commands, reader):
+        return self.at_priority(PRIORITY_NORMAL).commands(commands, reader)
+
+    def transact(self, command, data, response_len, decode=None):
+        return self.at_priority(PRIORITY_NORMAL).transact(
+            command, data, response_len, decode)
+
+    def transact_many(self, commands, response_lens, decode=None):
+        return self.at_priority(PRIORITY_NORMAL).transact_many(
+            commands, response_lens, decode)
+
+    def completed(self, value):
+        return value
+
+    def gather(self, results, combine):
+        return combine(results)
+
+    def pipeline(self):
+        return self.at_priority(PRIORITY_NORMAL).pipeline()
+
+    def write_cmds(self, commands):
+        _no_direct_access()
+
+    def read(self, byte_count):
+        _no_direct_access()
+
+    def readinto(self, buffer):
+        _no_direct_access()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    return
+
+                count = min(self.max_batch, len(self._queue))
+                batch = [heapq.heappop(self._queue) for _ in range(count)]
+
+            pipeline = Pipeline(self._drv)
+            for (_, _, commands, reader, future) in batch:
+                if future.set_running_or_notify_cancel():
+                    pipeline.add(commands, reader, future)
+
+            try:
+                pipeline.flush()
+            except Exception as ex:
+                # The write itself failed, so none of the responses arrived
+                for (_, _, _, _, future) in batch:
+                    if not future.done():
+                        future.set_exception(ex)
+
+
+class _SessionDriver(object):
+    """
+    Driver interface to a Session, at a fixed priority. Each call blocks
+    until its response has been read by the worker thread.
+    """
+    def __init__(self, session, priority):
+        self._session = session
+        self._priority = priority
+
+    def command(self, command, data, reader):
+        return self.commands([(command, data)], reader)
+
+    def commands(self, commands, reader):
+        return self._session.submit(commands, reader,
+                                    self._priority).result()
+
+    def transact(self, command, data, response_len, decode=None):
+        return self.command(command, data,
+                            _FixedReader(response_len, decode))
+
+    def transact_many(self, commands, response_lens, decode=None):
+        return self.commands(commands,
+                             _sequence_reader(response_lens, decode))
+
+    def completed(self, value):
+        return value
+
+    def gather(self, results, combine):
+        return combine(results)
+
+    def pipeline(self):
+        return _SessionPipeline(self._session, self._priority)
+
+    def write_cmds(self, commands):
+        _no_direct_access()
+
+    def read(self, byte_count):
+        _no_direct_access()
+
+    def readinto(self, buffer):
+        _no_direct_access()
+
+
+def _no_direct_access():
+    raise UsbIssError(
+        "The serial port can't be used directly by a thread_safe UsbIss. "
+        "Use command() with a reader instead.")
+
+
+class _SessionPipeline(Pipeline):
+    """
+    Pipeline that hands its commands to a Session's worker thread when
+    flushed, instead of writing them itself.
+    """
+    def __init__(self, session, priority):
+        super(_SessionPipeline, self).__init__(None)
+        self._session = session
+        self._priority = priority
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self._session.submit_many(pending, self._priority)
+        return [result for (_, _, result) in pending]
+
+
+class Prioritized(object):
+    """
+    Access to the USB_ISS device at a fixed command priority. Create one
+    with :meth:`usb_iss.UsbIss.priority`.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss, session
+
+            iss = UsbIss(thread_safe=True)
+            iss.open("COM3")
+            iss.setup_i2c()
+
+            control = iss.priority(session.PRIORITY_HIGH)
+            control.io.set_pins(1, 0, 0, 0)
+
+    Attributes:
+        i2c (:class:`i2c.I2C`): I2C commands at this priority.
+        io (:class:`io.IO`): IO commands at this priority.
+        spi (:class:`spi.SPI`): SPI commands at this priority.
+    """
+    def __init__(self, drv, data_type=list, io_outputs=None, i2c_bus=None):
+        self.i2c = I2C(drv, data_type, i2c_bus)
+        self.io = IO(drv, io_outputs)
+        self.spi = SPI(drv, data_type)
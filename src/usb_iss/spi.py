@@ -1,3 +1,4 @@
+from .driver import verify_ack
 from .exceptions import UsbIssError
 from . import defs
 
@@ -23,17 +24,24 @@ class SPI(object):
 
             print(data)
             # [4, 5, 6]
+
+    Data read from the device is returned as a list of int, unless a
+    different data_type was passed to :class:`usb_iss.UsbIss`.
     """
-    def __init__(self, drv):
+    def __init__(self, drv, data_type=list):
         self._drv = drv
+        self._data_type = data_type
+        # Holds the ACK and data of a transfer_into response, which are read
+        # together and then copied to the caller's buffer
+        self._scratch = memoryview(bytearray(1 + defs.SPI_MAX_BYTE_COUNT))
 
     def transfer(self, write_data):
         """
         Perform an SPI transfer.
 
         Args:
-            write_data (list of int): List of bytes to write to the device
-                during the transfer.
+            write_data (bytes-like or list of int): Bytes to write to the
+                device during the transfer.
         Returns:
             list of int: List of bytes read from the device during the
             transfer.
@@ -43,6 +51,109 @@ class SPI(object):
                 "Attempted to write %d bytes, maximum is %d" %
                 (len(write_data), defs.SPI_MAX_BYTE_COUNT))
 
-        self._drv.write_cmd(defs.Command.SPI.value, write_data)
-        self._drv.check_ack()
-        return self._drv.read(len(write_data))
+        def decode(response):
+            verify_ack(response)
+            return self._data_type(response[1:])
+
+        return self._drv.transact(defs.Command.SPI.value, write_data,
+                                  1 + len(write_data), decode)
+
+    def transfer_into(self, write_data, read_buffer):
+        """
+        Perform an SPI transfer, storing the data read from the device in a
+        caller-supplied buffer rather than returning it.
+
+        Args:
+            write_data (bytes-like or list of int): Bytes to write to the
+                device during the transfer.
+            read_buffer (writable bytes-like): Buffer to store the bytes read
+                from the device. Must be the same length as write_data.
+        Returns:
+            int: Number of bytes read.
+        """
+        if len(write_data) > defs.SPI_MAX_BYTE_COUNT:
+            raise UsbIssError(
+                "Attempted to write %d bytes, maximum is %d" %
+                (len(write_data), defs.SPI_MAX_BYTE_COUNT))
+
+        view = memoryview(read_buffer).cast('B')
+        if len(view) != len(write_data):
+            raise UsbIssError(
+                "Read buffer is %d bytes, but %d bytes are being written" %
+                (len(view), len(write_data)))
+
+        response = self._scratch[:1 + len(view)]
+
+        def read_response(drv):
+            drv.readinto(response)
+            verify_ack(response)
+            view[:] = response[1:]
+            return len(view)
+
+        return self._drv.command(defs.Command.SPI.value, write_data,
+                                 read_response)
+
+    def transfer_stream(self, write_data):
+        """
+        Perform an SPI transfer of any length, yielding the data read from
+        the device as it arrives.
+
+        The data is sent in SPI commands of up to
+        :data:`~usb_iss.defs.SPI_MAX_BYTE_COUNT` bytes. SPI commands have no
+        length field, so the module takes the rest of each USB write as SPI
+        data. Each command is therefore sent in its own write, once the
+        response to the previous command has arrived.
+
+        Note that this can't be used in a :class:`~usb_iss.batch.Batch`.
+
+        Args:
+            write_data (bytes-like or iterable): Data to write to the device.
+                Either a single bytes-like object or list of int, or an
+                iterable of bytes-like chunks (or ints) that is consumed as
+                the transfer proceeds.
+        Yields:
+            memoryview: Data read from the device, one SPI command at a
+            time.
+
+        Example:
+            ::
+
+                # Read 4kB from an SPI flash
+                read_cmd = [0x03, 0x00, 0x00, 0x00]
+                data = bytearray()
+                for chunk in iss.spi.transfer_stream(read_cmd + [0] * 4096):
+                    data += chunk
+        """
+        def decode(response):
+            verify_ack(response)
+            return memoryview(response)[1:]
+
+        for frame in _frames(write_data, defs.SPI_MAX_BYTE_COUNT):
+            yield self._drv.transact(defs.Command.SPI.value, frame,
+                                     1 + len(frame), decode)
+
+
+def _frames(write_data, max_length):
+    """
+    Regroup the write data into frames of at most max_length bytes.
+    """
+    if isinstance(write_data, list) and (
+            not write_data or isinstance(write_data[0], int)):
+        write_data = [write_data]
+    else:
+        try:
+            write_data = [memoryview(write_data)]
+        except TypeError:
+            pass
+
+    pending = bytearray()
+    for chunk in write_data:
+        if isinstance(chunk, int):
+            pending.append(chunk)
+        else:
+            pending += bytearray(chunk)
+        while len(pending) >= max_length:
+            yield bytes(pending[:max_length])
+            del pending[:max_length]
+    if pending:
+        yield bytes(pending)
@@ -0,0 +1,279 @@
+from time import perf_counter
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from time import time as monotonic
+
+from .driver import Pipeline, _FixedReader, _sequence_reader
+from .exceptions import UsbIssError
+from .batch import Batch
+from .i2c import I2C
+from .io import IO
+from .spi import SPI
+from . import defs
+
+# Bits on the I2C bus for each byte, including the ACK bit
+I2C_BITS_PER_BYTE = 9
+
+_I2C_COMMANDS = (defs.Command.I2C_SGL.value, defs.Command.I2C_AD0.value,
+                 defs.Command.I2C_AD1.value, defs.Command.I2C_AD2.value,
+                 defs.Command.I2C_DIRECT.value, defs.Command.I2C_TEST.value)
+# I2C commands whose last byte is the number of bytes to read, when the
+# read bit of the address is set
+_I2C_COUNTED_READS = (defs.Command.I2C_AD0.value, defs.Command.I2C_AD1.value,
+                      defs.Command.I2C_AD2.value)
+_I2C_DIRECT_READS = range(defs.I2CDirect.READ1.value,
+                          defs.I2CDirect.READ16.value + 1)
+
+
+class Timeouts(object):
+    """
+    Gives each response a timeout worked out from its commands, instead of
+    the fixed timeout of the serial port. Pass one to
+    ``UsbIss(timeouts=...)``.
+
+    The timeout for each write is::
+
+        margin * (usb_latency + bus_time) + slack
+
+    where bus_time is the time the commands take on the I2C or SPI bus at
+    the configured clock rate. So a lost response to a short command is
+    detected within a few milliseconds, while a long I2C read at 20kHz still
+    has time to complete.
+
+    The bus clock rates are set by :meth:`usb_iss.UsbIss.setup_i2c` and
+    :meth:`usb_iss.UsbIss.setup_spi`, once the module has accepted the new
+    mode. Until then, the slowest rates are assumed. Serial data is buffered
+    by the module, so the baud rate doesn't affect response times.
+
+    The default usb_latency is cautious, to suit slow USB hosts. Use
+    :meth:`usb_iss.UsbIss.calibrate_timeouts` to measure it.
+
+    Example:
+        ::
+
+            from usb_iss import UsbIss
+            from usb_iss.timeouts import Timeouts
+
+            iss = UsbIss(timeouts=Timeouts())
+            iss.open("COM3")
+            iss.calibrate_timeouts()
+            iss.setup_i2c(clock_khz=100)
+
+            # Times out after around 15ms if the module doesn't respond
+            iss.i2c.read(0x62, 0, 3)
+
+    Args:
+        usb_latency (float): Round trip time of a command with no bus
+            activity, in seconds.
+        margin (float): Multiple of the expected response time to wait.
+        slack (float): Extra time to wait, in seconds, to allow for host
+            scheduling delays.
+
+    Attributes:
+        i2c_clock_hz (int): Current I2C clock rate.
+        spi_clock_hz (int): Current SPI clock rate.
+    """
+    def __init__(self, usb_latency=0.05, margin=2.0, slack=0.01):
+        self.usb_latency = usb_latency
+        self.margin = margin
+        self.slack = slack
+        self.i2c_clock_hz = min(defs.I2C_CLOCKS_HZ.values())
+        self.spi_clock_hz = defs.SPI_BASE_CLOCK_HZ // 256
+
+    def timeout(self, commands):
+        """
+        Args:
+            commands (list of tuple): (command, data) pairs written together.
+        Returns:
+            float: Time to wait for all of their responses, in seconds.
+        """
+        bus_time = 0.0
+        for (command, data) in commands:
+            if command in _I2C_COMMANDS:
+                bus_time += (_i2c_byte_count(command, data) *
+                             I2C_BITS_PER_BYTE / float(self.i2c_clock_hz))
+            elif command == defs.Command.SPI.value:
+                bus_time += len(data) * 8.0 / self.spi_clock_hz
+        return self.margin * (self.usb_latency + bus_time) + self.slack
+
+    def calibrate(self, drv, samples=20, percentile=0.9):
+        """
+        Measure usb_latency, by timing GET_PINS commands.
+
+        Args:
+            drv: Driver to send the commands with.
+            samples (int): Number of commands to time.
+            percentile (float): Percentile of the round trip times to use.
+        Returns:
+            float: The new usb_latency, in seconds.
+        """
+        latencies = []
+        for _ in range(samples):
+            start = perf_counter()
+            drv.transact(defs.Command.GET_PINS.value, None, 1)
+            latencies.append(perf_counter() - start)
+
+        latencies.sort()
+        self.usb_latency = latencies[
+            min(len(latencies) - 1, int(len(latencies) * percentile))]
+        return self.usb_latency
+
+
+class TimeLimited(object):
+    """
+    Access to the USB_ISS device with an explicit response timeout or
+    deadline. Create one with :meth:`usb_iss.UsbIss.with_timeout`.
+
+    Example:
+        ::
+
+            from time import monotonic
+            from usb_iss import UsbIss
+
+            iss = UsbIss()
+            iss.open("COM3")
+            iss.setup_i2c()
+
+            # Each command must complete within 50ms
+            iss.with_timeout(0.05).i2c.read(0x62, 0, 3)
+
+            # All of these commands must complete within 200ms
+            limited = iss.with_timeout(deadline=monotonic() + 0.2)
+            for register in range(16):
+                limited.i2c.read(0x62, register, 1)
+
+    Attributes:
+        i2c (:class:`i2c.I2C`): I2C commands with this time limit.
+        io (:class:`io.IO`): IO commands with this time limit.
+        spi (:class:`spi.SPI`): SPI commands with this time limit.
+    """
+    def __init__(self, drv, timeout=None, deadline=None, data_type=list,
+                 io_outputs=None, i2c_bus=None):
+        self._drv = drv = _TimeLimitedDriver(drv, timeout, deadline)
+        self._data_type = data_type
+        self.i2c = I2C(drv, data_type, i2c_bus)
+        self.io = IO(drv, io_outputs)
+        self.spi = SPI(drv, data_type)
+
+    def batch(self):
+        """
+        Start a batch of commands with this time limit. A timeout is counted
+        from when each command is queued.
+
+        Returns:
+            :class:`batch.Batch`: The batch to queue commands on.
+        """
+        return Batch(self._drv.pipeline(), self._data_type,
+                     self.io._outputs, self.i2c._bus)
+
+
+class _TimeLimitedDriver(object):
+    """
+    Driver view whose responses must be read by a deadline. The deadline is
+    carried by each reader, so it also applies to commands sent by a
+    Session's worker thread.
+    """
+    def __init__(self, drv, timeout, deadline):
+        self._drv = drv
+        self._timeout = timeout
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self._drv, name)
+
+    def command(self, command, data, reader):
+        return self.commands([(command, data)], reader)
+
+    def commands(self, commands, reader):
+        reader = _DeadlineReader(reader, self._deadline_now())
+        return self._drv.commands(commands, reader)
+
+    def transact(self, command, data, response_len, decode=None):
+        return self.command(command, data,
+                            _FixedReader(response_len, decode))
+
+    def transact_many(self, commands, response_lens, decode=None):
+        return self.commands(commands,
+                             _sequence_reader(response_lens, decode))
+
+    def pipeline(self):
+        return _TimeLimitedPipeline(self._drv.pipeline(), self._deadline_now)
+
+    def write_cmds(self, commands):
+        _no_direct_access()
+
+    def read(self, byte_count):
+        _no_direct_access()
+
+    def readinto(self, buffer):
+        _no_direct_access()
+
+    def _deadline_now(self):
+        """
+        Deadline for the response to a command issued now.
+        """
+        deadline = self._deadline
+        if self._timeout is not None:
+            deadline = monotonic() + self._timeout
+            if self._deadline is not None:
+                deadline = min(deadline, self._deadline)
+        return deadline
+
+
+def _no_direct_access():
+    raise UsbIssError(
+        "The serial port can't be used directly with a time limit. "
+        "Use command() with a reader instead.")
+
+
+class _TimeLimitedPipeline(Pipeline):
+    """
+    Pipeline whose commands are queued on another pipeline, with readers
+    that must finish by the deadline of when each command was queued.
+    """
+    def __init__(self, pipeline, deadline_now):
+        super(_TimeLimitedPipeline, self).__init__(None)
+        self._pipeline = pipeline
+        self._deadline_now = deadline_now
+
+    def add(self, commands, reader, future):
+        return self._pipeline.add(
+            commands, _DeadlineReader(reader, self._deadline_now()), future)
+
+    def flush(self):
+        return self._pipeline.flush()
+
+    def discard(self):
+        self._pipeline.discard()
+
+
+class _DeadlineReader(object):
+    """
+    Runs a reader with a read deadline.
+    """
+    def __init__(self, reader, deadline):
+        self._reader = reader
+        self._deadline = deadline
+
+    def __call__(self, drv):
+        with drv.deadline(self._deadline):
+            return self._reader(drv)
+
+
+def _i2c_byte_count(command, data):
+    """
+    Upper bound on the number of bytes an I2C command puts on the bus.
+    """
+    data = data if data is not None else []
+    if command == defs.Command.I2C_DIRECT.value:
+        return len(data) + sum([byte - defs.I2CDirect.READ1.value + 1
+                                for byte in data
+                                if byte in _I2C_DIRECT_READS])
+    if data and data[0] & 1:
+        if command in _I2C_COUNTED_READS:
+            # The read, plus the address again after a repeated start
+            return len(data) + data[-1]
+        if command == defs.Command.I2C_SGL.value:
+            return 2
+    return len(data)
@@ -0,0 +1,149 @@
+import logging
+import os
+
+from .exceptions import UsbIssError
+from . import defs
+
+# Parent of the per-module trace loggers
+LOGGER_NAME = "usb_iss.trace"
+
+
+class Tracer(object):
+    """
+    Logs the commands written to the module and the responses read back,
+    with decoded command names. Pass one to ``UsbIss(tracer=...)``, or use
+    ``UsbIss(verbose=True)`` to print every command to the console.
+
+    Each module logs to its own logger, named after its serial port (for
+    example ``usb_iss.trace.ttyACM0``), so that traffic from several modules
+    can be routed or filtered separately. Messages are only formatted if the
+    logger is enabled for the trace level, so a tracer on a disabled logger
+    costs very little.
+
+    Tracing can be sampled, to leave it enabled under load. Sampling picks
+    whole writes, and logs the responses read after each sampled write.
+
+    A tracer serves a single module, since it holds the module's logger and
+    sampling state. Give each module its own tracer.
+
+    Example:
+        ::
+
+            import logging
+            from usb_iss import UsbIss
+            from usb_iss.trace import Tracer
+
+            logging.basicConfig(level=logging.DEBUG)
+
+            # Trace 1% of writes
+            iss = UsbIss(tracer=Tracer(sample_rate=0.01))
+            iss.open("/dev/ttyACM0")
+            # DEBUG:usb_iss.trace.ttyACM0:write: I2C_AD1 A1 00 03
+            # DEBUG:usb_iss.trace.ttyACM0:read : 00 01 02
+
+    Args:
+        logger (logging.Logger): Logger to use, instead of one named after
+            the serial port.
+        sample_rate (float): Fraction of writes to trace (0 - 1).
+        level (int): Logging level of the trace messages.
+    """
+    def __init__(self, logger=None, sample_rate=1.0, level=logging.DEBUG):
+        if not 0 < sample_rate <= 1:
+            raise UsbIssError("sample_rate must be between 0 and 1")
+
+        self.logger = logger or logging.getLogger(LOGGER_NAME)
+        self.level = level
+        self._bind_logger = logger is None
+        self._interval = int(round(1 / sample_rate))
+        self._countdown = 1
+        self._sampled = False
+
+    @classmethod
+    def console(cls):
+        """
+        Returns:
+            Tracer: A tracer that prints every command to the console.
+            It logs to a private logger that doesn't propagate, so the
+            application's logging configuration isn't changed and messages
+            aren't printed twice.
+        """
+        logger = logging.Logger(LOGGER_NAME, logging.DEBUG)
+        logger.propagate = False
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("USB_ISS %(message)s"))
+        logger.addHandler(handler)
+        return cls(logger)
+
+    def bind(self, port):
+        """
+        Log to the logger for a serial port, unless a logger was given.
+        Called when the port is opened.
+        """
+        if self._bind_logger and port:
+            name = os.path.basename(str(port)).replace(".", "_")
+            self.logger = logging.getLogger("%s.%s" % (LOGGER_NAME, name))
+
+    def write(self, commands):
+        """
+        Trace a write of (command, data) pairs.
+        """
+        self._countdown -= 1
+        if self._countdown > 0:
+            self._sampled = False
+            return
+
+        self._countdown = self._interval
+        self._sampled = self.logger.isEnabledFor(self.level)
+        if self._sampled:
+            self.logger.log(self.level, "write: %s", _Commands(commands))
+
+    def read(self, data):
+        """
+        Trace bytes read after a write.
+        """
+        if self._sampled:
+            self.logger.log(self.level, "read : %s", _Hex(data))
+
+
+class _Commands(object):
+    """
+    Formats (command, data) pairs when a log message is emitted.
+    """
+    def __init__(self, commands):
+        self._commands = commands
+
+    def __str__(self):
+        return "; ".join([_format_command(command, data)
+                          for (command, data) in self._commands])
+
+
+class _Hex(object):
+    """
+    Formats bytes as hex when a log message is emitted.
+    """
+    def __init__(self, data):
+        self._data = bytes(data)
+
+    def __str__(self):
+        return _hex(self._data)
+
+
+def _format_command(command, data):
+    data = bytearray(data if data is not None else [])
+    try:
+        name = defs.Command(command).name
+    except ValueError:
+        return _hex(bytearray([command]) + data)
+
+    if command == defs.Command.USB_ISS.value and data:
+        try:
+            name = defs.SubCommand(data[0]).name
+            data = data[1:]
+        except ValueError:
+            pass
+
+    return "%s %s" % (name, _hex(data)) if data else name
+
+
+def _hex(data):
+    return " ".join(["%02X" % byte for byte in bytearray(data)])
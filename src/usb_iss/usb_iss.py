@@ -1,10 +1,20 @@
+from contextlib import contextmanager
+
 from . import defs
 from .exceptions import UsbIssError
-from .driver import Driver, DummyDriver
+from .driver import Driver, verify_ack_error_code
+from .batch import Batch
+from .session import Session, Prioritized
 from .i2c import I2C
 from .io import IO
 from .spi import SPI
 from .serial_ import Serial
+from .emulator import Emulator, EmulatorDriver
+from .metrics import Metrics
+from .capture import CaptureWriter
+from .replay import ReplayDriver
+from .profile import Profiler, adapter_name
+from .timeouts import TimeLimited
 
 
 class UsbIss(object):
@@ -32,8 +42,30 @@ class UsbIss(object):
             # [0, 1, 2]
 
     Args:
-        dummy (bool): Use a dummy driver stub, for testing.
-        verbose (bool): Print debug output to the console.
+        dummy (bool): Use an emulated module instead of a serial port, for
+            testing. The emulated module is opened straight away, so there's
+            no need to call :meth:`open`. See :class:`emulator.Emulator`.
+        verbose (bool): Print every command and response to the console.
+        data_type (type): Type used to return data read from I2C, SPI and
+            Serial devices. Any callable that accepts bytes can be used, for
+            example ``bytes`` or ``bytearray`` to avoid building a list of
+            int for large transfers. Defaults to ``list``.
+        thread_safe (bool): Allow the module to be used from several threads
+            at once. Commands are sent by a single worker thread, which
+            pipelines commands queued by different threads together. Use
+            :meth:`priority` to send some commands ahead of others.
+        emulator (:class:`emulator.Emulator`): Emulated module to use instead
+            of a serial port, with virtual devices attached. Implies dummy.
+        metrics (bool): Record per-command counters and latencies. See
+            :meth:`stats`.
+        replay (:class:`replay.Replay`): Captured traffic to play back
+            instead of using a serial port. See :meth:`start_capture`.
+        tracer (:class:`trace.Tracer`): Log commands and responses with the
+            given tracer, for example to sample them or use another logger.
+        timeouts (:class:`timeouts.Timeouts`): Work out how long to wait for
+            each response from its commands and the bus clock rate, instead
+            of waiting up to 0.5s for every response. See
+            :meth:`calibrate_timeouts`.
 
     Attributes:
         i2c (:class:`i2c.I2C`): Attribute to use for I2C access. See
@@ -45,18 +77,40 @@ class UsbIss(object):
         serial (:class:`serial_.Serial`): Attribute to use for Serial UART
             access. See :class:`serial_.Serial` for the full set of Serial
             methods.
+        metrics (:class:`metrics.Metrics`): The recorded metrics, or None if
+            metrics are disabled.
 
     """
-    def __init__(self, dummy=False, verbose=False):
-        self._drv = DummyDriver() if dummy else Driver(verbose)
-
-        self.i2c = I2C(self._drv)
+    def __init__(self, dummy=False, verbose=False, data_type=list,
+                 thread_safe=False, emulator=None, metrics=False,
+                 replay=None, tracer=None, timeouts=None):
+        if dummy and emulator is None:
+            emulator = Emulator()
+        if replay is not None:
+            drv = ReplayDriver(replay, verbose)
+        elif emulator is not None:
+            drv = EmulatorDriver(emulator, verbose)
+        else:
+            drv = Driver(verbose)
+        self.metrics = drv.metrics = Metrics() if metrics else None
+        if tracer is not None:
+            drv.tracer = tracer
+        drv.timeouts = self._timeouts = timeouts
+        self._port_drv = drv
+        self._drv = Session(drv) if thread_safe else drv
+        self._data_type = data_type
+        self._port = None
+
+        self.i2c = I2C(self._drv, data_type)
         self.io = IO(self._drv)
-        self.spi = SPI(self._drv)
-        self.serial = Serial(self._drv)
+        self.spi = SPI(self._drv, data_type)
+        self.serial = Serial(self._drv, data_type)
 
         self.current_io_type = 0xAA  # Everything digital input by default
 
+        if emulator is not None:
+            self.open("emulator")
+
     def open(self, port):
         """
         Open the specified serial port for communication with the USB_ISS
@@ -66,6 +120,7 @@ class UsbIss(object):
             port (str): Serial port to use for usb_iss communication.
         """
         self._drv.open(port)
+        self._port = port
         return self
 
     def close(self):
@@ -74,6 +129,165 @@ class UsbIss(object):
         """
         self._drv.close()
 
+    def start_capture(self, path, max_bytes=16 * 1024 * 1024,
+                      backup_count=4):
+        """
+        Start capturing every byte written to and read from the module to a
+        binary log. Play it back with :class:`replay.Replay`, or read it
+        with :func:`capture.read_capture`.
+
+        Args:
+            path (str): Path of the capture file.
+            max_bytes (int): Size at which the capture file is rotated.
+            backup_count (int): Number of rotated files to keep.
+        Returns:
+            :class:`capture.CaptureWriter`: The capture.
+        """
+        self.stop_capture()
+        self._port_drv.capture = CaptureWriter(path, max_bytes, backup_count)
+        return self._port_drv.capture
+
+    def stop_capture(self):
+        """
+        Stop capturing, and close the capture file.
+        """
+        capture = self._port_drv.capture
+        if capture is not None:
+            with self._port_drv.lock:
+                self._port_drv.capture = None
+            capture.close()
+
+    def stats(self):
+        """
+        Take a snapshot of the metrics recorded for each command. Requires
+        ``UsbIss(metrics=True)``.
+
+        Example:
+            ::
+
+                iss = UsbIss(metrics=True)
+                iss.open("COM3")
+                iss.setup_i2c()
+                iss.i2c.read(0x62, 0, 3)
+
+                print(iss.stats()["I2C_AD1"])
+                # {'commands': 1, 'writes': 1, 'bytes_out': 4, 'bytes_in': 3,
+                #  'timeouts': 0, 'nacks': 0,
+                #  'latency': {'count': 1, 'min': 0.00201, ...}}
+
+        Returns:
+            dict: Counters and latency statistics keyed by command name. See
+            :meth:`metrics.Metrics.snapshot`.
+        """
+        if self.metrics is None:
+            raise UsbIssError("Metrics require UsbIss(metrics=True)")
+        return self.metrics.snapshot()
+
+    @contextmanager
+    def profile(self, profiler=None, name=None):
+        """
+        Profile the public methods called in a ``with`` block, splitting the
+        time spent in each into host overhead (encoding commands and
+        decoding responses) and serial port time (writing, waiting for the
+        first byte of the response and reading the rest). Open the module
+        before profiling it.
+
+        Example:
+            ::
+
+                iss = UsbIss()
+                iss.open("COM3")
+                iss.setup_i2c()
+
+                with iss.profile() as profiler:
+                    for _ in range(100):
+                        iss.i2c.read(0x62, 0, 3)
+
+                print(profiler.report())
+                # adapter  method    calls  total ms  mean us  encode ...
+                # COM3     i2c.read    100   201.312   2013.1    0.9% ...
+
+        Args:
+            profiler (:class:`profile.Profiler`): Profiler to add to, for
+                example to compare several modules. A new one is used by
+                default.
+            name (str): Name of the module in the profiles. Defaults to the
+                name of the serial port.
+        Returns:
+            :class:`profile.Profiler`: The profiler.
+        """
+        if profiler is None:
+            profiler = Profiler()
+        detach = profiler.attach(self, name or adapter_name(self._port))
+        try:
+            yield profiler
+        finally:
+            detach()
+
+    def calibrate_timeouts(self, samples=20):
+        """
+        Measure the round trip time of a command over USB, which is used to
+        work out response timeouts. Requires ``UsbIss(timeouts=...)``.
+
+        Args:
+            samples (int): Number of GET_PINS commands to time.
+        Returns:
+            float: The measured round trip time, in seconds.
+        """
+        if self._timeouts is None:
+            raise UsbIssError(
+                "Timeout calibration requires UsbIss(timeouts=...)")
+        return self._timeouts.calibrate(self._drv, samples)
+
+    def with_timeout(self, timeout=None, deadline=None):
+        """
+        Access the module with an explicit time limit for each response.
+
+        Args:
+            timeout (float): Time to wait for the response to each command,
+                in seconds, counted from when the command is called.
+            deadline (float): :func:`time.monotonic` time by which every
+                response must have been received.
+        Returns:
+            :class:`timeouts.TimeLimited`: I2C, IO and SPI access with the
+            time limit.
+        """
+        if timeout is None and deadline is None:
+            raise UsbIssError("A timeout or deadline is required")
+        return TimeLimited(self._drv, timeout, deadline, self._data_type,
+                           self.io._outputs, self.i2c._bus)
+
+    def batch(self):
+        """
+        Start a batch of I2C, IO and SPI commands, which are sent to the
+        module together instead of waiting for each response in turn.
+
+        Returns:
+            :class:`batch.Batch`: The batch to queue commands on.
+        """
+        return Batch(self._drv.pipeline(), self._data_type,
+                     self.io._outputs, self.i2c._bus)
+
+    def priority(self, priority):
+        """
+        Access the module with a different command priority. Requires a
+        thread_safe UsbIss.
+
+        Args:
+            priority (int): Commands with lower values are sent first. See
+                :data:`session.PRIORITY_HIGH`,
+                :data:`session.PRIORITY_NORMAL` and
+                :data:`session.PRIORITY_LOW`.
+        Returns:
+            :class:`session.Prioritized`: I2C, IO and SPI access at the given
+            priority.
+        """
+        if not isinstance(self._drv, Session):
+            raise UsbIssError(
+                "Command priorities require UsbIss(thread_safe=True)")
+        return Prioritized(self._drv.at_priority(priority), self._data_type,
+                           self.io._outputs, self.i2c._bus)
+
     def setup_i2c(self, clock_khz=400, use_i2c_hardware=True,
                   io1_type=None,
                   io2_type=None):
@@ -91,8 +305,8 @@ class UsbIss(object):
         """
         i2c_mode = self._get_i2c_mode(clock_khz, use_i2c_hardware)
         io_type = self._get_io_type(io1_type, io2_type, None, None)
-        self._set_mode(i2c_mode, [io_type & 0x0F])
-        self.current_io_type = io_type
+        return self._set_mode(i2c_mode, [io_type & 0x0F], io_type=io_type,
+                              i2c_clock_khz=clock_khz)
 
     def setup_i2c_serial(self, clock_khz=400, use_i2c_hardware=True,
                          baud_rate=9600):
@@ -109,7 +323,8 @@ class UsbIss(object):
         """
         i2c_mode = self._get_i2c_mode(clock_khz, use_i2c_hardware)
         divisor = self._get_serial_divisor(baud_rate)
-        self._set_mode(i2c_mode | defs.Mode.SERIAL.value, divisor)
+        return self._set_mode(i2c_mode | defs.Mode.SERIAL.value, divisor,
+                              baud_rate=baud_rate, i2c_clock_khz=clock_khz)
 
     def setup_spi(self, spi_mode=defs.SPIMode.TX_ACTIVE_TO_IDLE_IDLE_LOW,
                   clock_khz=500):
@@ -121,7 +336,9 @@ class UsbIss(object):
             clock_khz (int): SPI clock rate in kHz.
         """
         divisor = self._get_spi_divisor(clock_khz)
-        self._set_mode(spi_mode.value, [divisor])
+        return self._set_mode(
+            spi_mode.value, [divisor],
+            spi_clock_hz=defs.SPI_BASE_CLOCK_HZ // (divisor + 1))
 
     def setup_io(self,
                  io1_type=None,
@@ -138,8 +355,8 @@ class UsbIss(object):
             io4_type (defs.IOType): IO4 mode (or None for no change)
         """
         io_type = self._get_io_type(io1_type, io2_type, io3_type, io4_type)
-        self._set_mode(defs.Mode.IO_MODE.value, [io_type])
-        self.current_io_type = io_type
+        return self._set_mode(defs.Mode.IO_MODE.value, [io_type],
+                              io_type=io_type)
 
     def change_io(self,
                   io1_type=None,
@@ -157,8 +374,8 @@ class UsbIss(object):
             io4_type (defs.IOType): IO4 mode (or None for no change)
         """
         io_type = self._get_io_type(io1_type, io2_type, io3_type, io4_type)
-        self._set_mode(defs.Mode.IO_CHANGE.value, [io_type])
-        self.current_io_type = io_type
+        return self._set_mode(defs.Mode.IO_CHANGE.value, [io_type],
+                              io_type=io_type)
 
     def setup_serial(self, baud_rate=9600,
                      io3_type=None,
@@ -173,50 +390,70 @@ class UsbIss(object):
         """
         divisor = self._get_serial_divisor(baud_rate)
         io_type = self._get_io_type(None, None, io3_type, io4_type)
-        self._set_mode(defs.Mode.SERIAL.value, divisor + [io_type & 0xF0])
-        self.current_io_type = io_type
+        return self._set_mode(defs.Mode.SERIAL.value,
+                              divisor + [io_type & 0xF0],
+                              io_type=io_type, baud_rate=baud_rate)
 
     def read_module_id(self):
         """
         Returns:
             int: The USB_ISS module ID (always 7).
         """
-        self._drv.write_cmd(defs.Command.USB_ISS.value,
-                            [defs.SubCommand.ISS_VERSION.value])
-        return self._drv.read(3)[0]
+        return self._read_version(lambda version: version[0])
 
     def read_fw_version(self):
         """
         Returns:
             int: The USB_ISS firmware version.
         """
-        self._drv.write_cmd(defs.Command.USB_ISS.value,
-                            [defs.SubCommand.ISS_VERSION.value])
-        return self._drv.read(3)[1]
+        return self._read_version(lambda version: version[1])
 
     def read_iss_mode(self):
         """
         Returns:
             defs.Mode: The current ISS_MODE operating mode.
         """
-        self._drv.write_cmd(defs.Command.USB_ISS.value,
-                            [defs.SubCommand.ISS_VERSION.value])
-        return defs.Mode(self._drv.read(3)[2])
+        return self._read_version(lambda version: defs.Mode(version[2]))
 
     def read_serial_number(self):
         """
         Returns:
             str: The serial number of the attached USB_ISS module.
         """
-        self._drv.write_cmd(defs.Command.USB_ISS.value,
-                            [defs.SubCommand.GET_SER_NUM.value])
-        data = self._drv.read(8)
-        return ''.join([chr(byte) for byte in data])
+        serial_number = self._read_serial_number()
+        self.i2c.serial_number = serial_number
+        return serial_number
+
+    def _read_serial_number(self):
+        return self._drv.transact(
+            defs.Command.USB_ISS.value, [defs.SubCommand.GET_SER_NUM.value], 8,
+            lambda data: ''.join([chr(byte) for byte in data]))
+
+    def _read_version(self, decode):
+        return self._drv.transact(defs.Command.USB_ISS.value,
+                                  [defs.SubCommand.ISS_VERSION.value], 3,
+                                  decode)
+
+    def _set_mode(self, mode_value, data, io_type=None, baud_rate=None,
+                  i2c_clock_khz=None, spi_clock_hz=None):
+        # The new settings are recorded once the module has accepted them
+        def decode(response):
+            verify_ack_error_code(response, defs.ModeError)
+            if io_type is not None:
+                self.current_io_type = io_type
+                self.io._set_output_types(io_type)
+            if baud_rate is not None:
+                self.serial.baud_rate = baud_rate
+            if i2c_clock_khz is not None:
+                self.i2c.clock_khz = i2c_clock_khz
+            if self._timeouts is not None:
+                if i2c_clock_khz is not None:
+                    self._timeouts.i2c_clock_hz = i2c_clock_khz * 1000
+                if spi_clock_hz is not None:
+                    self._timeouts.spi_clock_hz = spi_clock_hz
 
-    def _set_mode(self, mode_value, data):
         data = [defs.SubCommand.ISS_MODE.value, mode_value] + data
-        self._drv.write_cmd(defs.Command.USB_ISS.value, data)
-        self._drv.check_ack_error_code(defs.ModeError)
+        return self._drv.transact(defs.Command.USB_ISS.value, data, 2, decode)
 
     def _get_io_type(self, io1_type, io2_type, io3_type, io4_type):
         new_io_type = self.current_io_type
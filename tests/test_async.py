@@ -0,0 +1,267 @@
+import asyncio
+import os
+import select
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from hamcrest import assert_that, is_, calling, raises
+
+from usb_iss import AsyncUsbIss, UsbIssError, defs
+from usb_iss.emulator import Emulator, PtyEmulator
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class FakeDevice(threading.Thread):
+    """
+    Plays the USB_ISS module's side of a pty. For each (request_len,
+    responses) step of the script, reads request_len bytes and then writes
+    each of the responses in turn.
+    """
+    def __init__(self, fd, script):
+        super(FakeDevice, self).__init__()
+        self.daemon = True
+        self.fd = fd
+        self.script = script
+        self.requests = []
+
+    def run(self):
+        for (request_len, responses) in self.script:
+            request = bytearray()
+            while len(request) < request_len:
+                (readable, _, _) = select.select([self.fd], [], [], 0.5)
+                if not readable:
+                    return
+                request += os.read(self.fd, request_len - len(request))
+            self.requests.append(bytes(request))
+
+            for response in responses:
+                time.sleep(0.01)
+                os.write(self.fd, bytes(response))
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), "Requires a pty")
+class TestAsyncUsbIss(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+        (self.master, slave) = os.openpty()
+        self.addCleanup(os.close, self.master)
+        self.addCleanup(os.close, slave)
+
+        self.usb_iss = AsyncUsbIss().open(os.ttyname(slave), loop=self.loop)
+        self.addCleanup(self.usb_iss.close)
+
+    def run_device(self, script):
+        device = FakeDevice(self.master, script)
+        device.start()
+        self.addCleanup(device.join)
+        return device
+
+    def wait(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def test_i2c_read(self):
+        device = self.run_device([(4, [[0x11, 0x22]])])
+
+        data = self.wait(self.usb_iss.i2c.read(0x60, 0x02, 2))
+
+        assert_that(data, is_([0x11, 0x22]))
+        assert_that(device.requests, is_([bytes([0x55, 0xC1, 0x02, 0x02])]))
+
+    def test_concurrent_commands_are_pipelined(self):
+        # The device only responds once both commands have been received
+        device = self.run_device([(8, [[0x11], [0x22, 0x33]])])
+
+        async def read_both():
+            return await asyncio.gather(
+                self.usb_iss.i2c.read(0x60, 0x02, 1),
+                self.usb_iss.i2c.read(0x61, 0x04, 2))
+
+        data = self.wait(read_both())
+
+        assert_that(data, is_([[0x11], [0x22, 0x33]]))
+        assert_that(device.requests, is_([bytes([0x55, 0xC1, 0x02, 0x01,
+                                                 0x55, 0xC3, 0x04, 0x02])]))
+
+    def test_i2c_read_block_split_across_writes(self):
+        self.run_device([(8, [list(range(60)), list(range(60, 70))])])
+
+        with patch('usb_iss.i2c.MAX_BLOCK_BYTES', 60):
+            data = self.wait(self.usb_iss.i2c.read_block(0x60, 0x00, 70))
+
+        assert_that(data, is_(list(range(70))))
+
+    def test_i2c_read_block_empty(self):
+        data = self.wait(self.usb_iss.i2c.read_block(0x60, 0x00, 0))
+
+        assert_that(data, is_([]))
+
+    def test_setup_i2c(self):
+        self.run_device([(4, [[0xFF, 0x00]])])
+
+        self.wait(self.usb_iss.setup_i2c(
+            io1_type=defs.IOType.OUTPUT_LOW,
+            io2_type=defs.IOType.OUTPUT_HIGH))
+
+        assert_that(self.usb_iss.current_io_type, is_(0xA4))
+
+    def test_setup_i2c_failure(self):
+        self.run_device([(4, [[0x00, 0x05]])])
+
+        assert_that(
+            calling(self.wait).with_args(self.usb_iss.setup_i2c()),
+            raises(UsbIssError, "Received ModeError.UNKNOWN_COMMAND"))
+        assert_that(self.usb_iss.current_io_type, is_(0xAA))
+
+    def test_read_module_id(self):
+        self.run_device([(2, [[0x07, 0x02, 0x40]])])
+
+        assert_that(self.wait(self.usb_iss.read_module_id()), is_(0x07))
+
+    def test_read_serial_number(self):
+        self.run_device([(2, [b"00000001"])])
+
+        serial_number = self.wait(self.usb_iss.read_serial_number())
+
+        assert_that(serial_number, is_("00000001"))
+        assert_that(self.usb_iss.i2c.serial_number, is_("00000001"))
+
+    def test_i2c_scan_cache(self):
+        cache = {("00000001", 400, 0x50, 0x51): frozenset([0x50])}
+        self.usb_iss.i2c.serial_number = "00000001"
+        self.usb_iss.i2c.clock_khz = 400
+
+        devices = self.wait(self.usb_iss.i2c.scan(0x50, 0x51, cache=cache))
+
+        assert_that(devices, is_({0x50}))
+
+    def test_response_in_pieces(self):
+        self.run_device([(4, [[0xFF, 0x02], [0x11], [0x22]])])
+
+        data = self.wait(self.usb_iss.i2c.direct([
+            defs.I2CDirect.START,
+            defs.I2CDirect.READ2,
+            defs.I2CDirect.STOP]))
+
+        assert_that(data, is_([0x11, 0x22]))
+
+    def test_failure_keeps_responses_in_sync(self):
+        self.run_device([(10, [[0x00], [0xFF]])])
+
+        async def write_both():
+            return await asyncio.gather(
+                self.usb_iss.i2c.write(0x60, 0x02, [0x11]),
+                self.usb_iss.i2c.write(0x61, 0x04, [0x22]),
+                return_exceptions=True)
+
+        (first, second) = self.wait(write_both())
+
+        assert_that(first, is_(UsbIssError))
+        assert_that(second, is_(None))
+
+    def test_cancelled_response_is_discarded(self):
+        self.run_device([(4, [[0x11]]), (4, [[0x22]])])
+
+        async def cancel_then_read():
+            first = self.usb_iss.i2c.read(0x60, 0x02, 1)
+            first.cancel()
+            return await self.usb_iss.i2c.read(0x60, 0x02, 1)
+
+        assert_that(self.wait(cancel_then_read()), is_([0x22]))
+
+    def test_timeout(self):
+        self.usb_iss._drv.timeout = 0.05
+
+        assert_that(
+            calling(self.wait).with_args(self.usb_iss.i2c.read(0x60, 0, 1)),
+            raises(UsbIssError, "Timed out waiting for a response"))
+
+    def test_timeout_discards_unwritten_commands(self):
+        device = self.run_device([(4, [[0x22]])])
+
+        # Times out before the first command has been written
+        first = self.usb_iss.i2c.read(0x60, 0x02, 1)
+        self.usb_iss._drv._on_timeout()
+        data = self.wait(self.usb_iss.i2c.read(0x61, 0x04, 1))
+
+        assert_that(first.exception(), is_(UsbIssError))
+        assert_that(data, is_([0x22]))
+        assert_that(device.requests, is_([bytes([0x55, 0xC3, 0x04, 0x01])]))
+
+    def test_spi_transfer_stream(self):
+        # One SPI command per write
+        device = self.run_device([
+            (63, [[0xFF] + list(range(62))]),
+            (63, [[0xFF] + list(range(62))]),
+            (7, [[0xFF] + list(range(6))]),
+        ])
+
+        async def transfer():
+            data = bytearray()
+            stream = self.usb_iss.spi.transfer_stream([0] * 130, window=2)
+            async for chunk in stream:
+                data += chunk
+            return data
+
+        data = self.wait(transfer())
+
+        assert_that(data, is_(bytearray(
+            list(range(62)) + list(range(62)) + list(range(6)))))
+        assert_that([len(request) for request in device.requests],
+                    is_([63, 63, 7]))
+
+    def test_spi_ends_write(self):
+        # The emulator takes the rest of each write as SPI data, as the
+        # module does
+        with PtyEmulator(Emulator()) as pty:
+            usb_iss = AsyncUsbIss().open(pty.port, loop=self.loop)
+            self.wait(usb_iss.setup_spi())
+
+            async def transfer_then_read():
+                return await asyncio.gather(
+                    usb_iss.spi.transfer([0x01, 0x02]),
+                    usb_iss.io.get_pins(),
+                    usb_iss.spi.transfer([0x03]))
+
+            result = self.wait(transfer_then_read())
+            usb_iss.close()
+
+        assert_that(result, is_([[0x01, 0x02], [0, 0, 0, 0], [0x03]]))
+
+    def test_serial_receive(self):
+        self.run_device([(1, [[0xFF, 0x1E, 0x02, 0x48, 0x69]])] +
+                        [(1, [[0xFF, 0x1E, 0x00]])] * 20)
+
+        data = self.wait(self.usb_iss.serial.receive(timeout_ms=20))
+
+        assert_that(data, is_([0x48, 0x69]))
+
+    def test_batch_not_supported(self):
+        assert_that(calling(self.usb_iss.batch),
+                    raises(UsbIssError, "pipelines commands automatically"))
+
+    def test_sample_not_supported(self):
+        assert_that(calling(self.usb_iss.io.sample).with_args([3], 1),
+                    raises(UsbIssError, "from AsyncUsbIss"))
+
+    def test_start_watcher_not_supported(self):
+        assert_that(calling(self.usb_iss.io.start_watcher),
+                    raises(UsbIssError, "supported by AsyncUsbIss"))
+
+    def test_unsupported(self):
+        for (method, args) in [(self.usb_iss.start_capture, ["capture"]),
+                               (self.usb_iss.stop_capture, []),
+                               (self.usb_iss.stats, []),
+                               (self.usb_iss.profile, []),
+                               (self.usb_iss.calibrate_timeouts, []),
+                               (self.usb_iss.with_timeout, [0.1])]:
+            assert_that(calling(method).with_args(*args),
+                        raises(UsbIssError, "supported by AsyncUsbIss"))
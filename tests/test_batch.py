@@ -0,0 +1,143 @@
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch, call
+except ImportError:
+    from mock import patch, call
+
+from hamcrest import assert_that, is_, calling, raises
+from matchmock import called_once_with, called_with
+
+from usb_iss import UsbIss, UsbIssError
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+
+        self.usb_iss = UsbIss().open('PORTNAME')
+
+    def test_batch(self):
+        self.serial.read.return_value = bytes([
+            0x11, 0x22, 0x02, 0xA6, 0xFF])
+
+        with self.usb_iss.batch() as batch:
+            data = batch.i2c.read(0x60, 0x02, 2)
+            sample = batch.io.get_ad(1)
+            ack = batch.i2c.write(0x70, 0x00, [0x51])
+
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x55, 0xC1, 0x02, 2,
+            0x65, 1,
+            0x55, 0xE0, 0x00, 0x01, 0x51])))
+        assert_that(self.serial.read, called_once_with(5))
+        assert_that(data.result(), is_([0x11, 0x22]))
+        assert_that(sample.result(), is_(0x02A6))
+        assert_that(ack.result(), is_(None))
+
+    def test_batch_failure(self):
+        self.serial.read.return_value = bytes([0x00, 0x0E])
+
+        with self.usb_iss.batch() as batch:
+            ack = batch.i2c.write(0x70, 0x00, [0x51])
+            pins = batch.io.get_pins()
+
+        assert_that(calling(ack.result),
+                    raises(UsbIssError, "Received NACK instead of ACK"))
+        assert_that(pins.result(), is_([0, 1, 1, 1]))
+
+    def test_batch_shares_io_outputs(self):
+        self.serial.read.side_effect = [bytes([0xFF]), bytes([0xFF, 0xFF])]
+        self.usb_iss.io.set_pins(1, 0, 0, 0)
+
+        with self.usb_iss.batch() as batch:
+            batch.io.set_pin(2, 1)
+            batch.io.set_pin(3, 1)
+
+        assert_that(self.serial.write,
+                    called_with(bytes([0x63, 0x03, 0x63, 0x07])))
+        assert_that(self.usb_iss.io.outputs, is_([1, 1, 1, 0]))
+
+    def test_batch_flush(self):
+        self.serial.read.return_value = bytes([0xFF, 0x11])
+
+        batch = self.usb_iss.batch()
+        batch.spi.transfer([0x01])
+        results = batch.flush()
+
+        assert_that(self.serial.write, called_once_with(bytes([0x61, 0x01])))
+        assert_that(results[0].result(), is_([0x11]))
+
+    def test_spi_ends_write(self):
+        self.serial.read.side_effect = [bytes([0x0E, 0xFF, 0x11, 0x22]),
+                                        bytes([0x02, 0xA6])]
+
+        with self.usb_iss.batch() as batch:
+            before = batch.io.get_pins()
+            spi = batch.spi.transfer([0x01, 0x02])
+            after = batch.io.get_ad(1)
+
+        # SPI data runs to the end of the write, so GET_AD waits for the next
+        assert_that(self.serial.write.call_args_list, is_([
+            call(bytes([0x64, 0x61, 0x01, 0x02])),
+            call(bytes([0x65, 1]))]))
+        assert_that(before.result(), is_([0, 1, 1, 1]))
+        assert_that(spi.result(), is_([0x11, 0x22]))
+        assert_that(after.result(), is_(0x02A6))
+
+    def test_batch_with_i2c_block(self):
+        self.serial.read.side_effect = [
+            bytes(range(60)), bytes(range(60, 70)), bytes([0x0E])]
+
+        with self.usb_iss.batch() as batch:
+            data = batch.i2c.read_block(0x60, 0x00, 70)
+            pins = batch.io.get_pins()
+
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x55, 0xC1, 0x00, 60,
+            0x55, 0xC1, 0x3C, 10,
+            0x64])))
+        assert_that(data.result(), is_(list(range(70))))
+        assert_that(pins.result(), is_([0, 1, 1, 1]))
+
+    def test_batch_with_split_i2c_block(self):
+        self.serial.read.side_effect = [
+            bytes(range(60)), bytes(range(60, 70))]
+
+        with patch('usb_iss.i2c.MAX_BLOCK_BYTES', 60):
+            with self.usb_iss.batch() as batch:
+                data = batch.i2c.read_block(0x60, 0x00, 70)
+
+        assert_that(data.result(), is_(list(range(70))))
+
+    def test_batch_with_empty_i2c_block(self):
+        with self.usb_iss.batch() as batch:
+            data = batch.i2c.read_block(0x60, 0x00, 0)
+            ack = batch.i2c.write_block(0x60, 0x00, [])
+
+        assert_that(self.serial.write.call_count, is_(0))
+        assert_that(data.result(), is_([]))
+        assert_that(ack.result(), is_(None))
+
+    def test_batch_with_i2c_direct(self):
+        self.serial.read.side_effect = [
+            bytes([0x42]), bytes([0xFF, 0x01]), bytes([0x43]), bytes([0x44])]
+
+        with self.usb_iss.batch() as batch:
+            first = batch.i2c.read_single(0x20)
+            direct = batch.i2c.direct([0x01, 0x30, 0x41, 0x20, 0x03])
+            last = batch.i2c.read_single(0x20)
+
+        assert_that(self.serial.read, called_with(1))
+        assert_that(self.serial.read, called_with(2))
+        assert_that(first.result(), is_(0x42))
+        assert_that(direct.result(), is_([0x43]))
+        assert_that(last.result(), is_(0x44))
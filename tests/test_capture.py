@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, is_, calling, raises, contains_exactly
+
+from usb_iss import UsbIss, UsbIssError
+from usb_iss.capture import CaptureWriter, read_capture, WRITE, READ
+from usb_iss.emulator import Emulator
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+def frame_data(frames):
+    return [(frame.direction, frame.data) for frame in frames]
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.cap")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read(self):
+        with CaptureWriter(self.path) as capture:
+            capture.write([0x5A, 0x01])
+            capture.read(bytes([0x07, 0x02, 0x40]))
+
+        frames = list(read_capture(self.path))
+
+        assert_that(frame_data(frames), is_([
+            (WRITE, bytes([0x5A, 0x01])),
+            (READ, bytes([0x07, 0x02, 0x40]))]))
+        assert_that(frames[0].timestamp <= frames[1].timestamp)
+
+    def test_truncated_on_close(self):
+        with CaptureWriter(self.path, max_bytes=4096) as capture:
+            capture.write([0x64])
+
+        # 16 byte header, plus a 13 byte record header and the data
+        assert_that(os.path.getsize(self.path), is_(30))
+
+    def test_unclosed_capture(self):
+        capture = CaptureWriter(self.path, max_bytes=4096)
+        capture.write([0x64])
+        capture.read([0x0F])
+        capture._map.flush()
+
+        assert_that(os.path.getsize(self.path), is_(4096))
+        assert_that(frame_data(read_capture(self.path)), is_([
+            (WRITE, bytes([0x64])), (READ, bytes([0x0F]))]))
+        capture.close()
+
+    def test_rotation(self):
+        with CaptureWriter(self.path, max_bytes=50,
+                           backup_count=2) as capture:
+            for byte in range(5):
+                capture.write([byte] * 10)
+
+        assert_that(sorted(os.listdir(self.directory)), contains_exactly(
+            "test.cap", "test.cap.1", "test.cap.2"))
+        assert_that(frame_data(read_capture(self.path)), is_([
+            (WRITE, bytes([2] * 10)),
+            (WRITE, bytes([3] * 10)),
+            (WRITE, bytes([4] * 10))]))
+
+    def test_replaces_earlier_capture(self):
+        with CaptureWriter(self.path, max_bytes=50) as capture:
+            for byte in range(3):
+                capture.write([byte] * 10)
+
+        with CaptureWriter(self.path, max_bytes=50) as capture:
+            capture.write([0x64])
+
+        assert_that(os.listdir(self.directory), is_(["test.cap"]))
+
+    def test_frame_too_large(self):
+        with CaptureWriter(self.path, max_bytes=50) as capture:
+            assert_that(calling(capture.write).with_args([0] * 30),
+                        raises(UsbIssError, r"larger than max_bytes"))
+
+    def test_closed(self):
+        capture = CaptureWriter(self.path)
+        capture.close()
+
+        assert_that(calling(capture.write).with_args([0x64]),
+                    raises(UsbIssError, r"closed"))
+
+    def test_not_a_capture(self):
+        with open(self.path, "wb") as capture_file:
+            capture_file.write(b"Not a capture file")
+
+        assert_that(calling(list).with_args(read_capture(self.path)),
+                    raises(UsbIssError, r"not a USB_ISS capture"))
+
+    def test_usb_iss_capture(self):
+        iss = UsbIss(emulator=Emulator()).open("emulated")
+
+        iss.start_capture(self.path)
+        iss.io.get_pins()
+        iss.stop_capture()
+        iss.io.get_pins()
+
+        assert_that(frame_data(read_capture(self.path)), is_([
+            (WRITE, bytes([0x64])), (READ, bytes([0x00]))]))
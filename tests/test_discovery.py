@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch, MagicMock
+except ImportError:
+    from mock import patch, MagicMock
+
+from hamcrest import assert_that, is_, contains_inanyorder
+from matchmock import called_once_with
+
+from usb_iss.discovery import discover, probe, ModuleInfo
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+def port_info(device, vid=0x04D8, pid=0xFFEE, hwid=None):
+    port = MagicMock()
+    port.device = device
+    port.vid = vid
+    port.pid = pid
+    port.hwid = hwid or "USB VID:PID=%04X:%04X %s" % (vid, pid, device)
+    return port
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.responses = {
+            'PORT0': bytes([0x07, 0x02, 0x40]) + b"00000001",
+            'PORT1': bytes([0x07, 0x03, 0x40]) + b"00000002",
+            'OTHER': bytes([0x55]),
+        }
+        self.opened = []
+
+        def open_port(port, **opts):
+            self.opened.append((port, opts['timeout']))
+            serial = MagicMock()
+            serial.read.return_value = self.responses[port]
+            return serial
+
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        patcher.start().side_effect = open_port
+
+        patcher = patch('usb_iss.discovery.list_ports.comports')
+        self.addCleanup(patcher.stop)
+        self.comports = patcher.start()
+        self.comports.return_value = [
+            port_info('PORT1'),
+            port_info('PORT0'),
+            port_info('OTHER'),
+            port_info('COM1', vid=0x1234, pid=0x5678),
+        ]
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache_path = os.path.join(self.cache_dir, "cache.json")
+
+    def test_discover(self):
+        modules = discover()
+
+        assert_that(modules, is_([
+            ModuleInfo('PORT0', "00000001", 0x02,
+                       "USB VID:PID=04D8:FFEE PORT0"),
+            ModuleInfo('PORT1', "00000002", 0x03,
+                       "USB VID:PID=04D8:FFEE PORT1"),
+        ]))
+
+    def test_discover_filters_by_vid_and_pid(self):
+        discover(timeout=0.05)
+
+        assert_that(self.opened, contains_inanyorder(
+            ('PORT0', 0.05), ('PORT1', 0.05), ('OTHER', 0.05)))
+
+    def test_discover_uses_cache(self):
+        discover(cache_path=self.cache_path)
+        self.opened = []
+
+        modules = discover(cache_path=self.cache_path)
+
+        # Only the port without a module is probed again
+        assert_that(self.opened, is_([('OTHER', 0.1)]))
+        assert_that([module.serial_number for module in modules],
+                    is_(["00000001", "00000002"]))
+
+    def test_discover_reprobes_reenumerated_ports(self):
+        discover(cache_path=self.cache_path)
+        self.opened = []
+        self.comports.return_value = [
+            port_info('PORT0', hwid="USB VID:PID=04D8:FFEE SER=NEW"),
+            port_info('PORT1'),
+        ]
+        self.responses['PORT0'] = bytes([0x07, 0x02, 0x40]) + b"00000009"
+
+        modules = discover(cache_path=self.cache_path)
+
+        assert_that(self.opened, is_([('PORT0', 0.1)]))
+        assert_that([module.serial_number for module in modules],
+                    is_(["00000009", "00000002"]))
+
+    def test_discover_ignores_corrupt_cache(self):
+        with open(self.cache_path, 'w') as cache_file:
+            cache_file.write("not json")
+
+        modules = discover(cache_path=self.cache_path)
+
+        assert_that(len(modules), is_(2))
+
+
+class TestProbe(unittest.TestCase):
+    @patch('serial.Serial')
+    def test_probe(self, serial):
+        serial().read.return_value = (bytes([0x07, 0x02, 0x40]) +
+                                      b"00000001")
+
+        module = probe('PORT0')
+
+        assert_that(module, is_(ModuleInfo('PORT0', "00000001", 2, None)))
+        assert_that(serial().write, called_once_with(
+            bytes([0x5A, 0x01, 0x5A, 0x03])))
+        assert_that(serial().close.called, is_(True))
+
+    @patch('serial.Serial')
+    def test_probe_timeout(self, serial):
+        serial().read.return_value = bytes([])
+
+        assert_that(probe('PORT0'), is_(None))
+
+    @patch('serial.Serial')
+    def test_probe_open_failure(self, serial):
+        serial.side_effect = IOError("No such port")
+
+        assert_that(probe('PORT0'), is_(None))
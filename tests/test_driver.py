@@ -5,11 +5,11 @@ try:
 except ImportError:
     from mock import patch
 
-from hamcrest import assert_that, is_, calling, raises
-from matchmock import called, called_once, called_once_with
+from hamcrest import assert_that, is_, calling, raises, instance_of
+from matchmock import called, called_once, called_once_with, called_with
 
 from usb_iss import defs, UsbIssError
-from usb_iss.driver import Driver
+from usb_iss.driver import Driver, Result, verify_ack
 
 # In Py2, bytes means str, and there's no immutable byte array defined.
 # Use bytearray instead - this is mutable, but otherwise equivalent to
@@ -26,6 +26,11 @@ class TestDriver(unittest.TestCase):
         assert_that(serial, called())
         assert_that(driver._serial, is_(serial()))
 
+    def test_open_with_timeout(self, serial):
+        Driver().open('PORTNAME', timeout=0.05)
+
+        assert_that(serial.call_args[1]['timeout'], is_(0.05))
+
     def test_close(self, serial):
         driver = Driver().open('PORTNAME')
 
@@ -85,14 +90,14 @@ class TestDriver(unittest.TestCase):
 
         data = driver.read(2)
 
-        assert_that(data, is_([0x01, 0x02]))
+        assert_that(data, is_(bytes([0x01, 0x02])))
 
     def test_read_zero_bytes(self, serial):
         driver = Driver().open('PORTNAME')
 
         data = driver.read(0)
 
-        assert_that(data, is_([]))
+        assert_that(data, is_(bytes([])))
         assert_that(serial().read.not_called())
 
     def test_read_failure(self, serial):
@@ -116,7 +121,36 @@ class TestDriver(unittest.TestCase):
 
         data = driver.read(2)
 
-        assert_that(data, is_([0x01, 0x02]))
+        assert_that(data, is_(bytes([0x01, 0x02])))
+
+    def test_readinto(self, serial):
+        driver = Driver().open('PORTNAME')
+
+        def readinto(view):
+            view[:] = bytes([0x01, 0x02])
+            return 2
+        serial().readinto.side_effect = readinto
+        buffer = bytearray(2)
+
+        count = driver.readinto(buffer)
+
+        assert_that(count, is_(2))
+        assert_that(buffer, is_(bytearray([0x01, 0x02])))
+
+    def test_readinto_failure(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial().readinto.return_value = 1
+
+        assert_that(
+            calling(driver.readinto).with_args(bytearray(2)),
+            raises(UsbIssError, "Expected 2 bytes, but 1 received"))
+
+    def test_readinto_fails_when_not_open(self, _):
+        driver = Driver()
+
+        assert_that(
+            calling(driver.readinto).with_args(bytearray(2)),
+            raises(UsbIssError, "Serial port has not been opened"))
 
     def test_check_i2c_ack_passing_with_0x01(self, serial):
         driver = Driver().open('PORTNAME')
@@ -168,3 +202,181 @@ class TestDriver(unittest.TestCase):
             calling(driver.check_ack_error_code).with_args(defs.ModeError),
             raises(UsbIssError, (r"Received ModeError.UNKNOWN_COMMAND " +
                                  r"\[0x00, 0x05\] instead of ACK")))
+
+    def test_write_cmds(self, serial):
+        driver = Driver().open('PORTNAME')
+
+        driver.write_cmds([(0x88, [0x01, 0x02]), (0x99, None)])
+
+        assert_that(serial().write, called_once_with(
+            bytes([0x88, 0x01, 0x02, 0x99])))
+
+    def test_command(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial().read.return_value = bytes([0x01, 0x02])
+
+        result = driver.command(0x88, [0x03], lambda drv: drv.read(2))
+
+        assert_that(serial().write, called_once_with(bytes([0x88, 0x03])))
+        assert_that(result, is_(bytes([0x01, 0x02])))
+
+    def test_transact(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial().read.return_value = bytes([0xFF, 0x01, 0x02])
+
+        result = driver.transact(0x88, [0x03], 3)
+
+        assert_that(serial().write, called_once_with(bytes([0x88, 0x03])))
+        assert_that(serial().read, called_once_with(3))
+        assert_that(result, is_(bytes([0xFF, 0x01, 0x02])))
+
+    def test_transact_with_decode(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial().read.return_value = bytes([0xFF, 0x01, 0x02])
+
+        result = driver.transact(0x88, None, 3, lambda response: response[1:])
+
+        assert_that(result, is_(bytes([0x01, 0x02])))
+
+    def test_transact_failure(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial().read.return_value = bytes([0xFF])
+
+        assert_that(
+            calling(driver.transact).with_args(0x88, None, 3),
+            raises(UsbIssError, "Expected 3 bytes, but 1 received"))
+
+    def test_transact_many(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial().read.side_effect = [bytes([0x01]), bytes([0x02, 0x03])]
+
+        result = driver.transact_many([(0x88, [0x01]), (0x99, None)], [1, 2])
+
+        assert_that(serial().write, called_once_with(
+            bytes([0x88, 0x01, 0x99])))
+        assert_that(result, is_([bytes([0x01]), bytes([0x02, 0x03])]))
+
+
+@patch('serial.Serial')
+class TestPipeline(unittest.TestCase):
+    def test_flush_writes_once(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.side_effect = [bytes([0x01]), bytes([0x02, 0x03])]
+
+        first = pipeline.command(0x88, [0x01], lambda drv: drv.read(1))
+        second = pipeline.command(0x99, None, lambda drv: drv.read(2))
+        assert_that(serial().write.called, is_(False))
+
+        results = pipeline.flush()
+
+        assert_that(serial().write, called_once_with(
+            bytes([0x88, 0x01, 0x99])))
+        assert_that(results, is_([first, second]))
+        assert_that(first.result(), is_(bytes([0x01])))
+        assert_that(second.result(), is_(bytes([0x02, 0x03])))
+
+    def test_command_returns_result(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+
+        result = pipeline.command(0x88, None, lambda drv: drv.read(1))
+
+        assert_that(result, instance_of(Result))
+        assert_that(result.done(), is_(False))
+
+    def test_result_flushes(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.return_value = bytes([0x42])
+
+        result = pipeline.command(0x88, None, lambda drv: drv.read(1))
+
+        assert_that(result.result(), is_(bytes([0x42])))
+        assert_that(serial().write, called_once_with(bytes([0x88])))
+
+    def test_failure_is_stored_in_result(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.side_effect = [bytes([0x00]), bytes([0xFF])]
+
+        first = pipeline.command(0x88, None, lambda drv: drv.check_ack())
+        second = pipeline.command(0x99, None, lambda drv: drv.check_ack())
+        pipeline.flush()
+
+        assert_that(calling(first.result),
+                    raises(UsbIssError, "Received 0x00 instead of ACK"))
+        assert_that(second.result(), is_(None))
+
+    def test_fixed_length_responses_are_read_together(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.return_value = bytes([0x01, 0xFF, 0x02, 0x03])
+
+        first = pipeline.transact(0x88, None, 1)
+        second = pipeline.transact(0x99, None, 3, lambda r: r[1:])
+        pipeline.flush()
+
+        assert_that(serial().read, called_once_with(4))
+        assert_that(first.result(), is_(bytes([0x01])))
+        assert_that(second.result(), is_(bytes([0x02, 0x03])))
+
+    def test_fixed_length_responses_are_read_in_packets(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.side_effect = [bytes(range(60)), bytes(range(10))]
+
+        first = pipeline.transact(0x88, None, 30)
+        second = pipeline.transact(0x88, None, 30)
+        third = pipeline.transact(0x88, None, 10)
+        pipeline.flush()
+
+        assert_that(serial().read, called_with(60))
+        assert_that(serial().read, called_with(10))
+        assert_that(first.result(), is_(bytes(range(30))))
+        assert_that(second.result(), is_(bytes(range(30, 60))))
+        assert_that(third.result(), is_(bytes(range(10))))
+
+    def test_fixed_length_decode_failure(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.return_value = bytes([0x00, 0xFF])
+
+        first = pipeline.transact(0x88, None, 1, verify_ack)
+        second = pipeline.transact(0x99, None, 1, verify_ack)
+        pipeline.flush()
+
+        assert_that(calling(first.result),
+                    raises(UsbIssError, "Received 0x00 instead of ACK"))
+        assert_that(second.result(), is_(None))
+
+    def test_fixed_length_read_failure(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+        serial().read.return_value = bytes([0x01])
+
+        first = pipeline.transact(0x88, None, 1)
+        second = pipeline.transact(0x99, None, 1)
+        pipeline.flush()
+
+        assert_that(calling(first.result),
+                    raises(UsbIssError, "Expected 2 bytes, but 1 received"))
+        assert_that(calling(second.result),
+                    raises(UsbIssError, "Expected 2 bytes, but 1 received"))
+
+    def test_context_manager_flushes(self, serial):
+        serial().read.return_value = bytes([0x42])
+
+        with Driver().open('PORTNAME').pipeline() as pipeline:
+            result = pipeline.command(0x88, None, lambda drv: drv.read(1))
+            assert_that(serial().write.called, is_(False))
+
+        assert_that(serial().write, called_once_with(bytes([0x88])))
+        assert_that(result.done(), is_(True))
+
+    def test_context_manager_discards_on_error(self, serial):
+        def queue_and_fail():
+            with Driver().open('PORTNAME').pipeline() as pipeline:
+                pipeline.command(0x88, None, lambda drv: drv.read(1))
+                raise ValueError
+
+        assert_that(calling(queue_and_fail), raises(ValueError))
+        assert_that(serial().write.called, is_(False))
+
+    def test_flush_empty(self, serial):
+        pipeline = Driver().open('PORTNAME').pipeline()
+
+        assert_that(pipeline.flush(), is_([]))
+        assert_that(serial().write.called, is_(False))
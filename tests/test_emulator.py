@@ -0,0 +1,277 @@
+import os
+import unittest
+
+from hamcrest import assert_that, is_, calling, raises, close_to
+
+from usb_iss import UsbIss, UsbIssError, defs
+from usb_iss.emulator import Emulator, PtyEmulator, I2CMemory, SPIDevice
+from usb_iss.i2c_direct import DirectSequence
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class TestEmulator(unittest.TestCase):
+    def setUp(self):
+        self.emulator = Emulator(serial_number="00001234", fw_version=9)
+        self.iss = UsbIss(emulator=self.emulator)
+        self.iss.open("emulated")
+
+    def test_module_info(self):
+        assert_that(self.iss.read_module_id(), is_(7))
+        assert_that(self.iss.read_fw_version(), is_(9))
+        assert_that(self.iss.read_serial_number(), is_("00001234"))
+        assert_that(self.iss.read_iss_mode(), is_(defs.Mode.IO_MODE))
+
+    def test_dummy(self):
+        iss = UsbIss(dummy=True).open("COM1")
+
+        assert_that(iss.read_serial_number(), is_("00000001"))
+
+    def test_dummy_without_open(self):
+        iss = UsbIss(dummy=True)
+
+        assert_that(iss.read_serial_number(), is_("00000001"))
+
+    def test_emulator_without_open(self):
+        iss = UsbIss(emulator=self.emulator, thread_safe=True)
+        self.addCleanup(iss.close)
+
+        assert_that(iss.read_serial_number(), is_("00001234"))
+
+    def test_process_partial_command(self):
+        assert_that(self.emulator.process([0x5A]), is_((bytes(), 0.002)))
+        assert_that(self.emulator.process([0x01]),
+                    is_((bytes([0x07, 0x09, 0x00]), 0.002)))
+
+    def test_unknown_mode(self):
+        assert_that(
+            calling(self.iss._set_mode).with_args(0x42, [0x00]),
+            raises(UsbIssError, r"Received ModeError.UNKNOWN_COMMAND"))
+
+    def test_i2c_memory(self):
+        memory = self.emulator.add_i2c_device(0x50, I2CMemory())
+        self.iss.setup_i2c()
+
+        self.iss.i2c.write(0x50, 0x10, [1, 2, 3])
+
+        assert_that(memory.data[0x10:0x13], is_(bytearray([1, 2, 3])))
+        assert_that(self.iss.i2c.read(0x50, 0x11, 2), is_([2, 3]))
+
+    def test_i2c_memory_2_byte_register(self):
+        memory = self.emulator.add_i2c_device(
+            0x50, I2CMemory(size=1024, register_size=2))
+        self.iss.setup_i2c()
+
+        self.iss.i2c.write_ad2(0x50, 0x0123, [0x55, 0xAA])
+
+        assert_that(memory.data[0x0123:0x0125], is_(bytearray([0x55, 0xAA])))
+        assert_that(self.iss.i2c.read_ad2(0x50, 0x0123, 2), is_([0x55, 0xAA]))
+
+    def test_i2c_single(self):
+        memory = self.emulator.add_i2c_device(0x50, I2CMemory())
+        memory.data[0] = 0x42
+        self.iss.setup_i2c()
+
+        assert_that(self.iss.i2c.read_single(0x50), is_(0x42))
+
+    def test_i2c_missing_device(self):
+        self.iss.setup_i2c()
+
+        assert_that(calling(self.iss.i2c.write).with_args(0x50, 0x10, [1]),
+                    raises(UsbIssError))
+
+    def test_i2c_scan(self):
+        self.emulator.add_i2c_device(0x20, I2CMemory())
+        self.emulator.add_i2c_device(0x50, I2CMemory())
+        self.iss.setup_i2c()
+
+        assert_that(self.iss.i2c.scan(), is_({0x20, 0x50}))
+
+    def test_i2c_scan_cache_in_batch(self):
+        self.emulator.add_i2c_device(0x50, I2CMemory())
+        self.iss.setup_i2c(clock_khz=100)
+        cache = {}
+
+        with self.iss.batch() as batch:
+            first = batch.i2c.scan(0x50, 0x51, cache=cache)
+        with self.iss.batch() as batch:
+            second = batch.i2c.scan(0x50, 0x51, cache=cache)
+
+        # The batches share the module's serial number and clock rate
+        assert_that(first.result(), is_({0x50}))
+        assert_that(second.result(), is_({0x50}))
+        assert_that(self.iss.i2c.serial_number, is_("00001234"))
+        assert_that(cache, is_({("00001234", 100, 0x50, 0x51): {0x50}}))
+
+    def test_i2c_disabled_in_io_mode(self):
+        self.emulator.add_i2c_device(0x50, I2CMemory())
+        self.iss.setup_io()
+
+        assert_that(self.iss.i2c.test(0x50), is_(False))
+
+    def test_i2c_direct(self):
+        memory = self.emulator.add_i2c_device(0x50, I2CMemory())
+        memory.data[0x20:0x24] = bytearray([9, 8, 7, 6])
+        self.iss.setup_i2c()
+
+        sequence = (DirectSequence()
+                    .write_register(0x50, 0x10, [1, 2])
+                    .read_register(0x50, 0x20, 4))
+
+        assert_that(self.iss.i2c.run_sequence(sequence),
+                    is_([None, [9, 8, 7, 6]]))
+        assert_that(memory.data[0x10:0x12], is_(bytearray([1, 2])))
+
+    def test_i2c_direct_device_error(self):
+        self.iss.setup_i2c()
+
+        assert_that(
+            calling(self.iss.i2c.run_sequence).with_args(
+                DirectSequence().write(0x50, [1])),
+            raises(UsbIssError, r"I2CDirectError.DEVICE_ERROR"))
+
+    def test_spi_loopback(self):
+        self.iss.setup_spi()
+
+        assert_that(self.iss.spi.transfer([1, 2, 3]), is_([1, 2, 3]))
+
+    def test_spi_device(self):
+        class Inverter(SPIDevice):
+            def transfer(self, data):
+                return bytes([~byte & 0xFF for byte in bytearray(data)])
+
+        self.emulator.spi_device = Inverter()
+        self.iss.setup_spi()
+
+        assert_that(self.iss.spi.transfer([0x00, 0x0F]), is_([0xFF, 0xF0]))
+
+    def test_spi_transfer_stream(self):
+        self.iss.setup_spi()
+
+        data = b"".join(self.iss.spi.transfer_stream(bytes(range(130))))
+
+        assert_that(data, is_(bytes(range(130))))
+
+    def test_spi_clock(self):
+        self.iss.setup_spi(clock_khz=1000)
+
+        assert_that(self.emulator.spi_clock_hz, is_(1000000))
+
+    def test_serial(self):
+        transmitted = []
+        self.emulator.serial_device = transmitted.append
+        self.iss.setup_serial(baud_rate=115200)
+
+        self.iss.serial.transmit([1, 2, 3])
+        self.emulator.serial_input([4, 5])
+
+        assert_that(transmitted, is_([bytes([1, 2, 3])]))
+        assert_that(self.iss.serial.receive(), is_([4, 5]))
+        assert_that(self.emulator.baud_rate, is_(115384))
+
+    def test_serial_echo(self):
+        self.emulator.serial_device = lambda data: data
+        self.iss.setup_serial()
+
+        self.iss.serial.transmit([1, 2, 3])
+
+        assert_that(self.iss.serial.receive(), is_([1, 2, 3]))
+
+    def test_serial_rx_overflow(self):
+        self.iss.setup_serial()
+
+        self.emulator.serial_input(range(100))
+
+        assert_that(self.iss.serial.receive(), is_(list(range(62))))
+
+    def test_io(self):
+        self.iss.setup_io(io1_type=defs.IOType.OUTPUT_LOW,
+                          io2_type=defs.IOType.OUTPUT_LOW,
+                          io3_type=defs.IOType.DIGITAL_INPUT,
+                          io4_type=defs.IOType.DIGITAL_INPUT)
+        self.emulator.pins = 0b1100
+
+        self.iss.io.set_pins(1, 0, 0, 1)
+
+        assert_that(self.iss.io.get_pins(), is_([1, 0, 1, 1]))
+        assert_that(self.emulator.outputs, is_(0b0001))
+
+    def test_adc(self):
+        self.iss.setup_io(io2_type=defs.IOType.ANALOGUE_INPUT)
+        self.emulator.adc[1] = 700
+
+        assert_that(self.iss.io.get_ad(2), is_(700))
+
+    def test_batch(self):
+        self.emulator.add_i2c_device(0x50, I2CMemory())
+        self.iss.setup_i2c()
+
+        with self.iss.batch() as batch:
+            batch.i2c.write(0x50, 0x00, [1, 2])
+            result = batch.i2c.read(0x50, 0x00, 2)
+
+        assert_that(result.result(), is_([1, 2]))
+
+    def test_batch_with_spi(self):
+        self.iss.setup_spi()
+        self.emulator.pins = 0x05
+
+        with self.iss.batch() as batch:
+            first = batch.spi.transfer([1, 2])
+            pins = batch.io.get_pins()
+            second = batch.spi.transfer([3])
+
+        assert_that(first.result(), is_([1, 2]))
+        assert_that(pins.result(), is_([1, 0, 1, 0]))
+        assert_that(second.result(), is_([3]))
+
+    def test_elapsed(self):
+        self.iss.setup_spi(clock_khz=500)
+        self.emulator.elapsed = 0.0
+
+        self.iss.spi.transfer([0] * 50)
+
+        # Two USB frames, plus 400 bits at 500kHz
+        assert_that(self.emulator.elapsed, close_to(0.0028, 1e-9))
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), "Requires a pty")
+class TestPtyEmulator(unittest.TestCase):
+    def test_pty(self):
+        emulator = Emulator()
+        memory = emulator.add_i2c_device(0x50, I2CMemory())
+
+        with PtyEmulator(emulator) as pty:
+            iss = UsbIss().open(pty.port)
+            iss.setup_i2c()
+            iss.i2c.write(0x50, 0x10, [1, 2, 3])
+            data = iss.i2c.read(0x50, 0x10, 3)
+            iss.close()
+
+        assert_that(data, is_([1, 2, 3]))
+        assert_that(memory.data[0x10:0x13], is_(bytearray([1, 2, 3])))
+
+    def test_pty_spi(self):
+        emulator = Emulator()
+
+        with PtyEmulator(emulator) as pty:
+            iss = UsbIss(data_type=bytes).open(pty.port)
+            iss.setup_spi()
+            stream = b"".join(iss.spi.transfer_stream(bytes(range(130))))
+            with iss.batch() as batch:
+                transfer = batch.spi.transfer([1, 2])
+                pins = batch.io.get_pins()
+            iss.close()
+
+        assert_that(stream, is_(bytes(range(130))))
+        assert_that(transfer.result(), is_(bytes([1, 2])))
+        assert_that(pins.result(), is_([0, 0, 0, 0]))
+
+    def test_start_twice(self):
+        with PtyEmulator(Emulator()) as pty:
+            assert_that(calling(pty.start),
+                        raises(UsbIssError, r"already running"))
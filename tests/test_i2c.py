@@ -1,30 +1,42 @@
 import unittest
 # Py2 doesn't have mock included in unittest
 try:
-    from unittest.mock import Mock
+    from unittest.mock import patch
 except ImportError:
-    from mock import Mock
+    from mock import patch
 
 from hamcrest import assert_that, is_, calling, raises
-from matchmock import called_once_with
+from matchmock import called_once_with, called_with
 
+from usb_iss.driver import Driver
 from usb_iss.i2c import I2C, defs
+from usb_iss.i2c_direct import DirectSequence
 from usb_iss import UsbIssError
 
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
 
 class TestI2C(unittest.TestCase):
     def setUp(self):
-        self.driver = Mock()
-        self.i2c = I2C(self.driver)
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+        self.serial.read.return_value = bytes([0xFF])
+
+        self.i2c = I2C(Driver().open('PORTNAME'))
 
     def test_write(self):
         self.i2c.write(0x70, 0x00, [0x51])
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xE0, 0x00, 0x01, 0x51]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xE0, 0x00, 0x01, 0x51])))
 
     def test_write_failure(self):
-        self.driver.check_i2c_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00])
 
         assert_that(
             calling(self.i2c.write).with_args(0x70, 0x00, [0x51]),
@@ -35,8 +47,8 @@ class TestI2C(unittest.TestCase):
 
         self.i2c.write(0x70, 0x00, expected_data)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xE0, 0x00, 60] + expected_data))
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x55, 0xE0, 0x00, 60] + expected_data)))
 
     def test_write_overflow_failure(self):
         expected_data = list(range(61))
@@ -46,17 +58,31 @@ class TestI2C(unittest.TestCase):
             raises(UsbIssError, "Attempted to write 61 bytes, maximum is 60"))
 
     def test_read(self):
-        self.driver.read.return_value = [0x11, 0x22]
+        self.serial.read.return_value = bytes([0x11, 0x22])
 
         data = self.i2c.read(0x60, 0x02, 2)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xC1, 0x02, 2]))
-        assert_that(self.driver.read, called_once_with(2))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xC1, 0x02, 2])))
+        assert_that(self.serial.read, called_once_with(2))
         assert_that(data, is_([0x11, 0x22]))
 
+    def test_write_from_bytes(self):
+        self.i2c.write(0x70, 0x00, b"\x51\x52")
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x55, 0xE0, 0x00, 0x02, 0x51, 0x52])))
+
+    def test_read_as_bytes(self):
+        self.serial.read.return_value = bytes([0x11, 0x22])
+        i2c = I2C(Driver().open('PORTNAME'), data_type=bytes)
+
+        data = i2c.read(0x60, 0x02, 2)
+
+        assert_that(data, is_(bytes([0x11, 0x22])))
+
     def test_read_failure(self):
-        self.driver.read.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([])
 
         assert_that(
             calling(self.i2c.read).with_args(0x60, 0x02, 2),
@@ -64,13 +90,13 @@ class TestI2C(unittest.TestCase):
 
     def test_read_large_data(self):
         expected_data = list(range(60))
-        self.driver.read.return_value = expected_data
+        self.serial.read.return_value = bytes(expected_data)
 
         data = self.i2c.read(0x60, 0x02, 60)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xC1, 0x02, 60]))
-        assert_that(self.driver.read, called_once_with(60))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xC1, 0x02, 60])))
+        assert_that(self.serial.read, called_once_with(60))
         assert_that(data, is_(expected_data))
 
     def test_read_overflow_failure(self):
@@ -81,27 +107,27 @@ class TestI2C(unittest.TestCase):
     def test_write_single(self):
         self.i2c.write_single(0x20, 0x00)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x53, [0x40, 0x00]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x53, 0x40, 0x00])))
 
     def test_write_single_failure(self):
-        self.driver.check_i2c_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00])
 
         assert_that(
             calling(self.i2c.write_single).with_args(0x20, 0x00),
             raises(UsbIssError))
 
     def test_read_single(self):
-        self.driver.read.return_value = [0x42]
+        self.serial.read.return_value = bytes([0x42])
 
         data = self.i2c.read_single(0x20)
 
-        assert_that(self.driver.write_cmd, called_once_with(0x53, [0x41]))
-        assert_that(self.driver.read, called_once_with(1))
+        assert_that(self.serial.write, called_once_with(bytes([0x53, 0x41])))
+        assert_that(self.serial.read, called_once_with(1))
         assert_that(data, is_(0x42))
 
     def test_read_single_failure(self):
-        self.driver.read.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([])
 
         assert_that(
             calling(self.i2c.read_single).with_args(0x20),
@@ -110,12 +136,11 @@ class TestI2C(unittest.TestCase):
     def test_write_ad0(self):
         self.i2c.write_ad0(0x18, [0x12, 0x34, 0x56, 0x78])
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x54, [
-                        0x30, 0x04, 0x12, 0x34, 0x56, 0x78]))
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x54, 0x30, 0x04, 0x12, 0x34, 0x56, 0x78])))
 
     def test_write_ad0_failure(self):
-        self.driver.check_i2c_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00])
 
         assert_that(
             calling(self.i2c.write_ad0).
@@ -123,16 +148,17 @@ class TestI2C(unittest.TestCase):
             raises(UsbIssError))
 
     def test_read_ad0(self):
-        self.driver.read.return_value = [0x11, 0x22]
+        self.serial.read.return_value = bytes([0x11, 0x22])
 
         data = self.i2c.read_ad0(0x78, 2)
 
-        assert_that(self.driver.write_cmd, called_once_with(0x54, [0xF1, 2]))
-        assert_that(self.driver.read, called_once_with(2))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x54, 0xF1, 2])))
+        assert_that(self.serial.read, called_once_with(2))
         assert_that(data, is_([0x11, 0x22]))
 
     def test_read_ad0_failure(self):
-        self.driver.read.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([])
 
         assert_that(
             calling(self.i2c.read_ad0).with_args(0x78, 2),
@@ -141,11 +167,11 @@ class TestI2C(unittest.TestCase):
     def test_write_ad1(self):
         self.i2c.write_ad1(0x70, 0x00, [0x51])
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xE0, 0x00, 0x01, 0x51]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xE0, 0x00, 0x01, 0x51])))
 
     def test_write_ad1_failure(self):
-        self.driver.check_i2c_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00])
 
         assert_that(
             calling(self.i2c.write_ad1).with_args(0x70, 0x00, [0x51]),
@@ -156,8 +182,8 @@ class TestI2C(unittest.TestCase):
 
         self.i2c.write_ad1(0x70, 0x00, expected_data)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xE0, 0x00, 60] + expected_data))
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x55, 0xE0, 0x00, 60] + expected_data)))
 
     def test_write_ad1_overflow_failure(self):
         expected_data = list(range(61))
@@ -167,17 +193,17 @@ class TestI2C(unittest.TestCase):
             raises(UsbIssError, "Attempted to write 61 bytes, maximum is 60"))
 
     def test_read_ad1(self):
-        self.driver.read.return_value = [0x11, 0x22]
+        self.serial.read.return_value = bytes([0x11, 0x22])
 
         data = self.i2c.read_ad1(0x60, 0x02, 2)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xC1, 0x02, 2]))
-        assert_that(self.driver.read, called_once_with(2))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xC1, 0x02, 2])))
+        assert_that(self.serial.read, called_once_with(2))
         assert_that(data, is_([0x11, 0x22]))
 
     def test_read_ad1_failure(self):
-        self.driver.read.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([])
 
         assert_that(
             calling(self.i2c.read_ad1).with_args(0x60, 0x02, 2),
@@ -185,13 +211,13 @@ class TestI2C(unittest.TestCase):
 
     def test_read_ad1_large_data(self):
         expected_data = list(range(60))
-        self.driver.read.return_value = expected_data
+        self.serial.read.return_value = bytes(expected_data)
 
         data = self.i2c.read_ad1(0x60, 0x02, 60)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x55, [0xC1, 0x02, 60]))
-        assert_that(self.driver.read, called_once_with(60))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xC1, 0x02, 60])))
+        assert_that(self.serial.read, called_once_with(60))
         assert_that(data, is_(expected_data))
 
     def test_read_ad1_overflow_failure(self):
@@ -202,11 +228,11 @@ class TestI2C(unittest.TestCase):
     def test_write_ad2(self):
         self.i2c.write_ad2(0x50, 0x1234, [0x51])
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x56, [0xA0, 0x12, 0x34, 1, 0x51]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x56, 0xA0, 0x12, 0x34, 1, 0x51])))
 
     def test_write_ad2_failure(self):
-        self.driver.check_i2c_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00])
 
         assert_that(
             calling(self.i2c.write_ad2).with_args(0x50, 0x1234, [0x51]),
@@ -217,9 +243,8 @@ class TestI2C(unittest.TestCase):
 
         self.i2c.write_ad2(0x50, 0x1234, expected_data)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x56, [
-                        0xA0, 0x12, 0x34, 59] + expected_data))
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x56, 0xA0, 0x12, 0x34, 59] + expected_data)))
 
     def test_write_ad2_overflow_failure(self):
         expected_data = list(range(60))
@@ -229,17 +254,17 @@ class TestI2C(unittest.TestCase):
             raises(UsbIssError, "Attempted to write 60 bytes, maximum is 59"))
 
     def test_read_ad2(self):
-        self.driver.read.return_value = [0x11, 0x22]
+        self.serial.read.return_value = bytes([0x11, 0x22])
 
         data = self.i2c.read_ad2(0x50, 0x4321, 2)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x56, [0xA1, 0x43, 0x21, 2]))
-        assert_that(self.driver.read, called_once_with(2))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x56, 0xA1, 0x43, 0x21, 2])))
+        assert_that(self.serial.read, called_once_with(2))
         assert_that(data, is_([0x11, 0x22]))
 
     def test_read_ad2_failure(self):
-        self.driver.read.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([])
 
         assert_that(
             calling(self.i2c.read_ad2).with_args(0x50, 0x4321, 2),
@@ -247,13 +272,13 @@ class TestI2C(unittest.TestCase):
 
     def test_read_ad2_large_data(self):
         expected_data = list(range(64))
-        self.driver.read.return_value = expected_data
+        self.serial.read.return_value = bytes(expected_data)
 
         data = self.i2c.read_ad2(0x50, 0x4321, 64)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x56, [0xA1, 0x43, 0x21, 64]))
-        assert_that(self.driver.read, called_once_with(64))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x56, 0xA1, 0x43, 0x21, 64])))
+        assert_that(self.serial.read, called_once_with(64))
         assert_that(data, is_(expected_data))
 
     def test_read_ad2_overflow_failure(self):
@@ -261,9 +286,176 @@ class TestI2C(unittest.TestCase):
             calling(self.i2c.read_ad2).with_args(0x50, 0x02, 65),
             raises(UsbIssError, "Attempted to read 65 bytes, maximum is 64"))
 
+    def test_write_block(self):
+        data = list(range(130))
+
+        self.i2c.write_block(0x70, 0x10, data)
+
+        assert_that(self.serial.write, called_once_with(bytes(
+            [0x55, 0xE0, 0x10, 60] + data[0:60] +
+            [0x55, 0xE0, 0x4C, 60] + data[60:120] +
+            [0x55, 0xE0, 0x88, 10] + data[120:130])))
+
+    def test_write_block_split_across_writes(self):
+        data = list(range(130))
+
+        with patch('usb_iss.i2c.MAX_BLOCK_BYTES', 130):
+            self.i2c.write_block(0x70, 0x10, data)
+
+        assert_that(self.serial.write.call_count, is_(2))
+        assert_that(self.serial.write, called_with(bytes(
+            [0x55, 0xE0, 0x10, 60] + data[0:60] +
+            [0x55, 0xE0, 0x4C, 60] + data[60:120])))
+        assert_that(self.serial.write, called_with(bytes(
+            [0x55, 0xE0, 0x88, 10] + data[120:130])))
+
+    def test_write_block_empty(self):
+        self.i2c.write_block(0x70, 0x10, [])
+
+        assert_that(self.serial.write.call_count, is_(0))
+
+    def test_write_block_ad2(self):
+        data = list(range(60))
+
+        self.i2c.write_block(0x50, 0x1234, data, register_size=2)
+
+        assert_that(self.serial.write, called_once_with(bytes(
+            [0x56, 0xA0, 0x12, 0x34, 59] + data[0:59] +
+            [0x56, 0xA0, 0x12, 0x6F, 1] + data[59:60])))
+
+    def test_write_block_page_size(self):
+        data = list(range(40))
+
+        self.i2c.write_block(0x50, 0x0010, data, register_size=2,
+                             page_size=32)
+
+        assert_that(self.serial.write, called_once_with(bytes(
+            [0x56, 0xA0, 0x00, 0x10, 16] + data[0:16] +
+            [0x56, 0xA0, 0x00, 0x20, 24] + data[16:40])))
+
+    def test_write_block_failure(self):
+        self.serial.read.side_effect = [bytes([0xFF]), bytes([0x00])]
+
+        assert_that(
+            calling(self.i2c.write_block).with_args(0x70, 0, list(range(90))),
+            raises(UsbIssError, "Received NACK instead of ACK"))
+
+    def test_write_block_beyond_last_register(self):
+        assert_that(
+            calling(self.i2c.write_block).with_args(0x70, 0xF0, [0] * 17),
+            raises(UsbIssError, "beyond the last register"))
+
+    def test_write_blocks(self):
+        self.i2c.write_blocks(0x70, [(0x10, [1, 2]), (0x20, [3])])
+
+        assert_that(self.serial.write, called_once_with(bytes(
+            [0x55, 0xE0, 0x10, 2, 1, 2] +
+            [0x55, 0xE0, 0x20, 1, 3])))
+
+    def test_read_block(self):
+        expected_data = list(range(130))
+        self.serial.read.side_effect = [bytes(expected_data[0:60]),
+                                        bytes(expected_data[60:120]),
+                                        bytes(expected_data[120:130])]
+
+        data = self.i2c.read_block(0x60, 0x02, 130)
+
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x55, 0xC1, 0x02, 60,
+            0x55, 0xC1, 0x3E, 60,
+            0x55, 0xC1, 0x7A, 10])))
+        assert_that(self.serial.read, called_with(60))
+        assert_that(self.serial.read, called_with(10))
+        assert_that(data, is_(expected_data))
+
+    def test_read_block_split_across_writes(self):
+        expected_data = list(range(130))
+        self.serial.read.side_effect = [bytes(expected_data[0:60]),
+                                        bytes(expected_data[60:120]),
+                                        bytes(expected_data[120:130])]
+
+        with patch('usb_iss.i2c.MAX_BLOCK_BYTES', 120):
+            data = self.i2c.read_block(0x60, 0x02, 130)
+
+        assert_that(self.serial.write.call_count, is_(2))
+        assert_that(self.serial.write, called_with(bytes([
+            0x55, 0xC1, 0x02, 60,
+            0x55, 0xC1, 0x3E, 60])))
+        assert_that(self.serial.write, called_with(bytes([
+            0x55, 0xC1, 0x7A, 10])))
+        assert_that(data, is_(expected_data))
+
+    def test_read_block_empty(self):
+        data = self.i2c.read_block(0x60, 0x02, 0)
+
+        assert_that(self.serial.write.call_count, is_(0))
+        assert_that(data, is_([]))
+
+    def test_read_block_ad2(self):
+        expected_data = list(range(100))
+        self.serial.read.side_effect = [bytes(expected_data[0:64]),
+                                        bytes(expected_data[64:100])]
+
+        data = self.i2c.read_block(0x50, 0x4321, 100, register_size=2)
+
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x56, 0xA1, 0x43, 0x21, 64,
+            0x56, 0xA1, 0x43, 0x61, 36])))
+        assert_that(data, is_(expected_data))
+
+    def test_read_block_failure(self):
+        self.serial.read.return_value = bytes([])
+
+        assert_that(
+            calling(self.i2c.read_block).with_args(0x60, 0x02, 100),
+            raises(UsbIssError, "Expected 60 bytes, but 0 received"))
+
+    def test_read_block_invalid_register_size(self):
+        assert_that(
+            calling(self.i2c.read_block).with_args(0x60, 0x02, 100,
+                                                   register_size=3),
+            raises(UsbIssError, "Invalid register_size value"))
+
+    def test_read_into(self):
+        def readinto(view):
+            view[:] = bytes(range(len(view)))
+            return len(view)
+        self.serial.readinto.side_effect = readinto
+        buffer = bytearray(70)
+
+        count = self.i2c.read_into(0x60, 0x02, buffer)
+
+        assert_that(count, is_(70))
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x55, 0xC1, 0x02, 60,
+            0x55, 0xC1, 0x3E, 10])))
+        assert_that(buffer, is_(bytearray(list(range(60)) +
+                                          list(range(10)))))
+
+    def test_read_into_split_across_writes(self):
+        def readinto(view):
+            view[:] = bytes(range(len(view)))
+            return len(view)
+        self.serial.readinto.side_effect = readinto
+        buffer = bytearray(70)
+
+        with patch('usb_iss.i2c.MAX_BLOCK_BYTES', 60):
+            count = self.i2c.read_into(0x60, 0x02, buffer)
+
+        assert_that(count, is_(70))
+        assert_that(self.serial.write.call_count, is_(2))
+        assert_that(buffer, is_(bytearray(list(range(60)) +
+                                          list(range(10)))))
+
+    def test_read_into_empty(self):
+        count = self.i2c.read_into(0x60, 0x02, bytearray())
+
+        assert_that(self.serial.write.call_count, is_(0))
+        assert_that(count, is_(0))
+
     def test_direct(self):
-        self.driver.check_ack_error_code.return_value = 4
-        self.driver.read.return_value = [0x11, 0x22, 0x33, 0x44]
+        self.serial.read.side_effect = [bytes([0xFF, 0x04]),
+                                        bytes([0x11, 0x22, 0x33, 0x44])]
 
         data = self.i2c.direct([
             defs.I2CDirect.START,
@@ -276,14 +468,15 @@ class TestI2C(unittest.TestCase):
             defs.I2CDirect.STOP,
         ])
 
-        assert_that(self.driver.write_cmd, called_once_with(
+        assert_that(self.serial.write, called_once_with(bytes([
             0x57,
-            [0x01, 0x32, 0xA0, 0x00, 0x00, 0x02, 0x30, 0xA1, 0x23, 0x03]))
-        assert_that(self.driver.read, called_once_with(4))
+            0x01, 0x32, 0xA0, 0x00, 0x00, 0x02, 0x30, 0xA1, 0x23, 0x03])))
+        assert_that(self.serial.read, called_with(2))
+        assert_that(self.serial.read, called_with(4))
         assert_that(data, is_([0x11, 0x22, 0x33, 0x44]))
 
     def test_direct_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x01])
 
         assert_that(
             calling(self.i2c.direct).with_args([
@@ -296,23 +489,116 @@ class TestI2C(unittest.TestCase):
                 defs.I2CDirect.READ4,
                 defs.I2CDirect.STOP,
                 ]),
-            raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.I2CDirectError))
+            raises(UsbIssError, "Received I2CDirectError.DEVICE_ERROR"))
+
+    def test_run_sequence(self):
+        sequence = (DirectSequence()
+                    .write_register(0x48, 0x01, [0x60])
+                    .read_register(0x48, 0x00, 2)
+                    .read(0x49, 1))
+        self.serial.read.side_effect = [bytes([0xFF, 0x03]),
+                                        bytes([0x12, 0x34, 0x56])]
+
+        result = self.i2c.run_sequence(sequence)
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x57]) + sequence.compile()[0][0]))
+        assert_that(result, is_([None, [0x12, 0x34], [0x56]]))
+
+    def test_run_sequence_several_commands(self):
+        sequence = DirectSequence()
+        for address in range(0x48, 0x50):
+            sequence.read_register(address, 0x00, 1)
+        self.serial.read.side_effect = [bytes([0xFF, 0x06]),
+                                        bytes([0, 1, 2, 3, 4, 5]),
+                                        bytes([0xFF, 0x02]),
+                                        bytes([6, 7])]
+
+        result = self.i2c.run_sequence(sequence)
+
+        assert_that(self.serial.write.call_count, is_(1))
+        assert_that(result, is_([[value] for value in range(8)]))
+
+    def test_run_sequence_failure_reads_all_responses(self):
+        sequence = DirectSequence()
+        for address in range(0x48, 0x50):
+            sequence.read_register(address, 0x00, 1)
+        self.serial.read.side_effect = [bytes([0x00, 0x01]),
+                                        bytes([0xFF, 0x02]),
+                                        bytes([6, 7])]
+
+        assert_that(
+            calling(self.i2c.run_sequence).with_args(sequence),
+            raises(UsbIssError, "Received I2CDirectError.DEVICE_ERROR"))
+        assert_that(self.serial.read.call_count, is_(3))
 
     def test_test_with_device(self):
-        self.driver.read.return_value = [0xFF]
+        self.serial.read.return_value = bytes([0xFF])
         device_present = self.i2c.test(0x50)
 
-        assert_that(self.driver.write_cmd, called_once_with(0x58, [0xA0]))
-        assert_that(self.driver.read, called_once_with(1))
+        assert_that(self.serial.write, called_once_with(bytes([0x58, 0xA0])))
+        assert_that(self.serial.read, called_once_with(1))
         assert_that(device_present, is_(True))
 
     def test_test_without_device(self):
-        self.driver.read.return_value = [0x00]
+        self.serial.read.return_value = bytes([0x00])
 
         device_present = self.i2c.test(0x50)
 
-        assert_that(self.driver.write_cmd, called_once_with(0x58, [0xA0]))
-        assert_that(self.driver.read, called_once_with(1))
+        assert_that(self.serial.write, called_once_with(bytes([0x58, 0xA0])))
+        assert_that(self.serial.read, called_once_with(1))
         assert_that(device_present, is_(False))
+
+    def test_scan(self):
+        self.serial.read.return_value = bytes([0x00, 0xFF, 0x00, 0xFF])
+
+        devices = self.i2c.scan(0x50, 0x53)
+
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x58, 0xA0, 0x58, 0xA2, 0x58, 0xA4, 0x58, 0xA6])))
+        assert_that(self.serial.read, called_once_with(4))
+        assert_that(devices, is_({0x51, 0x53}))
+
+    def test_scan_default_range(self):
+        self.serial.read.return_value = bytes([0x00] * 112)
+
+        devices = self.i2c.scan()
+
+        assert_that(self.serial.write.call_args[0][0][:2],
+                    is_(bytes([0x58, 0x10])))
+        assert_that(self.serial.write.call_args[0][0][-2:],
+                    is_(bytes([0x58, 0xEE])))
+        assert_that(self.serial.read, called_once_with(112))
+        assert_that(devices, is_(set()))
+
+    def test_scan_invalid_range(self):
+        assert_that(calling(self.i2c.scan).with_args(0x70, 0x80),
+                    raises(UsbIssError,
+                           "Invalid I2C address range 0x70 - 0x80"))
+
+    def test_scan_cache(self):
+        cache = {}
+        self.i2c.clock_khz = 400
+        self.serial.read.return_value = b"00000001" + bytes([0xFF, 0x00])
+
+        first = self.i2c.scan(0x50, 0x51, cache=cache)
+        second = self.i2c.scan(0x50, 0x51, cache=cache)
+
+        # The serial number is read in the same write as the scan
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x5A, 0x03, 0x58, 0xA0, 0x58, 0xA2])))
+        assert_that(first, is_({0x50}))
+        assert_that(second, is_({0x50}))
+        assert_that(cache, is_({("00000001", 400, 0x50, 0x51): {0x50}}))
+
+    def test_scan_cache_keyed_by_clock(self):
+        cache = {("00000001", 400, 0x50, 0x51): frozenset([0x50])}
+        self.i2c.serial_number = "00000001"
+        self.i2c.clock_khz = 100
+        self.serial.read.return_value = bytes([0xFF, 0xFF])
+
+        devices = self.i2c.scan(0x50, 0x51, cache=cache)
+
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x58, 0xA0, 0x58, 0xA2])))
+        assert_that(devices, is_({0x50, 0x51}))
@@ -0,0 +1,96 @@
+import unittest
+
+from hamcrest import assert_that, is_, calling, raises
+
+from usb_iss import UsbIssError
+from usb_iss.i2c_direct import DirectSequence
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class TestDirectSequence(unittest.TestCase):
+    def test_write(self):
+        sequence = DirectSequence().write(0x20, [0x55])
+
+        assert_that(sequence.compile(), is_([
+            (bytes([0x01, 0x31, 0x40, 0x55, 0x03]), [0])]))
+
+    def test_read(self):
+        sequence = DirectSequence().read(0x20, 3)
+
+        assert_that(sequence.compile(), is_([
+            (bytes([0x01, 0x30, 0x41, 0x21, 0x04, 0x20, 0x03]), [3])]))
+
+    def test_read_single_byte(self):
+        sequence = DirectSequence().read(0x20, 1)
+
+        assert_that(sequence.compile(), is_([
+            (bytes([0x01, 0x30, 0x41, 0x04, 0x20, 0x03]), [1])]))
+
+    def test_write_register(self):
+        sequence = DirectSequence().write_register(0x50, 0x1234, [0xAA],
+                                                   register_size=2)
+
+        assert_that(sequence.compile(), is_([
+            (bytes([0x01, 0x33, 0xA0, 0x12, 0x34, 0xAA, 0x03]), [0])]))
+
+    def test_read_register(self):
+        sequence = DirectSequence().read_register(0x48, 0x05, 2)
+
+        assert_that(sequence.compile(), is_([
+            (bytes([0x01, 0x31, 0x90, 0x05, 0x02, 0x30, 0x91,
+                    0x20, 0x04, 0x20, 0x03]), [2])]))
+
+    def test_long_accesses_are_split(self):
+        sequence = (DirectSequence()
+                    .write(0x20, range(20))
+                    .read(0x20, 20))
+
+        (data, read_counts) = sequence.compile()[0]
+
+        assert_that(list(data[:2]), is_([0x01, 0x3F]))
+        assert_that(list(data[18:21]), is_([0x34, 15, 16]))
+        assert_that(list(data[-6:]), is_([0x41, 0x2F, 0x22, 0x04, 0x20, 0x03]))
+        assert_that(read_counts, is_([0, 20]))
+
+    def test_transactions_are_packed_into_commands(self):
+        sequence = DirectSequence()
+        for address in range(0x48, 0x50):
+            sequence.read_register(address, 0x00, 2)
+
+        compiled = sequence.compile()
+
+        assert_that([len(data) for (data, _) in compiled], is_([55, 33]))
+        assert_that([counts for (_, counts) in compiled],
+                    is_([[2, 2, 2, 2, 2], [2, 2, 2]]))
+
+    def test_commands_are_limited_by_read_count(self):
+        sequence = DirectSequence().read(0x20, 40).read(0x21, 40)
+
+        assert_that([counts for (_, counts) in sequence.compile()],
+                    is_([[40], [40]]))
+
+    def test_compile_is_cached(self):
+        sequence = DirectSequence().read(0x20, 1)
+
+        assert_that(sequence.compile(), is_(sequence.compile()))
+        compiled = sequence.compile()
+
+        sequence.read(0x21, 1)
+
+        assert_that(len(sequence.compile()[0][1]), is_(2))
+        assert_that(len(compiled[0][1]), is_(1))
+
+    def test_transaction_too_large(self):
+        assert_that(
+            calling(DirectSequence().read).with_args(0x20, 61),
+            raises(UsbIssError, "I2C transaction is too large"))
+
+    def test_invalid_register_size(self):
+        assert_that(
+            calling(DirectSequence().read_register).with_args(0x20, 0, 1, 3),
+            raises(UsbIssError, "Invalid register_size value"))
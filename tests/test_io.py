@@ -1,26 +1,42 @@
 import unittest
 # Py2 doesn't have mock included in unittest
 try:
-    from unittest.mock import Mock
+    from unittest.mock import patch
 except ImportError:
-    from mock import Mock
+    from mock import patch
+
+from array import array
+import sys
 
 from hamcrest import assert_that, is_, calling, raises
-from matchmock import called_once_with
+from matchmock import called_once_with, called_with
 
 from usb_iss import UsbIssError
+from usb_iss.driver import Driver
 from usb_iss.io import IO
 
 
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
 class TestIO(unittest.TestCase):
     def setUp(self):
-        self.driver = Mock()
-        self.io = IO(self.driver)
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+        self.serial.read.return_value = bytes([0xFF])
+
+        self.io = IO(Driver().open('PORTNAME'))
 
     def test_set_pins(self):
         self.io.set_pins(0, 1, 1, 1)
 
-        assert_that(self.driver.write_cmd, called_once_with(0x63, [0x0E]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x63, 0x0E])))
 
     def test_set_pins_with_invalid_values(self):
         assert_that(
@@ -28,26 +44,221 @@ class TestIO(unittest.TestCase):
             raises(UsbIssError))
 
     def test_set_pins_failure(self):
-        self.driver.check_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00])
 
         assert_that(
             calling(self.io.set_pins).with_args(0, 1, 1, 1),
-            raises(UsbIssError))
+            raises(UsbIssError, "Received 0x00 instead of ACK"))
+        assert_that(self.io.outputs, is_([0, 0, 0, 0]))
+
+    def test_set_pin_after_failure(self):
+        self.io.set_pins(1, 0, 0, 0)
+        self.serial.read.return_value = bytes([0x00])
+        assert_that(calling(self.io.set_pin).with_args(2, 1),
+                    raises(UsbIssError))
+        self.serial.read.return_value = bytes([0xFF])
+
+        self.io.set_pin(3, 1)
+
+        # Built on the acknowledged outputs, not the failed ones
+        assert_that(self.serial.write, called_with(bytes([0x63, 0x05])))
+        assert_that(self.io.outputs, is_([1, 0, 1, 0]))
+
+    def test_set_pin(self):
+        self.io.set_pins(0, 1, 0, 0)
+        self.io.set_pin(3, 1)
+
+        assert_that(self.serial.write, called_with(bytes([0x63, 0x06])))
+        assert_that(self.serial.read.call_count, is_(2))
+        assert_that(self.io.outputs, is_([0, 1, 1, 0]))
+
+    def test_set_pin_low(self):
+        self.io.set_pins(1, 1, 1, 1)
+        self.io.set_pin(1, 0)
+
+        assert_that(self.serial.write, called_with(bytes([0x63, 0x0E])))
+
+    def test_set_pin_invalid(self):
+        assert_that(calling(self.io.set_pin).with_args(0, 1),
+                    raises(UsbIssError, "Pin must be between 1 and 4"))
+        assert_that(calling(self.io.set_pin).with_args(1, 2),
+                    raises(UsbIssError, "Pin values must be 0 or 1"))
+
+    def test_toggle(self):
+        self.io.toggle(2)
+        self.io.toggle(4)
+        self.io.toggle(2)
+
+        assert_that(self.serial.write, called_with(bytes([0x63, 0x08])))
+        assert_that(self.io.outputs, is_([0, 0, 0, 1]))
+
+    def test_write_sequence(self):
+        self.serial.read.return_value = bytes([0xFF] * 3)
+
+        self.io.write_sequence([0x1, 0x3, 0x2])
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x63, 0x01, 0x63, 0x03, 0x63, 0x02])))
+        assert_that(self.serial.read, called_once_with(3))
+        assert_that(self.io.outputs, is_([0, 1, 0, 0]))
+
+    def test_write_sequence_failure(self):
+        self.serial.read.return_value = bytes([0xFF, 0x00, 0xFF])
+
+        assert_that(
+            calling(self.io.write_sequence).with_args([0x1, 0x3, 0x2]),
+            raises(UsbIssError, "Received 0x00 instead of ACK"))
+        assert_that(self.io.outputs, is_([0, 0, 0, 0]))
+
+    def test_write_sequence_invalid_pattern(self):
+        assert_that(
+            calling(self.io.write_sequence).with_args([0x1, 0x10]),
+            raises(UsbIssError, "Pin patterns must be between 0x0 and 0xF"))
+        assert_that(self.serial.write.called, is_(False))
 
     def test_get_pins(self):
-        self.driver.read.return_value = [0x0E]
+        self.serial.read.return_value = bytes([0x0E])
 
         data = self.io.get_pins()
 
-        assert_that(self.driver.write_cmd, called_once_with(0x64))
-        assert_that(self.driver.read, called_once_with(1))
+        assert_that(self.serial.write, called_once_with(bytes([0x64])))
+        assert_that(self.serial.read, called_once_with(1))
         assert_that(data, is_([0, 1, 1, 1]))
 
     def test_get_ad(self):
-        self.driver.read.return_value = [0x02, 0xA6]
+        self.serial.read.return_value = bytes([0x02, 0xA6])
 
         data = self.io.get_ad(1)
 
-        assert_that(self.driver.write_cmd, called_once_with(0x65, [1]))
-        assert_that(self.driver.read, called_once_with(2))
+        assert_that(self.serial.write, called_once_with(bytes([0x65, 1])))
+        assert_that(self.serial.read, called_once_with(2))
         assert_that(data, is_(0x02A6))
+
+
+class TestIOSample(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+
+        # Each GET_AD returns 0x0102, and GET_PINS returns 0x05
+        def read(byte_count):
+            writes = self.serial.write.call_args[0][0]
+            response = bytearray()
+            index = 0
+            while index < len(writes):
+                if writes[index] == 0x65:
+                    response += bytes([0x01, 0x02])
+                    index += 2
+                else:
+                    response += bytes([0x05])
+                    index += 1
+            assert_that(len(response), is_(byte_count))
+            return bytes(response)
+        self.serial.read.side_effect = read
+
+        # Fake clock, where each round trip takes 1ms
+        self.now = 0
+        self.sleeps = []
+
+        def monotonic_ns():
+            self.now += 500000
+            return self.now
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.now += int(seconds * 1e9)
+
+        patcher = patch('usb_iss.io.monotonic_ns')
+        self.addCleanup(patcher.stop)
+        patcher.start().side_effect = monotonic_ns
+
+        patcher = patch('usb_iss.io.sleep')
+        self.addCleanup(patcher.stop)
+        patcher.start().side_effect = sleep
+
+        self.io = IO(Driver().open('PORTNAME'))
+
+    def test_sample(self):
+        samples = self.io.sample([3, 4], 3)
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x65, 0x03, 0x65, 0x04] * 3)))
+        assert_that(samples.values, is_(array('H', [0x0102] * 6)))
+        assert_that(samples.channel(4), is_(array('H', [0x0102] * 3)))
+        assert_that(len(samples), is_(3))
+        assert_that(samples.digital, is_(None))
+
+    def test_sample_timestamps(self):
+        samples = self.io.sample([3], 2)
+
+        assert_that(samples.timestamps,
+                    is_(array('q', [1125000, 1375000])))
+
+    def test_sample_batches_fill_a_usb_packet(self):
+        self.io.sample([1, 2, 3, 4], 20)
+
+        # 8 bytes per sample, so 8 samples per write
+        assert_that([len(args[0]) for (args, _) in
+                     self.serial.write.call_args_list],
+                    is_([64, 64, 32]))
+
+    def test_sample_digital(self):
+        samples = self.io.sample([3], 2, digital=True)
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x65, 0x03, 0x64] * 2)))
+        assert_that(samples.digital, is_(array('B', [0x05, 0x05])))
+
+    def test_sample_oversample(self):
+        samples = self.io.sample([3], 2, oversample=4)
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x65, 0x03] * 8)))
+        assert_that(samples.values, is_(array('H', [0x0102] * 2)))
+
+    def test_sample_at_rate(self):
+        samples = self.io.sample([3], 3, rate_hz=100)
+
+        assert_that(self.serial.write.call_count, is_(3))
+        assert_that(self.sleeps, is_([0.008, 0.0085]))
+        assert_that(len(samples), is_(3))
+
+    def test_sample_at_rate_catches_up(self):
+        samples = self.io.sample([3], 10, rate_hz=10000)
+
+        # Each round trip takes long enough for more samples to fall due
+        assert_that([len(args[0]) // 2 for (args, _) in
+                     self.serial.write.call_args_list],
+                    is_([6, 4]))
+        assert_that(len(samples), is_(10))
+
+    def test_volts(self):
+        samples = self.io.sample([3], 1)
+
+        assert_that(samples.volts(3.3),
+                    is_(array('d', [0x0102 * 3.3 / 1023])))
+
+    def test_sample_invalid_parameters(self):
+        assert_that(calling(self.io.sample).with_args([], 10),
+                    raises(UsbIssError, "Invalid sample parameters"))
+
+    def test_sample_from_batch(self):
+        batch = IO(Driver().open('PORTNAME').pipeline())
+
+        assert_that(calling(batch.sample).with_args([3], 1),
+                    raises(UsbIssError, "isn't available from a batch"))
+        assert_that(self.serial.write.called, is_(False))
+
+    def test_start_watcher_from_batch(self):
+        batch = IO(Driver().open('PORTNAME').pipeline())
+
+        assert_that(calling(batch.start_watcher),
+                    raises(UsbIssError, "isn't available from a batch"))
+
+    def test_sample_numpy_missing(self):
+        with patch.dict(sys.modules, {"numpy": None}):
+            assert_that(
+                calling(self.io.sample).with_args([3], 1, use_numpy=True),
+                raises(UsbIssError, "use_numpy requires NumPy"))
+        assert_that(self.serial.write.called, is_(False))
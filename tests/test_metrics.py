@@ -0,0 +1,253 @@
+import os
+import shutil
+import tempfile
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from hamcrest import (assert_that, is_, calling, raises, contains_string,
+                      has_entries, has_key, close_to)
+
+from usb_iss import UsbIss, UsbIssError, defs
+from usb_iss.driver import Driver
+from usb_iss.emulator import Emulator, I2CMemory
+from usb_iss.exceptions import ResponseTimeoutError
+from usb_iss.metrics import LatencyHistogram, Metrics, PrometheusExporter
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_empty(self):
+        histogram = LatencyHistogram()
+
+        assert_that(histogram.percentile(50), is_(None))
+        assert_that(histogram.snapshot(), is_({"count": 0}))
+
+    def test_fixed_size(self):
+        histogram = LatencyHistogram()
+        size = len(histogram._counts)
+
+        for latency_ns in range(0, 10**11, 10**8):
+            histogram.record(latency_ns)
+
+        assert_that(len(histogram._counts), is_(size))
+        assert_that(histogram.count, is_(1000))
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for latency_us in range(1, 1001):
+            histogram.record(latency_us * 1000)
+
+        # Values are accurate to within 1/16
+        assert_that(histogram.percentile(50), close_to(500000, 500000 / 16))
+        assert_that(histogram.percentile(99), close_to(990000, 990000 / 16))
+        assert_that(histogram.percentile(100), is_(1000000))
+
+    def test_percentile_small_values(self):
+        histogram = LatencyHistogram()
+        histogram.record(3000)
+        histogram.record(3500)
+        histogram.record(5000)
+
+        assert_that(histogram.percentile(50), is_(3999))
+
+    def test_snapshot(self):
+        histogram = LatencyHistogram()
+        histogram.record(2000000)
+        histogram.record(4000000)
+
+        assert_that(histogram.snapshot(), has_entries(
+            count=2, sum=0.006, min=0.002, mean=0.003, max=0.004))
+
+
+class TestMetrics(unittest.TestCase):
+    def test_record(self):
+        metrics = Metrics()
+
+        metrics.record([(defs.Command.I2C_TEST.value, [0x40]),
+                        (defs.Command.I2C_TEST.value, [0x42])], 2, 1000000)
+
+        assert_that(metrics.snapshot()["I2C_TEST"], has_entries(
+            commands=2, writes=1, bytes_out=4, bytes_in=2, timeouts=0,
+            nacks=0))
+
+    def test_record_errors(self):
+        metrics = Metrics()
+
+        metrics.record([(defs.Command.GET_PINS.value, None)], 0, 1000,
+                       ResponseTimeoutError("Timed out"))
+        metrics.record([(defs.Command.GET_PINS.value, None)], 1, 1000,
+                       UsbIssError("Received NACK instead of ACK"))
+
+        assert_that(metrics.snapshot()["GET_PINS"],
+                    has_entries(writes=2, timeouts=1, nacks=1))
+
+    def test_unknown_command(self):
+        metrics = Metrics()
+
+        metrics.record([(0x42, None)], 0, 1000)
+
+        assert_that(metrics.snapshot(), has_key("0x42"))
+
+    def test_no_commands(self):
+        metrics = Metrics()
+
+        metrics.record([], 0, 1000)
+
+        assert_that(metrics.snapshot(), is_({}))
+
+    def test_reset(self):
+        metrics = Metrics()
+        metrics.record([(defs.Command.GET_PINS.value, None)], 1, 1000)
+
+        metrics.reset()
+
+        assert_that(metrics.snapshot(), is_({}))
+
+
+@patch('serial.Serial')
+class TestDriverMetrics(unittest.TestCase):
+    def test_disabled(self, serial):
+        driver = Driver().open('PORTNAME')
+        serial.return_value.read.return_value = bytes([0x0F])
+
+        driver.transact(defs.Command.GET_PINS.value, None, 1)
+
+        assert_that(driver.metrics, is_(None))
+
+    def test_transact(self, serial):
+        driver = Driver().open('PORTNAME')
+        driver.metrics = Metrics()
+        serial.return_value.read.return_value = bytes([0xFF, 0x00])
+
+        driver.transact(defs.Command.USB_ISS.value, [0x02, 0x40, 0x00], 2)
+
+        assert_that(driver.metrics.snapshot()["USB_ISS"], has_entries(
+            commands=1, writes=1, bytes_out=4, bytes_in=2))
+
+    def test_timeout(self, serial):
+        driver = Driver().open('PORTNAME')
+        driver.metrics = Metrics()
+        serial.return_value.read.return_value = bytes()
+
+        assert_that(
+            calling(driver.transact).with_args(
+                defs.Command.GET_AD.value, [0x01], 2),
+            raises(ResponseTimeoutError))
+        assert_that(driver.metrics.snapshot()["GET_AD"],
+                    has_entries(timeouts=1, bytes_in=0))
+
+    def test_pipeline(self, serial):
+        driver = Driver().open('PORTNAME')
+        driver.metrics = Metrics()
+        serial.return_value.read.return_value = bytes([0x0F, 0x00])
+
+        with driver.pipeline() as pipeline:
+            pipeline.transact(defs.Command.GET_PINS.value, None, 1)
+            pipeline.transact(defs.Command.SET_PINS.value, [0x01], 1)
+
+        snapshot = driver.metrics.snapshot()
+        assert_that(snapshot["GET_PINS"],
+                    has_entries(writes=1, bytes_out=1, bytes_in=1))
+        assert_that(snapshot["SET_PINS"],
+                    has_entries(writes=1, bytes_out=2, bytes_in=1))
+
+
+class TestUsbIssStats(unittest.TestCase):
+    def test_stats(self):
+        emulator = Emulator()
+        emulator.add_i2c_device(0x50, I2CMemory())
+        iss = UsbIss(emulator=emulator, metrics=True).open("emulated")
+        iss.setup_i2c()
+
+        iss.i2c.read(0x50, 0x00, 3)
+        assert_that(calling(iss.i2c.write).with_args(0x51, 0x00, [0x01]),
+                    raises(UsbIssError))
+
+        assert_that(iss.stats()["I2C_AD1"], has_entries(
+            commands=2, writes=2, bytes_out=9, bytes_in=4, nacks=1,
+            latency=has_entries(count=2)))
+
+    def test_stats_zero_length_blocks(self):
+        emulator = Emulator()
+        emulator.add_i2c_device(0x50, I2CMemory())
+        iss = UsbIss(emulator=emulator, metrics=True).open("emulated")
+        iss.setup_i2c()
+
+        assert_that(iss.i2c.read_block(0x50, 0x00, 0), is_([]))
+        iss.i2c.write_block(0x50, 0x00, [])
+
+        # Only the ISS_MODE command from setup_i2c is recorded
+        assert_that(list(iss.stats()), is_(["USB_ISS"]))
+
+    def test_stats_thread_safe(self):
+        iss = UsbIss(emulator=Emulator(), metrics=True, thread_safe=True)
+        iss.open("emulated")
+        try:
+            iss.io.get_pins()
+        finally:
+            iss.close()
+
+        assert_that(iss.stats()["GET_PINS"], has_entries(commands=1))
+
+    def test_stats_disabled(self):
+        iss = UsbIss(dummy=True)
+
+        assert_that(calling(iss.stats),
+                    raises(UsbIssError, r"UsbIss\(metrics=True\)"))
+
+
+class TestPrometheusExporter(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.record([(defs.Command.GET_PINS.value, None)], 1, 2000000)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "usb_iss.prom")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_text(self):
+        exporter = PrometheusExporter(self.metrics, self.path,
+                                      labels={"module": "00000001"})
+
+        text = exporter.text()
+
+        assert_that(text, contains_string(
+            "# TYPE usb_iss_commands_total counter\n"
+            'usb_iss_commands_total{module="00000001",'
+            'command="GET_PINS"} 1\n'))
+        assert_that(text, contains_string(
+            'usb_iss_latency_seconds{module="00000001",command="GET_PINS",'
+            'quantile="0.99"} 0.002000000\n'))
+        assert_that(text, contains_string(
+            'usb_iss_latency_seconds_count{module="00000001",'
+            'command="GET_PINS"} 1\n'))
+
+    def test_write(self):
+        PrometheusExporter(self.metrics, self.path).write()
+
+        with open(self.path) as prom_file:
+            assert_that(prom_file.read(), contains_string(
+                'usb_iss_bytes_in_total{command="GET_PINS"} 1\n'))
+        assert_that(os.listdir(self.directory), is_(["usb_iss.prom"]))
+
+    def test_start_stop(self):
+        exporter = PrometheusExporter(self.metrics, self.path).start(60)
+        assert_that(calling(exporter.start),
+                    raises(UsbIssError, r"already running"))
+
+        self.metrics.record([(defs.Command.SET_PINS.value, [0x01])], 1, 1000)
+        exporter.stop()
+
+        with open(self.path) as prom_file:
+            assert_that(prom_file.read(), contains_string("SET_PINS"))
+        assert_that(exporter._thread, is_(None))
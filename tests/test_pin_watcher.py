@@ -0,0 +1,131 @@
+import asyncio
+import time
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from hamcrest import assert_that, is_, calling, raises, greater_than
+
+from usb_iss import UsbIssError
+from usb_iss.io import IO
+from usb_iss.pin_watcher import PinWatcher, MIN_IDLE_NS
+
+
+class FakeDriver(object):
+    """
+    Returns each of a list of GET_PINS responses in turn, then keeps
+    returning the last one.
+    """
+    def __init__(self, states):
+        self.states = list(states)
+        self.writes = []
+        self.write_times = []
+
+    def commands(self, commands, reader):
+        self.writes.append(commands)
+        self.write_times.append(time.monotonic())
+        response = bytearray()
+        for _ in commands:
+            response.append(self.states[0])
+            if len(self.states) > 1:
+                self.states.pop(0)
+        return reader.parse(bytes(response))
+
+
+class TestPinWatcher(unittest.TestCase):
+    def watch(self, states, **kwargs):
+        drv = FakeDriver(states)
+        kwargs.setdefault('rate_hz', None)
+        watcher = IO(drv).start_watcher(**kwargs)
+        self.addCleanup(watcher.stop)
+
+        # Wait until every state has been polled
+        deadline = time.time() + 1.0
+        while watcher.polls < len(states) and time.time() < deadline:
+            time.sleep(0.001)
+        return (drv, watcher)
+
+    def test_edges(self):
+        (_, watcher) = self.watch([0x0, 0x0, 0x1, 0x1, 0x3, 0x2])
+
+        edges = [watcher.get(1.0) for _ in range(3)]
+
+        assert_that([(edge.pin, edge.value) for edge in edges],
+                    is_([(1, 1), (2, 1), (1, 0)]))
+        assert_that(edges[0].timestamp, greater_than(0))
+        assert_that(watcher.get(0), is_(None))
+        assert_that(watcher.edges_detected, is_(3))
+        assert_that(watcher.state, is_([0, 1, 0, 0]))
+
+    def test_polls_are_pipelined(self):
+        (drv, watcher) = self.watch([0x0] * 8, polls_per_write=8)
+
+        assert_that(len(drv.writes[0]), is_(8))
+        assert_that(drv.writes[0][0], is_((0x64, None)))
+
+    def test_polls_leave_port_idle(self):
+        (drv, watcher) = self.watch([0x0] * 12)
+
+        gaps = [later - earlier for (earlier, later)
+                in zip(drv.write_times, drv.write_times[1:])]
+        assert_that(min(gaps), greater_than(0.9 * MIN_IDLE_NS / 1e9))
+
+    def test_unwatched_pins_are_ignored(self):
+        (_, watcher) = self.watch([0x0, 0x4, 0x6], pins=[2])
+
+        edge = watcher.get(1.0)
+
+        assert_that((edge.pin, edge.value), is_((2, 1)))
+        assert_that(watcher.get(0), is_(None))
+
+    def test_buffer_overflow(self):
+        (_, watcher) = self.watch([0x0, 0x1] * 4, buffer_size=2)
+
+        assert_that(watcher.edges_detected, is_(7))
+        assert_that(watcher.edges_dropped, is_(5))
+        assert_that(watcher.get(0).value, is_(0))
+
+    def test_callback(self):
+        edges = []
+
+        (_, watcher) = self.watch([0x0, 0x8], callback=edges.append)
+
+        assert_that([(edge.pin, edge.value) for edge in edges],
+                    is_([(4, 1)]))
+        assert_that(watcher.get(0), is_(None))
+
+    def test_asyncio_queue(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        watcher = PinWatcher(IO(FakeDriver([0x0, 0x2])), rate_hz=None)
+        queue = watcher.asyncio_queue(loop)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+
+        edge = loop.run_until_complete(asyncio.wait_for(queue.get(), 1.0))
+
+        assert_that((edge.pin, edge.value), is_((2, 1)))
+
+    def test_error(self):
+        drv = MagicMock()
+        drv.commands.side_effect = UsbIssError("Expected 4 bytes")
+        watcher = IO(drv).start_watcher()
+
+        assert_that(calling(watcher.get).with_args(1.0),
+                    raises(UsbIssError, "Expected 4 bytes"))
+        assert_that(watcher.running, is_(False))
+
+    def test_invalid_pin(self):
+        assert_that(calling(PinWatcher).with_args(IO(None), pins=[5]),
+                    raises(UsbIssError, "Pin must be between 1 and 4"))
+
+    def test_start_twice(self):
+        (_, watcher) = self.watch([0x0])
+
+        assert_that(calling(watcher.start),
+                    raises(UsbIssError, "Pin watcher is already running"))
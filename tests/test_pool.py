@@ -0,0 +1,138 @@
+import threading
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch, MagicMock
+except ImportError:
+    from mock import patch, MagicMock
+
+from hamcrest import assert_that, is_, calling, raises, instance_of
+from matchmock import called_with
+
+from usb_iss import UsbIssError
+from usb_iss.exceptions import PoolError
+from usb_iss.pool import UsbIssPool
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+SERIAL_NUMBERS = {
+    'PORT0': b"00000001",
+    'PORT1': b"00000002",
+    'PORT2': b"00000003",
+}
+
+
+class TestUsbIssPool(unittest.TestCase):
+    def setUp(self):
+        self.ports = {}
+
+        def open_port(port, **_):
+            serial = MagicMock()
+            serial.read.side_effect = [SERIAL_NUMBERS[port]]
+            self.ports[port] = serial
+            return serial
+
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        patcher.start().side_effect = open_port
+
+        self.pool = UsbIssPool().open(sorted(SERIAL_NUMBERS))
+        self.addCleanup(self.pool.close)
+
+    def test_open(self):
+        assert_that(self.pool.serial_numbers,
+                    is_(["00000001", "00000002", "00000003"]))
+        assert_that(len(self.pool), is_(3))
+        for serial in self.ports.values():
+            assert_that(serial.write, called_with(bytes([0x5A, 0x03])))
+
+    def test_open_duplicate_serial_number(self):
+        pool = UsbIssPool()
+
+        assert_that(calling(pool.open).with_args(['PORT0', 'PORT0']),
+                    raises(UsbIssError, "00000001 found more than once"))
+        assert_that(len(pool), is_(0))
+
+    def test_open_failure_closes_other_ports(self):
+        pool = UsbIssPool()
+        SERIAL_NUMBERS['BAD'] = b""
+        self.addCleanup(SERIAL_NUMBERS.pop, 'BAD')
+
+        assert_that(calling(pool.open).with_args(['PORT0', 'BAD']),
+                    raises(UsbIssError, "Expected 8 bytes, but 0 received"))
+        assert_that(len(pool), is_(0))
+        assert_that(self.ports['PORT0'].close.called, is_(True))
+
+    def test_run_function(self):
+        result = self.pool.run(lambda usb_iss, value: value * 2, 21)
+
+        assert_that(result, is_({"00000001": 42,
+                                 "00000002": 42,
+                                 "00000003": 42}))
+
+    def test_run_method_name(self):
+        for serial in self.ports.values():
+            serial.read.side_effect = [bytes([0x11, 0x22])]
+
+        result = self.pool.run("i2c.read", 0x60, 0x02, 2)
+
+        assert_that(result["00000002"], is_([0x11, 0x22]))
+        for serial in self.ports.values():
+            assert_that(serial.write,
+                        called_with(bytes([0x55, 0xC1, 0x02, 0x02])))
+
+    def test_run_is_parallel(self):
+        barrier = threading.Barrier(3, timeout=1.0)
+
+        result = self.pool.run(lambda usb_iss: barrier.wait() >= 0)
+
+        assert_that(list(result.values()), is_([True, True, True]))
+
+    def test_run_on(self):
+        result = self.pool.run_on(["00000003"], lambda usb_iss: "done")
+
+        assert_that(result, is_({"00000003": "done"}))
+
+    def test_run_failure(self):
+        def job(usb_iss):
+            if usb_iss is self.pool["00000002"]:
+                raise UsbIssError("Fixture fault")
+            return "ok"
+
+        with self.assertRaises(PoolError) as context:
+            self.pool.run(job)
+
+        assert_that(context.exception.results,
+                    is_({"00000001": "ok", "00000003": "ok"}))
+        assert_that(context.exception.errors["00000002"],
+                    instance_of(UsbIssError))
+        assert_that(str(context.exception),
+                    is_("Job failed on 00000002: Fixture fault"))
+
+    def test_submit_runs_in_order(self):
+        calls = []
+
+        futures = [self.pool.submit("00000001",
+                                    lambda usb_iss, value: calls.append(value),
+                                    value)
+                   for value in range(10)]
+        for future in futures:
+            future.result(1.0)
+
+        assert_that(calls, is_(list(range(10))))
+
+    def test_submit_unknown_serial_number(self):
+        assert_that(
+            calling(self.pool.submit).with_args("99999999", len),
+            raises(UsbIssError, "No module with serial number 99999999"))
+
+    def test_close(self):
+        self.pool.close()
+
+        assert_that(len(self.pool), is_(0))
+        for serial in self.ports.values():
+            assert_that(serial.close.called, is_(True))
@@ -0,0 +1,199 @@
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from hamcrest import assert_that, is_, contains_exactly, starts_with
+
+from usb_iss import UsbIss
+from usb_iss.emulator import Emulator, I2CMemory
+from usb_iss.profile import Profiler, CallProfile, OTHER
+
+
+def profile_calls(profiler):
+    return sorted([(profile.adapter, profile.method, profile.calls)
+                   for profile in profiler.profiles])
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.emulator = Emulator()
+        self.emulator.add_i2c_device(0x50, I2CMemory(256))
+        self.iss = UsbIss(emulator=self.emulator).open("/dev/ttyACM0")
+        self.iss.setup_i2c()
+
+    def test_profile(self):
+        with self.iss.profile() as profiler:
+            self.iss.i2c.write(0x50, 0, [1, 2, 3])
+            self.iss.i2c.read(0x50, 0, 3)
+            self.iss.i2c.read(0x50, 0, 3)
+            self.iss.io.get_pins()
+
+        # Nested calls (i2c.read calls i2c.read_ad1) aren't counted
+        assert_that(profile_calls(profiler), is_([
+            ("ttyACM0", "i2c.read", 2),
+            ("ttyACM0", "i2c.write", 1),
+            ("ttyACM0", "io.get_pins", 1)]))
+
+    def test_phases(self):
+        with self.iss.profile() as profiler:
+            self.iss.i2c.read(0x50, 0, 3)
+
+        [profile] = profiler.profiles
+        assert_that(profile.total > 0)
+        assert_that(profile.write > 0)
+        assert_that(profile.wait > 0)
+        phases = (profile.encode + profile.write + profile.wait +
+                  profile.read + profile.decode)
+        self.assertAlmostEqual(phases, profile.total)
+        self.assertAlmostEqual(profile.host + profile.wire, profile.total)
+
+    @patch('usb_iss.profile.perf_counter')
+    def test_timing(self, perf_counter):
+        perf_counter.side_effect = [
+            1.0,           # Call starts
+            1.1, 1.3,      # Write
+            1.4, 1.9,      # First byte of the response
+            2.0, 2.1,      # Rest of the response header
+            2.15, 2.25,    # Received data
+            2.5]           # Call ends
+        self.iss.setup_i2c_serial()
+        self.emulator.serial_input([0x41, 0x42])
+        profiler = Profiler()
+
+        with self.iss.profile(profiler):
+            self.iss.serial.get_rx_count()
+
+        [profile] = profiler.profiles
+        assert_that(profile.calls, is_(1))
+        self.assertAlmostEqual(profile.total, 1.5)
+        self.assertAlmostEqual(profile.encode, 0.1)
+        self.assertAlmostEqual(profile.write, 0.2)
+        self.assertAlmostEqual(profile.wait, 0.5)
+        self.assertAlmostEqual(profile.read, 0.2)
+        self.assertAlmostEqual(profile.decode, 0.5)
+
+    def test_first_byte(self):
+        with self.iss.profile() as profiler:
+            data = self.iss.i2c.read(0x50, 0, 3)
+
+        # The response is read in one go, but the wait for its first byte
+        # is counted separately
+        [profile] = profiler.profiles
+        assert_that(data, is_([0, 0, 0]))
+        assert_that(profile.wait > 0)
+        assert_that(profile.read > 0)
+
+    def test_first_byte_readinto(self):
+        self.iss.setup_spi()
+        buffer = bytearray(4)
+
+        with self.iss.profile() as profiler:
+            self.iss.spi.transfer_into([1, 2, 3, 4], buffer)
+
+        [profile] = profiler.profiles
+        assert_that(buffer, is_(bytearray([1, 2, 3, 4])))
+        assert_that(profile.wait > 0)
+        assert_that(profile.read > 0)
+
+    def test_batch(self):
+        with self.iss.profile() as profiler:
+            with self.iss.batch() as batch:
+                batch.io.get_pins()
+
+        # The batch is flushed outside any profiled method
+        assert_that(profile_calls(profiler), is_([
+            ("ttyACM0", OTHER, 0),
+            ("ttyACM0", "batch", 1)]))
+
+    def test_restored(self):
+        serial = self.iss._port_drv._serial
+
+        with self.iss.profile():
+            pass
+
+        assert_that(self.iss._port_drv._serial, is_(serial))
+        assert_that("read" in vars(self.iss.i2c), is_(False))
+
+    def test_serial_timeout(self):
+        serial = self.iss._port_drv._serial
+
+        with self.iss.profile():
+            self.iss._port_drv._serial.timeout = 0.1
+
+        assert_that(serial.timeout, is_(0.1))
+
+    def test_shared_profiler(self):
+        other = UsbIss(emulator=Emulator()).open("COM3")
+        profiler = Profiler()
+
+        with self.iss.profile(profiler), other.profile(profiler):
+            self.iss.io.get_pins()
+            other.io.get_pins()
+            other.io.get_pins()
+
+        assert_that(profile_calls(profiler), is_([
+            ("COM3", "io.get_pins", 2),
+            ("ttyACM0", "io.get_pins", 1)]))
+
+    def test_name(self):
+        with self.iss.profile(name="sensor") as profiler:
+            self.iss.io.get_pins()
+
+        assert_that(profiler.profiles[0].adapter, is_("sensor"))
+
+    def test_top_and_report(self):
+        profiler = Profiler()
+        slow = profiler._get("COM3", "i2c.read")
+        slow.calls = 2
+        slow.total = 0.004
+        slow.wait = 0.003
+        slow.decode = 0.001
+        fast = profiler._get("COM3", "io.get_pins")
+        fast.calls = 1
+        fast.total = 0.001
+        fast.encode = 0.001
+
+        assert_that(profiler.top(1), contains_exactly(slow))
+        assert_that(profiler.top(key="encode"), contains_exactly(fast, slow))
+
+        lines = profiler.report().splitlines()
+        assert_that(lines[0], starts_with("adapter"))
+        assert_that(lines[1].split(), is_([
+            "COM3", "i2c.read", "2", "4.000", "2000.0",
+            "0.0%", "0.0%", "75.0%", "0.0%", "25.0%"]))
+        assert_that(len(lines), is_(3))
+
+    def test_reset(self):
+        with self.iss.profile() as profiler:
+            self.iss.io.get_pins()
+
+        profiler.reset()
+
+        assert_that(profiler.profiles, is_([]))
+
+    def test_thread_safe(self):
+        iss = UsbIss(emulator=Emulator(), thread_safe=True).open("COM3")
+
+        with iss.profile() as profiler:
+            iss.io.get_pins()
+
+        [profile] = profiler.profiles
+        assert_that(profile.method, is_("io.get_pins"))
+        assert_that(profile.wait > 0)
+        iss.close()
+
+
+class TestCallProfile(unittest.TestCase):
+    def test_host_and_wire(self):
+        profile = CallProfile("COM3", "i2c.read")
+        profile.encode = 1.0
+        profile.write = 2.0
+        profile.wait = 4.0
+        profile.read = 8.0
+        profile.decode = 16.0
+
+        assert_that(profile.host, is_(17.0))
+        assert_that(profile.wire, is_(14.0))
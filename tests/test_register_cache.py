@@ -0,0 +1,183 @@
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import MagicMock, call
+except ImportError:
+    from mock import MagicMock, call
+
+from hamcrest import assert_that, is_, calling, raises
+
+from usb_iss import UsbIssError
+from usb_iss.register_cache import RegisterCache
+
+
+class TestRegisterCache(unittest.TestCase):
+    def setUp(self):
+        self.memory = list(range(0x100))
+
+        def read_block(address, register, byte_count, register_size):
+            return self.memory[register:register + byte_count]
+
+        def write_block(address, register, data, register_size):
+            self.memory[register:register + len(data)] = list(data)
+
+        def write_blocks(address, blocks, register_size):
+            for (register, data) in blocks:
+                write_block(address, register, data, register_size)
+
+        self.i2c = MagicMock()
+        self.i2c.read_block.side_effect = read_block
+        self.i2c.write_block.side_effect = write_block
+        self.i2c.write_blocks.side_effect = write_blocks
+
+    def test_read_is_cached(self):
+        cache = RegisterCache(self.i2c, 0x60)
+
+        first = cache.read(0x10, 2)
+        second = cache.read(0x11)
+
+        assert_that(first, is_([0x10, 0x11]))
+        assert_that(second, is_([0x11]))
+        assert_that(self.i2c.read_block.call_args_list,
+                    is_([call(0x60, 0x10, 2, 1)]))
+
+    def test_partially_cached_read(self):
+        cache = RegisterCache(self.i2c, 0x60)
+        cache.read(0x10)
+
+        result = cache.read(0x10, 2)
+
+        assert_that(result, is_([0x10, 0x11]))
+        assert_that(self.i2c.read_block.call_count, is_(2))
+
+    def test_volatile_registers_are_always_read(self):
+        cache = RegisterCache(self.i2c, 0x60, volatile=[0x00])
+        cache.read(0x00)
+        self.memory[0x00] = 0xAA
+
+        result = cache.read(0x00)
+
+        assert_that(result, is_([0xAA]))
+        assert_that(self.i2c.read_block.call_count, is_(2))
+
+    def test_write_through(self):
+        cache = RegisterCache(self.i2c, 0x60, register_size=2)
+
+        cache.write(0x10, [0xAA, 0xBB])
+
+        assert_that(self.i2c.write_block.call_args_list,
+                    is_([call(0x60, 0x10, bytearray([0xAA, 0xBB]), 2)]))
+        assert_that(cache.read(0x10, 2), is_([0xAA, 0xBB]))
+        assert_that(self.i2c.read_block.called, is_(False))
+        assert_that(cache.dirty, is_([]))
+
+    def test_write_through_failure(self):
+        cache = RegisterCache(self.i2c, 0x60)
+        cache.read(0x10, 2)
+        self.i2c.write_block.side_effect = UsbIssError("NACK")
+
+        assert_that(calling(cache.write).with_args(0x10, [0xAA, 0xBB]),
+                    raises(UsbIssError))
+
+        # The registers are read from the device again
+        assert_that(cache.read(0x10, 2), is_([0x10, 0x11]))
+        assert_that(self.i2c.read_block.call_count, is_(2))
+
+    def test_write_back(self):
+        cache = RegisterCache(self.i2c, 0x60, write_back=True)
+
+        cache.write(0x10, [0xAA])
+
+        assert_that(self.i2c.write_block.called, is_(False))
+        assert_that(cache.dirty, is_([0x10]))
+        assert_that(cache.read(0x10), is_([0xAA]))
+
+    def test_write_back_volatile_register(self):
+        cache = RegisterCache(self.i2c, 0x60, write_back=True,
+                              volatile=[0x00])
+
+        cache.write(0x00, [0xAA])
+
+        assert_that(self.memory[0x00], is_(0xAA))
+        assert_that(cache.dirty, is_([]))
+
+    def test_read_keeps_dirty_values(self):
+        cache = RegisterCache(self.i2c, 0x60, write_back=True)
+        cache.write(0x11, [0xAA])
+
+        result = cache.read(0x10, 3)
+
+        assert_that(result, is_([0x10, 0xAA, 0x12]))
+        assert_that(cache.read(0x11), is_([0xAA]))
+
+    def test_update(self):
+        cache = RegisterCache(self.i2c, 0x60)
+
+        cache.update(0x10, mask=0x0F, value=0x05)
+        cache.update(0x10, mask=0xF0, value=0x30)
+
+        assert_that(self.memory[0x10], is_(0x35))
+        assert_that(self.i2c.read_block.call_count, is_(1))
+        assert_that(self.i2c.write_block.call_count, is_(2))
+
+    def test_update_without_change(self):
+        cache = RegisterCache(self.i2c, 0x60)
+
+        cache.update(0x10, mask=0x10, value=0x10)
+
+        assert_that(self.i2c.write_block.called, is_(False))
+
+    def test_flush_coalesces_contiguous_registers(self):
+        cache = RegisterCache(self.i2c, 0x60, write_back=True)
+        for register in [0x12, 0x10, 0x11, 0x20]:
+            cache.update(register, mask=0xFF, value=register + 0x80)
+
+        writes = cache.flush()
+
+        # Both blocks are sent together
+        assert_that(writes, is_(2))
+        assert_that(self.i2c.write_blocks.call_args_list, is_([
+            call(0x60, [(0x10, [0x90, 0x91, 0x92]), (0x20, [0xA0])], 1)]))
+        assert_that(cache.dirty, is_([]))
+        assert_that(cache.flush(), is_(0))
+
+    def test_flush_failure(self):
+        cache = RegisterCache(self.i2c, 0x60, write_back=True)
+        cache.write(0x10, [0xAA])
+        self.i2c.write_blocks.side_effect = UsbIssError("NACK")
+
+        assert_that(calling(cache.flush), raises(UsbIssError))
+        assert_that(cache.dirty, is_([0x10]))
+
+    def test_invalidate(self):
+        cache = RegisterCache(self.i2c, 0x60)
+        cache.read(0x10, 2)
+        self.memory[0x10] = 0xAA
+        self.memory[0x11] = 0xBB
+
+        cache.invalidate(0x10)
+
+        assert_that(cache.read(0x11), is_([0x11]))
+        assert_that(cache.read(0x10), is_([0xAA]))
+
+    def test_invalidate_all(self):
+        cache = RegisterCache(self.i2c, 0x60)
+        cache.read(0x10, 2)
+
+        cache.invalidate()
+        cache.read(0x10, 2)
+
+        assert_that(self.i2c.read_block.call_count, is_(2))
+
+    def test_invalidate_dirty_register(self):
+        cache = RegisterCache(self.i2c, 0x60, write_back=True)
+        cache.write(0x10, [0xAA])
+
+        assert_that(calling(cache.invalidate).with_args(0x10),
+                    raises(UsbIssError,
+                           "Attempted to invalidate dirty registers"))
+
+    def test_data_type(self):
+        cache = RegisterCache(self.i2c, 0x60, data_type=bytes)
+
+        assert_that(cache.read(0x41, 2), is_(b"AB"))
@@ -0,0 +1,226 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch, MagicMock, call
+except ImportError:
+    from mock import patch, MagicMock, call
+
+from hamcrest import assert_that, is_, calling, raises
+from matchmock import called_once_with
+
+from usb_iss import UsbIssError
+from usb_iss.register_map import RegisterMap, I2CRegisterBus, SPIRegisterBus
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DESCRIPTION = {
+    "registers": {
+        "CONFIG": {
+            "address": 0x10,
+            "fields": {"ENABLE": 7, "VSEL": "5:0"},
+        },
+        "STATUS": {
+            "address": 0x11,
+            "access": "ro",
+            "fields": {"PGOOD": 0, "FAULT": "3:1"},
+        },
+        "THRESHOLD": {
+            "address": 0x12,
+            "width": 16,
+            "fields": {"LOW": "7:0", "HIGH": "15:8"},
+        },
+        "OFFSET": {
+            "address": 0x20,
+            "width": 16,
+            "endianness": "little",
+        },
+        "COMMAND": {
+            "address": 0x30,
+            "access": "wo",
+            "reset": 0x80,
+            "fields": {"RESET": 0},
+        },
+    },
+}
+
+
+class TestRegisterMap(unittest.TestCase):
+    def setUp(self):
+        self.memory = [0] * 0x100
+        self.memory[0x10:0x14] = [0x85, 0x05, 0x12, 0x34]
+        self.memory[0x20:0x22] = [0x34, 0x12]
+
+        def read_block(address, register, byte_count, register_size):
+            return self.memory[register:register + byte_count]
+
+        def write_block(address, register, data, register_size):
+            self.memory[register:register + len(data)] = list(data)
+
+        self.i2c = MagicMock()
+        self.i2c.read_block.side_effect = read_block
+        self.i2c.write_block.side_effect = write_block
+
+        self.map = RegisterMap(DESCRIPTION)
+        self.device = self.map.bind(I2CRegisterBus(self.i2c, 0x60))
+
+    def test_read_field(self):
+        assert_that(self.device.read("CONFIG.ENABLE"), is_(1))
+        assert_that(self.device.read("CONFIG.VSEL"), is_(0x05))
+        assert_that(self.device.read("STATUS.FAULT"), is_(0x02))
+
+    def test_read_register(self):
+        assert_that(self.device.read("CONFIG"), is_(0x85))
+
+    def test_read_wide_register(self):
+        assert_that(self.device.read("THRESHOLD"), is_(0x1234))
+        assert_that(self.device.read("THRESHOLD.HIGH"), is_(0x12))
+        assert_that(self.device.read("OFFSET"), is_(0x1234))
+
+    def test_read_many_groups_adjacent_registers(self):
+        values = self.device.read_many(
+            ["CONFIG.ENABLE", "THRESHOLD.LOW", "STATUS.PGOOD", "OFFSET"])
+
+        assert_that(dict(values), is_({"CONFIG.ENABLE": 1,
+                                       "THRESHOLD.LOW": 0x34,
+                                       "STATUS.PGOOD": 1,
+                                       "OFFSET": 0x1234}))
+        assert_that(self.i2c.read_block.call_args_list, is_([
+            call(0x60, 0x10, 4, 1),
+            call(0x60, 0x20, 2, 1)]))
+
+    def test_read_without_auto_increment(self):
+        description = dict(DESCRIPTION, auto_increment=False)
+        device = RegisterMap(description).bind(I2CRegisterBus(self.i2c,
+                                                              0x60))
+
+        device.read_many(["CONFIG", "STATUS"])
+
+        assert_that(self.i2c.read_block.call_count, is_(2))
+
+    def test_write_field(self):
+        self.device.write("CONFIG.VSEL", 0x21)
+
+        assert_that(self.memory[0x10], is_(0xA1))
+        assert_that(self.i2c.read_block.call_args_list,
+                    is_([call(0x60, 0x10, 1, 1)]))
+
+    def test_write_whole_register_skips_read(self):
+        self.device.write_many({"THRESHOLD.LOW": 0x56,
+                                "THRESHOLD.HIGH": 0x78})
+
+        assert_that(self.memory[0x12:0x14], is_([0x78, 0x56]))
+        assert_that(self.i2c.read_block.called, is_(False))
+
+    def test_write_many_groups_adjacent_registers(self):
+        self.device.write_many({"CONFIG.ENABLE": 0, "THRESHOLD": 0xABCD})
+
+        assert_that(self.i2c.write_block.call_args_list, is_([
+            call(0x60, 0x10, bytearray([0x05]), 1),
+            call(0x60, 0x12, bytearray([0xAB, 0xCD]), 1)]))
+
+    def test_write_little_endian_register(self):
+        self.device.write("OFFSET", 0xABCD)
+
+        assert_that(self.memory[0x20:0x22], is_([0xCD, 0xAB]))
+
+    def test_write_only_register(self):
+        self.device.write("COMMAND.RESET", 1)
+
+        assert_that(self.memory[0x30], is_(0x81))
+        assert_that(self.i2c.read_block.called, is_(False))
+        assert_that(calling(self.device.read).with_args("COMMAND"),
+                    raises(UsbIssError, "Register COMMAND is write-only"))
+
+    def test_write_read_only_register(self):
+        assert_that(calling(self.device.write).with_args("STATUS.PGOOD", 0),
+                    raises(UsbIssError, "Register STATUS is read-only"))
+
+    def test_write_value_too_large(self):
+        assert_that(calling(self.device.write).with_args("CONFIG.VSEL", 0x40),
+                    raises(UsbIssError, "Value 0x40 doesn't fit in "
+                                        "CONFIG.VSEL"))
+
+    def test_unknown_name(self):
+        assert_that(calling(self.device.read).with_args("CONFIG.NONE"),
+                    raises(UsbIssError, "Unknown register or field "
+                                        "CONFIG.NONE"))
+
+    def test_names(self):
+        assert_that(self.map.names[:3],
+                    is_(["CONFIG", "CONFIG.ENABLE", "CONFIG.VSEL"]))
+
+    def test_invalid_description(self):
+        for (register, message) in [
+                ({"address": 0, "width": 12}, "invalid width 12"),
+                ({"address": 0, "access": "rx"}, "invalid access rx"),
+                ({"address": 0, "fields": {"F": "8:0"}},
+                 "Field REG.F is outside the register"),
+                ({"address": 0, "fields": {"F": "high"}},
+                 "Invalid field position high"),
+                ({"address": 0, "endianness": "middle"},
+                 "Invalid endianness middle")]:
+            description = {"registers": {"REG": register}}
+            assert_that(calling(RegisterMap).with_args(description),
+                        raises(UsbIssError, message))
+
+
+class TestSPIRegisterBus(unittest.TestCase):
+    def setUp(self):
+        self.spi = MagicMock()
+        self.spi.transfer.side_effect = (
+            lambda data: [0] + list(range(1, len(data))))
+
+        self.device = RegisterMap(DESCRIPTION).bind(SPIRegisterBus(self.spi))
+
+    def test_read(self):
+        values = self.device.read_many(["CONFIG", "STATUS"])
+
+        assert_that(dict(values), is_({"CONFIG": 1, "STATUS": 2}))
+        assert_that(self.spi.transfer, called_once_with(
+            bytearray([0x90, 0x00, 0x00])))
+
+    def test_write(self):
+        self.device.write("THRESHOLD", 0x1234)
+
+        assert_that(self.spi.transfer, called_once_with(
+            bytearray([0x12, 0x12, 0x34])))
+
+    def test_long_access_is_split(self):
+        bus = SPIRegisterBus(self.spi)
+
+        bus.write(0x00, range(100))
+
+        assert_that([len(args[0]) for (args, _) in
+                     self.spi.transfer.call_args_list], is_([62, 40]))
+        assert_that(self.spi.transfer.call_args_list[1][0][0][0], is_(61))
+
+
+class TestYaml(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "map.yaml")
+        with open(self.path, "w") as yaml_file:
+            yaml_file.write("registers:\n"
+                            "  CONFIG:\n"
+                            "    address: 0x10\n"
+                            "    fields: {ENABLE: 7, VSEL: \"5:0\"}\n")
+
+    @unittest.skipIf(yaml is None, "PyYAML is not installed")
+    def test_from_yaml(self):
+        register_map = RegisterMap.from_yaml(self.path)
+
+        assert_that(register_map.names,
+                    is_(["CONFIG", "CONFIG.ENABLE", "CONFIG.VSEL"]))
+
+    def test_from_yaml_without_pyyaml(self):
+        with patch.dict(sys.modules, {"yaml": None}):
+            assert_that(calling(RegisterMap.from_yaml).with_args(self.path),
+                        raises(UsbIssError, "requires PyYAML"))
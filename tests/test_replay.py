@@ -0,0 +1,102 @@
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from hamcrest import assert_that, is_, is_not, calling, raises
+from matchmock import called, called_once_with
+
+from usb_iss import UsbIss, UsbIssError
+from usb_iss.capture import Frame, WRITE, READ
+from usb_iss.exceptions import ResponseTimeoutError
+from usb_iss.replay import Replay
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+GET_PINS = [
+    Frame(0, WRITE, bytes([0x64])),
+    Frame(2000000, READ, bytes([0x05])),
+    Frame(3000000, WRITE, bytes([0x64])),
+    Frame(5000000, READ, bytes([0x0A])),
+]
+
+
+class TestReplay(unittest.TestCase):
+    def test_replay(self):
+        replay = Replay(GET_PINS)
+        iss = UsbIss(replay=replay).open("replay")
+
+        assert_that(iss.io.get_pins(), is_([1, 0, 1, 0]))
+        assert_that(replay.finished, is_(False))
+        assert_that(iss.io.get_pins(), is_([0, 1, 0, 1]))
+        assert_that(replay.finished, is_(True))
+        assert_that(replay.elapsed, is_(0.005))
+
+    def test_regrouped_writes(self):
+        replay = Replay(GET_PINS)
+        iss = UsbIss(replay=replay).open("replay")
+
+        with iss.batch() as batch:
+            first = batch.io.get_pins()
+            second = batch.io.get_pins()
+
+        assert_that(first.result(), is_([1, 0, 1, 0]))
+        assert_that(second.result(), is_([0, 1, 0, 1]))
+
+    def test_mismatch(self):
+        iss = UsbIss(replay=Replay(GET_PINS)).open("replay")
+
+        assert_that(calling(iss.io.get_ad).with_args(1), raises(
+            UsbIssError, r"Replay mismatch at frame 4: expected \[64 64\], "
+                         r"written \[65 01\]"))
+
+    def test_mismatch_not_strict(self):
+        replay = Replay(GET_PINS, strict=False)
+
+        replay.write([0x63])
+
+        assert_that(replay.mismatches, is_(1))
+        assert_that(replay.read(1), is_(bytes([0x05])))
+
+    def test_end_of_capture(self):
+        iss = UsbIss(replay=Replay(GET_PINS[:2])).open("replay")
+        iss.io.get_pins()
+
+        assert_that(calling(iss.io.get_pins),
+                    raises(UsbIssError, r"end of the capture"))
+
+    def test_timeout(self):
+        replay = Replay([Frame(0, WRITE, bytes([0x65, 0x01])),
+                         Frame(500000000, READ, bytes([0x01]))])
+        iss = UsbIss(replay=replay).open("replay")
+
+        assert_that(calling(iss.io.get_ad).with_args(1),
+                    raises(ResponseTimeoutError))
+
+    @patch('usb_iss.replay.sleep')
+    @patch('usb_iss.replay.monotonic_ns')
+    def test_realtime(self, monotonic_ns, sleep):
+        # The read is requested 0.5ms after the write
+        monotonic_ns.side_effect = [10**9, 10**9 + 500000]
+        replay = Replay(GET_PINS, realtime=True)
+
+        replay.write([0x64])
+
+        assert_that(replay.read(1), is_(bytes([0x05])))
+        # The response arrived 2ms after the write in the capture
+        assert_that(sleep, called_once_with(0.0015))
+
+    @patch('usb_iss.replay.sleep')
+    def test_as_fast_as_possible(self, sleep):
+        replay = Replay(GET_PINS)
+
+        replay.write([0x64])
+
+        assert_that(replay.read(1), is_(bytes([0x05])))
+        assert_that(sleep, is_not(called()))
@@ -1,10 +1,9 @@
 import unittest
-from datetime import datetime, timedelta
 # Py2 doesn't have mock included in unittest
 try:
-    from unittest.mock import Mock, patch
+    from unittest.mock import MagicMock, patch
 except ImportError:
-    from mock import Mock, patch
+    from mock import MagicMock, patch
 
 from hamcrest import assert_that, is_, greater_than, less_than, calling
 from hamcrest import raises
@@ -18,19 +17,32 @@ EMPTY_READS = [[0xFF, 0x00, 0x00]] * 100
 
 class TestSerial(unittest.TestCase):
     def setUp(self):
-        self.driver = Mock()
+        self.driver = MagicMock()
+
+        def command(command, data, reader):
+            self.driver.write_cmd(command, data)
+            return reader(self.driver)
+        self.driver.command.side_effect = command
         self.serial = Serial(self.driver)
 
-        self.current_time = datetime(2000, 1, 1)
+        self.current_time = 1000.0
+        self.sleeps = []
 
-        def now_side_effect():
-            self.current_time += timedelta(milliseconds=10)
+        def monotonic_side_effect():
+            self.current_time += 0.001
             return self.current_time
 
-        patcher = patch('usb_iss.serial_.datetime')
+        def sleep_side_effect(seconds):
+            self.sleeps.append(seconds)
+            self.current_time += seconds
+
+        patcher = patch('usb_iss.serial_.monotonic')
+        self.addCleanup(patcher.stop)
+        patcher.start().side_effect = monotonic_side_effect
+
+        patcher = patch('usb_iss.serial_.sleep')
         self.addCleanup(patcher.stop)
-        datetime_mock = patcher.start()
-        datetime_mock.now.side_effect = now_side_effect
+        patcher.start().side_effect = sleep_side_effect
 
     def test_transmit(self):
         self.driver.read.side_effect = EMPTY_READS
@@ -52,8 +64,17 @@ class TestSerial(unittest.TestCase):
         assert_that(self.driver.read, called_with(2))
 
         elapsed_time = self.current_time - start_time
-        assert_that(elapsed_time, greater_than(timedelta(milliseconds=100)))
-        assert_that(elapsed_time, less_than(timedelta(milliseconds=200)))
+        assert_that(elapsed_time, greater_than(0.1))
+        assert_that(elapsed_time, less_than(0.2))
+
+    def test_receive_as_bytes(self):
+        self.driver.read.side_effect = [[0xFF, 0x1E, 0x02],
+                                        [0x48, 0x69]] + EMPTY_READS
+        serial = Serial(self.driver, data_type=bytes)
+
+        data = serial.receive()
+
+        assert_that(data, is_(b"Hi"))
 
     def test_receive_after_delay(self):
         self.driver.read.side_effect = [
@@ -84,8 +105,44 @@ class TestSerial(unittest.TestCase):
         assert_that(self.driver.read, called_with(1))
 
         elapsed_time = self.current_time - start_time
-        assert_that(elapsed_time, greater_than(timedelta(milliseconds=100)))
-        assert_that(elapsed_time, less_than(timedelta(milliseconds=200)))
+        assert_that(elapsed_time, greater_than(0.1))
+        assert_that(elapsed_time, less_than(0.2))
+
+    def test_receive_backs_off_when_idle(self):
+        self.driver.read.side_effect = EMPTY_READS
+
+        self.serial.receive()
+
+        assert_that(self.sleeps[0], is_(0.002))
+        assert_that(self.sleeps[1], is_(0.004))
+        assert_that(max(self.sleeps), less_than(0.033))
+        assert_that(len(self.sleeps), less_than(10))
+
+    def test_receive_polls_quickly_when_data_arrives(self):
+        self.driver.read.side_effect = [[0xFF, 0x1E, 0x00],
+                                        [0xFF, 0x1E, 0x00],
+                                        [0xFF, 0x1E, 0x01],
+                                        [0x48]] + EMPTY_READS
+
+        self.serial.receive()
+
+        assert_that(self.sleeps[2], is_(0.001))
+
+    def test_receive_max_poll_rate(self):
+        self.driver.read.side_effect = EMPTY_READS
+        self.serial.max_poll_rate_hz = 100
+
+        self.serial.receive()
+
+        assert_that(min(self.sleeps[:-1]), is_(0.02))
+
+    def test_receive_idle_poll_interval_follows_baud_rate(self):
+        self.driver.read.side_effect = EMPTY_READS
+        self.serial.baud_rate = 115200
+
+        self.serial.receive()
+
+        assert_that(max(self.sleeps), less_than(0.003))
 
     def test_receive_error(self):
         self.driver.read.return_value = [0x00, 0x1E, 0x00]
@@ -0,0 +1,186 @@
+import threading
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from hamcrest import assert_that, is_, calling, raises
+
+from usb_iss.serial_ import Serial
+from usb_iss.serial_reader import RingBuffer, Overflow
+from usb_iss import UsbIssError
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+EMPTY_READ = [0xFF, 0x1E, 0x00]
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_write_and_read(self):
+        ring = RingBuffer(8)
+
+        ring.write(b"abc")
+
+        assert_that(len(ring), is_(3))
+        assert_that(ring.read(2), is_(b"ab"))
+        assert_that(ring.read(5), is_(b"c"))
+        assert_that(len(ring), is_(0))
+
+    def test_write_when_full(self):
+        ring = RingBuffer(4)
+
+        written = ring.write(b"abcdef")
+
+        assert_that(written, is_(4))
+        assert_that(ring.read(10), is_(b"abcd"))
+
+    def test_wrap_around(self):
+        ring = RingBuffer(4)
+        ring.write(b"abc")
+        ring.read(2)
+
+        ring.write(b"def")
+
+        assert_that(ring.free, is_(0))
+        assert_that(ring.read(4), is_(b"cdef"))
+
+    def test_find_across_wrap(self):
+        ring = RingBuffer(4)
+        ring.write(b"abc")
+        ring.read(2)
+        ring.write(b"\r\n")
+
+        assert_that(ring.find(b"\r\n"), is_(1))
+        assert_that(ring.find(b"x"), is_(-1))
+        assert_that(ring.read(3), is_(b"c\r\n"))
+
+
+class TestSerialReader(unittest.TestCase):
+    def setUp(self):
+        self.driver = MagicMock()
+
+        def command(command, data, reader):
+            self.driver.write_cmd(command, data)
+            return reader(self.driver)
+        self.driver.command.side_effect = command
+        self.serial = Serial(self.driver, data_type=bytes)
+        self.serial.baud_rate = 115200
+        self.idle = threading.Event()
+
+    def set_responses(self, responses):
+        responses = list(responses)
+
+        def read(_):
+            if responses:
+                return responses.pop(0)
+            self.idle.set()
+            return EMPTY_READ
+        self.driver.read.side_effect = read
+
+    def start_reader(self, **kwargs):
+        reader = self.serial.start_reader(**kwargs)
+        self.addCleanup(reader.stop)
+        return reader
+
+    def test_read(self):
+        self.set_responses([[0xFF, 0x1E, 0x02], [0x48, 0x69],
+                            [0xFF, 0x1E, 0x01], [0x21]])
+        reader = self.start_reader()
+
+        assert_that(reader.read(3, timeout=1.0), is_(b"Hi!"))
+        assert_that(reader.bytes_received, is_(3))
+
+    def test_read_timeout(self):
+        self.set_responses([[0xFF, 0x1E, 0x02], [0x48, 0x69]])
+        reader = self.start_reader()
+
+        assert_that(reader.read(3, timeout=0.05), is_(b"Hi"))
+
+    def test_read_after_stop(self):
+        self.set_responses([[0xFF, 0x1E, 0x02], [0x48, 0x69]])
+        reader = self.start_reader()
+        self.idle.wait(1.0)
+
+        reader.stop()
+
+        assert_that(reader.running, is_(False))
+        assert_that(reader.in_waiting, is_(2))
+        assert_that(reader.read(3), is_(b"Hi"))
+
+    def test_read_until(self):
+        self.set_responses([[0xFF, 0x1E, 0x03], [0x48, 0x69, 0x0A],
+                            [0xFF, 0x1E, 0x01], [0x21]])
+        reader = self.start_reader()
+
+        assert_that(reader.read_until(b"\n", timeout=1.0), is_(b"Hi\n"))
+        assert_that(reader.read(1, timeout=1.0), is_(b"!"))
+
+    def test_read_until_timeout(self):
+        self.set_responses([[0xFF, 0x1E, 0x02], [0x48, 0x69]])
+        reader = self.start_reader()
+        self.idle.wait(1.0)
+
+        assert_that(reader.read_until(b"\n", timeout=0.01), is_(b"Hi"))
+
+    def test_callback(self):
+        chunks = []
+        self.set_responses([[0xFF, 0x1E, 0x02], [0x48, 0x69],
+                            [0xFF, 0x1E, 0x01], [0x21]])
+
+        reader = self.start_reader(callback=chunks.append)
+        self.idle.wait(1.0)
+
+        assert_that(chunks, is_([b"Hi", b"!"]))
+        assert_that(reader.in_waiting, is_(0))
+
+    def test_overflow_drop_oldest(self):
+        self.set_responses([[0xFF, 0x1E, 0x03], [0x01, 0x02, 0x03],
+                            [0xFF, 0x1E, 0x03], [0x04, 0x05, 0x06]])
+        reader = self.start_reader(buffer_size=4)
+        self.idle.wait(1.0)
+
+        assert_that(reader.read(4, timeout=1.0), is_(bytes([3, 4, 5, 6])))
+        assert_that(reader.bytes_dropped, is_(2))
+        assert_that(reader.overflow_count, is_(1))
+
+    def test_overflow_drop_newest(self):
+        self.set_responses([[0xFF, 0x1E, 0x03], [0x01, 0x02, 0x03],
+                            [0xFF, 0x1E, 0x03], [0x04, 0x05, 0x06]])
+        reader = self.start_reader(buffer_size=4,
+                                   overflow=Overflow.DROP_NEWEST)
+        self.idle.wait(1.0)
+
+        assert_that(reader.read(4, timeout=1.0), is_(bytes([1, 2, 3, 4])))
+        assert_that(reader.bytes_dropped, is_(2))
+
+    def test_overflow_raise(self):
+        self.set_responses([[0xFF, 0x1E, 0x03], [0x01, 0x02, 0x03],
+                            [0xFF, 0x1E, 0x03], [0x04, 0x05, 0x06]])
+        reader = self.start_reader(buffer_size=4, overflow=Overflow.RAISE)
+        self.idle.wait(1.0)
+
+        assert_that(
+            calling(reader.read).with_args(4, timeout=1.0),
+            raises(UsbIssError, "Serial receive buffer overflow, 2 bytes"))
+        assert_that(reader.read(4, timeout=1.0), is_(bytes([1, 2, 3, 4])))
+
+    def test_poll_failure(self):
+        self.set_responses([[0x00, 0x1E, 0x00]])
+        reader = self.start_reader()
+
+        assert_that(
+            calling(reader.read).with_args(1, timeout=1.0),
+            raises(UsbIssError, "NACK received - transmit buffer overflow"))
+
+    def test_start_twice(self):
+        self.set_responses([])
+        reader = self.start_reader()
+
+        assert_that(calling(reader.start),
+                    raises(UsbIssError, "Serial reader is already running"))
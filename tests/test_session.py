@@ -0,0 +1,261 @@
+import threading
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch, call
+except ImportError:
+    from mock import patch, call
+
+from hamcrest import assert_that, is_, calling, raises
+from matchmock import called_once_with
+
+from usb_iss import UsbIss, UsbIssError, defs, session
+from usb_iss.driver import Driver, _FixedReader
+from usb_iss.emulator import Emulator
+from usb_iss.session import Session
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+        self.serial.read.side_effect = lambda count: bytes(range(count))
+
+        self.session = Session(Driver()).open('PORTNAME')
+        self.addCleanup(self.session.stop)
+
+    def block_worker(self):
+        """
+        Keep the worker busy reading the response to a first command, so
+        that further commands pile up in the queue. Returns the event that
+        releases it.
+        """
+        release = threading.Event()
+        reading = threading.Event()
+
+        def read(count):
+            reading.set()
+            release.wait(1.0)
+            return bytes(range(count))
+        self.serial.read.side_effect = read
+
+        self.session.submit([(0x11, None)], _FixedReader(1))
+        reading.wait(1.0)
+        return release
+
+    def test_transact(self):
+        result = self.session.transact(0x88, [0x01], 3)
+
+        assert_that(result, is_(bytes([0x00, 0x01, 0x02])))
+        assert_that(self.serial.write, called_once_with(bytes([0x88, 0x01])))
+
+    def test_queued_commands_are_written_together(self):
+        release = self.block_worker()
+        first = self.session.submit([(0x88, [0x01])], _FixedReader(1))
+        second = self.session.submit([(0x99, None)], _FixedReader(2))
+
+        release.set()
+
+        # The responses are read back together too
+        assert_that(first.result(1.0), is_(bytes([0x00])))
+        assert_that(second.result(1.0), is_(bytes([0x01, 0x02])))
+        assert_that(self.serial.write.call_args_list, is_([
+            call(bytes([0x11])),
+            call(bytes([0x88, 0x01, 0x99])),
+        ]))
+
+    def test_spi_ends_write(self):
+        release = self.block_worker()
+        spi = self.session.submit([(0x61, [0x01, 0x02])], _FixedReader(3))
+        get_pins = self.session.submit([(0x64, None)], _FixedReader(1))
+
+        release.set()
+
+        assert_that(spi.result(1.0), is_(bytes([0x00, 0x01, 0x02])))
+        assert_that(get_pins.result(1.0), is_(bytes([0x00])))
+        assert_that(self.serial.write.call_args_list, is_([
+            call(bytes([0x11])),
+            call(bytes([0x61, 0x01, 0x02])),
+            call(bytes([0x64])),
+        ]))
+
+    def test_no_direct_access(self):
+        assert_that(calling(self.session.write_cmds).with_args([(0x11, None)]),
+                    raises(UsbIssError, "can't be used directly"))
+        assert_that(
+            calling(self.session.at_priority(0).read).with_args(1),
+            raises(UsbIssError, "can't be used directly"))
+
+    def test_priority_order(self):
+        release = self.block_worker()
+        low = self.session.submit([(0x22, None)], _FixedReader(1),
+                                  session.PRIORITY_LOW)
+        self.session.submit([(0x33, None)], _FixedReader(1),
+                            session.PRIORITY_NORMAL)
+        self.session.submit([(0x44, None)], _FixedReader(1),
+                            session.PRIORITY_HIGH)
+
+        release.set()
+        low.result(1.0)
+
+        assert_that(self.serial.write.call_args,
+                    is_(call(bytes([0x44, 0x33, 0x22]))))
+
+    def test_max_batch(self):
+        self.session.max_batch = 2
+        release = self.block_worker()
+        results = [self.session.submit([(command, None)], _FixedReader(1))
+                   for command in [0x22, 0x33, 0x44]]
+
+        release.set()
+        results[-1].result(1.0)
+
+        assert_that(self.serial.write.call_args_list[1:], is_([
+            call(bytes([0x22, 0x33])),
+            call(bytes([0x44])),
+        ]))
+
+    def test_failure_is_returned_to_caller(self):
+        self.serial.read.side_effect = None
+        self.serial.read.return_value = bytes([])
+
+        assert_that(
+            calling(self.session.transact).with_args(0x88, None, 1),
+            raises(UsbIssError, "Expected 1 bytes, but 0 received"))
+
+    def test_write_failure_is_returned_to_caller(self):
+        self.serial.write.side_effect = IOError("Device disconnected")
+
+        assert_that(
+            calling(self.session.transact).with_args(0x88, None, 1),
+            raises(IOError, "Device disconnected"))
+
+    def test_submit_after_stop(self):
+        self.session.stop()
+
+        assert_that(
+            calling(self.session.transact).with_args(0x88, None, 1),
+            raises(UsbIssError, "Session is not running"))
+
+    def test_stop_fails_queued_commands(self):
+        release = self.block_worker()
+        queued = self.session.submit([(0x22, None)], _FixedReader(1))
+
+        stopper = threading.Thread(target=self.session.stop)
+        stopper.start()
+        release.set()
+        stopper.join()
+
+        assert_that(calling(queued.result).with_args(1.0),
+                    raises(UsbIssError, "Session has been closed"))
+
+    def test_many_threads(self):
+        self.serial.read.side_effect = lambda count: bytes([0x42] * count)
+        results = {}
+
+        def worker(address):
+            results[address] = self.session.transact(address, None, 2)
+
+        threads = [threading.Thread(target=worker, args=(address,))
+                   for address in range(0x10, 0x20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(results, is_({address: bytes([0x42, 0x42])
+                                  for address in range(0x10, 0x20)}))
+
+
+class TestThreadSafeUsbIss(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+        self.serial.read.return_value = bytes([0xFF])
+
+        self.usb_iss = UsbIss(thread_safe=True).open('PORTNAME')
+        self.addCleanup(self.usb_iss.close)
+
+    def test_i2c(self):
+        self.usb_iss.i2c.write(0x70, 0x00, [0x51])
+
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x55, 0xE0, 0x00, 0x01, 0x51])))
+
+    def test_priority(self):
+        self.serial.read.return_value = bytes([0x11])
+
+        data = self.usb_iss.priority(session.PRIORITY_HIGH).i2c.read(
+            0x60, 0x02, 1)
+
+        assert_that(data, is_([0x11]))
+
+    def test_batch(self):
+        self.serial.read.return_value = bytes([0xFF, 0xFF])
+
+        with self.usb_iss.batch() as batch:
+            first = batch.i2c.write(0x70, 0x00, [0x51])
+            second = batch.i2c.write(0x70, 0x01, [0x52])
+
+        assert_that(first.result(1.0), is_(None))
+        assert_that(second.result(1.0), is_(None))
+        assert_that(self.serial.write, called_once_with(bytes([
+            0x55, 0xE0, 0x00, 0x01, 0x51,
+            0x55, 0xE0, 0x01, 0x01, 0x52])))
+
+    def test_spi_transfer_stream(self):
+        self.serial.read.side_effect = [bytes([0xFF] + [0x11] * 62),
+                                        bytes([0xFF, 0x22])]
+
+        data = b"".join(self.usb_iss.spi.transfer_stream([0] * 63))
+
+        assert_that(data, is_(bytes([0x11] * 62 + [0x22])))
+        assert_that(self.serial.write.call_args_list, is_([
+            call(bytes([0x61] + [0] * 62)),
+            call(bytes([0x61, 0])),
+        ]))
+
+    def test_priority_requires_thread_safe(self):
+        usb_iss = UsbIss()
+
+        assert_that(calling(usb_iss.priority).with_args(0),
+                    raises(UsbIssError, "require UsbIss"))
+
+
+class TestThreadSafeIO(unittest.TestCase):
+    def setUp(self):
+        self.emulator = Emulator()
+        self.usb_iss = UsbIss(emulator=self.emulator,
+                              thread_safe=True).open("COM3")
+        self.addCleanup(self.usb_iss.close)
+
+    def test_set_pin_during_setup_io(self):
+        # Decoding the setup_io response on the worker thread updates the
+        # output values while set_pin is waiting for its own response
+        def configure():
+            for _ in range(200):
+                self.usb_iss.setup_io(defs.IOType.OUTPUT_LOW,
+                                      defs.IOType.OUTPUT_LOW)
+
+        def write():
+            for count in range(200):
+                self.usb_iss.io.set_pin(3, count & 1)
+
+        threads = [threading.Thread(target=configure),
+                   threading.Thread(target=write)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(5.0)
+
+        assert_that([thread.is_alive() for thread in threads],
+                    is_([False, False]))
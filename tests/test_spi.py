@@ -1,51 +1,157 @@
 import unittest
 # Py2 doesn't have mock included in unittest
 try:
-    from unittest.mock import Mock
+    from unittest.mock import call, patch
 except ImportError:
-    from mock import Mock
+    from mock import call, patch
 
 from hamcrest import assert_that, is_, calling, raises
 from matchmock import called_once_with
 
+from usb_iss.driver import Driver
 from usb_iss.spi import SPI
 from usb_iss import UsbIssError
 
 
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
 class TestSPI(unittest.TestCase):
     def setUp(self):
-        self.driver = Mock()
-        self.spi = SPI(self.driver)
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial = patcher.start()()
+        self.serial.read.return_value = bytes([0xFF])
+
+        self.spi = SPI(Driver().open('PORTNAME'))
 
     def test_transfer(self):
-        self.driver.read.return_value = [0x11, 0x22]
+        self.serial.read.return_value = bytes([0xFF, 0x11, 0x22])
 
         result = self.spi.transfer([0x01, 0x41])
 
         assert_that(result, is_([0x11, 0x22]))
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x61, [0x01, 0x41]))
-        assert_that(self.driver.read, called_once_with(2))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x61, 0x01, 0x41])))
+        assert_that(self.serial.read, called_once_with(3))
 
     def test_transfer_failure(self):
-        self.driver.check_ack.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x00, 0x00])
 
         assert_that(
             calling(self.spi.transfer).with_args([0x01, 0x41]),
-            raises(UsbIssError))
+            raises(UsbIssError, "Received 0x00 instead of ACK"))
 
     def test_transfer_max_length(self):
-        self.driver.read.return_value = list(range(62))
+        self.serial.read.return_value = bytes([0xFF] + list(range(62)))
 
         result = self.spi.transfer(list(range(62)))
 
         assert_that(result, is_(list(range(62))))
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x61, list(range(62))))
-        assert_that(self.driver.read, called_once_with(62))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x61] + list(range(62)))))
+        assert_that(self.serial.read, called_once_with(63))
 
     def test_transfer_too_long(self):
 
         assert_that(
             calling(self.spi.transfer).with_args(list(range(63))),
             raises(UsbIssError, "Attempted to write 63 bytes, maximum is 62"))
+
+    def test_transfer_as_bytearray(self):
+        self.serial.read.return_value = bytes([0xFF, 0x11, 0x22])
+        spi = SPI(Driver().open('PORTNAME'), data_type=bytearray)
+
+        result = spi.transfer(b"\x01\x41")
+
+        assert_that(result, is_(bytearray([0x11, 0x22])))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x61, 0x01, 0x41])))
+
+    def test_transfer_into(self):
+        def readinto(view):
+            view[:] = bytes([0xFF, 0x11, 0x22])
+            return 3
+        self.serial.readinto.side_effect = readinto
+        buffer = bytearray(2)
+
+        count = self.spi.transfer_into([0x01, 0x41], buffer)
+
+        # The ACK and data are read together
+        assert_that(count, is_(2))
+        assert_that(buffer, is_(bytearray([0x11, 0x22])))
+        assert_that(self.serial.readinto.call_count, is_(1))
+        assert_that(self.serial.read.called, is_(False))
+
+    def test_transfer_into_failure(self):
+        def readinto(view):
+            view[:] = bytes([0x00, 0x11])
+            return 2
+        self.serial.readinto.side_effect = readinto
+
+        assert_that(
+            calling(self.spi.transfer_into).with_args([0x01], bytearray(1)),
+            raises(UsbIssError, "Received 0x00 instead of ACK"))
+
+    def test_transfer_into_wrong_buffer_size(self):
+        assert_that(
+            calling(self.spi.transfer_into).with_args([0x01], bytearray(2)),
+            raises(UsbIssError, "Read buffer is 2 bytes"))
+
+    def test_transfer_stream(self):
+        write_data = bytes(range(130))
+        self.serial.read.side_effect = [bytes([0xFF] + list(range(62))),
+                                        bytes([0xFF] + list(range(62, 124))),
+                                        bytes([0xFF] + list(range(124, 130)))]
+
+        result = list(self.spi.transfer_stream(write_data))
+
+        # One SPI command per write
+        assert_that(self.serial.write.call_args_list, is_([
+            call(bytes([0x61] + list(range(62)))),
+            call(bytes([0x61] + list(range(62, 124)))),
+            call(bytes([0x61] + list(range(124, 130)))),
+        ]))
+        assert_that([bytes(chunk) for chunk in result],
+                    is_([bytes(range(62)),
+                         bytes(range(62, 124)),
+                         bytes(range(124, 130))]))
+
+    def test_transfer_stream_from_chunks(self):
+        self.serial.read.side_effect = [bytes([0xFF] + list(range(62))),
+                                        bytes([0xFF] + list(range(8)))]
+
+        chunks = (bytes(range(i, i + 10)) for i in range(0, 70, 10))
+        result = b"".join(self.spi.transfer_stream(chunks))
+
+        assert_that(self.serial.write.call_args_list, is_([
+            call(bytes([0x61] + list(range(62)))),
+            call(bytes([0x61] + list(range(62, 70)))),
+        ]))
+        assert_that(result, is_(bytes(range(62)) + bytes(range(8))))
+
+    def test_transfer_stream_failure(self):
+        self.serial.read.side_effect = [bytes([0x00] * 63),
+                                        bytes([0xFF] * 7)]
+
+        assert_that(
+            calling(list).with_args(self.spi.transfer_stream([0] * 68)),
+            raises(UsbIssError, "Received 0x00 instead of ACK"))
+        # The rest of the data isn't sent
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x61] + [0] * 62)))
+
+    def test_transfer_stream_closed_early(self):
+        self.serial.read.side_effect = [bytes([0xFF] * 63),
+                                        bytes([0xFF] * 7)]
+
+        stream = self.spi.transfer_stream([0] * 68)
+        next(stream)
+        stream.close()
+
+        assert_that(self.serial.write, called_once_with(
+            bytes([0x61] + [0] * 62)))
@@ -0,0 +1,260 @@
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from hamcrest import assert_that, is_, calling, raises, close_to
+
+from usb_iss import UsbIss, UsbIssError, defs
+from usb_iss.emulator import Emulator, EmulatedSerial
+from usb_iss.exceptions import ResponseTimeoutError
+from usb_iss.timeouts import Timeouts
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+GET_PINS = (defs.Command.GET_PINS.value, None)
+
+
+class RecordingSerial(EmulatedSerial):
+    """
+    Records the timeout of each read.
+    """
+    def __init__(self, emulator):
+        super(RecordingSerial, self).__init__(emulator)
+        self.read_timeouts = []
+
+    def read(self, size=1):
+        self.read_timeouts.append(self.timeout)
+        return super(RecordingSerial, self).read(size)
+
+
+class TestTimeouts(unittest.TestCase):
+    def setUp(self):
+        self.timeouts = Timeouts(usb_latency=0.001, margin=2.0, slack=0.01)
+
+    def test_no_bus_activity(self):
+        assert_that(self.timeouts.timeout([GET_PINS]), close_to(0.012, 1e-9))
+
+    def test_i2c_read(self):
+        # Address, register, address again after the restart, 60 bytes read
+        # at 20kHz
+        commands = [(defs.Command.I2C_AD1.value, [0xA1, 0x00, 60])]
+
+        assert_that(self.timeouts.timeout(commands), close_to(
+            2.0 * (0.001 + 63 * 9 / 20000.0) + 0.01, 1e-9))
+
+    def test_spi(self):
+        commands = [(defs.Command.SPI.value, [0] * 62)]
+        self.timeouts.spi_clock_hz = 500000
+
+        assert_that(self.timeouts.timeout(commands), close_to(
+            2.0 * (0.001 + 62 * 8 / 500000.0) + 0.01, 1e-9))
+
+    def test_several_commands(self):
+        self.timeouts.i2c_clock_hz = 100000
+        commands = [GET_PINS, (defs.Command.I2C_AD1.value, [0xA1, 0x00, 9])]
+
+        assert_that(self.timeouts.timeout(commands), close_to(
+            2.0 * (0.001 + 12 * 9 / 100000.0) + 0.01, 1e-9))
+
+    @patch('usb_iss.timeouts.perf_counter')
+    def test_calibrate(self, perf_counter):
+        round_trips = [0.001, 0.003, 0.002, 0.009, 0.002]
+        perf_counter.side_effect = [
+            time for round_trip in round_trips for time in (1.0,
+                                                            1.0 + round_trip)]
+        iss = UsbIss(emulator=Emulator(), timeouts=self.timeouts).open("COM3")
+
+        assert_that(iss.calibrate_timeouts(samples=5), close_to(0.009, 1e-9))
+        assert_that(self.timeouts.usb_latency, close_to(0.009, 1e-9))
+
+    @patch('usb_iss.timeouts.perf_counter')
+    def test_calibrate_percentile(self, perf_counter):
+        perf_counter.side_effect = [
+            time for round_trip in range(1, 11) for time in (0.0, round_trip)]
+        iss = UsbIss(emulator=Emulator()).open("COM3")
+
+        assert_that(self.timeouts.calibrate(iss._drv, samples=10,
+                                            percentile=0.5), is_(6))
+
+    def test_calibrate_without_timeouts(self):
+        iss = UsbIss(emulator=Emulator()).open("COM3")
+
+        assert_that(calling(iss.calibrate_timeouts),
+                    raises(UsbIssError, r"UsbIss\(timeouts=...\)"))
+
+
+class TestUsbIssTimeouts(unittest.TestCase):
+    def setUp(self):
+        self.emulator = Emulator()
+        self.serial = RecordingSerial(self.emulator)
+
+    def open(self, **kwargs):
+        iss = UsbIss(emulator=self.emulator, **kwargs).open("COM3")
+        iss._port_drv._serial = self.serial
+        return iss
+
+    @patch('usb_iss.driver.monotonic')
+    def test_adaptive_timeout(self, monotonic):
+        monotonic.return_value = 100.0
+        iss = self.open(timeouts=Timeouts(usb_latency=0.001))
+
+        iss.io.get_pins()
+
+        # Rounded up to the millisecond
+        assert_that(self.serial.read_timeouts, is_([0.012]))
+
+    @patch('usb_iss.driver.monotonic')
+    def test_deadline_cleared_after_responses(self, monotonic):
+        monotonic.return_value = 100.0
+        iss = self.open(timeouts=Timeouts(usb_latency=0.001))
+        iss.io.get_pins()
+        with iss.batch() as batch:
+            batch.io.get_pins()
+
+        # A later read that doesn't follow a write uses the usual timeout
+        monotonic.return_value = 200.0
+        self.serial._output.extend(bytes([0x00]))
+        iss._port_drv.read(1)
+
+        assert_that(self.serial.read_timeouts, is_([0.012, 0.012, 0.5]))
+
+    def test_fixed_timeout(self):
+        iss = self.open()
+
+        iss.io.get_pins()
+
+        assert_that(self.serial.read_timeouts, is_([None]))
+
+    @patch('usb_iss.driver.monotonic')
+    @patch('usb_iss.timeouts.monotonic')
+    def test_with_timeout(self, timeouts_monotonic, driver_monotonic):
+        timeouts_monotonic.return_value = 100.0
+        driver_monotonic.return_value = 100.0
+        iss = self.open()
+
+        assert_that(iss.with_timeout(0.05).io.get_pins(), is_([0, 0, 0, 0]))
+        iss.with_timeout(deadline=100.02).io.get_pins()
+        iss.with_timeout(0.05, deadline=100.03).io.get_pins()
+
+        assert_that(self.serial.read_timeouts, is_([0.05, 0.02, 0.03]))
+        # The usual timeout is restored afterwards
+        assert_that(self.serial.timeout, is_(0.5))
+
+    @patch('usb_iss.driver.monotonic')
+    @patch('usb_iss.timeouts.monotonic')
+    def test_with_timeout_overrides_adaptive(self, timeouts_monotonic,
+                                             driver_monotonic):
+        timeouts_monotonic.return_value = 100.0
+        driver_monotonic.return_value = 100.0
+        iss = self.open(timeouts=Timeouts(usb_latency=0.001))
+
+        iss.with_timeout(0.25).io.get_pins()
+        iss.io.get_pins()
+
+        assert_that(self.serial.read_timeouts, is_([0.25, 0.012]))
+
+    def test_i2c_clock(self):
+        timeouts = Timeouts()
+        iss = self.open(timeouts=timeouts)
+
+        iss.setup_i2c(clock_khz=100)
+
+        assert_that(timeouts.i2c_clock_hz, is_(100000))
+
+    def test_i2c_serial_clock(self):
+        timeouts = Timeouts()
+        iss = self.open(timeouts=timeouts)
+
+        iss.setup_i2c_serial(clock_khz=1000)
+
+        assert_that(timeouts.i2c_clock_hz, is_(1000000))
+
+    def test_spi_clock(self):
+        timeouts = Timeouts()
+        iss = self.open(timeouts=timeouts)
+
+        iss.setup_spi(clock_khz=500)
+
+        assert_that(timeouts.spi_clock_hz, is_(500000))
+
+    def test_clock_unchanged_by_rejected_mode(self):
+        timeouts = Timeouts()
+        iss = self.open(timeouts=timeouts)
+
+        assert_that(
+            calling(iss._set_mode).with_args(0x42, [0x00],
+                                             i2c_clock_khz=100),
+            raises(UsbIssError, "UNKNOWN_COMMAND"))
+
+        assert_that(timeouts.i2c_clock_hz, is_(20000))
+
+    @patch('usb_iss.driver.monotonic')
+    @patch('usb_iss.timeouts.monotonic')
+    def test_batch_with_timeout(self, timeouts_monotonic, driver_monotonic):
+        timeouts_monotonic.return_value = 100.0
+        driver_monotonic.return_value = 100.0
+        iss = self.open()
+        self.emulator.pins = 0x05
+
+        with iss.with_timeout(deadline=100.02).batch() as batch:
+            pins = batch.io.get_pins()
+            ad = batch.io.get_ad(1)
+
+        assert_that(pins.result(), is_([1, 0, 1, 0]))
+        assert_that(ad.result(), is_(0))
+        assert_that(self.serial.read_timeouts, is_([0.02, 0.02]))
+        # The usual timeout is restored afterwards
+        assert_that(self.serial.timeout, is_(0.5))
+
+    def test_batch_with_timeout_thread_safe(self):
+        iss = UsbIss(emulator=self.emulator, thread_safe=True)
+        self.addCleanup(iss.close)
+        self.emulator.pins = 0x05
+
+        with iss.with_timeout(0.5).batch() as batch:
+            pins = batch.io.get_pins()
+
+        assert_that(pins.result(), is_([1, 0, 1, 0]))
+
+    def test_with_timeout_no_direct_access(self):
+        iss = self.open()
+
+        assert_that(calling(iss.with_timeout(0.05).i2c._drv.read).with_args(1),
+                    raises(UsbIssError, "can't be used directly"))
+
+    def test_with_timeout_thread_safe(self):
+        iss = UsbIss(emulator=self.emulator, thread_safe=True).open("COM3")
+        self.emulator.pins = 0x05
+
+        assert_that(iss.with_timeout(0.5).io.get_pins(), is_([1, 0, 1, 0]))
+        iss.close()
+
+    def test_with_timeout_required(self):
+        iss = self.open()
+
+        assert_that(calling(iss.with_timeout),
+                    raises(UsbIssError, r"timeout or deadline"))
+
+    def test_deadline_passed(self):
+        iss = self.open()
+
+        iss.with_timeout(deadline=0.0).io.get_pins()
+
+        assert_that(self.serial.read_timeouts, is_([0.0]))
+
+    def test_late_response_discarded(self):
+        iss = self.open()
+        assert_that(calling(iss._port_drv.read).with_args(1),
+                    raises(ResponseTimeoutError))
+
+        # The response arrives after the timeout
+        self.serial._output.extend(bytes([0x0F]))
+
+        assert_that(iss.io.get_pins(), is_([0, 0, 0, 0]))
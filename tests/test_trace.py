@@ -0,0 +1,122 @@
+from io import StringIO
+import logging
+import unittest
+# Py2 doesn't have mock included in unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from hamcrest import assert_that, is_, calling, raises
+
+from usb_iss import UsbIss, UsbIssError, defs
+from usb_iss.emulator import Emulator
+from usb_iss.trace import Tracer, LOGGER_NAME
+
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
+
+class TestTracer(unittest.TestCase):
+    def test_write_and_read(self):
+        tracer = Tracer()
+
+        with self.assertLogs(LOGGER_NAME, logging.DEBUG) as logs:
+            tracer.write([(defs.Command.I2C_AD1.value, [0xA1, 0x00, 0x03]),
+                          (defs.Command.GET_PINS.value, None)])
+            tracer.read(bytes([0x01, 0x02, 0x03, 0x0F]))
+
+        assert_that(logs.output, is_([
+            "DEBUG:usb_iss.trace:write: I2C_AD1 A1 00 03; GET_PINS",
+            "DEBUG:usb_iss.trace:read : 01 02 03 0F"]))
+
+    def test_sub_commands(self):
+        tracer = Tracer()
+
+        with self.assertLogs(LOGGER_NAME, logging.DEBUG) as logs:
+            tracer.write([(defs.Command.USB_ISS.value, [0x02, 0x70, 0x0A]),
+                          (defs.Command.USB_ISS.value, [0x42]),
+                          (0x42, [0x01])])
+
+        assert_that(logs.output, is_([
+            "DEBUG:usb_iss.trace:write: ISS_MODE 70 0A; USB_ISS 42; 42 01"]))
+
+    def test_sampling(self):
+        tracer = Tracer(sample_rate=0.25)
+
+        with self.assertLogs(LOGGER_NAME, logging.DEBUG) as logs:
+            for pins in range(8):
+                tracer.write([(defs.Command.GET_PINS.value, None)])
+                tracer.read(bytes([pins]))
+
+        assert_that(logs.output, is_([
+            "DEBUG:usb_iss.trace:write: GET_PINS",
+            "DEBUG:usb_iss.trace:read : 00",
+            "DEBUG:usb_iss.trace:write: GET_PINS",
+            "DEBUG:usb_iss.trace:read : 04"]))
+
+    def test_invalid_sample_rate(self):
+        assert_that(calling(Tracer).with_args(sample_rate=0),
+                    raises(UsbIssError, r"sample_rate"))
+
+    def test_disabled_logger(self):
+        logger = logging.getLogger("usb_iss.test.disabled")
+        logger.setLevel(logging.INFO)
+        tracer = Tracer(logger)
+
+        tracer.write([(defs.Command.GET_PINS.value, None)])
+        tracer.read(bytes([0x00]))
+
+        assert_that(tracer._sampled, is_(False))
+
+    def test_bind(self):
+        tracer = Tracer()
+
+        tracer.bind("/dev/ttyACM0")
+
+        assert_that(tracer.logger.name, is_("usb_iss.trace.ttyACM0"))
+
+    def test_bind_with_logger(self):
+        logger = logging.getLogger("fixture")
+        tracer = Tracer(logger)
+
+        tracer.bind("COM3")
+
+        assert_that(tracer.logger, is_(logger))
+
+    def test_console(self):
+        logger = logging.getLogger(LOGGER_NAME)
+        handlers = list(logger.handlers)
+        level = logger.level
+
+        with patch('sys.stderr', new_callable=StringIO) as stderr:
+            tracer = Tracer.console()
+            tracer.bind("COM3")
+            tracer.write([(defs.Command.GET_PINS.value, None)])
+
+        assert_that(stderr.getvalue(), is_("USB_ISS write: GET_PINS\n"))
+        assert_that(tracer.logger.propagate, is_(False))
+        # The application's loggers are left alone
+        assert_that(logger.handlers, is_(handlers))
+        assert_that(logger.level, is_(level))
+
+
+class TestUsbIssTrace(unittest.TestCase):
+    def test_tracer(self):
+        iss = UsbIss(emulator=Emulator(), tracer=Tracer())
+        iss.open("COM3")
+
+        with self.assertLogs("usb_iss.trace.COM3", logging.DEBUG) as logs:
+            iss.io.get_pins()
+
+        assert_that(logs.output, is_([
+            "DEBUG:usb_iss.trace.COM3:write: GET_PINS",
+            "DEBUG:usb_iss.trace.COM3:read : 00"]))
+
+    def test_no_tracer(self):
+        iss = UsbIss(emulator=Emulator())
+
+        assert_that(iss._drv.tracer, is_(None))
@@ -1,33 +1,39 @@
 import unittest
 # Py2 doesn't have mock included in unittest
 try:
-    from unittest.mock import Mock
+    from unittest.mock import patch
 except ImportError:
-    from mock import Mock
+    from mock import patch
 
 from hamcrest import assert_that, is_, calling, raises
 from matchmock import called_with, called_once, called_once_with
 
 from usb_iss import UsbIss, UsbIssError, defs
 
+# In Py2, bytes means str, and there's no immutable byte array defined.
+# Use bytearray instead - this is mutable, but otherwise equivalent to
+# Python3's bytes.
+if isinstance(bytes(), str):
+    bytes = bytearray
+
 
 class TestUSbIss(unittest.TestCase):
     def setUp(self):
-        self.usb_iss = UsbIss()
-        self.driver = Mock()
-        self.usb_iss._drv = self.driver
+        patcher = patch('serial.Serial')
+        self.addCleanup(patcher.stop)
+        self.serial_class = patcher.start()
+        self.serial = self.serial_class()
+        self.serial.read.return_value = bytes([0xFF, 0x00])
 
-    def test_open(self):
-        self.usb_iss.open('PORTNAME')
+        self.usb_iss = UsbIss().open('PORTNAME')
 
-        assert_that(self.driver.open, called_once_with('PORTNAME'))
+    def test_open(self):
+        assert_that(self.serial_class.call_args[1]['port'], is_('PORTNAME'))
 
     def test_close(self):
-        self.usb_iss.open('PORTNAME')
-
         self.usb_iss.close()
 
-        assert_that(self.driver.close, called_once())
+        assert_that(self.serial.close, called_once())
 
     def test_setup_i2c(self):
         test_matrix = [
@@ -47,26 +53,31 @@ class TestUSbIss(unittest.TestCase):
                 io1_type=defs.IOType.OUTPUT_LOW,
                 io2_type=defs.IOType.OUTPUT_HIGH)
 
-            assert_that(self.driver.write_cmd,
-                        called_with(0x5A, [0x02, i2c_mode, 0x04]))
+            assert_that(self.serial.write,
+                        called_with(bytes([0x5A, 0x02, i2c_mode, 0x04])))
 
     def test_setup_i2c_default_values(self):
         self.usb_iss.setup_i2c()
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_once_with(bytes([
+                        0x5A,
                         0x02,
                         defs.Mode.I2C_H_400KHZ.value,
                         defs.IOType.DIGITAL_INPUT.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
+
+    def test_setup_i2c_records_clock(self):
+        self.usb_iss.setup_i2c(clock_khz=100)
+
+        assert_that(self.usb_iss.i2c.clock_khz, is_(100))
 
     def test_setup_i2c_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x05])
 
         assert_that(calling(self.usb_iss.setup_i2c),
-                    raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.ModeError))
+                    raises(UsbIssError,
+                           "Received ModeError.UNKNOWN_COMMAND"))
 
     def test_setup_i2c_invalid_clock_rate(self):
         assert_that(calling(self.usb_iss.setup_i2c).
@@ -101,8 +112,8 @@ class TestUSbIss(unittest.TestCase):
                 clock_khz=clk_khz,
                 use_i2c_hardware=use_i2c_hardware)
 
-            assert_that(self.driver.write_cmd,
-                        called_with(0x5A, [0x02, i2c_mode, 0x01, 0x37]))
+            assert_that(self.serial.write,
+                        called_with(bytes([0x5A, 0x02, i2c_mode, 0x01, 0x37])))
 
     def test_setup_i2c_serial_baud_rates(self):
         test_matrix = [
@@ -119,39 +130,41 @@ class TestUSbIss(unittest.TestCase):
         for (baud_rate, divisor) in test_matrix:
             self.usb_iss.setup_i2c_serial(baud_rate=baud_rate)
 
-            assert_that(self.driver.write_cmd,
-                        called_with(0x5A, [
+            assert_that(self.serial.write,
+                        called_with(bytes([
+                            0x5A,
                             0x02,
                             defs.Mode.I2C_H_400KHZ.value | 0x01] +
-                            divisor))
+                            divisor)))
 
     def test_setup_i2c_serial_default_values(self):
         self.usb_iss.setup_i2c_serial()
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_once_with(bytes([
+                        0x5A,
                         0x02,
                         defs.Mode.I2C_H_400KHZ.value | 0x01,
                         0x01,
-                        0x37]))
+                        0x37])))
 
     def test_setup_i2c_serial_overflow(self):
         self.usb_iss.setup_i2c_serial(baud_rate=1)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_once_with(bytes([
+                        0x5A,
                         0x02,
                         defs.Mode.I2C_H_400KHZ.value | 0x01,
                         0xFF,
-                        0xFF]))
+                        0xFF])))
 
     def test_setup_i2c_serial_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x05])
 
         assert_that(calling(self.usb_iss.setup_i2c_serial),
-                    raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.ModeError))
+                    raises(UsbIssError,
+                           "Received ModeError.UNKNOWN_COMMAND"))
 
     def test_setup_spi(self):
         test_matrix = [
@@ -165,28 +178,27 @@ class TestUSbIss(unittest.TestCase):
                 spi_mode=defs.SPIMode.TX_IDLE_TO_ACTIVE_IDLE_HIGH,
                 clock_khz=clk_khz)
 
-            assert_that(self.driver.write_cmd,
-                        called_with(0x5A, [0x02, 0x93, divisor]))
+            assert_that(self.serial.write,
+                        called_with(bytes([0x5A, 0x02, 0x93, divisor])))
 
     def test_setup_spi_default_values(self):
         self.usb_iss.setup_spi()
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [0x02, 0x90, 11]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x5A, 0x02, 0x90, 11])))
 
     def test_setup_spi_overflow(self):
         self.usb_iss.setup_spi(clock_khz=1)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [0x02, 0x90, 0xFF]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x5A, 0x02, 0x90, 0xFF])))
 
     def test_setup_spi_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x05])
 
         assert_that(calling(self.usb_iss.setup_spi),
-                    raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.ModeError))
+                    raises(UsbIssError,
+                           "Received ModeError.UNKNOWN_COMMAND"))
 
     def test_setup_io(self):
         self.usb_iss.setup_io(
@@ -195,28 +207,38 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [0x02, 0x00, 0xB4]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x5A, 0x02, 0x00, 0xB4])))
+
+    def test_setup_io_records_outputs(self):
+        self.serial.read.side_effect = [bytes([0xFF, 0x00]), bytes([0xFF])]
+        self.usb_iss.setup_io(
+            io1_type=defs.IOType.OUTPUT_LOW,
+            io2_type=defs.IOType.OUTPUT_HIGH,
+            io3_type=defs.IOType.OUTPUT_HIGH)
+        self.usb_iss.io.set_pin(1, 1)
+
+        assert_that(self.serial.write, called_with(bytes([0x63, 0x07])))
 
     def test_setup_io_default_values(self):
         self.usb_iss.setup_io()
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_once_with(bytes([
+                        0x5A,
                         0x02,
                         0x00,
                         defs.IOType.DIGITAL_INPUT.value << 6 |
                         defs.IOType.DIGITAL_INPUT.value << 4 |
                         defs.IOType.DIGITAL_INPUT.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
 
     def test_setup_io_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x05])
 
         assert_that(calling(self.usb_iss.setup_io),
-                    raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.ModeError))
+                    raises(UsbIssError,
+                           "Received ModeError.UNKNOWN_COMMAND"))
 
     def test_change_io(self):
         self.usb_iss.change_io(
@@ -225,28 +247,28 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [0x02, 0x10, 0xB4]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([0x5A, 0x02, 0x10, 0xB4])))
 
     def test_change_io_default_values(self):
         self.usb_iss.change_io()
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_once_with(bytes([
+                        0x5A,
                         0x02,
                         0x10,
                         defs.IOType.DIGITAL_INPUT.value << 6 |
                         defs.IOType.DIGITAL_INPUT.value << 4 |
                         defs.IOType.DIGITAL_INPUT.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
 
     def test_change_io_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x05])
 
         assert_that(calling(self.usb_iss.change_io),
-                    raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.ModeError))
+                    raises(UsbIssError,
+                           "Received ModeError.UNKNOWN_COMMAND"))
 
     def test_setup_serial_baud_rates(self):
         test_matrix = [
@@ -265,71 +287,72 @@ class TestUSbIss(unittest.TestCase):
                                       io3_type=defs.IOType.OUTPUT_LOW,
                                       io4_type=defs.IOType.OUTPUT_HIGH)
 
-            assert_that(self.driver.write_cmd,
-                        called_with(0x5A, [0x02, 0x01] + divisor + [0x40]))
+            assert_that(self.serial.write, called_with(
+                bytes([0x5A, 0x02, 0x01] + divisor + [0x40])))
+            assert_that(self.usb_iss.serial.baud_rate, is_(baud_rate))
 
     def test_setup_serial_default_values(self):
         self.usb_iss.setup_serial()
 
-        assert_that(self.driver.write_cmd,
-                    called_once_with(0x5A,
-                                     [0x02, 0x01, 0x01, 0x37,
-                                      defs.IOType.DIGITAL_INPUT.value << 6 |
-                                      defs.IOType.DIGITAL_INPUT.value << 4]))
+        assert_that(self.serial.write,
+                    called_once_with(bytes([
+                        0x5A, 0x02, 0x01, 0x01, 0x37,
+                        defs.IOType.DIGITAL_INPUT.value << 6 |
+                        defs.IOType.DIGITAL_INPUT.value << 4])))
 
     def test_setup_serial_failure(self):
-        self.driver.check_ack_error_code.side_effect = UsbIssError
+        self.serial.read.return_value = bytes([0x00, 0x05])
 
         assert_that(calling(self.usb_iss.setup_serial),
-                    raises(UsbIssError))
-        assert_that(self.driver.check_ack_error_code,
-                    called_once_with(defs.ModeError))
+                    raises(UsbIssError,
+                           "Received ModeError.UNKNOWN_COMMAND"))
 
     def test_read_module_id(self):
-        self.driver.read.return_value = [0x07, 0x02, 0x40]
+        self.serial.read.return_value = bytes([0x07, 0x02, 0x40])
 
         result = self.usb_iss.read_module_id()
 
         assert_that(result, is_(0x07))
-        assert_that(self.driver.write_cmd, called_once_with(0x5A, [0x01]))
-        assert_that(self.driver.read, called_once_with(3))
+        assert_that(self.serial.write, called_once_with(bytes([0x5A, 0x01])))
+        assert_that(self.serial.read, called_once_with(3))
 
     def test_read_fw_version(self):
-        self.driver.read.return_value = [0x07, 0x02, 0x40]
+        self.serial.read.return_value = bytes([0x07, 0x02, 0x40])
 
         result = self.usb_iss.read_fw_version()
 
         assert_that(result, is_(0x02))
-        assert_that(self.driver.write_cmd, called_once_with(0x5A, [0x01]))
-        assert_that(self.driver.read, called_once_with(3))
+        assert_that(self.serial.write, called_once_with(bytes([0x5A, 0x01])))
+        assert_that(self.serial.read, called_once_with(3))
 
     def test_read_iss_mode(self):
-        self.driver.read.return_value = [0x07, 0x02, 0x40]
+        self.serial.read.return_value = bytes([0x07, 0x02, 0x40])
 
         result = self.usb_iss.read_iss_mode()
 
         assert_that(result, is_(defs.Mode.I2C_S_100KHZ))
-        assert_that(self.driver.write_cmd, called_once_with(0x5A, [0x01]))
-        assert_that(self.driver.read, called_once_with(3))
+        assert_that(self.serial.write, called_once_with(bytes([0x5A, 0x01])))
+        assert_that(self.serial.read, called_once_with(3))
 
     def test_read_iss_mode_with_serial(self):
-        self.driver.read.return_value = [0x07, 0x02, 0x71]
+        self.serial.read.return_value = bytes([0x07, 0x02, 0x71])
 
         result = self.usb_iss.read_iss_mode()
 
         assert_that(result, is_(defs.Mode.SERIAL_I2C_H_400KHZ))
-        assert_that(self.driver.write_cmd, called_once_with(0x5A, [0x01]))
-        assert_that(self.driver.read, called_once_with(3))
+        assert_that(self.serial.write, called_once_with(bytes([0x5A, 0x01])))
+        assert_that(self.serial.read, called_once_with(3))
 
     def test_read_serial_number(self):
-        self.driver.read.return_value = [
-            0x30, 0x30, 0x30, 0x30, 0x30, 0x30, 0x30, 0x31]
+        self.serial.read.return_value = bytes([
+            0x30, 0x30, 0x30, 0x30, 0x30, 0x30, 0x30, 0x31])
 
         result = self.usb_iss.read_serial_number()
 
         assert_that(result, is_("00000001"))
-        assert_that(self.driver.write_cmd, called_once_with(0x5A, [0x03]))
-        assert_that(self.driver.read, called_once_with(8))
+        assert_that(self.serial.write, called_once_with(bytes([0x5A, 0x03])))
+        assert_that(self.serial.read, called_once_with(8))
+        assert_that(self.usb_iss.i2c.serial_number, is_("00000001"))
 
     def test_setup_io_then_change_io_defaults(self):
         self.usb_iss.setup_io(
@@ -338,19 +361,20 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [0x02, 0x00, 0xB4]))
+        assert_that(self.serial.write,
+                    called_with(bytes([0x5A, 0x02, 0x00, 0xB4])))
 
         self.usb_iss.change_io()
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         0x10,
                         defs.IOType.DIGITAL_INPUT.value << 6 |
                         defs.IOType.ANALOGUE_INPUT.value << 4 |
                         defs.IOType.OUTPUT_HIGH.value << 2 |
-                        defs.IOType.OUTPUT_LOW.value]))
+                        defs.IOType.OUTPUT_LOW.value])))
 
     def test_setup_io_then_change_io(self):
         self.usb_iss.setup_io(
@@ -359,8 +383,8 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [0x02, 0x00, 0xB4]))
+        assert_that(self.serial.write,
+                    called_with(bytes([0x5A, 0x02, 0x00, 0xB4])))
 
         self.usb_iss.change_io(
             io1_type=defs.IOType.DIGITAL_INPUT,
@@ -368,14 +392,15 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.OUTPUT_HIGH,
             io4_type=defs.IOType.OUTPUT_LOW)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         0x10,
                         defs.IOType.OUTPUT_LOW.value << 6 |
                         defs.IOType.OUTPUT_HIGH.value << 4 |
                         defs.IOType.ANALOGUE_INPUT.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
 
     def test_setup_io_then_change_io_partial(self):
         self.usb_iss.setup_io(
@@ -384,21 +409,22 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [0x02, 0x00, 0xB4]))
+        assert_that(self.serial.write,
+                    called_with(bytes([0x5A, 0x02, 0x00, 0xB4])))
 
         self.usb_iss.change_io(
             io1_type=defs.IOType.DIGITAL_INPUT,
             io3_type=defs.IOType.OUTPUT_HIGH)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         0x10,
                         defs.IOType.DIGITAL_INPUT.value << 6 |
                         defs.IOType.OUTPUT_HIGH.value << 4 |
                         defs.IOType.OUTPUT_HIGH.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
 
     def test_setup_io_then_setup_i2c_override(self):
         self.usb_iss.setup_io(
@@ -407,25 +433,27 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         0x00,
                         defs.IOType.DIGITAL_INPUT.value << 6 |
                         defs.IOType.ANALOGUE_INPUT.value << 4 |
                         defs.IOType.OUTPUT_HIGH.value << 2 |
-                        defs.IOType.OUTPUT_LOW.value]))
+                        defs.IOType.OUTPUT_LOW.value])))
 
         self.usb_iss.setup_i2c(
             io1_type=defs.IOType.DIGITAL_INPUT,
             io2_type=defs.IOType.ANALOGUE_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         defs.Mode.I2C_H_400KHZ.value,
                         defs.IOType.ANALOGUE_INPUT.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
 
     def test_setup_io_then_setup_i2c_defaults(self):
         self.usb_iss.setup_io(
@@ -434,43 +462,47 @@ class TestUSbIss(unittest.TestCase):
             io3_type=defs.IOType.ANALOGUE_INPUT,
             io4_type=defs.IOType.DIGITAL_INPUT)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         0x00,
                         defs.IOType.DIGITAL_INPUT.value << 6 |
                         defs.IOType.ANALOGUE_INPUT.value << 4 |
                         defs.IOType.OUTPUT_HIGH.value << 2 |
-                        defs.IOType.OUTPUT_LOW.value]))
+                        defs.IOType.OUTPUT_LOW.value])))
 
         self.usb_iss.setup_i2c()
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         defs.Mode.I2C_H_400KHZ.value,
                         defs.IOType.OUTPUT_HIGH.value << 2 |
-                        defs.IOType.OUTPUT_LOW.value]))
+                        defs.IOType.OUTPUT_LOW.value])))
 
     def test_setup_i2c_defaults_then_change_io_partial(self):
         self.usb_iss.setup_i2c()
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         defs.Mode.I2C_H_400KHZ.value,
                         defs.IOType.DIGITAL_INPUT.value << 2 |
-                        defs.IOType.DIGITAL_INPUT.value]))
+                        defs.IOType.DIGITAL_INPUT.value])))
 
         self.usb_iss.change_io(
             io1_type=defs.IOType.OUTPUT_LOW,
             io4_type=defs.IOType.OUTPUT_HIGH)
 
-        assert_that(self.driver.write_cmd,
-                    called_with(0x5A, [
+        assert_that(self.serial.write,
+                    called_with(bytes([
+                        0x5A,
                         0x02,
                         0x10,
                         defs.IOType.OUTPUT_HIGH.value << 6 |
                         defs.IOType.DIGITAL_INPUT.value << 4 |
                         defs.IOType.DIGITAL_INPUT.value << 2 |
-                        defs.IOType.OUTPUT_LOW.value]))
+                        defs.IOType.OUTPUT_LOW.value])))